@@ -10,6 +10,14 @@ from decimal import Decimal, ROUND_HALF_UP
 import uuid
 import calendar
 
+from backend.utils.financial_reports import category_totals, summarize, validate_range
+
+try:
+    from backend.dependencies import get_db
+except Exception:
+    async def get_db():
+        raise RuntimeError("get_db dependency not found; import path needs adjustment")
+
 # Financial Models
 
 class AccountType(str, Enum):
@@ -432,9 +440,43 @@ class TaxReport(BaseModel):
 
 # Financial Analysis Classes
 
+def _money(value: float) -> Decimal:
+    return Decimal(str(value)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
 class FinancialAnalyzer:
     """Advanced financial analysis and reporting"""
     
+    @staticmethod
+    def profit_loss_line(transaction_type: str, category: Optional[str]) -> Optional[str]:
+        """The ProfitLossReport field a transaction of this type/category rolls into"""
+        category = (category or "").lower()
+        
+        # Categorize revenue
+        if transaction_type == TransactionType.INCOME:
+            if 'patient' in category:
+                return 'patient_services'
+            elif 'insurance' in category:
+                return 'insurance_reimbursements'
+            return 'other_income'
+        
+        # Categorize expenses
+        elif transaction_type == TransactionType.EXPENSE:
+            if 'salary' in category or 'wage' in category or 'payroll' in category:
+                return 'salaries_wages'
+            elif 'benefit' in category:
+                return 'benefits'
+            elif 'supply' in category or category == 'medical_supplies':
+                return 'medical_supplies'
+            elif 'rent' in category or 'utilit' in category:
+                return 'rent_utilities'
+            elif 'insurance' in category:
+                return 'insurance_expense'
+            elif 'depreciation' in category:
+                return 'depreciation'
+            return 'other_expenses'
+        
+        return None
+    
     @staticmethod
     def generate_profit_loss(start_date: date, end_date: date, transactions: List[ComprehensiveTransaction]) -> ProfitLossReport:
         """Generate Profit & Loss statement"""
@@ -442,33 +484,22 @@ class FinancialAnalyzer:
         
         for transaction in transactions:
             if start_date <= transaction.transaction_date <= end_date:
-                amount = transaction.amount
-                
-                # Categorize revenue
-                if transaction.transaction_type == TransactionType.INCOME:
-                    if 'patient' in transaction.category.lower():
-                        pl.patient_services += amount
-                    elif 'insurance' in transaction.category.lower():
-                        pl.insurance_reimbursements += amount
-                    else:
-                        pl.other_income += amount
-                
-                # Categorize expenses
-                elif transaction.transaction_type == TransactionType.EXPENSE:
-                    if 'salary' in transaction.category.lower() or 'wage' in transaction.category.lower():
-                        pl.salaries_wages += amount
-                    elif 'benefit' in transaction.category.lower():
-                        pl.benefits += amount
-                    elif 'supply' in transaction.category.lower():
-                        pl.medical_supplies += amount
-                    elif 'rent' in transaction.category.lower() or 'utility' in transaction.category.lower():
-                        pl.rent_utilities += amount
-                    elif 'insurance' in transaction.category.lower():
-                        pl.insurance_expense += amount
-                    elif 'depreciation' in transaction.category.lower():
-                        pl.depreciation += amount
-                    else:
-                        pl.other_expenses += amount
+                line = FinancialAnalyzer.profit_loss_line(transaction.transaction_type, transaction.category)
+                if line:
+                    setattr(pl, line, getattr(pl, line) + transaction.amount)
+        
+        pl.calculate_totals()
+        return pl
+    
+    @staticmethod
+    def profit_loss_from_totals(start_date: date, end_date: date, rows: List[Dict[str, Any]]) -> ProfitLossReport:
+        """Profit & Loss statement from pre-aggregated (type, category) totals"""
+        pl = ProfitLossReport(period_start=start_date, period_end=end_date)
+        
+        for row in rows:
+            line = FinancialAnalyzer.profit_loss_line(row["type"], row.get("category"))
+            if line:
+                setattr(pl, line, getattr(pl, line) + _money(row["total"]))
         
         pl.calculate_totals()
         return pl
@@ -611,14 +642,22 @@ async def get_transactions(
     """Get transactions with filtering"""
     pass
 
-@finance_router.get("/reports/profit-loss")
+async def _period_totals(db, start_date: date, end_date: date, granularity: Optional[str] = None) -> List[Dict[str, Any]]:
+    try:
+        validate_range(start_date, end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await category_totals(db, start_date, end_date, granularity)
+
+@finance_router.get("/reports/profit-loss", response_model=ProfitLossReport)
 async def generate_profit_loss_report(
     start_date: date,
-    end_date: date
+    end_date: date,
+    db=Depends(get_db)
 ):
     """Generate Profit & Loss report"""
-    # Implementation would use FinancialAnalyzer
-    pass
+    rows = await _period_totals(db, start_date, end_date)
+    return FinancialAnalyzer.profit_loss_from_totals(start_date, end_date, rows)
 
 @finance_router.get("/reports/balance-sheet")
 async def generate_balance_sheet_report(as_of_date: date):
@@ -628,18 +667,66 @@ async def generate_balance_sheet_report(as_of_date: date):
 @finance_router.get("/reports/cash-flow")
 async def generate_cash_flow_report(
     start_date: date,
-    end_date: date
+    end_date: date,
+    db=Depends(get_db)
 ):
-    """Generate Cash Flow statement"""
-    pass
-
-@finance_router.get("/kpis")
+    """Generate Cash Flow statement (operating cash in/out by month and payment method)"""
+    rows = await _period_totals(db, start_date, end_date, "month")
+    total = summarize(rows)
+    by_month: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        by_month.setdefault(row["period"], []).append(row)
+    
+    running = Decimal('0.00')
+    months = []
+    for period in sorted(by_month):
+        month = summarize(by_month[period])
+        running += _money(month["net_income"])
+        months.append({
+            "period": period,
+            "cash_in": month["total_income"],
+            "cash_out": month["total_expenses"],
+            "net_cash_flow": month["net_income"],
+            "cumulative_cash_flow": float(running)
+        })
+    
+    return {
+        "period_start": start_date,
+        "period_end": end_date,
+        "operating_cash_in": total["total_income"],
+        "operating_cash_out": total["total_expenses"],
+        "net_cash_flow": total["net_income"],
+        "by_payment_method": total["by_payment_method"],
+        "months": months
+    }
+
+@finance_router.get("/kpis", response_model=FinancialKPI)
 async def get_financial_kpis(
     start_date: date,
-    end_date: date
+    end_date: date,
+    db=Depends(get_db)
 ):
     """Get financial KPIs for period"""
-    pass
+    rows = await _period_totals(db, start_date, end_date)
+    profit_loss = FinancialAnalyzer.profit_loss_from_totals(start_date, end_date, rows)
+    
+    # Paying patients in the period stand in for visits (one $group, no row loading)
+    visits = await db.financial_transactions.aggregate([
+        {"$match": {
+            "transaction_date": {"$gte": start_date.isoformat(), "$lte": end_date.isoformat()},
+            "transaction_type": TransactionType.INCOME.value,
+            "patient_id": {"$ne": None}
+        }},
+        {"$group": {"_id": "$patient_id"}},
+        {"$count": "patients"}
+    ]).to_list(1)
+    
+    return FinancialAnalyzer.calculate_financial_kpis(
+        profit_loss,
+        BalanceSheet(as_of_date=end_date),
+        patient_visits=visits[0]["patients"] if visits else 0,
+        collection_rate=0.0
+    )
 
 @finance_router.post("/budgets", response_model=Budget)
 async def create_budget(budget: Budget):
@@ -0,0 +1,202 @@
+from __future__ import annotations
+from datetime import datetime
+from typing import Any, Dict, Iterable, List
+import time
+
+# Columns summed into the YTD figures carried on each payroll record
+YTD_FIELDS = ("gross_pay", "net_pay", "federal_tax", "state_tax", "social_security_tax", "medicare_tax")
+
+# Simplified flat withholding rates (same as the legacy per-employee loop)
+TAX_RATES = {
+    "federal_tax": 0.12,
+    "state_tax": 0.05,
+    "social_security_tax": 0.062,
+    "medicare_tax": 0.0145,
+}
+
+REGULAR_HOURS_CAP = 40.0
+
+
+class StageTimer:
+    """Collects wall-clock milliseconds per named stage."""
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self._t0 = time.perf_counter()
+        self._last = self._t0
+
+    def mark(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.timings[stage] = round((now - self._last) * 1000, 2)
+        self._last = now
+
+    def as_dict(self) -> Dict[str, float]:
+        out = dict(self.timings)
+        out["total"] = round((time.perf_counter() - self._t0) * 1000, 2)
+        return out
+
+
+def _as_datetime(value, end_of_day: bool = False) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    return datetime.combine(value, datetime.max.time() if end_of_day else datetime.min.time())
+
+
+def hours_from_entries(entries: Iterable[Dict[str, Any]]) -> Dict[str, float]:
+    """
+    Pair clock_in/clock_out entries (already sorted by timestamp) into worked hours.
+    Mirrors calculate_employee_hours so batched and per-employee results agree.
+    """
+    total_hours = 0.0
+    daily_hours: Dict[Any, float] = {}
+    current_clock_in = None
+
+    for entry in entries:
+        if entry.get("entry_type") == "clock_in":
+            current_clock_in = entry["timestamp"]
+        elif entry.get("entry_type") == "clock_out" and current_clock_in:
+            hours_worked = (entry["timestamp"] - current_clock_in).total_seconds() / 3600
+            entry_date = entry["timestamp"].date()
+            daily_hours[entry_date] = daily_hours.get(entry_date, 0) + hours_worked
+            total_hours += hours_worked
+            current_clock_in = None
+
+    regular_hours = min(total_hours, REGULAR_HOURS_CAP)
+    overtime_hours = max(0, total_hours - REGULAR_HOURS_CAP)
+    return {
+        "total_hours": round(total_hours, 2),
+        "regular_hours": round(regular_hours, 2),
+        "overtime_hours": round(overtime_hours, 2),
+        "double_time_hours": 0.0,
+        "daily_breakdown": {str(k): round(v, 2) for k, v in daily_hours.items()},
+    }
+
+
+async def load_period_hours(db, employee_ids: List[str], start_date, end_date) -> Dict[str, Dict[str, float]]:
+    """
+    One sorted cursor over time_entries for every employee in the period.
+    Entries arrive grouped by employee, so each group is folded as soon as it closes.
+    """
+    out: Dict[str, Dict[str, float]] = {}
+    if not employee_ids:
+        return out
+
+    cur = db.time_entries.find(
+        {
+            "employee_id": {"$in": list(employee_ids)},
+            "timestamp": {"$gte": _as_datetime(start_date), "$lte": _as_datetime(end_date, end_of_day=True)},
+        },
+        {"_id": 0, "employee_id": 1, "entry_type": 1, "timestamp": 1},
+    ).sort([("employee_id", 1), ("timestamp", 1)])
+
+    current_id = None
+    bucket: List[Dict[str, Any]] = []
+    async for entry in cur:
+        if entry["employee_id"] != current_id:
+            if current_id is not None:
+                out[current_id] = hours_from_entries(bucket)
+            current_id, bucket = entry["employee_id"], []
+        bucket.append(entry)
+    if current_id is not None:
+        out[current_id] = hours_from_entries(bucket)
+
+    empty = hours_from_entries([])
+    for emp_id in employee_ids:
+        out.setdefault(emp_id, dict(empty))
+    return out
+
+
+async def load_ytd_totals(db, employee_ids: List[str], year: int) -> Dict[str, Dict[str, float]]:
+    """
+    YTD sums for every employee in a single $group.
+    Period ids for the year are resolved first so payroll_records is matched
+    by (employee_id, payroll_period_id) instead of a per-row $lookup.
+    """
+    zero = {f: 0.0 for f in YTD_FIELDS}
+    out = {emp_id: dict(zero) for emp_id in employee_ids}
+    if not employee_ids:
+        return out
+
+    period_ids = [
+        p["id"] async for p in db.payroll_periods.find(
+            {"period_start": {"$gte": datetime(year, 1, 1), "$lt": datetime(year + 1, 1, 1)}},
+            {"_id": 0, "id": 1},
+        )
+    ]
+    if not period_ids:
+        return out
+
+    group: Dict[str, Any] = {"_id": "$employee_id"}
+    for f in YTD_FIELDS:
+        group[f] = {"$sum": f"${f}"}
+
+    pipeline = [
+        {"$match": {"employee_id": {"$in": list(employee_ids)}, "payroll_period_id": {"$in": period_ids}}},
+        {"$group": group},
+    ]
+    async for row in db.payroll_records.aggregate(pipeline):
+        out[row["_id"]] = {f: float(row.get(f) or 0.0) for f in YTD_FIELDS}
+    return out
+
+
+def compute_payroll_rows(
+    period_id: str,
+    employees: List[Dict[str, Any]],
+    hours: Dict[str, Dict[str, float]],
+    ytd: Dict[str, Dict[str, float]],
+) -> List[Dict[str, Any]]:
+    """
+    Column-wise gross/tax/net for all employees at once.
+    Returns plain dicts with PayrollRecord field names; callers validate/serialize.
+    """
+    ids = [e["id"] for e in employees]
+
+    regular_rate = []
+    for e in employees:
+        rate = e.get("hourly_rate", 0.0) or 0.0
+        if rate == 0.0 and e.get("salary"):
+            # Convert salary to hourly (assuming 40 hours/week, 52 weeks/year)
+            rate = e["salary"] / (40 * 52)
+        regular_rate.append(rate)
+
+    reg_hours = [hours[i]["regular_hours"] for i in ids]
+    ot_hours = [hours[i]["overtime_hours"] for i in ids]
+    dt_hours = [hours[i].get("double_time_hours", 0.0) for i in ids]
+
+    ot_rate = [r * 1.5 for r in regular_rate]
+    dt_rate = [r * 2.0 for r in regular_rate]
+    regular_pay = [h * r for h, r in zip(reg_hours, regular_rate)]
+    overtime_pay = [h * r for h, r in zip(ot_hours, ot_rate)]
+    double_time_pay = [h * r for h, r in zip(dt_hours, dt_rate)]
+    gross = [a + b + c for a, b, c in zip(regular_pay, overtime_pay, double_time_pay)]
+
+    taxes = {name: [g * rate for g in gross] for name, rate in TAX_RATES.items()}
+    total_taxes = [sum(col) for col in zip(*taxes.values())]
+    net = [g - t for g, t in zip(gross, total_taxes)]
+
+    rows = []
+    for n, emp_id in enumerate(ids):
+        prior = ytd.get(emp_id) or {}
+        current = {
+            "gross_pay": gross[n],
+            "net_pay": net[n],
+            **{name: col[n] for name, col in taxes.items()},
+        }
+        row = {
+            "payroll_period_id": period_id,
+            "employee_id": emp_id,
+            "regular_hours": reg_hours[n],
+            "overtime_hours": ot_hours[n],
+            "regular_rate": regular_rate[n],
+            "overtime_rate": ot_rate[n],
+            "double_time_rate": dt_rate[n],
+            "regular_pay": regular_pay[n],
+            "overtime_pay": overtime_pay[n],
+            "double_time_pay": double_time_pay[n],
+            "total_taxes": total_taxes[n],
+            **current,
+        }
+        for f in YTD_FIELDS:
+            row[f"ytd_{f}"] = float(prior.get(f, 0.0)) + current[f]
+        rows.append(row)
+    return rows
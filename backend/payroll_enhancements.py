@@ -10,6 +10,10 @@ import uuid
 from decimal import Decimal, ROUND_HALF_UP
 import calendar
 
+from backend.utils.payroll_ytd import (
+    ensure_ytd_indexes, tax_year_for_period, get_ytd, reapply_record, apply_period, reverse_period, rebuild_ytd,
+)
+
 # --- ADD (near imports) ---
 try:
     from backend.dependencies import get_db, get_current_active_user as get_current_user  # adjust if your project path differs
@@ -566,16 +570,13 @@ async def calculate_payroll(
     addl_state = D(tax_info.get("additional_state_withholding"))
     pay_freq = PayFrequency(record.get("pay_frequency", "biweekly"))
 
-    # YTD taxable wages (simplified: sum posted payroll_records for employee this year)
-    this_year = str(datetime.utcnow().year)
-    ytd_cur = db.payroll_records.aggregate([
-        {"$match": {"employee_id": record["employee_id"], "status": "paid", "created_at": {"$gte": datetime(int(this_year), 1, 1)}}},
-        {"$group": {"_id": None, "ytd_taxable": {"$sum": "$taxable_wages"}}}
-    ])
-    ytd_doc = None
-    async for d in ytd_cur:
-        ytd_doc = d
-    ytd_taxable = D((ytd_doc or {}).get("ytd_taxable", 0))
+    # YTD from the payroll_ytd accumulator (point lookup), excluding this record if already posted
+    tax_year = tax_year_for_period(period)
+    ytd_prior = await get_ytd(db, record["employee_id"], tax_year)
+    own = record.get("ytd_applied") or {}
+    if own:
+        ytd_prior = {k: v - float(own.get(k) or 0.0) for k, v in ytd_prior.items()}
+    ytd_taxable = D(ytd_prior["taxable_wages"])
 
     # Taxes (simplified but deterministic)
     federal_tax = calc.calculate_federal_tax(taxable_wages, filing_status, fed_allow, addl_fed, pay_freq)
@@ -608,12 +609,21 @@ async def calculate_payroll(
         "total_taxes": str(total_taxes), "total_pre_tax_deductions": str(pretax),
         "total_post_tax_deductions": str(posttax), "total_deductions": str(total_deductions),
         "net_pay": str(net_pay),
+        "ytd_gross_pay": str(D(ytd_prior["gross_pay"]) + gross_pay),
+        "ytd_federal_tax": str(D(ytd_prior["federal_tax"]) + federal_tax),
+        "ytd_state_tax": str(D(ytd_prior["state_tax"]) + state_tax),
+        "ytd_social_security_tax": str(D(ytd_prior["social_security_tax"]) + ss_tax),
+        "ytd_medicare_tax": str(D(ytd_prior["medicare_tax"]) + medicare_tax),
+        "ytd_net_pay": str(D(ytd_prior["net_pay"]) + net_pay),
         "status": "calculated",
         "calculated_at": datetime.utcnow(),
         "updated_by": current_user.username,
     }
     await db.payroll_records.update_one({"id": payroll_record_id}, {"$set": updates})
     record.update(updates)
+    # A recalculated posted record moves its YTD contribution to the new amounts
+    if own:
+        await reapply_record(db, record)
     return record
 
 @payroll_router.get("/paystub/{payroll_record_id}")
@@ -771,6 +781,7 @@ async def _ensure_run_indexes(db):
     await db.pay_periods.create_index([("start_date", 1), ("end_date", 1)], name="period_range", background=True)
     await db.payroll_records.create_index([("payroll_period_id", 1)], name="payrec_period", background=True)
     await db.payroll_runs.create_index([("period_id", 1), ("status", 1)], name="run_period_status", background=True)
+    await ensure_ytd_indexes(db)
 
 # ---------- models for periods/runs ----------
 class PayPeriodIn(BaseModel):
@@ -909,6 +920,18 @@ async def post_run(
     # uses the async tax hook: computes taxes if first time, persists breakdown,
     # posts EXPENSE idempotently, marks paid, aggregates totals
     run_doc = await post_payroll_run_apply_taxes(db, run_id, current_user)
+    # roll newly posted records into payroll_ytd (idempotent per record)
+    period = await db.pay_periods.find_one({"id": run_doc.get("period_id")})
+    if period:
+        await apply_period(db, period)
+    # a posted run is immutable: render its paystubs now so the first download is a cache hit
+    try:
+        from backend.utils.pdf_artifacts import pdf_artifacts
+        stubs = await _run_paystubs(db, {**run_doc, "id": run_id})
+        pdf_artifacts.prerender(db, "paystubs", {"run_id": run_id, "stubs": stubs}, PAYSTUB_CLINIC_INFO,
+                                lambda: _render_paystubs(stubs))
+    except Exception as e:
+        print(f"[WARN] Could not schedule paystub pre-render for run {run_id}: {e}")
     # ensure consistent API shape
     try:
         run_doc["_id"] = str(run_doc.get("_id") or run_doc.get("id"))
@@ -964,6 +987,10 @@ async def void_run(
         run["totals"] = _ensure_totals_count(run.get("totals"))
         return _with_api_id(run)
 
+    # Reverse YTD before flipping the status: if the reversal fails the run stays POSTED and
+    # the void can be retried (reverse_period is idempotent per record)
+    if run.get("status") == "POSTED":
+        await reverse_period(db, run.get("period_id"))
     await db.payroll_runs.update_one(
         {"id": run_id},
         {"$set": {"status": "VOID", "void_at": datetime.utcnow(), "void_by": current_user.username, "void_reason": reason or ""}}
@@ -997,13 +1024,14 @@ async def void_run(
     
     return _with_api_id(run)
 
-@payroll_router.get("/runs/{run_id}/paystubs")
-async def list_run_paystubs(
-    run_id: str,
-    format: Optional[str] = Query(default="json", pattern="^(json|pdf)$"),
-    db=Depends(get_db),
-):
-    run = await _get_run(db, run_id)
+PAYSTUB_CLINIC_INFO = {
+    "name": "Clínica Familia y Salud",
+    "address": "13626 Veterans Memorial Dr Suite F, Houston, TX 77014",
+    "phone": "(281) 580-8880",
+    "email": "info@clinicafamiliaysalud.com",
+}
+
+async def _run_paystubs(db, run: dict) -> list:
     period = await get_pay_period(db, run["period_id"])
     recs_cur = db.payroll_records.find({"payroll_period_id": period["id"]})
     recs = [r async for r in recs_cur]
@@ -1018,16 +1046,33 @@ async def list_run_paystubs(
             "deductions": str(D(r.get("total_pre_tax_deductions")) + D(r.get("total_post_tax_deductions"))),
             "net": r.get("net_pay"),
         })
+    return stubs
+
+async def _render_paystubs(stubs: list) -> bytes:
+    from backend.utils.pdf_render import pdf_renderer
+    return await pdf_renderer.render_paystubs(stubs, clinic_info=PAYSTUB_CLINIC_INFO)
+
+@payroll_router.get("/runs/{run_id}/paystubs")
+async def list_run_paystubs(
+    run_id: str,
+    request: Request,
+    format: Optional[str] = Query(default="json", pattern="^(json|pdf)$"),
+    db=Depends(get_db),
+):
+    run = await _get_run(db, run_id)
+    stubs = await _run_paystubs(db, run)
     if format == "json":
         return stubs
     elif format == "pdf":
-        from backend.utils.paystubs_pdf import render_paystubs_pdf
-        pdf = render_paystubs_pdf(stubs, clinic_info={
-            "name": "Clínica Familia y Salud",
-            "address": "13626 Veterans Memorial Dr Suite F, Houston, TX 77014",
-            "phone": "(281) 580-8880",
-            "email": "info@clinicafamiliaysalud.com",
-        })
+        if run.get("status") == "POSTED":
+            # posted runs never change: serve the stored artifact (pre-rendered by post_run)
+            from backend.utils.pdf_artifacts import pdf_artifacts, artifact_response
+            key, pdf, hit = await pdf_artifacts.get_or_render(
+                db, "paystubs", {"run_id": run_id, "stubs": stubs}, PAYSTUB_CLINIC_INFO,
+                lambda: _render_paystubs(stubs),
+            )
+            return artifact_response(request, key, pdf, f"paystubs_{run_id}.pdf", "hit" if hit else "miss")
+        pdf = await _render_paystubs(stubs)
         
         # Audit log the PDF export
         from backend.utils.audit import audit_log
@@ -1037,4 +1082,36 @@ async def list_run_paystubs(
         
         return Response(content=pdf, media_type="application/pdf")
     else:
-        raise HTTPException(status_code=400, detail="Unsupported format")
\ No newline at end of file
+        raise HTTPException(status_code=400, detail="Unsupported format")
+
+@payroll_router.get("/ytd/{employee_id}")
+async def get_employee_ytd(
+    employee_id: str,
+    tax_year: Optional[int] = Query(None),
+    db=Depends(get_db),
+):
+    """Year-to-date totals for an employee from the payroll_ytd accumulator."""
+    year = tax_year or datetime.utcnow().year
+    return {"employee_id": employee_id, "tax_year": year, **(await get_ytd(db, employee_id, year))}
+
+@payroll_router.post("/ytd/rebuild")
+async def rebuild_payroll_ytd(
+    tax_year: Optional[int] = Query(None),
+    db=Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Regenerate payroll_ytd for a tax year from posted payroll history.
+    Same as: python -m backend.utils.payroll_ytd --year YYYY
+    """
+    await ensure_ytd_indexes(db)
+    result = await rebuild_ytd(db, tax_year or datetime.utcnow().year)
+
+    from backend.utils.audit import audit_log
+    await audit_log(db, current_user,
+        action="payroll.ytd.rebuild",
+        subject_type="payroll_ytd",
+        subject_id=str(result["tax_year"]),
+        meta=result
+    )
+    return result
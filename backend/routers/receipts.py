@@ -4,6 +4,7 @@ from typing import List, Optional
 import uuid
 from datetime import datetime
 from ..dependencies import get_current_active_user, db
+from ..utils.patient_summary import bump_patient_version
 
 router = APIRouter(prefix="/api/receipts", tags=["receipts"])
 
@@ -77,6 +78,7 @@ async def create_from_soap(note_id: str):
                 {"id": note_id}, 
                 {"$set": {"status": "completed", "receipt_generated": True}}
             )
+            await bump_patient_version(db, soap_note.get("patient_id"))
             receipt_data["patient_id"] = soap_note.get("patient_id")
         
         await db.receipts.insert_one(receipt_data)
@@ -1,43 +1,53 @@
 # backend/routes/audit.py
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from typing import Optional
 from backend.dependencies import get_db, get_current_active_user as get_current_user
 from backend.utils.audit import AUDIT_COLL
+from backend.utils.audit_query import audit_facets
+from backend.utils.audit_partitions import audit_partitions
+from backend.utils.audit_queue import audit_queue
 
 router = APIRouter(prefix="/api/audit", tags=["Audit"])
 
 @router.get("")
 async def list_audit(
+    response: Response,
     subject_type: Optional[str] = None,
     subject_id: Optional[str] = None,
     action: Optional[str] = None,
+    user_id: Optional[str] = None,
     since: Optional[str] = Query(None, description="ISO timestamp lower bound"),
+    until: Optional[str] = Query(None, description="ISO timestamp upper bound (exclusive)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
     limit: int = Query(100, ge=1, le=1000),
     db = Depends(get_db),
     user = Depends(get_current_user),
 ):
     """
-    Get audit log entries with optional filtering.
+    Get audit log entries with optional filtering, newest first.
     
     - **subject_type**: Filter by subject type (e.g., 'payroll_run', 'payroll_period')
     - **subject_id**: Filter by specific subject ID
     - **action**: Filter by action (e.g., 'payroll.run.post', 'payroll.export.csv')
-    - **since**: Filter entries after this ISO timestamp
+    - **user_id**: Filter by acting user
+    - **since** / **until**: Time range on ts
+    - **cursor**: Opaque keyset cursor; the next page's cursor is returned in the
+      X-Next-Cursor header (absent on the last page)
     - **limit**: Maximum number of entries to return (1-1000)
     """
-    q = {}
-    if subject_type: q["subject_type"] = subject_type
-    if subject_id:   q["subject_id"] = subject_id
-    if action:       q["action"] = action
-    if since:        q["ts"] = {"$gte": since}
-
+    filters = {"subject_type": subject_type, "subject_id": subject_id, "action": action, "user.id": user_id}
     try:
-        cur = db[AUDIT_COLL].find(q, {"_id": 0}).sort("ts", -1).limit(limit)
-        items = await cur.to_list(None)
-        return items
+        # Only the monthly partitions (or archives) the range touches are read
+        items, next_cursor = await audit_partitions.page(db, AUDIT_COLL, filters, since=since, until=until,
+                                                         cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"[ERROR] Failed to query audit log: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve audit log")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
 
 @router.get("/actions")
 async def list_audit_actions(
@@ -46,8 +56,8 @@ async def list_audit_actions(
 ):
     """Get list of distinct audit actions for filtering"""
     try:
-        actions = await db[AUDIT_COLL].distinct("action")
-        return {"actions": sorted(actions)}
+        sources = await audit_partitions.sources(db, AUDIT_COLL)
+        return {"actions": await audit_facets.values(db, "action", sources)}
     except Exception as e:
         print(f"[ERROR] Failed to get audit actions: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve audit actions")
@@ -59,8 +69,15 @@ async def list_audit_subject_types(
 ):
     """Get list of distinct subject types for filtering"""
     try:
-        types = await db[AUDIT_COLL].distinct("subject_type")
-        return {"subject_types": sorted(types)}
+        sources = await audit_partitions.sources(db, AUDIT_COLL)
+        return {"subject_types": await audit_facets.values(db, "subject_type", sources)}
     except Exception as e:
         print(f"[ERROR] Failed to get audit subject types: {e}")
-        raise HTTPException(status_code=500, detail="Failed to retrieve audit subject types")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to retrieve audit subject types")
+
+@router.get("/queue-metrics")
+async def get_audit_queue_metrics(
+    user = Depends(get_current_user),
+):
+    """Write-behind audit queue health: depth, flush latency, failures and spilled segments"""
+    return audit_queue.metrics()
@@ -1,17 +1,17 @@
 # backend/routes/forms.py
-from fastapi import APIRouter, Depends, HTTPException, Response, Query
-from io import StringIO
-import csv
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
+from fastapi.responses import StreamingResponse
 from typing import Optional
 from datetime import datetime
 from bson import ObjectId
 from backend.dependencies import get_db, get_current_active_user as get_current_user
 from backend.utils.forms import (
-    FORMS_COLL, SUBMISSIONS_COLL, ensure_form_indexes,
-    validate_schema, validate_submission,
-    csv_headers_for, flatten_submission,
+    FORMS_COLL, SUBMISSIONS_COLL, FORMS_BULK_MAX, ensure_form_indexes,
+    validate_schema, form_validators,
+    iter_submissions_csv, plan_submissions_export, insert_submissions,
 )
-from backend.utils.forms_pdf import render_submission_pdf, render_submissions_summary_pdf
+from backend.utils.pdf_render import pdf_renderer
+from backend.utils.pdf_artifacts import pdf_artifacts, artifact_response
 from backend.utils.audit import audit_log
 from backend.utils.notify import notify_user
 
@@ -98,6 +98,7 @@ async def create_or_update_form(
             res = await db[FORMS_COLL].insert_one(base)
             doc = await db[FORMS_COLL].find_one({"_id": res.inserted_id})
             action = "forms.create"
+        form_validators.invalidate(doc)
 
         # Audit and notify
         await audit_log(db, user, 
@@ -166,6 +167,7 @@ async def publish_form(
         
         await db[FORMS_COLL].update_one({"_id": doc["_id"]}, {"$set": update_data})
         doc = await db[FORMS_COLL].find_one({"_id": doc["_id"]})
+        form_validators.invalidate(doc)
         
         # Audit and notify
         await audit_log(db, user, 
@@ -302,30 +304,19 @@ async def submit_form(
     - **data**: Dictionary of field values keyed by field key
     """
     try:
-        # Find form
-        form = None
+        # Find form (compiled validator cached per form version)
+        compiled = await form_validators.get(form_id, lambda: find_form_by_id_or_key(db, form_id))
         
-        # Try as ObjectId if it looks like one
-        if len(form_id) == 24:
-            try:
-                obj_id = ObjectId(form_id)
-                form = await db[FORMS_COLL].find_one({"_id": obj_id})
-            except:
-                pass
-        
-        # If not found by ObjectId, try by key
-        if not form:
-            form = await db[FORMS_COLL].find_one({"key": form_id})
-        
-        if not form:
+        if not compiled:
             raise HTTPException(status_code=404, detail="form not found")
+        form = compiled.form
             
         if form.get("status") != "published":
             raise HTTPException(status_code=400, detail="form is not published and cannot accept submissions")
         
         # Validate submission data
         data = payload.get("data") or {}
-        ok, errs = validate_submission(form["schema"], data)
+        ok, errs = compiled.validator.validate(data)
         if not ok:
             raise HTTPException(status_code=400, detail={"validation_errors": errs})
         
@@ -369,6 +360,116 @@ async def submit_form(
         print(f"[ERROR] Failed to submit form: {e}")
         raise HTTPException(status_code=500, detail="Failed to submit form")
 
+@router.post("/{form_id}/submit/bulk")
+async def submit_form_bulk(
+    form_id: str,
+    payload: dict,
+    db=Depends(get_db),
+    user=Depends(get_current_user)
+):
+    """
+    Submit a batch of form submissions (e.g. kiosk tablets syncing offline entries)
+    
+    Body should contain:
+    - **submissions**: List of {data, meta, client_id}; client_id is an optional
+      device-generated id that makes re-syncing the same batch a no-op
+    
+    Valid entries are inserted in one insert_many; invalid ones are reported by index,
+    as are entries whose client_id is already stored (unique per form).
+    """
+    try:
+        compiled = await form_validators.get(form_id, lambda: find_form_by_id_or_key(db, form_id))
+        
+        if not compiled:
+            raise HTTPException(status_code=404, detail="form not found")
+        form = compiled.form
+        
+        if form.get("status") != "published":
+            raise HTTPException(status_code=400, detail="form is not published and cannot accept submissions")
+        
+        items = payload.get("submissions")
+        if not isinstance(items, list) or not items:
+            raise HTTPException(status_code=400, detail="submissions must be a non-empty list")
+        if len(items) > FORMS_BULK_MAX:
+            raise HTTPException(status_code=400, detail=f"at most {FORMS_BULK_MAX} submissions per request")
+        
+        # Entries already synced by an earlier attempt of this batch
+        client_ids = [i.get("client_id") for i in items if isinstance(i, dict) and i.get("client_id")]
+        seen = set()
+        if client_ids:
+            async for d in db[SUBMISSIONS_COLL].find(
+                {"form_id": str(form["_id"]), "client_id": {"$in": client_ids}}, {"client_id": 1}
+            ):
+                seen.add(d["client_id"])
+        
+        now = datetime.utcnow().isoformat()
+        created_by = {"id": getattr(user, "id", None), "username": getattr(user, "username", None)}
+        docs, positions, errors, duplicates = [], [], [], []
+        for idx, item in enumerate(items):
+            if not isinstance(item, dict):
+                errors.append({"index": idx, "validation_errors": ["submission must be an object"]})
+                continue
+            client_id = item.get("client_id")
+            if client_id and client_id in seen:
+                duplicates.append({"index": idx, "client_id": client_id})
+                continue
+            data = item.get("data") or {}
+            ok, errs = compiled.validator.validate(data)
+            if not ok:
+                errors.append({"index": idx, "client_id": client_id, "validation_errors": errs})
+                continue
+            doc = {
+                "form_id": str(form["_id"]),
+                "form_key": form["key"],
+                "form_version": form["version"],
+                "data": data,
+                "created_at": now,
+                "created_by": created_by,
+                "meta": item.get("meta", {}),
+            }
+            if client_id:
+                doc["client_id"] = client_id
+                seen.add(client_id)  # repeated within the same batch
+            docs.append(doc)
+            positions.append(idx)
+        
+        inserted_ids = []
+        if docs:
+            # The unique (form_id, client_id) index catches entries an overlapping retry inserted meanwhile
+            inserted_ids, raced = await insert_submissions(db, docs)
+            duplicates.extend({"index": positions[i], "client_id": docs[i]["client_id"]} for i in raced)
+            duplicates.sort(key=lambda d: d["index"])
+            
+            # Audit and notify once for the batch
+            await audit_log(db, user,
+                           action="forms.submit.bulk",
+                           subject_type="form",
+                           subject_id=str(form["_id"]),
+                           meta={"form_key": form["key"], "version": form["version"],
+                                 "inserted": len(inserted_ids), "rejected": len(errors), "duplicates": len(duplicates)})
+            
+            await notify_user(db,
+                             user_id=getattr(user, "id", "system"),
+                             type="forms.submit.bulk",
+                             title="Form submissions synced",
+                             body=f"Synced {len(inserted_ids)} submissions of '{form['name']}'.",
+                             subject_type="form",
+                             subject_id=str(form["_id"]),
+                             severity="success" if not errors else "warning")
+        
+        return {
+            "inserted": len(inserted_ids),
+            "inserted_ids": inserted_ids,
+            "duplicates": duplicates,
+            "errors": errors,
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"[ERROR] Failed to bulk submit form: {e}")
+        raise HTTPException(status_code=500, detail="Failed to bulk submit form")
+
 @router.get("/{form_id}/submissions")
 async def list_submissions(
     form_id: str,
@@ -419,11 +520,22 @@ async def list_submissions(
 @router.get("/{form_id}/submissions.csv")
 async def export_submissions_csv(
     form_id: str, 
+    since: Optional[str] = Query(None, description="Only submissions created at or after this ISO timestamp"),
+    until: Optional[str] = Query(None, description="Only submissions created before this ISO timestamp"),
+    order: str = Query("desc", pattern="^(asc|desc)$", description="Sort by created_at, then _id"),
+    after_created_at: Optional[str] = Query(None, description="Resume after this row: its _created_at"),
+    after_id: Optional[str] = Query(None, description="Resume after this row: its _id"),
+    gzip: bool = Query(False, description="Return the CSV gzip-compressed (.csv.gz)"),
+    batch_size: int = Query(1000, ge=100, le=10000, description="Rows fetched and written per chunk"),
     db=Depends(get_db), 
     user=Depends(get_current_user)
 ):
     """
-    Export all form submissions as CSV
+    Export form submissions as CSV
+    
+    The file is streamed from a database cursor, so memory use does not grow with the
+    number of submissions. An interrupted export can be resumed by passing the last
+    received row's `_created_at` and `_id` as `after_created_at` and `after_id`.
     """
     try:
         # Find form
@@ -432,50 +544,56 @@ async def export_submissions_csv(
         if not form:
             raise HTTPException(status_code=404, detail="form not found")
         
-        # Get all submissions for this form
-        subs = await db[SUBMISSIONS_COLL].find({"form_id": str(form["_id"])}).sort("created_at", -1).to_list(None)
-
-        # Generate CSV
-        buf = StringIO()
-        headers = csv_headers_for(form["schema"]) + ["_id", "_created_at", "_form_version", "_created_by"]
-        writer = csv.DictWriter(buf, fieldnames=headers)
+        try:
+            q, sort = plan_submissions_export(str(form["_id"]), since, until, order, after_created_at, after_id)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        writer.writeheader()
-        for submission in subs:
-            row = flatten_submission(form["schema"], submission)
-            writer.writerow(row)
+        cursor = db[SUBMISSIONS_COLL].find(
+            q, {"data": 1, "created_at": 1, "form_version": 1, "created_by.id": 1}
+        ).sort(sort).batch_size(batch_size)
         
-        csv_content = buf.getvalue().encode("utf-8")
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"[ERROR] Failed to export CSV: {e}")
+        raise HTTPException(status_code=500, detail="Failed to export CSV")
+    
+    async def body():
+        counter = {"rows": 0}
+        try:
+            async for chunk in iter_submissions_csv(cursor, form["schema"], batch_size, gzip, counter):
+                yield chunk
+        except Exception as e:
+            # Headers are already sent; the client sees a truncated file and can resume
+            print(f"[ERROR] CSV export stream for form {form['key']} failed after {counter['rows']} rows: {e}")
+            raise
         
         # Audit and notify
         await audit_log(db, user, 
                        action="forms.export.csv", 
                        subject_type="form", 
                        subject_id=str(form["_id"]),
-                       meta={"submissions_count": len(subs)})
+                       meta={"submissions_count": counter["rows"], "since": since, "until": until, "gzip": gzip})
         
         await notify_user(db, 
                          user_id=getattr(user, "id", "system"), 
                          type="forms.export.csv",
                          title="Form CSV exported", 
-                         body=f"Exported CSV for '{form['name']}' with {len(subs)} submissions.",
+                         body=f"Exported CSV for '{form['name']}' with {counter['rows']} submissions.",
                          severity="info")
-        
-        return Response(
-            content=csv_content, 
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename=form_{form['key']}_submissions.csv"}
-        )
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"[ERROR] Failed to export CSV: {e}")
-        raise HTTPException(status_code=500, detail="Failed to export CSV")
+    
+    filename = f"form_{form['key']}_submissions.csv" + (".gz" if gzip else "")
+    return StreamingResponse(
+        body(),
+        media_type="application/gzip" if gzip else "text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
 
 @router.get("/submissions/{submission_id}.pdf")
 async def export_submission_pdf(
     submission_id: str, 
+    request: Request,
     db=Depends(get_db), 
     user=Depends(get_current_user)
 ):
@@ -500,8 +618,11 @@ async def export_submission_pdf(
         if not form:
             raise HTTPException(status_code=404, detail="associated form not found")
         
-        # Generate PDF
-        pdf_content = render_submission_pdf(form, sub)
+        # Submissions are immutable: reuse the stored artifact, else render in the pool
+        key, pdf_content, hit = await pdf_artifacts.get_or_render(
+            db, "submission", {"form": form, "submission": sub}, None,
+            lambda: pdf_renderer.render_submission(form, sub),
+        )
         
         # Audit and notify
         await audit_log(db, user, 
@@ -517,11 +638,8 @@ async def export_submission_pdf(
                          body=f"Exported PDF for '{form['name']}' submission.",
                          severity="info")
         
-        return Response(
-            content=pdf_content, 
-            media_type="application/pdf",
-            headers={"Content-Disposition": f'attachment; filename="form_{form["key"]}_{submission_id[:8]}.pdf"'}
-        )
+        return artifact_response(request, key, pdf_content, f'form_{form["key"]}_{submission_id[:8]}.pdf',
+                                 "hit" if hit else "miss")
         
     except HTTPException:
         raise
@@ -532,6 +650,7 @@ async def export_submission_pdf(
 @router.get("/{form_id}/summary.pdf") 
 async def export_form_summary_pdf(
     form_id: str,
+    request: Request,
     db=Depends(get_db),
     user=Depends(get_current_user)
 ):
@@ -548,8 +667,11 @@ async def export_form_summary_pdf(
         # Get all submissions
         subs = await db[SUBMISSIONS_COLL].find({"form_id": str(form["_id"])}).sort("created_at", -1).to_list(None)
         
-        # Generate PDF summary
-        pdf_content = render_submissions_summary_pdf(form, subs)
+        # Keyed on the form plus every submission, so a new submission yields a new artifact
+        key, pdf_content, hit = await pdf_artifacts.get_or_render(
+            db, "summary", {"form": form, "submissions": subs}, None,
+            lambda: pdf_renderer.render_summary(form, subs),
+        )
         
         # Audit and notify
         await audit_log(db, user,
@@ -565,11 +687,8 @@ async def export_form_summary_pdf(
                          body=f"Exported summary PDF for '{form['name']}' with {len(subs)} submissions.",
                          severity="info")
         
-        return Response(
-            content=pdf_content,
-            media_type="application/pdf",
-            headers={"Content-Disposition": f'attachment; filename="form_{form["key"]}_summary.pdf"'}
-        )
+        return artifact_response(request, key, pdf_content, f'form_{form["key"]}_summary.pdf',
+                                 "hit" if hit else "miss")
         
     except HTTPException:
         raise
@@ -577,6 +696,14 @@ async def export_form_summary_pdf(
         print(f"[ERROR] Failed to export summary PDF: {e}")
         raise HTTPException(status_code=500, detail="Failed to export summary PDF")
 
+@router.get("/pdf/metrics")
+async def get_pdf_render_metrics(db=Depends(get_db), user=Depends(get_current_user)):
+    """
+    PDF render pool metrics: queued/running jobs, latency and failures,
+    plus artifact cache hits/misses and store usage
+    """
+    return {**pdf_renderer.metrics(), "artifacts": await pdf_artifacts.metrics(db)}
+
 @router.delete("/{form_id}")
 async def delete_form(
     form_id: str,
@@ -612,6 +739,7 @@ async def delete_form(
         
         # Delete the form
         await db[FORMS_COLL].delete_one({"_id": form_obj_id})
+        form_validators.invalidate(form)
         
         # Audit and notify
         await audit_log(db, user,
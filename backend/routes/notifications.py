@@ -2,7 +2,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import Optional, Literal
 from backend.dependencies import get_db, get_current_active_user as get_current_user
-from backend.utils.notify import NOTIF_COLL, ensure_notification_indexes, notify_user, mark_read, mark_all_read, get_unread_count
+from backend.utils.notify import NOTIF_COLL, ensure_notification_indexes, notify_user, mark_read, mark_all_read, get_counts, delete_notification as delete_user_notification
 
 router = APIRouter(prefix="/api/notifications", tags=["Notifications"])
 
@@ -46,16 +46,9 @@ async def get_notification_count(
     db=Depends(get_db),
     user=Depends(get_current_user),
 ):
-    """Get total and unread notification counts for the current user"""
+    """Get total and unread notification counts for the current user (one counter read)"""
     try:
-        user_id = getattr(user, "id", None)
-        total_count = await db[NOTIF_COLL].count_documents({"user_id": user_id})
-        unread_count = await get_unread_count(db, user_id)
-        
-        return {
-            "total": total_count,
-            "unread": unread_count
-        }
+        return await get_counts(db, getattr(user, "id", None))
     except Exception as e:
         print(f"[ERROR] Failed to get notification count: {e}")
         raise HTTPException(status_code=500, detail="Failed to get notification count")
@@ -166,12 +159,9 @@ async def delete_notification(
             except:
                 pass
         
-        result = await db[NOTIF_COLL].delete_one({
-            "_id": notif_id, 
-            "user_id": getattr(user, "id", None)
-        })
+        doc = await delete_user_notification(db, notif_id, getattr(user, "id", None))
         
-        if result.deleted_count == 0:
+        if not doc:
             raise HTTPException(status_code=404, detail="Notification not found")
         
         return {"deleted": True}
@@ -12,7 +12,7 @@ print("🔧 ClinicHub starting - using deployment-managed configuration")
 # Add this to beginning of sys.path to ensure priority
 sys.path.insert(0, '/app/backend')
 
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Request
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
@@ -398,11 +398,10 @@ async def create_audit_event(
             error_message=error_message
         )
         
-        # Store in database
-        await db.audit_events.insert_one(jsonable_encoder(audit_event))
-        
-        # Also log to stdout for external systems (ELK, Wazuh)
-        logging.info(f"AUDIT: {jsonable_encoder(audit_event)}")
+        # Queue for batched insert into this month's audit_events partition; the AUDIT stdout line for
+        # external systems (ELK, Wazuh) is emitted when the batch is flushed
+        event_doc = jsonable_encoder(audit_event)
+        audit_queue.enqueue(db, audit_partitions.route_write(db, "audit_events", event_doc), event_doc, log_line=True)
         
     except Exception as e:
         # Critical: audit failures should be logged but not break the app
@@ -489,9 +488,29 @@ print("🔧 Using environment-provided MongoDB configuration for deployment")
 
 # Register error handlers
 from fastapi import HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import ValidationError
 from .errors import validation_exception_handler, generic_exception_handler
+from .utils.audit_queue import audit_queue
+from .utils.audit_partitions import audit_partitions, ensure_audit_partition_indexes
+from .utils.auth_cache import auth_principals
+from .utils.password_pool import LoginThrottled, client_ip, password_hash_pool
+from .utils.interaction_index import interaction_index
+from .utils.icd10_index import icd10_index
+from .utils.availability import MAX_RANGE_DAYS, compute_availability, day_slots, load_busy
+from .utils.dashboard_stats import dashboard_stats
+from .utils.financial_reports import ensure_financial_report_indexes, month_range, payables, period_report
+from .utils.daily_financials import daily_financials, ensure_daily_financial_indexes, summarize_days
+from .utils.inventory_stock import apply_inventory_transactions, backfill_low_stock, count_low_stock, ensure_inventory_indexes, finish_pending_inventory, refresh_low_stock
+from .utils.loaders import Loaders
+from .utils.pdf_render import pdf_renderer
+from .utils.pdf_artifacts import ensure_pdf_artifact_indexes
+from .utils.push import parse_topics, publish_safely, push_hub, sse_format
+from .utils.notify import notify_user
+from .utils.patient_summary import bump_for_record, bump_patient_version, ensure_patient_version_indexes, fetch_patient_summary, get_patient_version, patient_summary_cache, summary_etag
+from .utils.search_index import ensure_search_indexes, rebuild_search_index, reindex, search as search_index_query
+from .payroll_batch import StageTimer, hours_from_entries, load_period_hours, load_ytd_totals, compute_payroll_rows
 
 app.add_exception_handler(ValidationError, validation_exception_handler)
 
@@ -3140,13 +3159,24 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password on the hashing pool, off the event loop"""
+    return await password_hash_pool.run(verify_password, plain_password, hashed_password)
+
+def login_throttled(e: LoginThrottled) -> HTTPException:
+    return HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+
+def request_client_ip(request: Request) -> Optional[str]:
+    # Behind nginx the socket peer is the proxy; the login throttle needs the real client
+    return client_ip(request.client.host if request.client else None, request.headers)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -3165,11 +3195,20 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except jwt.PyJWTError:
         raise credentials_exception
     
+    # Tokens issued before iat was added are keyed by their expiry instead
+    issued = payload.get("iat") or payload.get("exp")
+    cached = auth_principals.get(username, issued)
+    if cached is not None:
+        return cached
+    
+    generation = auth_principals.generation(username)
     user = await db.users.find_one({"username": username})
     if user is None:
         raise credentials_exception
     
-    return User(**user)
+    user = User(**user)
+    auth_principals.put(username, issued, user, generation)
+    return user
 
 async def get_current_active_user(current_user: User = Depends(get_current_user)):
     if current_user.status != UserStatus.ACTIVE:
@@ -3178,7 +3217,7 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
 
 def require_permission(permission: str):
     async def permission_checker(current_user: User = Depends(get_current_active_user)):
-        if permission not in current_user.permissions and current_user.role != UserRole.ADMIN:
+        if permission not in auth_principals.permissions(current_user) and current_user.role != UserRole.ADMIN:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Not enough permissions. Required: {permission}"
@@ -3332,6 +3371,7 @@ async def get_or_create_synology_user(synology_data: Dict) -> User:
                 }
             }
         )
+        auth_principals.invalidate(username)
         return User(**existing_user)
     else:
         # Create new user from Synology data
@@ -3396,7 +3436,7 @@ async def authenticate_user(username: str, password: str):
         return user_obj
     
     # Verify password for local users
-    if not verify_password(password, user_obj.password_hash):
+    if not await verify_password_async(password, user_obj.password_hash):
         # Increment failed login attempts
         await db.users.update_one(
             {"username": username},
@@ -3409,6 +3449,7 @@ async def authenticate_user(username: str, password: str):
                 {"username": username},
                 {"$set": {"locked_until": jsonable_encoder(lock_until)}}
             )
+        auth_principals.invalidate(username)
         return False
     
     # Check if account is locked
@@ -3427,6 +3468,7 @@ async def authenticate_user(username: str, password: str):
             "last_login": jsonable_encoder(datetime.utcnow())
         }}
     )
+    auth_principals.invalidate(username)
     
     return user_obj
 
@@ -3461,8 +3503,12 @@ async def get_current_patient(credentials: HTTPAuthorizationCredentials = Depend
 
 # Authentication Routes
 @api_router.post("/auth/login", response_model=Token)
-async def login(user_credentials: UserLogin):
-    user = await authenticate_user(user_credentials.username, user_credentials.password)
+async def login(user_credentials: UserLogin, request: Request):
+    try:
+        async with password_hash_pool.admit(user_credentials.username, request_client_ip(request)):
+            user = await authenticate_user(user_credentials.username, user_credentials.password)
+    except LoginThrottled as e:
+        raise login_throttled(e)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -3520,6 +3566,7 @@ async def logout(current_user: User = Depends(get_current_active_user)):
                     }
                 }
             )
+            auth_principals.invalidate(current_user.username)
         
         return {"message": "Logout successful", "auth_source": current_user.auth_source}
         
@@ -3533,17 +3580,20 @@ async def change_password(
     new_password: str,
     current_user: User = Depends(get_current_active_user)
 ):
-    if not verify_password(current_password, current_user.password_hash):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Incorrect current password"
-        )
-    
-    new_password_hash = get_password_hash(new_password)
+    try:
+        if not await verify_password_async(current_password, current_user.password_hash):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Incorrect current password"
+            )
+        new_password_hash = await password_hash_pool.run(get_password_hash, new_password)
+    except LoginThrottled as e:
+        raise login_throttled(e)
     await db.users.update_one(
         {"id": current_user.id},
         {"$set": {"password_hash": new_password_hash, "updated_at": jsonable_encoder(datetime.utcnow())}}
     )
+    auth_principals.invalidate(current_user.username)
     
     return {"message": "Password changed successfully"}
 
@@ -3698,6 +3748,7 @@ async def update_user(
             {"id": user_id},
             {"$set": jsonable_encoder(update_data)}
         )
+        auth_principals.invalidate(user_id=user_id)
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="User not found")
@@ -3721,6 +3772,7 @@ async def delete_user(
         )
     
     result = await db.users.delete_one({"id": user_id})
+    auth_principals.invalidate(user_id=user_id)
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -3737,6 +3789,7 @@ async def initialize_admin():
             if "first_name" not in admin_exists or "last_name" not in admin_exists:
                 # Delete old incomplete admin user and recreate
                 await db.users.delete_many({"username": "admin"})
+                auth_principals.invalidate("admin")
                 print("Deleted incomplete admin user, recreating...")
             else:
                 raise HTTPException(
@@ -3777,6 +3830,7 @@ async def force_initialize_admin():
     try:
         # Delete any existing admin users
         await db.users.delete_many({"username": "admin"})
+        auth_principals.invalidate("admin")
         
         # Create fresh admin user with all required fields
         admin_user = User(
@@ -3837,6 +3891,8 @@ async def create_patient(patient_data: PatientCreate, request: Request, current_
     # Use jsonable_encoder to handle date serialization
     patient_dict = jsonable_encoder(patient)
     await db.patients.insert_one(patient_dict)
+    dashboard_stats.invalidate("patients")
+    await reindex(db, "patients", [patient_dict["id"]])
     
     # INTEROP: Publish domain event with FHIR data for external systems
     try:
@@ -3912,6 +3968,9 @@ async def update_patient(patient_id: str, patient_data: PatientCreate, request:
     
     updated_patient_dict = jsonable_encoder(updated_patient)
     await db.patients.replace_one({"id": patient_id}, updated_patient_dict)
+    dashboard_stats.invalidate("patients")
+    await bump_patient_version(db, patient_id)
+    await reindex(db, "patients", [patient_id])
     return updated_patient
 
 # Smart Form Routes
@@ -4187,6 +4246,7 @@ async def link_form_to_encounter(encounter_id: str, submission_id: str):
         {"id": encounter_id},
         {"$addToSet": {"form_submissions": submission_id}}
     )
+    await bump_for_record(db, "encounters", encounter_id)
 
 async def create_medical_form_templates():
     """Create HIPAA and Texas compliant medical form templates"""
@@ -4698,6 +4758,7 @@ async def create_invoice(invoice_data: InvoiceCreate):
         
         invoice_dict = jsonable_encoder(invoice)
         await db.invoices.insert_one(invoice_dict)
+        dashboard_stats.invalidate("invoices")
         return invoice
     except Exception as e:
         logger.error(f"Error creating invoice: {str(e)}")
@@ -4762,6 +4823,7 @@ async def update_invoice(invoice_id: str, invoice_data: InvoiceCreate, current_u
     
     updated_invoice_dict = jsonable_encoder(updated_invoice)
     await db.invoices.replace_one({"id": invoice_id}, updated_invoice_dict)
+    dashboard_stats.invalidate("invoices")
     return updated_invoice
 
 @api_router.put("/invoices/{invoice_id}/status")
@@ -4783,6 +4845,7 @@ async def update_invoice_status(invoice_id: str, status_data: Dict[str, str], cu
         {"id": invoice_id},
         {"$set": {"status": new_status, "updated_at": jsonable_encoder(datetime.utcnow())}}
     )
+    dashboard_stats.invalidate("invoices")
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Invoice not found")
@@ -4796,6 +4859,8 @@ async def update_invoice_status(invoice_id: str, status_data: Dict[str, str], cu
 async def create_inventory_item(item: InventoryItem):
     item_dict = jsonable_encoder(item)
     await db.inventory.insert_one(item_dict)
+    dashboard_stats.invalidate("inventory")
+    await refresh_low_stock(db, [item.id])
     return item
 
 @api_router.get("/inventory", response_model=List[InventoryItem])
@@ -4829,12 +4894,15 @@ async def update_inventory_item(item_id: str, item_data: InventoryItemCreate, cu
     
     updated_item_dict = jsonable_encoder(updated_item)
     await db.inventory.replace_one({"id": item_id}, updated_item_dict)
+    dashboard_stats.invalidate("inventory")
+    await refresh_low_stock(db, [item_id])
     return updated_item
 
 @api_router.delete("/inventory/{item_id}")
 async def delete_inventory_item(item_id: str, current_user: User = Depends(get_current_active_user)):
     """Delete inventory item"""
     result = await db.inventory.delete_one({"id": item_id})
+    dashboard_stats.invalidate("inventory")
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Inventory item not found")
     return {"message": "Inventory item deleted successfully"}
@@ -4842,28 +4910,17 @@ async def delete_inventory_item(item_id: str, current_user: User = Depends(get_c
 @api_router.post("/inventory/{item_id}/transaction", response_model=InventoryTransaction)
 async def create_inventory_transaction(item_id: str, transaction: InventoryTransaction):
     try:
-        # Update inventory stock
-        item = await db.inventory.find_one({"id": item_id}, {"_id": 0})
-        if not item:
-            raise HTTPException(status_code=404, detail="Inventory item not found")
-        
-        new_stock = item["current_stock"]
-        if transaction.transaction_type == "in":
-            new_stock += transaction.quantity
-        elif transaction.transaction_type == "out":
-            new_stock -= transaction.quantity
-        elif transaction.transaction_type == "adjustment":
-            new_stock = transaction.quantity
-        
-        await db.inventory.update_one(
-            {"id": item_id},
-            {"$set": {"current_stock": new_stock, "updated_at": jsonable_encoder(datetime.utcnow())}}
-        )
+        if transaction.transaction_type not in ("in", "out", "adjustment"):
+            raise HTTPException(status_code=400, detail="transaction_type must be in, out or adjustment")
         
         # Set the item_id in the transaction
         transaction.item_id = item_id
         transaction_dict = jsonable_encoder(transaction)
-        await db.inventory_transactions.insert_one(transaction_dict)
+        # Atomic stock update + ledger row; concurrent movements on the same item all land
+        levels = await apply_inventory_transactions(db, [transaction_dict])
+        dashboard_stats.invalidate("inventory")
+        if item_id not in levels:
+            raise HTTPException(status_code=404, detail="Inventory item not found")
         return transaction
     except HTTPException:
         raise
@@ -4887,6 +4944,7 @@ async def create_enhanced_employee(employee_data: EnhancedEmployeeCreate):
         
         employee_dict = jsonable_encoder(employee)
         await db.enhanced_employees.insert_one(employee_dict)
+        dashboard_stats.invalidate("employees")
         return employee
     except Exception as e:
         logger.error(f"Error creating enhanced employee: {str(e)}")
@@ -4912,6 +4970,7 @@ async def update_enhanced_employee(employee_id: str, employee_data: Dict[str, An
             {"id": employee_id},
             {"$set": jsonable_encoder(employee_data)}
         )
+        dashboard_stats.invalidate("employees")
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Employee not found")
         return {"message": "Employee updated successfully"}
@@ -4936,6 +4995,7 @@ async def create_employee(employee_data: EnhancedEmployeeCreate):
         
         employee_dict = jsonable_encoder(employee)
         await db.enhanced_employees.insert_one(employee_dict)
+        dashboard_stats.invalidate("employees")
         return employee
     except Exception as e:
         logger.error(f"Error creating employee: {str(e)}")
@@ -4961,6 +5021,7 @@ async def update_employee(employee_id: str, employee_data: Dict[str, Any]):
             {"id": employee_id},
             {"$set": jsonable_encoder(employee_data)}
         )
+        dashboard_stats.invalidate("employees")
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Employee not found")
         return {"message": "Employee updated successfully"}
@@ -4978,6 +5039,7 @@ async def delete_employee(employee_id: str):
             {"id": employee_id},
             {"$set": {"is_active": False, "updated_at": datetime.utcnow()}}
         )
+        dashboard_stats.invalidate("employees")
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Employee not found")
         return {"message": "Employee deleted successfully"}
@@ -5285,84 +5347,32 @@ async def calculate_payroll(period_id: str):
         period_start = period["period_start"]
         period_end = period["period_end"]
         
+        timer = StageTimer()
+
         # Get all active employees
         employees = []
         async for emp in db.employees.find({"is_active": True}, {"_id": 0}):
             employees.append(emp)
-        
-        payroll_records = []
-        
-        for employee in employees:
-            # Calculate hours worked from timesheet
-            hours_data = await calculate_employee_hours(employee["id"], period_start, period_end)
-            
-            # Determine pay rate
-            regular_rate = employee.get("hourly_rate", 0.0)
-            if regular_rate == 0.0 and employee.get("salary"):
-                # Convert salary to hourly (assuming 40 hours/week, 52 weeks/year)
-                regular_rate = employee["salary"] / (40 * 52)
-                
-            overtime_rate = regular_rate * 1.5
-            double_time_rate = regular_rate * 2.0
-            
-            # Calculate gross pay
-            regular_pay = hours_data["regular_hours"] * regular_rate
-            overtime_pay = hours_data["overtime_hours"] * overtime_rate
-            double_time_pay = hours_data.get("double_time_hours", 0.0) * double_time_rate
-            
-            gross_pay = regular_pay + overtime_pay + double_time_pay
-            
-            # Calculate taxes (simplified - real implementation would use tax tables)
-            federal_tax = gross_pay * 0.12  # Simplified 12% federal tax
-            state_tax = gross_pay * 0.05    # Simplified 5% state tax
-            social_security_tax = gross_pay * 0.062  # 6.2% social security
-            medicare_tax = gross_pay * 0.0145        # 1.45% medicare
-            
-            total_taxes = federal_tax + state_tax + social_security_tax + medicare_tax
-            
-            # Calculate net pay (simplified - would include other deductions)
-            net_pay = gross_pay - total_taxes
-            
-            # Get current YTD totals (simplified)
-            ytd_gross = await get_ytd_total(employee["id"], "gross_pay")
-            ytd_net = await get_ytd_total(employee["id"], "net_pay")
-            ytd_federal = await get_ytd_total(employee["id"], "federal_tax")
-            ytd_state = await get_ytd_total(employee["id"], "state_tax")
-            ytd_ss = await get_ytd_total(employee["id"], "social_security_tax")
-            ytd_medicare = await get_ytd_total(employee["id"], "medicare_tax")
-            
-            # Create payroll record
-            payroll_record = PayrollRecord(
-                payroll_period_id=period_id,
-                employee_id=employee["id"],
-                regular_hours=hours_data["regular_hours"],
-                overtime_hours=hours_data["overtime_hours"],
-                regular_rate=regular_rate,
-                overtime_rate=overtime_rate,
-                double_time_rate=double_time_rate,
-                regular_pay=regular_pay,
-                overtime_pay=overtime_pay,
-                double_time_pay=double_time_pay,
-                gross_pay=gross_pay,
-                federal_tax=federal_tax,
-                state_tax=state_tax,
-                social_security_tax=social_security_tax,
-                medicare_tax=medicare_tax,
-                total_taxes=total_taxes,
-                net_pay=net_pay,
-                ytd_gross_pay=ytd_gross + gross_pay,
-                ytd_net_pay=ytd_net + net_pay,
-                ytd_federal_tax=ytd_federal + federal_tax,
-                ytd_state_tax=ytd_state + state_tax,
-                ytd_social_security_tax=ytd_ss + social_security_tax,
-                ytd_medicare_tax=ytd_medicare + medicare_tax
-            )
-            
-            payroll_records.append(payroll_record.dict())
+        employee_ids = [emp["id"] for emp in employees]
+        timer.mark("load_employees")
+
+        # Hours for every employee from one sorted time_entries cursor
+        hours_by_employee = await load_period_hours(db, employee_ids, period_start, period_end)
+        timer.mark("load_time_entries")
+
+        # YTD totals for every employee from one $group pipeline
+        ytd_by_employee = await load_ytd_totals(db, employee_ids, datetime.now().year)
+        timer.mark("load_ytd_totals")
+
+        # Gross/tax/net for all employees in one pass
+        rows = compute_payroll_rows(period_id, employees, hours_by_employee, ytd_by_employee)
+        payroll_records = [PayrollRecord(**row).dict() for row in rows]
+        timer.mark("compute")
         
         # Save all payroll records
         if payroll_records:
             result = await db.payroll_records.insert_many(payroll_records)
+            timer.mark("insert_records")
             
             # Update payroll period totals
             total_gross = sum(r["gross_pay"] for r in payroll_records)
@@ -5380,15 +5390,17 @@ async def calculate_payroll(period_id: str):
                     "updated_at": datetime.utcnow()
                 }}
             )
+            timer.mark("update_period")
             
             return {
                 "message": f"Payroll calculated for {len(payroll_records)} employees",
                 "total_gross_pay": total_gross,
                 "total_net_pay": total_net,
-                "employee_count": len(payroll_records)
+                "employee_count": len(payroll_records),
+                "timings_ms": timer.as_dict()
             }
         else:
-            return {"message": "No employees found for payroll calculation"}
+            return {"message": "No employees found for payroll calculation", "timings_ms": timer.as_dict()}
             
     except Exception as e:
         logger.error(f"Error calculating payroll: {str(e)}")
@@ -5585,80 +5597,11 @@ async def calculate_employee_hours(employee_id: str, start_date, end_date) -> Di
         }, {"_id": 0}).sort("timestamp", 1):
             entries.append(entry)
         
-        # Calculate hours worked
-        total_hours = 0.0
-        daily_hours = {}
-        current_clock_in = None
-        
-        for entry in entries:
-            entry_date = entry["timestamp"].date()
-            
-            if entry["entry_type"] == "clock_in":
-                current_clock_in = entry["timestamp"]
-            elif entry["entry_type"] == "clock_out" and current_clock_in:
-                hours_worked = (entry["timestamp"] - current_clock_in).total_seconds() / 3600
-                daily_hours[entry_date] = daily_hours.get(entry_date, 0) + hours_worked
-                total_hours += hours_worked
-                current_clock_in = None
-        
-        # Calculate regular vs overtime (assuming 40 hours/week is regular)
-        regular_hours = min(total_hours, 40.0)
-        overtime_hours = max(0, total_hours - 40.0)
-        
-        return {
-            "total_hours": round(total_hours, 2),
-            "regular_hours": round(regular_hours, 2),
-            "overtime_hours": round(overtime_hours, 2),
-            "double_time_hours": 0.0,  # Would be calculated based on company policy
-            "daily_breakdown": {str(k): round(v, 2) for k, v in daily_hours.items()}
-        }
+        return hours_from_entries(entries)
     except Exception as e:
         logger.error(f"Error calculating employee hours: {str(e)}")
         return {"total_hours": 0.0, "regular_hours": 0.0, "overtime_hours": 0.0, "double_time_hours": 0.0}
 
-async def get_ytd_total(employee_id: str, field: str) -> float:
-    """Get year-to-date total for a specific field"""
-    try:
-        current_year = datetime.now().year
-        start_of_year = datetime(current_year, 1, 1)
-        
-        pipeline = [
-            {
-                "$match": {
-                    "employee_id": employee_id,
-                    "payroll_period_id": {
-                        "$exists": True
-                    }
-                }
-            },
-            {
-                "$lookup": {
-                    "from": "payroll_periods",
-                    "localField": "payroll_period_id",
-                    "foreignField": "id",
-                    "as": "period"
-                }
-            },
-            {
-                "$match": {
-                    "period.period_start": {"$gte": start_of_year}
-                }
-            },
-            {
-                "$group": {
-                    "_id": None,
-                    "total": {"$sum": f"${field}"}
-                }
-            }
-        ]
-        
-        result = await db.payroll_records.aggregate(pipeline).to_list(1)
-        return result[0]["total"] if result else 0.0
-        
-    except Exception as e:
-        logger.error(f"Error calculating YTD total: {str(e)}")
-        return 0.0
-
 # Finance Module Routes
 
 # Vendor Management
@@ -5728,6 +5671,8 @@ async def create_check(check_data: CheckCreate):
         
         check_dict = jsonable_encoder(check)
         await db.checks.insert_one(check_dict)
+        dashboard_stats.invalidate("checks")
+        await daily_financials.record_check(db, check_dict)
         
         # Create corresponding expense transaction
         if check.expense_category:
@@ -5747,6 +5692,8 @@ async def create_check(check_data: CheckCreate):
             
             transaction_dict = jsonable_encoder(transaction)
             await db.financial_transactions.insert_one(transaction_dict)
+            dashboard_stats.invalidate("financial_transactions")
+            await daily_financials.record_transaction(db, transaction_dict)
         
         return check
     except Exception as e:
@@ -5789,10 +5736,15 @@ async def update_check_status(check_id: str, status_data: Dict[str, str], curren
             {"id": check_id},
             {"$set": update_data}
         )
+        dashboard_stats.invalidate("checks")
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Check not found")
         
+        # Voided checks drop out of the day's checks-written totals
+        if (new_status == "voided") != (existing_check.get("status") == "voided"):
+            await daily_financials.record_check(db, existing_check, -1 if new_status == "voided" else 1)
+        
         # Return updated check
         updated_check = await db.checks.find_one({"id": check_id}, {"_id": 0})
         return Check(**updated_check)
@@ -5863,6 +5815,7 @@ async def print_check(check_id: str, current_user: User = Depends(get_current_ac
             {"id": check_id},
             {"$set": {"status": "printed", "updated_at": jsonable_encoder(datetime.utcnow())}}
         )
+        dashboard_stats.invalidate("checks")
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Check not found")
@@ -5903,6 +5856,8 @@ async def create_financial_transaction(transaction_data: FinancialTransactionCre
         
         transaction_dict = jsonable_encoder(transaction)
         await db.financial_transactions.insert_one(transaction_dict)
+        dashboard_stats.invalidate("financial_transactions")
+        await daily_financials.record_transaction(db, transaction_dict)
         return transaction
     except Exception as e:
         logger.error(f"Error creating transaction: {str(e)}")
@@ -5956,6 +5911,10 @@ async def update_financial_transaction(transaction_id: str, transaction_data: Fi
     
     updated_transaction_dict = jsonable_encoder(updated_transaction)
     await db.financial_transactions.replace_one({"id": transaction_id}, updated_transaction_dict)
+    dashboard_stats.invalidate("financial_transactions")
+    # Move the amount out of the old day/bucket and into the new one
+    await daily_financials.record_transaction(db, existing_transaction, -1)
+    await daily_financials.record_transaction(db, updated_transaction_dict)
     return updated_transaction
 
 # Vendor Invoice Management
@@ -5972,6 +5931,7 @@ async def create_vendor_invoice(invoice_data: VendorInvoiceCreate):
         
         invoice_dict = jsonable_encoder(invoice)
         await db.vendor_invoices.insert_one(invoice_dict)
+        dashboard_stats.invalidate("vendor_invoices")
         return invoice
     except Exception as e:
         logger.error(f"Error creating vendor invoice: {str(e)}")
@@ -5998,22 +5958,28 @@ async def pay_vendor_invoice(invoice_id: str, check_id: str):
             raise HTTPException(status_code=404, detail="Invoice or check not found")
         
         # Update invoice payment status
+        payment = {
+            "payment_status": "paid",
+            "amount_paid": invoice["total_amount"],
+            "payment_date": jsonable_encoder(date.today()),
+            "check_id": check_id,
+            "updated_at": jsonable_encoder(datetime.utcnow())
+        }
         result = await db.vendor_invoices.update_one(
             {"id": invoice_id},
-            {"$set": {
-                "payment_status": "paid",
-                "amount_paid": invoice["total_amount"],
-                "payment_date": date.today(),
-                "check_id": check_id,
-                "updated_at": jsonable_encoder(datetime.utcnow())
-            }}
+            {"$set": payment}
         )
+        dashboard_stats.invalidate("vendor_invoices")
+        if invoice.get("payment_status") == "paid":
+            await daily_financials.record_vendor_payment(db, invoice, -1)
+        await daily_financials.record_vendor_payment(db, payment)
         
         # Update check reference
         await db.checks.update_one(
             {"id": check_id},
             {"$set": {"reference_invoice_id": invoice_id}}
         )
+        dashboard_stats.invalidate("checks")
         
         return {"message": "Invoice marked as paid"}
     except HTTPException:
@@ -6026,71 +5992,10 @@ async def pay_vendor_invoice(invoice_id: str, check_id: str):
 @api_router.get("/financial-summary/{summary_date}")
 async def get_daily_financial_summary(summary_date: date):
     try:
-        # Get all transactions for the date
-        transactions = await db.financial_transactions.find({
-            "transaction_date": summary_date
-        }).to_list(1000)
+        # Precomputed row, kept current by transaction/check writes (built on first read for older days)
+        row = await daily_financials.day(db, summary_date)
         
-        # Calculate totals
-        cash_income = 0.0
-        credit_card_income = 0.0
-        check_income = 0.0
-        other_income = 0.0
-        
-        cash_expenses = 0.0
-        check_expenses = 0.0
-        credit_card_expenses = 0.0
-        other_expenses = 0.0
-        
-        income_count = 0
-        expense_count = 0
-        
-        for trans_data in transactions:
-            trans = FinancialTransaction(**trans_data)
-            
-            if trans.transaction_type == TransactionType.INCOME:
-                income_count += 1
-                if trans.payment_method == PaymentMethod.CASH:
-                    cash_income += trans.amount
-                elif trans.payment_method in [PaymentMethod.CREDIT_CARD, PaymentMethod.DEBIT_CARD]:
-                    credit_card_income += trans.amount
-                elif trans.payment_method == PaymentMethod.CHECK:
-                    check_income += trans.amount
-                else:
-                    other_income += trans.amount
-            
-            elif trans.transaction_type == TransactionType.EXPENSE:
-                expense_count += 1
-                if trans.payment_method == PaymentMethod.CASH:
-                    cash_expenses += trans.amount
-                elif trans.payment_method in [PaymentMethod.CREDIT_CARD, PaymentMethod.DEBIT_CARD]:
-                    credit_card_expenses += trans.amount
-                elif trans.payment_method == PaymentMethod.CHECK:
-                    check_expenses += trans.amount
-                else:
-                    other_expenses += trans.amount
-        
-        total_income = cash_income + credit_card_income + check_income + other_income
-        total_expenses = cash_expenses + check_expenses + credit_card_expenses + other_expenses
-        net_amount = total_income - total_expenses
-        
-        summary = DailyFinancialSummary(
-            summary_date=summary_date,
-            cash_income=cash_income,
-            credit_card_income=credit_card_income,
-            check_income=check_income,
-            other_income=other_income,
-            total_income=total_income,
-            cash_expenses=cash_expenses,
-            check_expenses=check_expenses,
-            credit_card_expenses=credit_card_expenses,
-            other_expenses=other_expenses,
-            total_expenses=total_expenses,
-            net_amount=net_amount,
-            income_transaction_count=income_count,
-            expense_transaction_count=expense_count,
-            created_by="System"
-        )
+        summary = DailyFinancialSummary(**{k: round(v, 2) if isinstance(v, float) else v for k, v in row.items()})
         
         return summary
     except Exception as e:
@@ -6101,107 +6006,81 @@ async def get_daily_financial_summary(summary_date: date):
 async def get_monthly_financial_report(year: int, month: int):
     try:
         # Calculate date range for the month
-        start_date = date(year, month, 1)
-        if month == 12:
-            end_date = date(year + 1, 1, 1) - timedelta(days=1)
-        else:
-            end_date = date(year, month + 1, 1) - timedelta(days=1)
-        
-        # Get all transactions for the month
-        transactions = await db.financial_transactions.find({
-            "transaction_date": {"$gte": start_date, "$lte": end_date}
-        }).to_list(10000)
-        
-        # Calculate category-wise totals
-        income_by_category = {}
-        expense_by_category = {}
-        total_income = 0.0
-        total_expenses = 0.0
-        
-        for trans_data in transactions:
-            trans = FinancialTransaction(**trans_data)
-            
-            if trans.transaction_type == TransactionType.INCOME:
-                total_income += trans.amount
-                category = trans.category or "other_income"
-                income_by_category[category] = income_by_category.get(category, 0) + trans.amount
-            
-            elif trans.transaction_type == TransactionType.EXPENSE:
-                total_expenses += trans.amount
-                category = trans.category or "other_expense"
-                expense_by_category[category] = expense_by_category.get(category, 0) + trans.amount
-        
-        # Get unpaid vendor invoices
-        unpaid_invoices = await db.vendor_invoices.find({
-            "payment_status": "unpaid",
-            "due_date": {"$lte": end_date}
-        }).to_list(1000)
+        try:
+            start_date, end_date = month_range(year, month)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        total_payables = sum(inv["total_amount"] for inv in unpaid_invoices)
+        # Sum of the month's precomputed day rows (at most 31)
+        report = summarize_days(await daily_financials.days(db, start_date, end_date))
+        unpaid = await payables(db, end_date)
         
         return {
             "period": {"year": year, "month": month, "start_date": start_date, "end_date": end_date},
             "summary": {
-                "total_income": total_income,
-                "total_expenses": total_expenses,
-                "net_income": total_income - total_expenses,
-                "total_payables": total_payables
+                "total_income": report["total_income"],
+                "total_expenses": report["total_expenses"],
+                "net_income": report["net_income"],
+                "total_payables": unpaid["total"]
             },
-            "income_breakdown": income_by_category,
-            "expense_breakdown": expense_by_category,
-            "unpaid_invoices_count": len(unpaid_invoices),
-            "transaction_count": len(transactions)
+            "income_breakdown": report["income_breakdown"],
+            "expense_breakdown": report["expense_breakdown"],
+            "unpaid_invoices_count": unpaid["count"],
+            "transaction_count": report["transaction_count"]
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating monthly report: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating report: {str(e)}")
 
+@api_router.get("/financial-reports/range")
+async def get_financial_report_range(start_date: date, end_date: date, group_by: Optional[str] = None):
+    """Income/expense rollups for any date range; group_by=day|month|year adds one entry per period for comparison"""
+    try:
+        report = await period_report(db, start_date, end_date, group_by)
+        unpaid = await payables(db, end_date)
+        return {
+            "period": {"start_date": start_date, "end_date": end_date, "group_by": group_by},
+            **report,
+            "total_payables": unpaid["total"],
+            "unpaid_invoices_count": unpaid["count"]
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error generating financial report: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error generating report: {str(e)}")
+
 # Dashboard Integration - Update existing dashboard
 @api_router.get("/dashboard/stats")
-async def get_dashboard_stats():
+async def get_dashboard_stats(response: Response):
     try:
-        total_patients = await db.patients.count_documents({"status": "active"})
-        total_invoices = await db.invoices.count_documents({})
-        total_enhanced_invoices = await db.enhanced_invoices.count_documents({})
-        pending_invoices = await db.invoices.count_documents({"status": {"$in": ["draft", "sent"]}})
-        pending_enhanced_invoices = await db.enhanced_invoices.count_documents({"status": {"$in": ["draft", "sent"]}})
-        low_stock_items = await db.inventory.count_documents({"$expr": {"$lte": ["$current_stock", "$min_stock_level"]}})
-        total_employees = await db.employees.count_documents({"is_active": True})
-        
-        # Finance stats
-        today = datetime.combine(date.today(), datetime.min.time())  # Convert date to datetime for MongoDB
-        today_income = await db.financial_transactions.aggregate([
-            {"$match": {"transaction_date": today, "transaction_type": "income"}},
-            {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-        ]).to_list(1)
-        
-        unpaid_vendor_invoices = await db.vendor_invoices.count_documents({"payment_status": "unpaid"})
-        pending_checks = await db.checks.count_documents({"status": {"$in": ["draft", "printed"]}})
-        
-        # Recent activity (removed encounters from dashboard)
-        recent_patients = await db.patients.find().sort("created_at", -1).limit(5).to_list(5)
-        recent_invoices = await db.invoices.find().sort("created_at", -1).limit(3).to_list(3)
-        recent_enhanced_invoices = await db.enhanced_invoices.find().sort("created_at", -1).limit(2).to_list(2)
+        # Counts come from a short-TTL cache that is invalidated per source collection;
+        # stale entries are recomputed concurrently
+        values, cache_state, compute_ms = await dashboard_stats.get(db)
+        response.headers["X-Dashboard-Cache"] = cache_state
+        response.headers["Server-Timing"] = f"stats;dur={compute_ms}"
         
         # Combine recent invoices
         all_recent_invoices = []
-        for inv in recent_invoices:
+        for inv in values["recent_invoices"]:
             all_recent_invoices.append(Invoice(**inv))
-        for inv in recent_enhanced_invoices:
+        for inv in values["recent_enhanced_invoices"]:
             all_recent_invoices.append(EnhancedInvoice(**inv))
         
         return {
             "stats": {
-                "total_patients": total_patients,
-                "total_invoices": total_invoices + total_enhanced_invoices,
-                "pending_invoices": pending_invoices + pending_enhanced_invoices,
-                "low_stock_items": low_stock_items,
-                "total_employees": total_employees,
-                "today_income": today_income[0]["total"] if today_income else 0.0,
-                "unpaid_vendor_invoices": unpaid_vendor_invoices,
-                "pending_checks": pending_checks
+                "total_patients": values["total_patients"],
+                "total_invoices": values["total_invoices"] + values["total_enhanced_invoices"],
+                "pending_invoices": values["pending_invoices"] + values["pending_enhanced_invoices"],
+                "low_stock_items": values["low_stock_items"],
+                "total_employees": values["total_employees"],
+                "today_income": values["today_income"],
+                "unpaid_vendor_invoices": values["unpaid_vendor_invoices"],
+                "pending_checks": values["pending_checks"]
             },
-            "recent_patients": [Patient(**p) for p in recent_patients],
+            "recent_patients": [Patient(**p) for p in values["recent_patients"]],
             "recent_invoices": all_recent_invoices
         }
     except Exception as e:
@@ -6222,16 +6101,24 @@ async def get_erx_patients(current_user: User = Depends(get_current_active_user)
             }
         }).sort("scheduled_date", 1).to_list(100)
         
+        # Batch patient, prescription and allergy lookups: one query each for the whole day
+        loaders = Loaders(db)
+        patient_ids = [e["patient_id"] for e in todays_encounters]
+        prescriptions = loaders.get("prescriptions", key="patient_id", projection={"patient_id": 1},
+                                    filter={"status": {"$in": ["active", "draft"]}}, many=True)
+        allergies = loaders.get("allergies", key="patient_id", projection={"patient_id": 1}, many=True)
+        patients, _, _ = await asyncio.gather(
+            loaders.patients().load_many(patient_ids),
+            prescriptions.load_many(patient_ids),
+            allergies.load_many(patient_ids)
+        )
+        
         # Get patient details for each encounter
         erx_patients = []
-        for encounter in todays_encounters:
-            patient = await db.patients.find_one({"id": encounter["patient_id"]}, {"_id": 0})
+        for encounter, patient in zip(todays_encounters, patients):
             if patient:
                 # Get active prescriptions count
-                active_prescriptions = await db.prescriptions.count_documents({
-                    "patient_id": encounter["patient_id"],
-                    "status": {"$in": ["active", "draft"]}
-                })
+                active_prescriptions = len(await prescriptions.load(encounter["patient_id"]))
                 
                 erx_patients.append({
                     "encounter_id": encounter["id"],
@@ -6244,7 +6131,7 @@ async def get_erx_patients(current_user: User = Depends(get_current_active_user)
                     "provider": encounter.get("provider", "Not assigned"),
                     "chief_complaint": encounter.get("chief_complaint", ""),
                     "active_prescriptions": active_prescriptions,
-                    "allergies_count": len(await db.allergies.find({"patient_id": patient["id"]}).to_list(100))
+                    "allergies_count": len(await allergies.load(patient["id"]))
                 })
         
         return {
@@ -6275,12 +6162,23 @@ async def get_daily_log(current_user: User = Depends(get_current_active_user)):
         total_revenue = 0
         total_paid = 0
         
-        for encounter in completed_encounters:
-            patient = await db.patients.find_one({"id": encounter["patient_id"]}, {"_id": 0})
+        loaders = Loaders(db)
+        encounter_ids = [e["id"] for e in completed_encounters]
+        invoice_loader = loaders.get("invoices", key="encounter_id",
+                                     projection={"total_amount": 1, "status": 1}, many=True)
+        enhanced_invoice_loader = loaders.get("enhanced_invoices", key="encounter_id",
+                                              projection={"total_amount": 1, "payment_status": 1}, many=True)
+        patients, _, _ = await asyncio.gather(
+            loaders.patients().load_many([e["patient_id"] for e in completed_encounters]),
+            invoice_loader.load_many(encounter_ids),
+            enhanced_invoice_loader.load_many(encounter_ids)
+        )
+        
+        for encounter, patient in zip(completed_encounters, patients):
             if patient:
                 # Get related invoices
-                invoices = await db.invoices.find({"encounter_id": encounter["id"]}).to_list(100)
-                enhanced_invoices = await db.enhanced_invoices.find({"encounter_id": encounter["id"]}).to_list(100)
+                invoices = await invoice_loader.load(encounter["id"])
+                enhanced_invoices = await enhanced_invoice_loader.load(encounter["id"])
                 
                 # Calculate totals
                 encounter_total = 0
@@ -6361,8 +6259,10 @@ async def get_patient_queue(current_user: User = Depends(get_current_active_user
         
         queue_data = []
         
-        for encounter in active_encounters:
-            patient = await db.patients.find_one({"id": encounter["patient_id"]}, {"_id": 0})
+        # One batched patient query for the whole queue instead of one per encounter
+        patients = await Loaders(db).patients().load_many([e["patient_id"] for e in active_encounters])
+        
+        for encounter, patient in zip(active_encounters, patients):
             if patient:
                 # Determine location based on encounter status and time
                 location = "lobby"  # default
@@ -6549,7 +6449,7 @@ async def get_legacy_dashboard_stats():
         total_enhanced_invoices = await db.enhanced_invoices.count_documents({})
         pending_invoices = await db.invoices.count_documents({"status": {"$in": ["draft", "sent"]}})
         pending_enhanced_invoices = await db.enhanced_invoices.count_documents({"status": {"$in": ["draft", "sent"]}})
-        low_stock_items = await db.inventory.count_documents({"$expr": {"$lte": ["$current_stock", "$min_stock_level"]}})
+        low_stock_items = await count_low_stock(db)
         total_employees = await db.employees.count_documents({"is_active": True})
         
         # Recent activity (removed encounters from dashboard)
@@ -6578,44 +6478,6 @@ async def get_legacy_dashboard_stats():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving legacy dashboard stats: {str(e)}")
 
-# Dashboard Stats
-@api_router.get("/dashboard/stats")
-async def get_dashboard_stats():
-    try:
-        total_patients = await db.patients.count_documents({"status": "active"})
-        total_invoices = await db.invoices.count_documents({})
-        total_enhanced_invoices = await db.enhanced_invoices.count_documents({})
-        pending_invoices = await db.invoices.count_documents({"status": {"$in": ["draft", "sent"]}})
-        pending_enhanced_invoices = await db.enhanced_invoices.count_documents({"status": {"$in": ["draft", "sent"]}})
-        low_stock_items = await db.inventory.count_documents({"$expr": {"$lte": ["$current_stock", "$min_stock_level"]}})
-        total_employees = await db.employees.count_documents({"is_active": True})
-        
-        # Recent activity (removed encounters from dashboard)
-        recent_patients = await db.patients.find().sort("created_at", -1).limit(5).to_list(5)
-        recent_invoices = await db.invoices.find().sort("created_at", -1).limit(3).to_list(3)
-        recent_enhanced_invoices = await db.enhanced_invoices.find().sort("created_at", -1).limit(2).to_list(2)
-        
-        # Combine recent invoices
-        all_recent_invoices = []
-        for inv in recent_invoices:
-            all_recent_invoices.append(Invoice(**inv))
-        for inv in recent_enhanced_invoices:
-            all_recent_invoices.append(EnhancedInvoice(**inv))
-        
-        return {
-            "stats": {
-                "total_patients": total_patients,
-                "total_invoices": total_invoices + total_enhanced_invoices,
-                "pending_invoices": pending_invoices + pending_enhanced_invoices,
-                "low_stock_items": low_stock_items,
-                "total_employees": total_employees
-            },
-            "recent_patients": [Patient(**p) for p in recent_patients],
-            "recent_invoices": all_recent_invoices
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error retrieving dashboard stats: {str(e)}")
-
 # Enhanced EHR Routes
 
 # Encounter/Visit Management
@@ -6632,6 +6494,8 @@ async def create_encounter(encounter_data: EncounterCreate):
     
     encounter_dict = jsonable_encoder(encounter)
     await db.encounters.insert_one(encounter_dict)
+    await bump_patient_version(db, encounter.patient_id)
+    await publish_safely("queue", {"encounter_id": encounter.id, "status": encounter_dict.get("status")}, type="queue.encounter")
     return encounter
 
 @api_router.get("/encounters", response_model=List[Encounter])
@@ -6657,6 +6521,8 @@ async def update_encounter_status(encounter_id: str, status: EncounterStatus):
         {"id": encounter_id},
         {"$set": jsonable_encoder(update_data)}
     )
+    await bump_for_record(db, "encounters", encounter_id)
+    await publish_safely("queue", {"encounter_id": encounter_id, "status": update_data["status"]}, type="queue.encounter")
     return {"message": "Encounter status updated"}
 
 # SOAP Notes
@@ -6665,6 +6531,7 @@ async def create_soap_note(soap_data: SOAPNoteCreate):
     soap_note = SOAPNote(**soap_data.dict())
     soap_dict = jsonable_encoder(soap_note)
     await db.soap_notes.insert_one(soap_dict)
+    await bump_patient_version(db, soap_note.patient_id)
     return soap_note
 
 @api_router.post("/soap-notes/{soap_note_id}/complete")
@@ -6694,6 +6561,7 @@ async def complete_soap_note(soap_note_id: str, completion_data: Dict[str, Any],
             "updated_at": jsonable_encoder(datetime.utcnow())
         }}
     )
+    await bump_patient_version(db, soap_note["patient_id"])
     
     # WORKFLOW 1: Automatic Receipt/Invoice Generation
     workflow_results = {}
@@ -6763,6 +6631,7 @@ async def complete_soap_note(soap_note_id: str, completion_data: Dict[str, Any],
             
             invoice_dict = jsonable_encoder(invoice)
             await db.invoices.insert_one(invoice_dict)
+            dashboard_stats.invalidate("invoices")
             
             workflow_results["invoice_created"] = {
                 "invoice_id": invoice.id,
@@ -6780,6 +6649,7 @@ async def complete_soap_note(soap_note_id: str, completion_data: Dict[str, Any],
     if prescribed_medications:
         try:
             inventory_updates = []
+            ledger_rows = []
             for med in prescribed_medications:
                 # Find inventory item by medication name/SKU
                 inventory_item = await db.inventory.find_one({
@@ -6790,14 +6660,8 @@ async def complete_soap_note(soap_note_id: str, completion_data: Dict[str, Any],
                 }, {"_id": 0})
                 
                 if inventory_item:
-                    # Update stock (subtract dispensed quantity)
+                    # Subtract the dispensed quantity (applied below with the other medications)
                     dispensed_qty = med.get("quantity_dispensed", 1)
-                    new_stock = inventory_item["current_stock"] - dispensed_qty
-                    
-                    await db.inventory.update_one(
-                        {"id": inventory_item["id"]},
-                        {"$set": {"current_stock": new_stock, "updated_at": jsonable_encoder(datetime.utcnow())}}
-                    )
                     
                     # Create inventory transaction
                     transaction = InventoryTransaction(
@@ -6809,17 +6673,21 @@ async def complete_soap_note(soap_note_id: str, completion_data: Dict[str, Any],
                         created_by=current_user.username
                     )
                     
-                    transaction_dict = jsonable_encoder(transaction)
-                    await db.inventory_transactions.insert_one(transaction_dict)
+                    ledger_rows.append(jsonable_encoder(transaction))
                     
                     inventory_updates.append({
                         "item_id": inventory_item["id"],
                         "item_name": inventory_item["name"],
                         "previous_stock": inventory_item["current_stock"],
-                        "new_stock": new_stock,
                         "dispensed_quantity": dispensed_qty
                     })
             
+            # Every dispensed medication in one bulk stock write + one ledger insert
+            levels = await apply_inventory_transactions(db, ledger_rows)
+            dashboard_stats.invalidate("inventory")
+            for update in inventory_updates:
+                update["new_stock"] = levels.get(update["item_id"])
+            
             workflow_results["inventory_updated"] = inventory_updates
             
         except Exception as e:
@@ -6905,6 +6773,7 @@ async def update_soap_note(soap_note_id: str, soap_note_data: SOAPNoteCreate, cu
     
     updated_note_dict = jsonable_encoder(updated_note)
     await db.soap_notes.replace_one({"id": soap_note_id}, updated_note_dict)
+    await bump_patient_version(db, existing_note["patient_id"])
     return updated_note
 
 @api_router.delete("/soap-notes/{soap_note_id}")
@@ -6917,6 +6786,7 @@ async def delete_soap_note(soap_note_id: str, current_user: User = Depends(get_c
     
     # Delete the SOAP note
     result = await db.soap_notes.delete_one({"id": soap_note_id})
+    await bump_patient_version(db, existing_note.get("patient_id"))
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="SOAP note not found")
     
@@ -6932,6 +6802,7 @@ async def create_vital_signs(vital_signs_data: VitalSignsCreate, current_user: U
     )
     vital_signs_dict = jsonable_encoder(vital_signs)
     await db.vital_signs.insert_one(vital_signs_dict)
+    await bump_patient_version(db, vital_signs.patient_id)
     return vital_signs
 
 @api_router.get("/vital-signs", response_model=List[VitalSigns])
@@ -6968,6 +6839,7 @@ async def create_allergy(allergy_data: AllergyCreate, current_user: User = Depen
     )
 
     await db.allergies.insert_one(jsonable_encoder(allergy))
+    await bump_patient_version(db, allergy.patient_id)
 
     await create_audit_event(
         event_type="create",
@@ -6993,6 +6865,7 @@ async def create_medication(medication_data: MedicationCreate):
     medication = Medication(**medication_data.dict())
     medication_dict = jsonable_encoder(medication)
     await db.medications.insert_one(medication_dict)
+    await bump_patient_version(db, medication.patient_id)
     return medication
 
 @api_router.get("/medications/patient/{patient_id}", response_model=List[Medication])
@@ -7006,6 +6879,7 @@ async def update_medication_status(medication_id: str, status: MedicationStatus)
         {"id": medication_id},
         {"$set": {"status": status, "updated_at": jsonable_encoder(datetime.utcnow())}}
     )
+    await bump_for_record(db, "medications", medication_id)
     return {"message": "Medication status updated"}
 
 # Medical History
@@ -7014,6 +6888,7 @@ async def create_medical_history(history_data: MedicalHistoryCreate):
     history = MedicalHistory(**history_data.dict())
     history_dict = jsonable_encoder(history)
     await db.medical_history.insert_one(history_dict)
+    await bump_patient_version(db, history.patient_id)
     return history
 
 @api_router.get("/medical-history/patient/{patient_id}", response_model=List[MedicalHistory])
@@ -7058,32 +6933,51 @@ async def get_patient_procedures(patient_id: str):
     return [Procedure(**procedure) for procedure in procedures]
 
 # Comprehensive Patient Summary
+def _fields_projection(model, exclude=()) -> Dict[str, int]:
+    return {f: 1 for f in model.model_fields if f not in exclude}
+
+# Summary sections only load the fields their models expose; document bodies (file_data) are left out
+_SUMMARY_PROJECTIONS = {
+    "patient": _fields_projection(Patient),
+    "recent_encounters": _fields_projection(Encounter),
+    "allergies": _fields_projection(Allergy),
+    "active_medications": _fields_projection(Medication),
+    "medical_history": _fields_projection(MedicalHistory),
+    "recent_vitals": _fields_projection(VitalSigns),
+    "recent_soap_notes": _fields_projection(SOAPNote),
+    "documents": _fields_projection(PatientDocument, exclude=("file_data",)),
+}
+
 @api_router.get("/patients/{patient_id}/summary")
-async def get_patient_summary(patient_id: str):
-    # Get patient basic info
-    patient = await db.patients.find_one({"id": patient_id}, {"_id": 0})
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient not found")
-    
-    # Get all related medical data
-    encounters = await db.encounters.find({"patient_id": patient_id}, {"_id": 0}).sort("scheduled_date", -1).limit(10).to_list(10)
-    allergies = await db.allergies.find({"patient_id": patient_id}).to_list(100)
-    medications = await db.medications.find({"patient_id": patient_id, "status": "active"}).to_list(100)
-    medical_history = await db.medical_history.find({"patient_id": patient_id}).to_list(100)
-    recent_vitals = await db.vital_signs.find({"patient_id": patient_id}, {"_id": 0}).sort("recorded_at", -1).limit(1).to_list(1)
-    recent_soap_notes = await db.soap_notes.find({"patient_id": patient_id}, {"_id": 0}).sort("created_at", -1).limit(5).to_list(5)
-    documents = await db.patient_documents.find({"patient_id": patient_id}, {"_id": 0}).sort("upload_date", -1).to_list(100)
+async def get_patient_summary(patient_id: str, request: Request, response: Response):
+    # The patient's version counter is bumped by every chart write, so an unchanged
+    # version means the client's copy (ETag) or our cached snapshot is still current
+    version = await get_patient_version(db, patient_id)
+    etag = summary_etag(patient_id, version)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    summary = patient_summary_cache.get(patient_id, version)
+    if summary is None:
+        data = await fetch_patient_summary(db, patient_id, _SUMMARY_PROJECTIONS)
+        if not data["patient"]:
+            raise HTTPException(status_code=404, detail="Patient not found")
+        
+        summary = jsonable_encoder({
+            "patient": Patient(**data["patient"]),
+            "recent_encounters": [Encounter(**e) for e in data["recent_encounters"]],
+            "allergies": [Allergy(**a) for a in data["allergies"]],
+            "active_medications": [Medication(**m) for m in data["active_medications"]],
+            "medical_history": [MedicalHistory(**h) for h in data["medical_history"]],
+            "recent_vitals": [VitalSigns(**v) for v in data["recent_vitals"]],
+            "recent_soap_notes": [SOAPNote(**s) for s in data["recent_soap_notes"]],
+            "documents": data["documents"]
+        })
+        patient_summary_cache.put(patient_id, version, summary)
     
-    return {
-        "patient": Patient(**patient),
-        "recent_encounters": [Encounter(**e) for e in encounters],
-        "allergies": [Allergy(**a) for a in allergies],
-        "active_medications": [Medication(**m) for m in medications],
-        "medical_history": [MedicalHistory(**h) for h in medical_history],
-        "recent_vitals": [VitalSigns(**v) for v in recent_vitals],
-        "recent_soap_notes": [SOAPNote(**s) for s in recent_soap_notes],
-        "documents": [PatientDocument(**d) for d in documents]
-    }
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return summary
 
 # Enhanced Features - Document Management
 @api_router.post("/patients/{patient_id}/documents", response_model=PatientDocument)
@@ -7098,6 +6992,7 @@ async def upload_patient_document(patient_id: str, document: PatientDocumentCrea
         doc = PatientDocument(**document.dict())
         doc_dict = jsonable_encoder(doc)
         await db.patient_documents.insert_one(doc_dict)
+        await bump_patient_version(db, doc.patient_id)
         return doc
     except HTTPException:
         raise
@@ -7112,9 +7007,11 @@ async def get_patient_documents(patient_id: str):
 
 @api_router.delete("/documents/{document_id}")
 async def delete_patient_document(document_id: str):
+    document = await db.patient_documents.find_one({"id": document_id}, {"_id": 0, "patient_id": 1})
     result = await db.patient_documents.delete_one({"id": document_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Document not found")
+    await bump_patient_version(db, (document or {}).get("patient_id"))
     return {"message": "Document deleted successfully"}
 
 # Enhanced SOAP Notes with Plan Items and Auto-Billing
@@ -7175,6 +7072,7 @@ async def create_enhanced_invoice(invoice_data: EnhancedInvoiceCreate):
         
         invoice_dict = jsonable_encoder(invoice)
         await db.enhanced_invoices.insert_one(invoice_dict)
+        dashboard_stats.invalidate("enhanced_invoices")
         return invoice
     except Exception as e:
         logger.error(f"Error creating enhanced invoice: {str(e)}")
@@ -7193,12 +7091,21 @@ async def update_enhanced_invoice_status(invoice_id: str, status: InvoiceStatus)
         # If invoice is being marked as paid, deduct inventory items
         if status == InvoiceStatus.PAID and invoice["status"] != "paid":
             update_data["paid_date"] = date.today()
-            await process_inventory_deductions(invoice["items"])
+            # Only the request that actually flips the invoice to paid deducts stock
+            result = await db.enhanced_invoices.update_one(
+                {"id": invoice_id, "status": {"$ne": "paid"}},
+                {"$set": jsonable_encoder(update_data)}
+            )
+            dashboard_stats.invalidate("enhanced_invoices")
+            if result.modified_count:
+                await process_inventory_deductions(invoice["items"], invoice_id)
+            return {"message": "Invoice status updated successfully"}
         
         await db.enhanced_invoices.update_one(
             {"id": invoice_id},
             {"$set": jsonable_encoder(update_data)}
         )
+        dashboard_stats.invalidate("enhanced_invoices")
         
         return {"message": "Invoice status updated successfully"}
     except HTTPException:
@@ -7248,34 +7155,26 @@ async def auto_generate_invoice_from_plan(patient_id: str, encounter_id: str, pl
     except Exception as e:
         logger.error(f"Error auto-generating invoice: {str(e)}")
 
-async def process_inventory_deductions(invoice_items: List[dict]):
-    """Process inventory deductions when invoice is paid"""
+async def process_inventory_deductions(invoice_items: List[dict], invoice_id: Optional[str] = None):
+    """Process inventory deductions when invoice is paid (one ledger batch per invoice)"""
     try:
+        ledger_rows = []
         for item in invoice_items:
             if item.get("inventory_item_id") and item.get("service_type") in ["product", "injectable"]:
-                # Find inventory item
-                inventory_item = await db.inventory.find_one({"id": item["inventory_item_id"]}, {"_id": 0})
-                if inventory_item:
-                    # Create inventory transaction (deduction)
-                    transaction = InventoryTransaction(
-                        item_id=item["inventory_item_id"],
-                        transaction_type="out",
-                        quantity=item["quantity"],
-                        reference_id=item.get("invoice_id"),
-                        notes=f"Auto-deducted from paid invoice: {item['description']}",
-                        created_by="System"
-                    )
-                    
-                    # Update inventory stock
-                    new_stock = inventory_item["current_stock"] - item["quantity"]
-                    await db.inventory.update_one(
-                        {"id": item["inventory_item_id"]},
-                        {"$set": {"current_stock": max(0, new_stock), "updated_at": jsonable_encoder(datetime.utcnow())}}
-                    )
-                    
-                    # Record transaction
-                    transaction_dict = jsonable_encoder(transaction)
-                    await db.inventory_transactions.insert_one(transaction_dict)
+                # Create inventory transaction (deduction)
+                transaction = InventoryTransaction(
+                    item_id=item["inventory_item_id"],
+                    transaction_type="out",
+                    quantity=item["quantity"],
+                    reference_id=item.get("invoice_id") or invoice_id,
+                    notes=f"Auto-deducted from paid invoice: {item['description']}",
+                    created_by="System"
+                )
+                ledger_rows.append(jsonable_encoder(transaction))
+        
+        # Stock never goes below zero for invoice deductions; unknown items are skipped
+        await apply_inventory_transactions(db, ledger_rows, floor=0)
+        dashboard_stats.invalidate("inventory")
     except Exception as e:
         logger.error(f"Error processing inventory deductions: {str(e)}")
 
@@ -7530,18 +7429,46 @@ async def search_drug_interactions(
 ):
     """Search for interactions between two specific drugs"""
     try:
-        interaction = await db.drug_interactions.find_one({
-            "$or": [
-                {"drug1_id": drug1_id, "drug2_id": drug2_id},
-                {"drug1_id": drug2_id, "drug2_id": drug1_id}
-            ]
-        })
+        await interaction_index.ensure_loaded(db)
+        interaction = interaction_index.lookup(drug1_id, drug2_id)
         
         return {"interaction": interaction}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error checking drug interaction: {str(e)}")
 
+@api_router.post("/drug-interactions/regimen")
+async def check_regimen_interactions(
+    regimen: Dict[str, Any],
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Check a proposed regimen in one call: every new drug against each other
+    and against the patient's current prescriptions.
+    Body: {"patient_id": "...", "medication_ids": ["...", "..."]}
+    """
+    try:
+        medication_ids = regimen.get("medication_ids") or []
+        if not isinstance(medication_ids, list) or not medication_ids:
+            raise HTTPException(status_code=400, detail="medication_ids must be a non-empty list")
+        
+        await interaction_index.ensure_loaded(db)
+        current_prescriptions = []
+        if regimen.get("patient_id"):
+            current_prescriptions = await get_active_prescriptions(regimen["patient_id"])
+        
+        interactions = interaction_index.check_regimen(medication_ids, current_prescriptions)
+        return {
+            "interactions": interactions,
+            "checked_medications": len(set(medication_ids)),
+            "current_medications": len(current_prescriptions)
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error checking regimen interactions: {str(e)}")
+
 # Helper Functions
 
 async def check_drug_allergies(patient_id: str, medication_id: str) -> List[Dict[str, Any]]:
@@ -7580,41 +7507,23 @@ async def check_drug_allergies(patient_id: str, medication_id: str) -> List[Dict
         return []
 
 async def check_drug_interactions(patient_id: str, new_medication_id: str) -> List[Dict[str, Any]]:
-    """Check for drug-drug interactions"""
+    """Check for drug-drug interactions (one prescriptions query + in-memory pair lookups)"""
     try:
-        # Get patient's current active prescriptions
-        current_prescriptions = await db.prescriptions.find({
-            "patient_id": patient_id,
-            "status": {"$in": ["active", "draft"]}
-        }).to_list(100)
-        
-        alerts = []
-        for prescription in current_prescriptions:
-            if prescription["medication_id"] != new_medication_id:
-                # Check for interaction
-                interaction = await db.drug_interactions.find_one({
-                    "$or": [
-                        {"drug1_id": prescription["medication_id"], "drug2_id": new_medication_id},
-                        {"drug1_id": new_medication_id, "drug2_id": prescription["medication_id"]}
-                    ]
-                })
-                
-                if interaction:
-                    alerts.append({
-                        "type": "drug_interaction",
-                        "severity": interaction["severity"],
-                        "message": f"Interaction with {prescription['medication_display']}",
-                        "description": interaction["description"],
-                        "clinical_consequence": interaction["clinical_consequence"],
-                        "management": interaction["management_recommendation"]
-                    })
-        
-        return alerts
+        await interaction_index.ensure_loaded(db)
+        current_prescriptions = await get_active_prescriptions(patient_id)
+        return interaction_index.check_against(new_medication_id, current_prescriptions)
         
     except Exception as e:
         print(f"Error checking interactions: {str(e)}")
         return []
 
+async def get_active_prescriptions(patient_id: str) -> List[Dict[str, Any]]:
+    """Patient's current active/draft prescriptions, projected to what interaction checks need"""
+    return await db.prescriptions.find(
+        {"patient_id": patient_id, "status": {"$in": ["active", "draft"]}},
+        {"_id": 0, "medication_id": 1, "medication_display": 1}
+    ).to_list(100)
+
 async def create_prescription_audit_log(
     prescription_id: Optional[str],
     patient_id: str,
@@ -7848,6 +7757,7 @@ async def initialize_erx_data(current_user: User = Depends(get_current_active_us
         
         # Insert interactions
         await db.drug_interactions.insert_many(interactions)
+        await interaction_index.load(db)
         
         return {
             "message": "eRx data initialized successfully",
@@ -8417,6 +8327,7 @@ async def create_appointment(appointment_data: dict, current_user: User = Depend
         }
         appointment = Appointment(id=str(uuid.uuid4()), **appointment_data_with_names)
         await db.appointments.insert_one(jsonable_encoder(appointment))
+        await reindex(db, "appointments", [appointment.id])
         return appointment
     except HTTPException:
         raise
@@ -8517,6 +8428,96 @@ async def get_calendar_view(provider_id: str, date: str, view: str = "day"):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching calendar: {str(e)}")
 
+@api_router.get("/appointments/available-slots")
+async def get_available_slots(
+    provider_id: str,
+    date: str,  # YYYY-MM-DD
+    duration_minutes: int = 30,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get available time slots for a provider on a specific date"""
+    try:
+        from datetime import datetime
+        
+        appointment_date = datetime.strptime(date, "%Y-%m-%d").date()
+        
+        # Get provider schedule for the day
+        day_of_week = appointment_date.weekday()  # 0=Monday
+        provider_schedule = await db.provider_schedules.find_one({
+            "provider_id": provider_id,
+            "day_of_week": day_of_week,
+            "is_available": True
+        })
+        
+        if not provider_schedule:
+            return {"available_slots": [], "message": "Provider not available on this day"}
+        
+        # One query for the day's bookings; each slot is then checked against the interval index
+        busy = await load_busy(db, [provider_id], appointment_date, appointment_date)
+        slots = day_slots(provider_schedule, busy.get((provider_id, appointment_date.isoformat())), duration_minutes)
+        
+        return {"available_slots": [TimeSlot(**slot).dict() for slot in slots]}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting available slots: {str(e)}")
+
+@api_router.get("/appointments/availability")
+async def get_providers_availability(
+    start_date: str,  # YYYY-MM-DD
+    end_date: Optional[str] = None,  # defaults to start_date + 6 days
+    provider_ids: Optional[str] = None,  # comma separated; all active providers when omitted
+    duration_minutes: int = 30,
+    only_available: bool = True,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Free slots for several providers over a date range, plus the first available slot overall"""
+    try:
+        from datetime import datetime, timedelta
+        
+        try:
+            start = datetime.strptime(start_date, "%Y-%m-%d").date()
+            end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else start + timedelta(days=6)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+        if end < start or (end - start).days >= MAX_RANGE_DAYS:
+            raise HTTPException(status_code=400, detail=f"Date range must be 1-{MAX_RANGE_DAYS} days")
+        if duration_minutes <= 0:
+            raise HTTPException(status_code=400, detail="duration_minutes must be positive")
+        
+        provider_query = {"id": {"$in": provider_ids.split(",")}} if provider_ids else {"is_active": True}
+        providers = await db.providers.find(
+            provider_query, {"_id": 0, "id": 1, "name": 1, "first_name": 1, "last_name": 1}
+        ).to_list(1000)
+        ids = [p["id"] for p in providers]
+        
+        availability = await compute_availability(db, ids, start, end, duration_minutes) if ids else {}
+        
+        result = []
+        first_available = None
+        for provider in providers:
+            provider_name = provider.get("name") or f"{provider.get('first_name', '')} {provider.get('last_name', '')}".strip()
+            days = []
+            for day, entry in sorted(availability.get(provider["id"], {}).items()):
+                slots = [slot for slot in entry["slots"] if slot["is_available"] or not only_available]
+                days.append({"date": day, "slots": slots})
+                free = next((slot for slot in entry["slots"] if slot["is_available"]), None)
+                if free and (first_available is None or (day, free["start_time"]) < (first_available["date"], first_available["start_time"])):
+                    first_available = {"date": day, "provider_id": provider["id"], "provider_name": provider_name, **free}
+            result.append({"provider_id": provider["id"], "provider_name": provider_name, "days": days})
+        
+        return {
+            "start_date": start.isoformat(),
+            "end_date": end.isoformat(),
+            "duration_minutes": duration_minutes,
+            "providers": result,
+            "first_available": first_available
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting provider availability: {str(e)}")
+
 @api_router.get("/appointments/{appointment_id}", response_model=Appointment)
 async def get_appointment(appointment_id: str):
     appointment = await db.appointments.find_one({"id": appointment_id}, {"_id": 0})
@@ -8540,6 +8541,7 @@ async def update_appointment_status(appointment_id: str, status_data: dict):
             {"id": appointment_id},
             {"$set": jsonable_encoder(update_data)}
         )
+        await reindex(db, "appointments", [appointment_id])
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Appointment not found")
         return {"message": "Appointment status updated successfully"}
@@ -8555,6 +8557,7 @@ async def cancel_appointment(appointment_id: str):
             {"id": appointment_id},
             {"$set": {"status": "cancelled", "updated_at": datetime.utcnow()}}
         )
+        await reindex(db, "appointments", [appointment_id])
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Appointment not found")
         return {"message": "Appointment cancelled successfully"}
@@ -8589,6 +8592,7 @@ async def update_appointment(appointment_id: str, appointment_data: dict, curren
             {"id": appointment_id},
             {"$set": update_data}
         )
+        await reindex(db, "appointments", [appointment_id])
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Appointment not found")
@@ -8644,63 +8648,6 @@ async def check_appointment_conflicts(provider_id: str, appointment_date: date,
         logger.error(f"Error checking conflicts: {str(e)}")
         return []
 
-@api_router.get("/appointments/available-slots")
-async def get_available_slots(
-    provider_id: str,
-    date: str,  # YYYY-MM-DD
-    duration_minutes: int = 30,
-    current_user: User = Depends(get_current_active_user)
-):
-    """Get available time slots for a provider on a specific date"""
-    try:
-        from datetime import datetime, timedelta
-        
-        appointment_date = datetime.strptime(date, "%Y-%m-%d").date()
-        
-        # Get provider schedule for the day
-        day_of_week = appointment_date.weekday()  # 0=Monday
-        provider_schedule = await db.provider_schedules.find_one({
-            "provider_id": provider_id,
-            "day_of_week": day_of_week,
-            "is_available": True
-        })
-        
-        if not provider_schedule:
-            return {"available_slots": [], "message": "Provider not available on this day"}
-        
-        # Parse schedule times
-        schedule_start = datetime.strptime(provider_schedule["start_time"], "%H:%M").time()
-        schedule_end = datetime.strptime(provider_schedule["end_time"], "%H:%M").time()
-        
-        # Generate all possible slots
-        available_slots = []
-        current_time = datetime.combine(appointment_date, schedule_start)
-        end_time = datetime.combine(appointment_date, schedule_end)
-        
-        while current_time + timedelta(minutes=duration_minutes) <= end_time:
-            slot_start = current_time.time().strftime("%H:%M")
-            slot_end = (current_time + timedelta(minutes=duration_minutes)).time().strftime("%H:%M")
-            
-            # Check if slot is available (no conflicting appointments)
-            conflicts = await check_appointment_conflicts(provider_id, appointment_date, slot_start, duration_minutes)
-            
-            available_slots.append(TimeSlot(
-                date=appointment_date,
-                start_time=slot_start,
-                end_time=slot_end,
-                provider_id=provider_id,
-                provider_name=provider_schedule.get("provider_name", ""),
-                is_available=len(conflicts) == 0,
-                duration_minutes=duration_minutes
-            ))
-            
-            current_time += timedelta(minutes=duration_minutes)
-        
-        return {"available_slots": [slot.dict() for slot in available_slots]}
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error getting available slots: {str(e)}")
-
 # Recurring Appointments
 @api_router.post("/appointments/recurring")
 async def create_recurring_appointment(recurrence_data: dict, current_user: User = Depends(get_current_active_user)):
@@ -8729,6 +8676,7 @@ async def create_recurring_appointment(recurrence_data: dict, current_user: User
         )
         parent_dict = jsonable_encoder(parent_appointment)
         await db.appointments.insert_one(parent_dict)
+        await reindex(db, "appointments", [parent_dict["id"]])
         
         # Create recurrence record
         recurrence_record = AppointmentRecurrence(
@@ -8772,6 +8720,7 @@ async def create_recurring_appointment(recurrence_data: dict, current_user: User
             )
             recurring_dict = jsonable_encoder(recurring_appointment)
             await db.appointments.insert_one(recurring_dict)
+            await reindex(db, "appointments", [recurring_dict["id"]])
             
             created_appointments.append(recurring_appointment.id)
             occurrence_count += 1
@@ -8895,6 +8844,7 @@ async def convert_waiting_list_to_appointment(entry_id: str, appointment_data: d
         appointment = Appointment(**appointment_creation_data)
         appointment_dict = jsonable_encoder(appointment)
         await db.appointments.insert_one(appointment_dict)
+        await reindex(db, "appointments", [appointment_dict["id"]])
         
         # Mark waiting list entry as inactive
         await db.waiting_list.update_one(
@@ -9543,6 +9493,7 @@ async def prescribe_medication_from_chart(
         
         patient_medication_dict = jsonable_encoder(patient_medication)
         await db.medications.insert_one(patient_medication_dict)
+        await bump_patient_version(db, patient_medication_dict.get("patient_id"))
         
         return {
             "status": "success",
@@ -9615,6 +9566,7 @@ async def update_prescription_status_from_chart(
                 {"prescription_id": prescription_id, "patient_id": patient_id},
                 {"$set": {"status": "discontinued", "end_date": jsonable_encoder(date.today()), "updated_at": jsonable_encoder(datetime.utcnow())}}
             )
+            await bump_patient_version(db, patient_id)
         
         # Get updated prescription
         updated_prescription = await db.prescriptions.find_one({"id": prescription_id}, {"_id": 0})
@@ -9671,6 +9623,7 @@ async def create_telehealth_session(session_data: TelehealthSessionCreate, curre
         
         session_dict = jsonable_encoder(session)
         await db.telehealth_sessions.insert_one(session_dict)
+        await reindex(db, "telehealth", [session_dict["id"]])
         
         return session
         
@@ -9823,6 +9776,7 @@ async def update_telehealth_session(
             {"id": session_id},
             {"$set": update_data}
         )
+        await reindex(db, "telehealth", [session_id])
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Telehealth session not found")
@@ -9854,6 +9808,7 @@ async def start_telehealth_session(session_id: str, current_user: User = Depends
             {"id": session_id},
             {"$set": update_data}
         )
+        await reindex(db, "telehealth", [session_id])
         
         # Create encounter if linked to appointment
         encounter_id = None
@@ -9874,6 +9829,7 @@ async def start_telehealth_session(session_id: str, current_user: User = Depends
                 encounter = Encounter(**encounter_data)
                 encounter_dict = jsonable_encoder(encounter)
                 await db.encounters.insert_one(encounter_dict)
+                await bump_patient_version(db, encounter.patient_id)
                 encounter_id = encounter.id
                 
                 # Link encounter to session
@@ -9930,6 +9886,7 @@ async def end_telehealth_session(session_id: str, session_summary: Dict[str, Any
             {"id": session_id},
             {"$set": update_data}
         )
+        await reindex(db, "telehealth", [session_id])
         
         # Complete associated encounter
         if session.get("encounter_id"):
@@ -9942,6 +9899,7 @@ async def end_telehealth_session(session_id: str, session_summary: Dict[str, Any
                         "updated_at": jsonable_encoder(datetime.utcnow())
                     }}
                 )
+                await bump_for_record(db, "encounters", session["encounter_id"])
             except Exception as e:
                 logger.warning(f"Could not complete encounter: {str(e)}")
         
@@ -9984,6 +9942,7 @@ async def join_waiting_room(session_id: str, current_user: User = Depends(get_cu
             {"id": session_id},
             {"$set": {"status": TelehealthSessionStatus.WAITING.value}}
         )
+        await reindex(db, "telehealth", [session_id])
         
         return {
             "message": "Joined waiting room successfully",
@@ -10061,18 +10020,126 @@ async def handle_webrtc_signal(signal_data: Dict[str, Any], current_user: User =
             signal_data=signal_data["signal_data"]
         )
         
-        # Store signal temporarily for real-time delivery
+        # Keep a copy for late joiners, then deliver to the target user's push stream
         signal_dict = jsonable_encoder(signal)
         await db.webrtc_signals.insert_one(signal_dict)
-        
-        # In a production system, this would use WebSocket or Server-Sent Events
-        # to deliver the signal to the target user in real-time
+        signal_dict.pop("_id", None)
+        await publish_safely("webrtc", signal_dict, user_id=signal.to_user_id, type=f"webrtc.{signal.signal_type}")
         
         return {"message": "Signal processed successfully"}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing WebRTC signal: {str(e)}")
 
+# Push gateway: notifications, WebRTC signals and patient-queue updates
+async def _push_user(token: Optional[str]) -> Optional[User]:
+    """Resolve a bearer token for push connections (EventSource and browsers' WebSocket can't set headers)."""
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        return None
+    username = payload.get("sub")
+    user = await db.users.find_one({"username": username}) if username else None
+    if user is None:
+        return None
+    user = User(**user)
+    return user if user.status == UserStatus.ACTIVE else None
+
+def _push_token(headers, token: Optional[str]) -> Optional[str]:
+    auth = headers.get("authorization") or ""
+    if auth.lower().startswith("bearer "):
+        return auth[7:].strip()
+    return token
+
+@api_router.get("/push/stream")
+async def push_stream(
+    request: Request,
+    topics: Optional[str] = None,
+    token: Optional[str] = None,
+    last_event_id: Optional[str] = None,
+):
+    """
+    Server-sent events for the current user. topics: comma list of notifications,
+    webrtc, queue (default all). Reconnects resume after the Last-Event-ID header
+    that EventSource sends automatically (or ?last_event_id=).
+    """
+    user = await _push_user(_push_token(request.headers, token))
+    if not user:
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+    try:
+        wanted = parse_topics(topics)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    sub = push_hub.subscribe(user.id, wanted)
+    resume = request.headers.get("last-event-id") or last_event_id
+
+    async def body():
+        try:
+            yield "retry: 3000\n\n"
+            async for event in push_hub.stream(sub, resume):
+                yield sse_format(event)
+        finally:
+            push_hub.unsubscribe(sub)
+
+    return StreamingResponse(body(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@api_router.websocket("/push/ws")
+async def push_websocket(
+    websocket: WebSocket,
+    topics: Optional[str] = None,
+    token: Optional[str] = None,
+    last_event_id: Optional[str] = None,
+):
+    """Same stream as /push/stream over a WebSocket; heartbeats are {"type": "ping"} frames."""
+    user = await _push_user(_push_token(websocket.headers, token))
+    if not user:
+        await websocket.close(code=4401)
+        return
+    try:
+        wanted = parse_topics(topics)
+    except ValueError:
+        await websocket.close(code=4400)
+        return
+    await websocket.accept()
+    sub = push_hub.subscribe(user.id, wanted)
+
+    async def drain_client():
+        # Nothing is expected from the client; reading just notices the disconnect
+        while True:
+            await websocket.receive_text()
+
+    reader = asyncio.create_task(drain_client())
+    try:
+        async for event in push_hub.stream(sub, last_event_id):
+            if reader.done():
+                break
+            await websocket.send_text(json.dumps({"type": "ping"} if event is None else event, default=str))
+        if sub.overflowed:
+            await websocket.close(code=4008)  # too far behind: reconnect with the last event id
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader.cancel()
+        push_hub.unsubscribe(sub)
+
+@api_router.get("/auth/cache-metrics")
+async def auth_cache_metrics(current_user: User = Depends(get_current_active_user)):
+    """Principal cache hit rate and size for this worker"""
+    return auth_principals.metrics()
+
+@api_router.get("/auth/login-metrics")
+async def login_metrics(current_user: User = Depends(get_current_active_user)):
+    """Password hashing pool load and login throttle rejections for this worker"""
+    return password_hash_pool.metrics()
+
+@api_router.get("/push/metrics")
+async def push_metrics(current_user: User = Depends(get_current_active_user)):
+    """Push gateway connections and delivery counters for this worker"""
+    return push_hub.metrics()
+
 # Integration with Appointment System
 @api_router.post("/appointments/{appointment_id}/convert-to-telehealth")
 async def convert_appointment_to_telehealth(
@@ -10147,6 +10214,7 @@ async def convert_appointment_to_telehealth(
         
         session_dict = jsonable_encoder(session)
         await db.telehealth_sessions.insert_one(session_dict)
+        await reindex(db, "telehealth", [session_dict["id"]])
         
         # Update appointment to indicate it's now a telehealth session
         await db.appointments.update_one(
@@ -10158,6 +10226,7 @@ async def convert_appointment_to_telehealth(
                 "updated_at": jsonable_encoder(datetime.utcnow())
             }}
         )
+        await reindex(db, "appointments", [appointment_id])
         
         return {
             "message": "Appointment converted to telehealth session successfully",
@@ -10725,6 +10794,7 @@ async def join_telehealth_session_portal(session_id: str, session_token: str):
                 {"id": session_id},
                 {"$set": {"status": "waiting"}}
             )
+            await reindex(db, "telehealth", [session_id])
         
         return {
             "message": "Joined telehealth session successfully",
@@ -11996,6 +12066,7 @@ async def initialize_icd10_codes(current_user: User = Depends(get_current_active
             code["id"] = str(uuid.uuid4())
         
         await db.icd10_codes.insert_many(comprehensive_codes)
+        await icd10_index.load(db)
         
         return {
             "message": "Comprehensive ICD-10 codes initialized successfully",
@@ -12031,61 +12102,11 @@ async def search_icd10_codes(
 ):
     """Search ICD-10 codes by description, code, or search terms with fuzzy matching"""
     try:
-        # Enhanced search query with multiple fields and fuzzy matching
-        search_query = {
-            "$or": [
-                {"description": {"$regex": query, "$options": "i"}},
-                {"code": {"$regex": query, "$options": "i"}},
-                {"category": {"$regex": query, "$options": "i"}},
-                {"search_terms": {"$regex": query, "$options": "i"}}
-            ]
-        }
-        
-        # Find exact matches first, then partial matches
-        codes = await db.icd10_codes.find(search_query).limit(limit).to_list(limit)
-        
-        # Remove MongoDB ObjectId and add relevance scoring
-        results = []
-        for code in codes:
-            if "_id" in code:
-                del code["_id"]
-            
-            # Calculate relevance score for better sorting
-            relevance_score = 0
-            query_lower = query.lower()
-            
-            # Exact code match gets highest score
-            if query_lower == code["code"].lower():
-                relevance_score = 100
-            # Code starts with query
-            elif code["code"].lower().startswith(query_lower):
-                relevance_score = 90
-            # Description starts with query
-            elif code["description"].lower().startswith(query_lower):
-                relevance_score = 80
-            # Search terms contain query
-            elif any(term.lower().startswith(query_lower) for term in code.get("search_terms", [])):
-                relevance_score = 70
-            # Query found in description
-            elif query_lower in code["description"].lower():
-                relevance_score = 60
-            # Query found in search terms
-            elif any(query_lower in term.lower() for term in code.get("search_terms", [])):
-                relevance_score = 50
-            else:
-                relevance_score = 30
-            
-            code["relevance_score"] = relevance_score
-            results.append(code)
-        
-        # Sort by relevance score (highest first)
-        results.sort(key=lambda x: x["relevance_score"], reverse=True)
-        
-        # Remove relevance score from final results
-        for result in results:
-            del result["relevance_score"]
-        
-        return results
+        # Served from the in-memory prefix/trigram index; every match is ranked
+        # (exact code > code prefix > description prefix > term prefix > substring)
+        # before the limit is applied
+        await icd10_index.ensure_loaded(db)
+        return icd10_index.search(query, limit)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error searching ICD-10 codes: {str(e)}")
 
@@ -12278,6 +12299,7 @@ async def create_referral(referral: Referral):
         referral_dict["updated_at"] = datetime.now()
         
         result = await db.referrals.insert_one(referral_dict)
+        await reindex(db, "referrals", [referral.id])
         if result.inserted_id:
             return {"id": referral.id, "message": "Referral created successfully"}
         else:
@@ -12324,6 +12346,7 @@ async def update_referral_status(referral_id: str, status: str, notes: Optional[
             {"id": referral_id},
             {"$set": update_data}
         )
+        await reindex(db, "referrals", [referral_id])
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Referral not found")
@@ -12389,6 +12412,7 @@ async def update_referral(referral_id: str, update_data: Dict):
             {"id": referral_id},
             {"$set": update_data}
         )
+        await reindex(db, "referrals", [referral_id])
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Referral not found")
@@ -12424,6 +12448,7 @@ async def create_clinical_template(template: ClinicalTemplate):
     try:
         template_dict = template.dict()
         result = await db.clinical_templates.insert_one(template_dict)
+        await reindex(db, "templates", [template.id])
         if result.inserted_id:
             return {"id": template.id, "message": "Clinical template created successfully"}
         else:
@@ -12470,6 +12495,7 @@ async def update_clinical_template(template_id: str, update_data: Dict):
             {"id": template_id},
             {"$set": update_data}
         )
+        await reindex(db, "templates", [template_id])
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Clinical template not found")
@@ -12529,6 +12555,7 @@ async def init_clinical_templates():
         
         for template in templates:
             await db.clinical_templates.insert_one(template)
+        await reindex(db, "templates", [t["id"] for t in templates])
         
         return {"message": f"Initialized {len(templates)} clinical templates successfully"}
     except Exception as e:
@@ -12769,10 +12796,17 @@ async def register_portal_user(user_data: Dict):
         raise HTTPException(status_code=500, detail=f"Error creating account: {str(e)}")
 
 @api_router.post("/portal/login")
-async def portal_login(login_data: Dict):
+async def portal_login(login_data: Dict, request: Request):
     try:
         user = await db.portal_users.find_one({"username": login_data["username"]})
-        if not user or not pwd_context.verify(login_data["password"], user["password_hash"]):
+        if not user:
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+        try:
+            async with password_hash_pool.admit(f"portal:{login_data['username']}", request_client_ip(request)):
+                verified = await password_hash_pool.run(pwd_context.verify, login_data["password"], user["password_hash"])
+        except LoginThrottled as e:
+            raise login_throttled(e)
+        if not verified:
             raise HTTPException(status_code=401, detail="Invalid credentials")
         
         if not user["is_active"]:
@@ -13035,6 +13069,7 @@ async def upload_document(document: ClinicalDocument):
     try:
         document_dict = document.dict()
         result = await db.clinical_documents.insert_one(document_dict)
+        await reindex(db, "documents", [document.id])
         if result.inserted_id:
             return {"id": document.id, "message": "Document uploaded successfully"}
         else:
@@ -13102,6 +13137,7 @@ async def update_document(document_id: str, update_data: Dict):
             {"id": document_id},
             {"$set": update_data}
         )
+        await reindex(db, "documents", [document_id])
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Document not found")
@@ -13135,6 +13171,7 @@ async def upload_document_file(file_data: Dict):
         
         document_dict = document.dict()
         result = await db.clinical_documents.insert_one(document_dict)
+        await reindex(db, "documents", [document.id])
         if result.inserted_id:
             return {"id": document.id, "message": "Document uploaded successfully", "file_path": document.file_path}
         else:
@@ -13146,14 +13183,13 @@ async def upload_document_file(file_data: Dict):
 @api_router.get("/documents/patient/{patient_id}")
 async def get_documents_by_patient(patient_id: str):
     try:
-        documents = []
-        async for document in db.clinical_documents.find({"patient_id": patient_id}, {"_id": 0}).sort("created_at", -1):
-            # Get category name
-            category = await db.document_categories.find_one({"id": document.get("category_id")}, {"_id": 0})
+        documents = await db.clinical_documents.find({"patient_id": patient_id}, {"_id": 0}).sort("created_at", -1).to_list(None)
+        
+        # Get category names (one query for all distinct categories)
+        categories = Loaders(db).get("document_categories", projection={"name": 1})
+        for document, category in zip(documents, await categories.load_many(d.get("category_id") for d in documents)):
             document["category_name"] = category["name"] if category else "Uncategorized"
             
-            documents.append(document)
-            
         return documents
     except Exception as e:
         logger.error(f"Error fetching patient documents: {str(e)}")
@@ -13175,6 +13211,7 @@ async def update_document_workflow(document_id: str, workflow_data: Dict):
             {"id": document_id},
             {"$set": update_data}
         )
+        await reindex(db, "documents", [document_id])
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Document not found")
@@ -13198,6 +13235,7 @@ async def update_document_status(document_id: str, status: str, notes: Optional[
             {"id": document_id},
             {"$set": update_data}
         )
+        await reindex(db, "documents", [document_id])
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Document not found")
@@ -13234,6 +13272,7 @@ async def create_telehealth_session_v2(session: TelehealthSession):
         session_dict["provider_join_url"] = f"{meeting_url}#config.moderator=true"
         
         result = await db.telehealth_sessions.insert_one(session_dict)
+        await reindex(db, "telehealth", [session.id])
         if result.inserted_id:
             return {
                 "id": session.id, 
@@ -13303,6 +13342,7 @@ async def update_telehealth_session(session_id: str, update_data: Dict):
             {"id": session_id},
             {"$set": update_data}
         )
+        await reindex(db, "telehealth", [session_id])
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Telehealth session not found")
@@ -13329,6 +13369,7 @@ async def join_telehealth_session(session_id: str, join_data: Dict):
                 {"id": session_id},
                 {"$set": {"status": "active", "actual_start": datetime.now()}}
             )
+            await reindex(db, "telehealth", [session_id])
         
         # Return appropriate join URL
         if user_type == "provider":
@@ -13371,6 +13412,7 @@ async def update_telehealth_session_status(session_id: str, status_data: Dict):
             {"id": session_id},
             {"$set": update_data}
         )
+        await reindex(db, "telehealth", [session_id])
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Telehealth session not found")
@@ -13413,6 +13455,7 @@ async def create_referral_appointment_workflow(workflow_data: Dict):
         }
         
         appointment_result = await db.appointments.insert_one(appointment)
+        await reindex(db, "appointments", [appointment["id"]])
         
         # Create telehealth session if requested
         telehealth_session = None
@@ -13434,6 +13477,7 @@ async def create_referral_appointment_workflow(workflow_data: Dict):
             session_dict["meeting_url"] = meeting_url
             
             telehealth_result = await db.telehealth_sessions.insert_one(session_dict)
+            await reindex(db, "telehealth", [session_dict["id"]])
             telehealth_session = session_dict
         
         # Update referral status
@@ -13441,6 +13485,7 @@ async def create_referral_appointment_workflow(workflow_data: Dict):
             {"id": referral_id},
             {"$set": {"status": "scheduled", "appointment_id": appointment["id"], "updated_at": datetime.now()}}
         )
+        await reindex(db, "referrals", [referral_id])
         
         # Create workflow record
         workflow_record = {
@@ -13520,109 +13565,15 @@ async def get_workflow_details(workflow_id: str):
 
 # 2. Global Search Endpoint
 @api_router.get("/search")
-async def global_search(query: str, modules: Optional[str] = None, limit: int = 50):
+async def global_search(query: str, modules: Optional[str] = None, limit: int = 50, cursor: Optional[str] = None):
     """Global search across all modules"""
     try:
-        search_results = {
-            "query": query,
-            "results": [],
-            "total_count": 0
-        }
-        
-        search_modules = modules.split(",") if modules else ["patients", "referrals", "appointments", "documents", "templates", "telehealth"]
-        
-        # Search patients
-        if "patients" in search_modules:
-            async for patient in db.patients.find({
-                "$or": [
-                    {"name.0.given": {"$regex": query, "$options": "i"}},
-                    {"name.0.family": {"$regex": query, "$options": "i"}},
-                    {"mrn": {"$regex": query, "$options": "i"}}
-                ]
-            }, {"_id": 0}).limit(10):
-                search_results["results"].append({
-                    "type": "patient",
-                    "id": patient["id"],
-                    "title": f"{patient['name'][0]['given']} {patient['name'][0]['family']}",
-                    "subtitle": f"MRN: {patient.get('mrn', 'N/A')}",
-                    "module": "patients",
-                    "data": patient
-                })
-        
-        # Search referrals
-        if "referrals" in search_modules:
-            async for referral in db.referrals.find({
-                "$or": [
-                    {"reason_for_referral": {"$regex": query, "$options": "i"}},
-                    {"referred_to_provider_name": {"$regex": query, "$options": "i"}},
-                    {"referred_to_specialty": {"$regex": query, "$options": "i"}}
-                ]
-            }, {"_id": 0}).limit(10):
-                search_results["results"].append({
-                    "type": "referral",
-                    "id": referral["id"],
-                    "title": f"Referral to {referral['referred_to_specialty']}",
-                    "subtitle": referral["reason_for_referral"],
-                    "module": "referrals",
-                    "data": referral
-                })
-        
-        # Search documents
-        if "documents" in search_modules:
-            async for document in db.clinical_documents.find({
-                "$or": [
-                    {"title": {"$regex": query, "$options": "i"}},
-                    {"content": {"$regex": query, "$options": "i"}},
-                    {"tags": {"$regex": query, "$options": "i"}}
-                ]
-            }, {"_id": 0}).limit(10):
-                search_results["results"].append({
-                    "type": "document",
-                    "id": document["id"],
-                    "title": document["title"],
-                    "subtitle": f"Type: {document['document_type']}",
-                    "module": "documents",
-                    "data": document
-                })
-        
-        # Search clinical templates
-        if "templates" in search_modules:
-            async for template in db.clinical_templates.find({
-                "$or": [
-                    {"name": {"$regex": query, "$options": "i"}},
-                    {"specialty": {"$regex": query, "$options": "i"}},
-                    {"condition": {"$regex": query, "$options": "i"}}
-                ]
-            }, {"_id": 0}).limit(10):
-                search_results["results"].append({
-                    "type": "template",
-                    "id": template["id"],
-                    "title": template["name"],
-                    "subtitle": f"Specialty: {template.get('specialty', 'General')}",
-                    "module": "clinical-templates",
-                    "data": template
-                })
-        
-        # Search telehealth sessions
-        if "telehealth" in search_modules:
-            async for session in db.telehealth_sessions.find({
-                "$or": [
-                    {"notes": {"$regex": query, "$options": "i"}},
-                    {"session_type": {"$regex": query, "$options": "i"}}
-                ]
-            }, {"_id": 0}).limit(10):
-                search_results["results"].append({
-                    "type": "telehealth",
-                    "id": session["id"],
-                    "title": f"Telehealth Session - {session['session_type']}",
-                    "subtitle": f"Status: {session['status']}",
-                    "module": "telehealth",
-                    "data": session
-                })
-        
-        search_results["total_count"] = len(search_results["results"])
-        return search_results
-        
+        # Per-module token indexes (search_index collection) are queried concurrently,
+        # merged by score and paged with next_cursor; data holds a projection, not the record
+        search_modules = modules.split(",") if modules else None
+        return await search_index_query(db, query, search_modules, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error performing global search: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error performing search: {str(e)}")
@@ -13634,9 +13585,6 @@ async def create_notification(notification_data: Dict):
     try:
         notification = {
             "id": str(uuid.uuid4()),
-            "user_id": notification_data["user_id"],
-            "type": notification_data["type"],  # workflow, reminder, alert, info
-            "title": notification_data["title"],
             "message": notification_data["message"],
             "module": notification_data.get("module"),
             "related_id": notification_data.get("related_id"),
@@ -13646,8 +13594,16 @@ async def create_notification(notification_data: Dict):
             "expires_at": datetime.now() + timedelta(days=30)
         }
         
-        result = await db.notifications.insert_one(notification)
-        if result.inserted_id:
+        # Through notify_user so the per-user counters and push stream see it too
+        created = await notify_user(
+            db,
+            user_id=notification_data["user_id"],
+            type=notification_data["type"],  # workflow, reminder, alert, info
+            title=notification_data["title"],
+            body=notification_data["message"],
+            fields=notification,
+        )
+        if created:
             return {"id": notification["id"], "message": "Notification created successfully"}
         else:
             raise HTTPException(status_code=500, detail="Failed to create notification")
@@ -13793,6 +13749,7 @@ async def start_telehealth_session(session_id: str):
                 }
             }
         )
+        await reindex(db, "telehealth", [session_id])
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Session not found")
@@ -13817,6 +13774,7 @@ async def end_telehealth_session(session_id: str, session_notes: Optional[str] =
             {"id": session_id},
             {"$set": update_data}
         )
+        await reindex(db, "telehealth", [session_id])
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Session not found")
@@ -13921,6 +13879,7 @@ async def initialize_new_modules():
                 }
             ]
             await db.clinical_templates.insert_many(default_templates)
+            await reindex(db, "templates", [t["id"] for t in default_templates])
             results["clinical_templates"] = len(default_templates)
         
         return {"message": "New modules initialized successfully", "initialized": results}
@@ -14283,6 +14242,28 @@ async def startup_event():
         # Test database connection
         await client.admin.command('ping')
         print("✅ MongoDB connection successful")
+        interaction_count = await interaction_index.load(db)
+        print(f"💊 Drug interaction index loaded ({interaction_count} pairs)")
+        icd10_count = await icd10_index.load(db)
+        print(f"🩺 ICD-10 search index loaded ({icd10_count} codes)")
+        await ensure_search_indexes(db)
+        await ensure_inventory_indexes(db)
+        await ensure_financial_report_indexes(db)
+        await ensure_daily_financial_indexes(db)
+        await ensure_patient_version_indexes(db)
+        await ensure_pdf_artifact_indexes(db)
+        await ensure_audit_partition_indexes(db)
+        audit_partitions.start_maintenance(db)
+        daily_financials.start_maintenance(db)
+        await backfill_low_stock(db)
+        pending_inventory = await finish_pending_inventory(db)
+        if pending_inventory:
+            print(f"📦 Settled {pending_inventory} pending inventory ledger rows")
+        dashboard_stats.start_watch(db)
+        await push_hub.start(db)
+        if not await db.search_index.estimated_document_count():
+            # First boot with global search indexes: build them without holding up startup
+            asyncio.create_task(rebuild_search_index(db))
         print(f"🏥 ClinicHub backend started successfully on {os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', '8001')}")
     except Exception as e:
         print(f"❌ MongoDB connection failed: {str(e)}")
@@ -14291,4 +14272,12 @@ async def startup_event():
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    # Drain buffered audit events before the Mongo client goes away
+    await audit_queue.stop()
+    await dashboard_stats.stop()
+    await push_hub.stop()
+    await audit_partitions.stop()
+    await daily_financials.stop()
+    pdf_renderer.shutdown()
+    password_hash_pool.shutdown()
     client.close()
\ No newline at end of file
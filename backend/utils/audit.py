@@ -2,19 +2,26 @@
 from __future__ import annotations
 from datetime import datetime
 from typing import Optional, Mapping, Any
+from backend.utils.audit_queue import audit_queue
+from backend.utils.audit_query import AUDIT_INDEXES, SUPERSEDED_AUDIT_INDEXES, audit_facets, ensure_audit_facet_indexes
+from backend.utils.audit_partitions import audit_partitions, ensure_audit_partition_indexes
 
 AUDIT_COLL = "audit_log"
 
 async def ensure_audit_indexes(db):
     """Create audit log indexes if they don't exist"""
     try:
-        await db[AUDIT_COLL].create_index([("ts", -1)], background=True)
-        await db[AUDIT_COLL].create_index([("subject_type", 1), ("subject_id", 1), ("ts", -1)], background=True)
-        await db[AUDIT_COLL].create_index([("action", 1), ("ts", -1)], background=True)
-        await db[AUDIT_COLL].create_index([("user.id", 1), ("ts", -1)], background=True)
+        for keys in {tuple(keys) for _, keys in AUDIT_INDEXES}:
+            await db[AUDIT_COLL].create_index(list(keys), background=True)
+        existing = await db[AUDIT_COLL].index_information()
+        for name in SUPERSEDED_AUDIT_INDEXES:
+            if name in existing:
+                await db[AUDIT_COLL].drop_index(name)
         print(f"[INFO] Audit indexes ensured for collection {AUDIT_COLL}")
     except Exception as e:
         print(f"[WARN] Failed to create audit indexes: {e}")
+    await ensure_audit_facet_indexes(db)
+    await ensure_audit_partition_indexes(db)
 
 async def audit_log(
     db,
@@ -28,6 +35,7 @@ async def audit_log(
 ):
     """
     Write an immutable audit record. Keep meta lightweight (ids, totals, flags).
+    The record is queued and persisted asynchronously; see utils/audit_queue.py.
     """
     doc = {
         "ts": datetime.utcnow().isoformat(),
@@ -43,10 +51,7 @@ async def audit_log(
         "request_id": request_id,             # pass through from X-Request-ID if you have it
     }
     
-    try:
-        await db[AUDIT_COLL].insert_one(doc)
-        return doc
-    except Exception as e:
-        print(f"[ERROR] Failed to write audit log: {e}")
-        # Don't fail the main operation if audit logging fails
-        return None
\ No newline at end of file
+    audit_facets.observe(db, doc)
+    # Write-behind: buffered and journaled locally, flushed with insert_many off the request path,
+    # into this month's partition (audit_log_YYYYMM); see utils/audit_partitions.py
+    return audit_queue.enqueue(db, audit_partitions.route_write(db, AUDIT_COLL, doc), doc)
\ No newline at end of file
@@ -0,0 +1,574 @@
+# backend/utils/audit_partitions.py
+from __future__ import annotations
+import asyncio
+import gzip
+import hashlib
+import heapq
+import json
+import os
+import re
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Set, Tuple
+
+from bson import json_util
+from pymongo.errors import DuplicateKeyError
+
+from .audit_query import AUDIT_INDEXES, AUDIT_SORT, decode_cursor, encode_cursor, plan_audit_query
+
+AUDIT_HOT_MONTHS = int(os.environ.get("AUDIT_HOT_MONTHS", "13"))
+# Partitions are only dropped once their archive is verified here, so this must be durable storage that every
+# host mounts and that is backed up (see docker-compose*.yml); left unset, months stay in Mongo indefinitely
+AUDIT_ARCHIVE_DIR = os.environ.get("AUDIT_ARCHIVE_DIR", "")
+AUDIT_ARCHIVE_BLOCK = int(os.environ.get("AUDIT_ARCHIVE_BLOCK", "5000"))
+AUDIT_ARCHIVE_INTERVAL_S = int(os.environ.get("AUDIT_ARCHIVE_INTERVAL_S", "86400"))
+AUDIT_PARTITION_TTL_S = float(os.environ.get("AUDIT_PARTITION_TTL_S", "60"))
+ARCHIVE_CATALOG_COLL = "audit_archive_catalog"
+ROLLUP_COLL = "audit_rollups"
+
+# base collection -> (time field, indexes for each monthly partition, rollup dimensions)
+PARTITIONED: Dict[str, Tuple[str, List[List[Tuple[str, int]]], Tuple[str, ...]]] = {
+    "audit_log": (
+        "ts",
+        [list(k) for k in {tuple(keys) for _, keys in AUDIT_INDEXES}],
+        ("action", "subject_type"),
+    ),
+    "audit_events": (
+        "timestamp",
+        [
+            [("timestamp", -1), ("_id", -1)],
+            [("user_id", 1), ("timestamp", -1), ("_id", -1)],
+            [("resource_type", 1), ("resource_id", 1), ("timestamp", -1), ("_id", -1)],
+        ],
+        ("event_type", "resource_type", "phi_accessed"),
+    ),
+}
+# Block-level values kept in the archive sidecar so reads can skip whole blocks
+ARCHIVE_BLOCK_FACETS = {"audit_log": ("action", "subject_type", "user.id"), "audit_events": ("event_type", "resource_type", "user_id")}
+_CLAIM_STALE = timedelta(hours=6)
+
+
+def _facet_key(path: str) -> str:
+    # The index is stored in the catalog, where field names cannot contain dots
+    return path.replace(".", "__")
+
+
+def month_of(ts: Any) -> str:
+    """YYYYMM of an ISO string or datetime; records without a usable time land in the current month."""
+    if isinstance(ts, datetime):
+        return ts.strftime("%Y%m")
+    if isinstance(ts, str) and len(ts) >= 7 and ts[4] == "-":
+        return ts[:4] + ts[5:7]
+    return datetime.utcnow().strftime("%Y%m")
+
+
+def partition_name(base: str, month: str) -> str:
+    return f"{base}_{month}"
+
+
+def months_back(month: str, n: int) -> str:
+    y, m = int(month[:4]), int(month[4:])
+    total = y * 12 + (m - 1) - n
+    return f"{total // 12:04d}{total % 12 + 1:02d}"
+
+
+def _get(doc: Mapping[str, Any], path: str) -> Any:
+    for part in path.split("."):
+        if not isinstance(doc, Mapping):
+            return None
+        doc = doc.get(part)
+    return doc
+
+
+def _before(doc: Mapping[str, Any], field: str, after: Tuple[str, Any]) -> bool:
+    ts, _id = doc.get(field), doc.get("_id")
+    if ts != after[0]:
+        return ts < after[0]
+    if type(_id) is type(after[1]):
+        return _id < after[1]
+    return str(_id) < str(after[1])
+
+
+def _sort_key(field: str):
+    return lambda d: (d.get(field) or "", str(d.get("_id")))
+
+
+def _rollup_key(doc: Mapping[str, Any], field: str, dims: Tuple[str, ...]) -> Tuple[str, ...]:
+    return (str(doc.get(field))[:10],) + tuple(str(_get(doc, d)) for d in dims)
+
+
+# ---------- archive files ----------
+class ArchiveWriter:
+    """
+    <month>.jsonl.gz is a sequence of independent gzip members (one per block, newest
+    first); <month>.idx.json records each member's offset, time range and facet values.
+    Blocks are compressed and appended as they arrive, so a month never sits in memory.
+    """
+
+    def __init__(self, path: Path, base: str, month: str):
+        self.path, self.base, self.month = path, base, month
+        self.field = PARTITIONED[base][0]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp = path.with_suffix(".tmp")
+        self._f = open(self._tmp, "wb")
+        self._sha = hashlib.sha256()
+        self._blocks: List[Dict[str, Any]] = []
+        self._offset = 0
+        self._count = 0
+
+    def add_block(self, block: List[Dict[str, Any]]):
+        raw = gzip.compress("".join(json_util.dumps(d) + "\n" for d in block).encode("utf-8"))
+        self._f.write(raw)
+        self._sha.update(raw)
+        self._blocks.append({
+            "offset": self._offset,
+            "length": len(raw),
+            "count": len(block),
+            "ts_max": block[0].get(self.field),
+            "ts_min": block[-1].get(self.field),
+            "facets": {_facet_key(k): sorted({str(v) for v in (_get(d, k) for d in block) if v is not None})
+                       for k in ARCHIVE_BLOCK_FACETS[self.base]},
+        })
+        self._offset += len(raw)
+        self._count += len(block)
+
+    def close(self) -> Dict[str, Any]:
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+        os.replace(self._tmp, self.path)
+        index = {"base": self.base, "month": self.month, "count": self._count, "bytes": self._offset,
+                 "sha256": self._sha.hexdigest(),
+                 "ts_max": self._blocks[0]["ts_max"] if self._blocks else None,
+                 "ts_min": self._blocks[-1]["ts_min"] if self._blocks else None,
+                 "blocks": self._blocks}
+        self.path.with_suffix("").with_suffix(".idx.json").write_text(json.dumps(index))
+        return index
+
+    def abort(self):
+        self._f.close()
+        self._tmp.unlink(missing_ok=True)
+
+
+def _read_block(f, block: Mapping[str, Any]) -> List[Dict[str, Any]]:
+    f.seek(block["offset"])
+    return [json_util.loads(line) for line in gzip.decompress(f.read(block["length"])).decode("utf-8").splitlines()]
+
+
+def iter_archive(path: Path, index: Mapping[str, Any]):
+    """Every record of an archive file in stored order (newest first), one block in memory at a time."""
+    with open(path, "rb") as f:
+        for block in index["blocks"]:
+            yield from _read_block(f, block)
+
+
+def verify_archive(path: Path, index: Mapping[str, Any]):
+    """Re-read a written archive from its final location and check its size and sha256 against the index."""
+    sha = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+            size += len(chunk)
+    if size != index["bytes"] or sha.hexdigest() != index["sha256"]:
+        raise RuntimeError(f"archive {path} failed verification ({size} bytes, expected {index['bytes']})")
+
+
+def read_archive(path: str, index: Mapping[str, Any], base: str, filters: Mapping[str, Optional[str]],
+                 since: Optional[str], until: Optional[str], after: Optional[Tuple[str, Any]],
+                 need: int) -> List[Dict[str, Any]]:
+    """Up to `need` matching records, newest first, decompressing only blocks that can match."""
+    field = PARTITIONED[base][0]
+    eq = {k: v for k, v in filters.items() if v}
+    out: List[Dict[str, Any]] = []
+    with open(path, "rb") as f:
+        for block in index["blocks"]:
+            if since and block["ts_max"] < since:
+                break
+            if (until and block["ts_min"] >= until) or (after and block["ts_min"] > after[0]):
+                continue
+            facets = block["facets"]
+            if any(_facet_key(k) in facets and str(v) not in facets[_facet_key(k)] for k, v in eq.items()):
+                continue
+            for doc in _read_block(f, block):
+                ts = doc.get(field)
+                if (since and ts < since) or (until and ts >= until) or (after and not _before(doc, field, after)):
+                    continue
+                if any(_get(doc, k) != v for k, v in eq.items()):
+                    continue
+                out.append(doc)
+                if len(out) >= need:
+                    return out
+    return out
+
+
+class AuditPartitions:
+    """
+    Monthly partitions for the audit collections (audit_log_YYYYMM, audit_events_YYYYMM).
+
+    Writes are routed by record time; reads walk only the months a time range
+    touches, newest first, and stop once a page is full. Months older than
+    AUDIT_HOT_MONTHS are compacted into gzip block files with a sidecar index
+    under AUDIT_ARCHIVE_DIR (shared storage when several hosts run workers),
+    rolled up into daily counts in audit_rollups, then dropped from Mongo once
+    the file has been read back and verified; reads that reach an archived
+    month decompress only the blocks that can match, and skip (with a
+    warning) an archive this host cannot see. Rows written later into an
+    archived month land in a fresh partition that is read alongside the
+    archive and merged into a new archive generation on the next pass. Rows
+    still in the unpartitioned base collection are merged into every page
+    until migrate_legacy() has moved them.
+    """
+
+    def __init__(self, archive_dir: str = AUDIT_ARCHIVE_DIR, hot_months: int = AUDIT_HOT_MONTHS):
+        self.archive_dir = Path(archive_dir) if archive_dir else None
+        self.hot_months = hot_months
+        self._ensured: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._cache: Dict[str, Tuple[Any, float]] = {}
+        self._maintenance_task: Optional[asyncio.Task] = None
+
+    # ---------- write path ----------
+    def route_write(self, db, base: str, doc: Mapping[str, Any]) -> str:
+        """Partition collection for this record; new partitions get their indexes in the background."""
+        name = partition_name(base, month_of(doc.get(PARTITIONED[base][0])))
+        if name not in self._ensured:
+            self._ensured.add(name)
+            self._cache.pop(base, None)
+            try:
+                task = asyncio.get_running_loop().create_task(self._ensure_indexes(db, base, name))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            except RuntimeError:
+                self._ensured.discard(name)
+        return name
+
+    async def _ensure_indexes(self, db, base: str, name: str):
+        try:
+            for keys in PARTITIONED[base][1]:
+                await db[name].create_index(keys, background=True)
+            self._ensured.add(name)
+        except Exception as e:
+            self._ensured.discard(name)
+            print(f"[WARN] Failed to create audit partition indexes for {name}: {e}")
+
+    # ---------- catalog ----------
+    async def _layout(self, db, base: str) -> Tuple[List[str], Dict[str, Dict[str, Any]], bool]:
+        """
+        (months with a live partition desc, archived month -> catalog doc, legacy base collection
+        non-empty), cached briefly. A month can be in both when rows arrived after it was archived.
+        """
+        cached = self._cache.get(base)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        pattern = re.compile(rf"^{re.escape(base)}_(\d{{6}})$")
+        names = await db.list_collection_names()
+        hot = sorted((m.group(1) for m in map(pattern.match, names) if m), reverse=True)
+        for month in hot:
+            if partition_name(base, month) not in self._ensured:
+                await self._ensure_indexes(db, base, partition_name(base, month))
+        archived = {
+            d["month"]: d async for d in db[ARCHIVE_CATALOG_COLL].find({"base": base, "status": "archived"}, {"_id": 0})
+        }
+        legacy = base in names and await db[base].estimated_document_count() > 0
+        layout = (hot, archived, legacy)
+        self._cache[base] = (layout, time.monotonic() + AUDIT_PARTITION_TTL_S)
+        return layout
+
+    async def sources(self, db, base: str) -> List[str]:
+        """Every live collection holding records of `base` (for one-off scans such as facet seeding)."""
+        hot, _, legacy = await self._layout(db, base)
+        return [partition_name(base, m) for m in hot] + ([base] if legacy else [])
+
+    # ---------- read path ----------
+    async def page(self, db, base: str, filters: Mapping[str, Optional[str]], *, since: Optional[str] = None,
+                   until: Optional[str] = None, cursor: Optional[str] = None,
+                   limit: int = 100) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Keyset page across partitions, newest first: (items without _id, next cursor or None)."""
+        field = PARTITIONED[base][0]
+        q, hint = plan_audit_query(filters, since, until, cursor)
+        after = decode_cursor(cursor)
+        hot, archived, legacy = await self._layout(db, base)
+        hi = min([month_of(t) for t in (until, after and after[0]) if t] or ["999999"])
+        lo = month_of(since) if since else "000000"
+        months = sorted((m for m in set(hot) | set(archived) if lo <= m <= hi), reverse=True)
+
+        want = limit + 1
+        rows: List[Dict[str, Any]] = []
+        for month in months:
+            if len(rows) >= want:
+                break
+            need = want - len(rows)
+            found: List[Dict[str, Any]] = []
+            if month in archived:
+                found.extend(await self._read_archived(db, base, month, archived[month], filters, since, until,
+                                                       after, need))
+            if month in hot:
+                coll = db[partition_name(base, month)]
+                found.extend(await coll.find(q).sort(AUDIT_SORT).hint(hint).limit(need).to_list(need))
+            if month in archived and month in hot:
+                found.sort(key=_sort_key(field), reverse=True)
+            rows.extend(found[:need])
+        if legacy:
+            rows.extend(await db[base].find(q).sort(AUDIT_SORT).hint(hint).limit(want).to_list(want))
+            rows.sort(key=_sort_key(field), reverse=True)
+            rows = rows[:want]
+
+        next_cursor = encode_cursor(rows[limit - 1][field], rows[limit - 1]["_id"]) if len(rows) > limit else None
+        items = rows[:limit]
+        for item in items:
+            item.pop("_id", None)
+        return items, next_cursor
+
+    def _archive_path(self, entry: Mapping[str, Any]) -> Optional[Path]:
+        """Catalog paths are relative to AUDIT_ARCHIVE_DIR so hosts may mount it at different places."""
+        path = Path(entry["path"])
+        if path.is_absolute():
+            return path
+        return self.archive_dir / path if self.archive_dir else None
+
+    async def _read_archived(self, db, base: str, month: str, entry: Mapping[str, Any], filters, since, until,
+                             after, need: int) -> List[Dict[str, Any]]:
+        for attempt in range(2):
+            path = self._archive_path(entry)
+            try:
+                if path is None:
+                    raise FileNotFoundError(entry["path"])
+                return await asyncio.to_thread(read_archive, str(path), entry["index"], base, filters, since, until,
+                                               after, need)
+            except FileNotFoundError:
+                # A merge may have replaced the file since the layout was cached; retry once on the current entry
+                fresh = None if attempt else await db[ARCHIVE_CATALOG_COLL].find_one(
+                    {"base": base, "month": month, "status": "archived"}, {"_id": 0})
+                if fresh and fresh.get("path") != entry.get("path"):
+                    self._cache.pop(base, None)
+                    entry = fresh
+                    continue
+                print(f"[WARN] Audit archive {entry['path']} for {partition_name(base, month)} is not available "
+                      f"on this host (AUDIT_ARCHIVE_DIR={self.archive_dir or 'unset'}); skipping it")
+                return []
+        return []
+
+    # ---------- archive tier ----------
+    def _require_archive_dir(self) -> Path:
+        if self.archive_dir is None:
+            raise RuntimeError("AUDIT_ARCHIVE_DIR is not set; audit partitions are kept in Mongo")
+        if not self.archive_dir.is_dir():
+            raise RuntimeError(f"AUDIT_ARCHIVE_DIR {self.archive_dir} is not a mounted directory")
+        return self.archive_dir
+
+    async def _claim(self, db, base: str, month: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """(claimed, existing archived entry to merge into) for one month."""
+        now = datetime.utcnow()
+        try:
+            await db[ARCHIVE_CATALOG_COLL].insert_one({"base": base, "month": month, "status": "archiving", "claimed_at": now})
+            return True, None
+        except DuplicateKeyError:
+            stale = {"$lt": now - _CLAIM_STALE}
+            prior = await db[ARCHIVE_CATALOG_COLL].find_one_and_update(
+                {"base": base, "month": month, "$or": [
+                    {"status": "archiving", "claimed_at": stale},
+                    {"status": "archived", "$or": [{"claimed_at": {"$exists": False}}, {"claimed_at": stale}]},
+                ]},
+                {"$set": {"claimed_at": now}},
+                projection={"_id": 0},
+            )
+            if prior is None:
+                return False, None
+            return True, prior if prior["status"] == "archived" else None
+
+    async def _release(self, db, base: str, month: str, prior: Optional[Mapping[str, Any]]):
+        if prior is None:
+            await db[ARCHIVE_CATALOG_COLL].delete_one({"base": base, "month": month, "status": "archiving"})
+        else:
+            await db[ARCHIVE_CATALOG_COLL].update_one({"base": base, "month": month}, {"$unset": {"claimed_at": ""}})
+
+    async def archive_month(self, db, base: str, month: str) -> Optional[Dict[str, Any]]:
+        """
+        Compact one month into the archive tier; returns its catalog entry (None if another worker has it).
+        A month that is already archived gets a new archive generation holding the old file plus the rows
+        written to its partition since.
+        """
+        root = self._require_archive_dir()
+        if month >= months_back(datetime.utcnow().strftime("%Y%m"), self.hot_months - 1):
+            raise ValueError(f"{base} {month} is inside the hot window ({self.hot_months} months)")
+        claimed, prior = await self._claim(db, base, month)
+        if not claimed:
+            return None
+        field, _, dims = PARTITIONED[base]
+        name = partition_name(base, month)
+        coll = db[name]
+        sort = [(field, -1), ("_id", -1)]
+        writer = None
+        try:
+            generation = (prior or {}).get("generation", 1) + (1 if prior else 0)
+            rel = Path(base) / (f"{month}.jsonl.gz" if generation == 1 else f"{month}.g{generation}.jsonl.gz")
+            path = root / rel
+            writer = await asyncio.to_thread(ArchiveWriter, path, base, month)
+            rollup: Counter = Counter()
+            if prior is None:
+                block = []
+                async for doc in coll.find({}).sort(sort).batch_size(AUDIT_ARCHIVE_BLOCK):
+                    block.append(doc)
+                    rollup[_rollup_key(doc, field, dims)] += 1
+                    if len(block) >= AUDIT_ARCHIVE_BLOCK:
+                        await asyncio.to_thread(writer.add_block, block)
+                        block = []
+                if block:
+                    await asyncio.to_thread(writer.add_block, block)
+            else:
+                old_path = self._archive_path(prior)
+                if old_path is None or not old_path.exists():
+                    raise RuntimeError(f"existing archive {prior['path']} is not available to merge into")
+                # Late rows for an archived month are few; merge them into the old archive's stream
+                late = await coll.find({}).sort(sort).to_list(None)
+
+                def _merge():
+                    block = []
+                    for doc in heapq.merge(iter_archive(old_path, prior["index"]), late,
+                                           key=_sort_key(field), reverse=True):
+                        block.append(doc)
+                        rollup[_rollup_key(doc, field, dims)] += 1
+                        if len(block) >= AUDIT_ARCHIVE_BLOCK:
+                            writer.add_block(block)
+                            block = []
+                    if block:
+                        writer.add_block(block)
+
+                await asyncio.to_thread(_merge)
+            index = await asyncio.to_thread(writer.close)
+            writer = None
+            await asyncio.to_thread(verify_archive, path, index)
+            if index["count"] != (prior or {}).get("count", 0) + await coll.count_documents({}):
+                raise RuntimeError("partition changed while archiving")
+
+            for key, n in rollup.items():
+                ident = {"base": base, "day": key[0], **dict(zip(dims, key[1:]))}
+                await db[ROLLUP_COLL].update_one(ident, {"$set": {"count": n, "month": month}}, upsert=True)
+            entry = {"status": "archived", "path": str(rel), "generation": generation, "index": index,
+                     "count": index["count"], "ts_min": index["ts_min"], "ts_max": index["ts_max"],
+                     "sha256": index["sha256"], "archived_at": datetime.utcnow()}
+            await db[ARCHIVE_CATALOG_COLL].update_one({"base": base, "month": month},
+                                                      {"$set": entry, "$unset": {"claimed_at": ""}})
+            await coll.drop()
+            self._ensured.discard(name)
+            self._cache.pop(base, None)
+            if prior is not None:
+                for old in (old_path, old_path.with_suffix("").with_suffix(".idx.json")):
+                    old.unlink(missing_ok=True)
+            print(f"[INFO] Archived {name} (generation {generation}): {index['count']} records, {index['bytes']} bytes")
+            return {"base": base, "month": month, **entry}
+        except Exception:
+            if writer:
+                writer.abort()
+            await self._release(db, base, month, prior)
+            raise
+
+    async def archive_due(self, db) -> List[Dict[str, Any]]:
+        """Archive every partition that has aged out of the hot window (or reappeared for an archived month)."""
+        if self.archive_dir is None or not self.archive_dir.is_dir():
+            print(f"[WARN] Audit archival skipped: AUDIT_ARCHIVE_DIR ({self.archive_dir or 'unset'}) is not a "
+                  "mounted, backed-up directory; partitions stay in Mongo")
+            return []
+        cutoff = months_back(datetime.utcnow().strftime("%Y%m"), self.hot_months - 1)
+        done = []
+        for base in PARTITIONED:
+            self._cache.pop(base, None)
+            hot, _, _ = await self._layout(db, base)
+            for month in sorted(m for m in hot if m < cutoff):
+                try:
+                    entry = await self.archive_month(db, base, month)
+                    if entry:
+                        done.append(entry)
+                except Exception as e:
+                    print(f"[WARN] Failed to archive {partition_name(base, month)}: {e}")
+        return done
+
+    async def migrate_legacy(self, db, base: str, batch: int = AUDIT_ARCHIVE_BLOCK) -> int:
+        """Move rows from the unpartitioned base collection into their monthly partitions."""
+        field = PARTITIONED[base][0]
+        moved = 0
+        while True:
+            docs = await db[base].find({}).sort("_id", 1).limit(batch).to_list(batch)
+            if not docs:
+                break
+            by_part: Dict[str, List[Dict[str, Any]]] = {}
+            for d in docs:
+                by_part.setdefault(partition_name(base, month_of(d.get(field))), []).append(d)
+            for name, part in by_part.items():
+                await self._ensure_indexes(db, base, name)
+                try:
+                    await db[name].insert_many(part, ordered=False)
+                except Exception as e:
+                    # Duplicate _ids mean an interrupted run already copied those rows
+                    errors = (getattr(e, "details", None) or {}).get("writeErrors") or []
+                    if not errors or any(err.get("code") != 11000 for err in errors):
+                        raise
+            await db[base].delete_many({"_id": {"$in": [d["_id"] for d in docs]}})
+            moved += len(docs)
+        self._cache.pop(base, None)
+        return moved
+
+    # ---------- maintenance ----------
+    def start_maintenance(self, db):
+        if self._maintenance_task is None or self._maintenance_task.done():
+            self._maintenance_task = asyncio.get_running_loop().create_task(self._maintain(db))
+
+    async def _maintain(self, db):
+        while True:
+            try:
+                await self.archive_due(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[WARN] Audit archival pass failed: {e}")
+            await asyncio.sleep(AUDIT_ARCHIVE_INTERVAL_S)
+
+    async def stop(self):
+        if self._maintenance_task:
+            self._maintenance_task.cancel()
+            try:
+                await self._maintenance_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._maintenance_task = None
+
+
+async def ensure_audit_partition_indexes(db):
+    """Create archive catalog / rollup indexes if they don't exist"""
+    try:
+        await db[ARCHIVE_CATALOG_COLL].create_index([("base", 1), ("month", 1)], unique=True, background=True)
+        await db[ROLLUP_COLL].create_index([("base", 1), ("day", 1)], background=True)
+        print(f"[INFO] Audit partition indexes ensured for collections {ARCHIVE_CATALOG_COLL} and {ROLLUP_COLL}")
+    except Exception as e:
+        print(f"[WARN] Failed to create audit partition indexes: {e}")
+
+
+# Process-wide partition router for audit_log and audit_events
+audit_partitions = AuditPartitions()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Audit partition maintenance")
+    parser.add_argument("--migrate-legacy", action="store_true", help="move unpartitioned rows into monthly partitions")
+    parser.add_argument("--archive-due", action="store_true", help="archive partitions older than AUDIT_HOT_MONTHS")
+    parser.add_argument("--archive", metavar="BASE:YYYYMM", help="archive one partition, e.g. audit_log:202301")
+    args = parser.parse_args()
+
+    async def _main():
+        from backend.dependencies import db
+        await ensure_audit_partition_indexes(db)
+        if args.migrate_legacy:
+            for base in PARTITIONED:
+                print(base, await audit_partitions.migrate_legacy(db, base))
+        if args.archive:
+            base, month = args.archive.split(":")
+            print(await audit_partitions.archive_month(db, base, month))
+        if args.archive_due:
+            print(await audit_partitions.archive_due(db))
+
+    asyncio.run(_main())
@@ -0,0 +1,155 @@
+# backend/utils/audit_query.py
+from __future__ import annotations
+import asyncio
+import base64
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional, Set, Tuple
+
+from bson import ObjectId
+
+FACETS_COLL = "audit_facets"  # one {field, value} document per distinct action / subject_type
+_SEEDED = {"field": "_seeded", "value": "audit_log"}  # marker: history was scanned once
+AUDIT_FACET_FIELDS = ("action", "subject_type")
+AUDIT_FACET_TTL_S = float(os.environ.get("AUDIT_FACET_TTL_S", "60"))
+
+# Every index ends in (ts, _id) so a keyset page is an index range walk, never a blocking sort.
+# (equality fields, index keys)
+AUDIT_INDEXES: List[Tuple[Tuple[str, ...], List[Tuple[str, int]]]] = [
+    (("subject_type", "subject_id"), [("subject_type", 1), ("subject_id", 1), ("ts", -1), ("_id", -1)]),
+    (("subject_id",), [("subject_id", 1), ("ts", -1), ("_id", -1)]),
+    (("subject_type",), [("subject_type", 1), ("ts", -1), ("_id", -1)]),
+    (("user.id",), [("user.id", 1), ("ts", -1), ("_id", -1)]),
+    (("action",), [("action", 1), ("ts", -1), ("_id", -1)]),
+    ((), [("ts", -1), ("_id", -1)]),
+]
+# Declared before keyset paging; covered by the indexes above
+SUPERSEDED_AUDIT_INDEXES = ("ts_-1", "subject_type_1_subject_id_1_ts_-1", "action_1_ts_-1", "user.id_1_ts_-1")
+
+AUDIT_SORT = [("ts", -1), ("_id", -1)]
+
+
+def encode_cursor(ts: str, _id: Any) -> str:
+    kind = "oid" if isinstance(_id, ObjectId) else "str"
+    return base64.urlsafe_b64encode(json.dumps([ts, str(_id), kind]).encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[str, Any]]:
+    if not cursor:
+        return None
+    try:
+        ts, _id, kind = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return ts, (ObjectId(_id) if kind == "oid" else _id)
+    except Exception:
+        raise ValueError("Invalid audit cursor")
+
+
+def plan_audit_query(filters: Mapping[str, Optional[str]], since: Optional[str] = None,
+                     until: Optional[str] = None, cursor: Optional[str] = None) -> Tuple[Dict[str, Any], List[Tuple[str, int]]]:
+    """
+    Returns (query, index hint). The hint is the index whose equality prefix
+    covers the most supplied filters; the rest are applied as residual filters
+    on that index walk.
+    """
+    eq = {k: v for k, v in filters.items() if v}
+    hint = next(keys for fields, keys in AUDIT_INDEXES if all(f in eq for f in fields))
+
+    q: Dict[str, Any] = dict(eq)
+    ts: Dict[str, Any] = {}
+    if since:
+        ts["$gte"] = since
+    if until:
+        ts["$lt"] = until
+    if ts:
+        q["ts"] = ts
+    after = decode_cursor(cursor)
+    if after:
+        last_ts, last_id = after
+        q["$or"] = [{"ts": {"$lt": last_ts}}, {"ts": last_ts, "_id": {"$lt": last_id}}]
+    return q, hint
+
+
+class AuditFacets:
+    """
+    Distinct action / subject_type values for the audit filter dropdowns, kept in
+    audit_facets as they are first seen instead of running distinct() over the
+    whole log. observe() is called for every audit record and only touches Mongo
+    for a value this process has not seen; reads are cached for AUDIT_FACET_TTL_S.
+    """
+
+    def __init__(self, ttl_s: float = AUDIT_FACET_TTL_S):
+        self.ttl_s = ttl_s
+        self._known: Dict[str, Set[str]] = {f: set() for f in AUDIT_FACET_FIELDS}
+        self._cache: Dict[str, Tuple[List[str], float]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._rebuild_lock = asyncio.Lock()
+
+    def observe(self, db, doc: Mapping[str, Any]):
+        for field in AUDIT_FACET_FIELDS:
+            value = doc.get(field)
+            if not value or value in self._known[field]:
+                continue
+            self._known[field].add(value)
+            self._cache.pop(field, None)
+            try:
+                task = asyncio.get_running_loop().create_task(self._record(db, field, value))
+            except RuntimeError:  # no loop (scripts): the next rebuild picks it up
+                continue
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _record(self, db, field: str, value: str):
+        try:
+            await db[FACETS_COLL].update_one(
+                {"field": field, "value": value},
+                {"$setOnInsert": {"first_seen": datetime.utcnow().isoformat()}},
+                upsert=True,
+            )
+        except Exception as e:
+            self._known[field].discard(value)  # retried on the next occurrence
+            print(f"[WARN] Failed to record audit facet {field}={value}: {e}")
+
+    async def values(self, db, field: str, sources: List[str]) -> List[str]:
+        cached = self._cache.get(field)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        if not await db[FACETS_COLL].find_one(_SEEDED, {"_id": 1}):
+            async with self._rebuild_lock:
+                if not await db[FACETS_COLL].find_one(_SEEDED, {"_id": 1}):
+                    await self._seed(db, sources)
+        docs = await db[FACETS_COLL].find({"field": field}, {"_id": 0, "value": 1}).to_list(None)
+        values = sorted(d["value"] for d in docs)
+        self._known[field].update(values)
+        self._cache[field] = (values, time.monotonic() + self.ttl_s)
+        return values
+
+    async def _seed(self, db, sources: List[str]) -> Dict[str, int]:
+        out = {}
+        for field in AUDIT_FACET_FIELDS:
+            values = sorted({v for coll in sources for v in await db[coll].distinct(field) if v})
+            for v in values:
+                await self._record(db, field, v)
+            out[field] = len(values)
+        await db[FACETS_COLL].update_one(_SEEDED, {"$set": _SEEDED}, upsert=True)
+        self._cache.clear()
+        return out
+
+    async def rebuild(self, db, sources: List[str]) -> Dict[str, int]:
+        """Seed audit_facets from the log itself (runs once automatically; rerun after manual cleanup)."""
+        async with self._rebuild_lock:
+            return await self._seed(db, sources)
+
+
+async def ensure_audit_facet_indexes(db):
+    """Create audit facet indexes if they don't exist"""
+    try:
+        await db[FACETS_COLL].create_index([("field", 1), ("value", 1)], unique=True, background=True)
+        print(f"[INFO] Audit facet indexes ensured for collection {FACETS_COLL}")
+    except Exception as e:
+        print(f"[WARN] Failed to create audit facet indexes: {e}")
+
+
+# Process-wide facet cache behind /api/audit/actions and /api/audit/subject-types
+audit_facets = AuditFacets()
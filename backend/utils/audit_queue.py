@@ -0,0 +1,228 @@
+# backend/utils/audit_queue.py
+from __future__ import annotations
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+AUDIT_FLUSH_EVENTS = int(os.environ.get("AUDIT_FLUSH_EVENTS", "200"))
+AUDIT_FLUSH_MS = int(os.environ.get("AUDIT_FLUSH_MS", "250"))
+AUDIT_QUEUE_MAX = int(os.environ.get("AUDIT_QUEUE_MAX", "10000"))
+AUDIT_JOURNAL_FSYNC = os.environ.get("AUDIT_JOURNAL_FSYNC", "0").lower() in ("1", "true", "yes")
+AUDIT_SPILL_DIR = os.environ.get("AUDIT_SPILL_DIR", str(Path(__file__).resolve().parent.parent / "audit_spill"))
+
+log = logging.getLogger("clinichub.audit")
+
+
+class AuditQueue:
+    """
+    Write-behind buffer for audit documents.
+
+    enqueue() writes the event through to an append-only journal segment
+    (handed to the OS before it returns) and to an in-memory buffer; no Mongo
+    round trip on the request path. A background task flushes the buffer with
+    insert_many every AUDIT_FLUSH_EVENTS events or AUDIT_FLUSH_MS
+    milliseconds. Before each flush the segment is fsync'd and sealed; it is
+    deleted only after Mongo accepted the batch. Sealed segments left behind
+    by a failed flush, a full buffer or a crash are replayed on the next flush
+    cycle and at startup. Every document carries a generated _id so a replay
+    never duplicates rows.
+
+    A process crash loses nothing that enqueue() returned for. A host crash or
+    power loss can lose the events of the unsealed segment (at most
+    AUDIT_FLUSH_MS of them) unless AUDIT_JOURNAL_FSYNC fsyncs every enqueue.
+    """
+
+    def __init__(self, spill_dir: str = AUDIT_SPILL_DIR, flush_events: int = AUDIT_FLUSH_EVENTS,
+                 flush_ms: int = AUDIT_FLUSH_MS, max_depth: int = AUDIT_QUEUE_MAX,
+                 fsync_each: bool = AUDIT_JOURNAL_FSYNC):
+        self.spill_dir = Path(spill_dir)
+        self.flush_events = flush_events
+        self.flush_ms = flush_ms
+        self.max_depth = max_depth
+        self.fsync_each = fsync_each
+        self.db = None
+        self._buffer: List[tuple] = []
+        self._segment = None
+        self._segment_path: Optional[Path] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._metrics = {
+            "enqueued": 0, "flushed": 0, "flushes": 0, "flush_failures": 0,
+            "spilled_segments": 0, "replayed": 0,
+            "last_flush_ms": 0.0, "max_flush_ms": 0.0, "total_flush_ms": 0.0,
+        }
+
+    # ---------- journal ----------
+    def _open_segment(self):
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        self._segment_path = self.spill_dir / f"audit-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}.open"
+        self._segment = open(self._segment_path, "a", encoding="utf-8")
+        # Held until sealed so other workers sharing the spill dir skip it on replay
+        fcntl.flock(self._segment.fileno(), fcntl.LOCK_EX)
+
+    def _seal_segment(self) -> Optional[Path]:
+        """fsync and close the active segment; returns its sealed path."""
+        if not self._segment:
+            return None
+        self._segment.flush()
+        os.fsync(self._segment.fileno())
+        self._segment.close()
+        sealed = self._segment_path.with_suffix(".jsonl")
+        os.replace(self._segment_path, sealed)
+        self._segment = None
+        self._segment_path = None
+        return sealed
+
+    # ---------- producer side ----------
+    def enqueue(self, db, collection: str, doc: Dict[str, Any], log_line: bool = False) -> Dict[str, Any]:
+        """Buffer one audit document for `collection`. Never awaits, never raises."""
+        try:
+            if self.db is None:
+                self.db = db
+            doc.setdefault("_id", uuid.uuid4().hex)
+            if self._segment is None:
+                self._open_segment()
+            self._segment.write(json.dumps({"c": collection, "d": doc, "l": log_line}, default=str) + "\n")
+            self._segment.flush()  # out of Python's buffer: survives a process crash
+            if self.fsync_each:
+                os.fsync(self._segment.fileno())
+            self._buffer.append((collection, doc, log_line))
+            self._metrics["enqueued"] += 1
+
+            if len(self._buffer) >= self.max_depth:
+                # Memory bound reached (e.g. Mongo outage): leave these on disk only
+                self._seal_segment()
+                self._buffer = []
+                self._metrics["spilled_segments"] += 1
+            self._ensure_started()
+            if len(self._buffer) >= self.flush_events and self._wake:
+                self._wake.set()
+        except Exception as e:
+            log.error(f"AUDIT FAILURE: could not enqueue audit event: {e}")
+        return doc
+
+    def _ensure_started(self):
+        if self._task and not self._task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._wake = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    # ---------- consumer side ----------
+    async def _run(self):
+        await self.replay_spill()
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def _insert(self, items: List[tuple]):
+        by_coll: Dict[str, List[Dict[str, Any]]] = {}
+        for coll, doc, _ in items:
+            by_coll.setdefault(coll, []).append(doc)
+        for coll, docs in by_coll.items():
+            try:
+                await self.db[coll].insert_many(docs, ordered=False)
+            except Exception as e:
+                # Duplicate _ids mean an earlier attempt already landed those rows
+                details = getattr(e, "details", None) or {}
+                errors = details.get("writeErrors") or []
+                if not errors or any(err.get("code") != 11000 for err in errors):
+                    raise
+        for coll, doc, log_line in items:
+            if log_line:
+                log.info(f"AUDIT: {doc}")
+
+    async def flush(self):
+        """Seal the active segment and write the buffered batch; then retry spilled segments."""
+        if self._buffer:
+            items, self._buffer = self._buffer, []
+            sealed = self._seal_segment()
+            t0 = time.perf_counter()
+            try:
+                await self._insert(items)
+                if sealed:
+                    sealed.unlink(missing_ok=True)
+                self._metrics["flushed"] += len(items)
+                self._metrics["flushes"] += 1
+            except Exception as e:
+                self._metrics["flush_failures"] += 1
+                self._metrics["spilled_segments"] += 1
+                log.error(f"AUDIT FAILURE: flush of {len(items)} events failed, kept in {sealed}: {e}")
+            elapsed = (time.perf_counter() - t0) * 1000
+            self._metrics["last_flush_ms"] = round(elapsed, 2)
+            self._metrics["max_flush_ms"] = round(max(self._metrics["max_flush_ms"], elapsed), 2)
+            self._metrics["total_flush_ms"] += elapsed
+        if self._metrics["spilled_segments"]:
+            await self.replay_spill()
+
+    async def replay_spill(self):
+        """Insert every sealed segment on disk (and stale .open segments from a crash)."""
+        if self.db is None or not self.spill_dir.exists():
+            return
+        active = self._segment_path
+        paths = sorted(p for p in self.spill_dir.iterdir()
+                       if p.suffix in (".jsonl", ".open") and p != active)
+        for path in paths:
+            items = []
+            try:
+                fh = open(path, "r", encoding="utf-8")
+            except FileNotFoundError:
+                continue  # another worker already replayed it
+            with fh:
+                if path.suffix == ".open":
+                    try:
+                        fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue  # live segment of another worker
+                for line in fh:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue  # torn final line from a crash
+                    items.append((rec["c"], rec["d"], rec.get("l", False)))
+            try:
+                if items:
+                    await self._insert(items)
+                path.unlink(missing_ok=True)
+                self._metrics["replayed"] += len(items)
+            except Exception as e:
+                log.error(f"AUDIT FAILURE: replay of {path.name} failed: {e}")
+                return
+        self._metrics["spilled_segments"] = 0
+
+    async def stop(self):
+        """Flush what is buffered and stop the background task (shutdown hook)."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        await self.flush()
+
+    def metrics(self) -> Dict[str, Any]:
+        m = dict(self._metrics)
+        flushes = m["flushes"] or 1
+        m["avg_flush_ms"] = round(m.pop("total_flush_ms") / flushes, 2)
+        m["queue_depth"] = len(self._buffer)
+        m["flush_events"] = self.flush_events
+        m["flush_ms"] = self.flush_ms
+        return m
+
+
+# Process-wide queue shared by audit_log() and the monolith's create_audit_event()
+audit_queue = AuditQueue()
@@ -0,0 +1,104 @@
+# backend/utils/auth_cache.py
+from __future__ import annotations
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Hashable, Optional, Tuple
+
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL_S = float(os.environ.get("AUTH_CACHE_TTL_S", "30"))
+
+
+class _Principal:
+    __slots__ = ("user", "permissions", "generation", "expires")
+
+    def __init__(self, user: Any, generation: int, expires: float):
+        self.user = user
+        self.permissions: FrozenSet[str] = frozenset(getattr(user, "permissions", None) or ())
+        self.generation = generation
+        self.expires = expires
+
+
+class AuthPrincipalCache:
+    """
+    Resolved users for get_current_user, keyed by (username, token iat) so a
+    re-issued token never picks up an older resolution. Entries live
+    AUTH_CACHE_TTL_S (LRU-bounded to AUTH_CACHE_SIZE) and carry the user's
+    permission set for require_permission.
+
+    Writes that change a user (profile/role, password, lockout, deletion) call
+    invalidate(); a resolution that was in flight during the write is not
+    stored. Invalidation is per process, so other workers catch up within the TTL.
+    """
+
+    def __init__(self, maxsize: int = AUTH_CACHE_SIZE, ttl_s: float = AUTH_CACHE_TTL_S):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self._entries: "OrderedDict[Tuple[str, Hashable], _Principal]" = OrderedDict()
+        self._by_user: Dict[int, _Principal] = {}  # id(user) -> entry, for permissions()
+        self._usernames: Dict[str, str] = {}  # user id -> username, for invalidation by id
+        self._generations: Dict[str, int] = {}
+        self._metrics = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+    def generation(self, username: str) -> int:
+        """Read before loading a user and hand to put(), so a concurrent invalidate() wins"""
+        return self._generations.get(username, 0)
+
+    def get(self, username: str, iat: Hashable) -> Optional[Any]:
+        key = (username, iat)
+        entry = self._entries.get(key)
+        if entry is None or entry.expires <= time.monotonic() or entry.generation != self.generation(username):
+            if entry is not None:
+                self._drop(key)
+            self._metrics["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self._metrics["hits"] += 1
+        return entry.user
+
+    def put(self, username: str, iat: Hashable, user: Any, generation: int):
+        if generation != self.generation(username):
+            return  # invalidated while it was being loaded
+        key = (username, iat)
+        self._drop(key)
+        entry = _Principal(user, generation, time.monotonic() + self.ttl_s)
+        self._entries[key] = entry
+        self._by_user[id(user)] = entry
+        user_id = getattr(user, "id", None)
+        if user_id:
+            self._usernames[user_id] = username
+        while len(self._entries) > self.maxsize:
+            self._drop(next(iter(self._entries)))
+            self._metrics["evictions"] += 1
+
+    def _drop(self, key: Tuple[str, Hashable]):
+        entry = self._entries.pop(key, None)
+        if entry is not None and self._by_user.get(id(entry.user)) is entry:
+            del self._by_user[id(entry.user)]
+
+    def permissions(self, user: Any) -> FrozenSet[str]:
+        """The precomputed permission set of a cached user (computed on the fly otherwise)"""
+        entry = self._by_user.get(id(user))
+        if entry is not None and entry.user is user:
+            return entry.permissions
+        return frozenset(getattr(user, "permissions", None) or ())
+
+    def invalidate(self, username: Optional[str] = None, user_id: Optional[str] = None):
+        """Drop every cached token resolution of a user; stale entries are discarded lazily"""
+        if username is None and user_id:
+            username = self._usernames.get(user_id)
+        if username is None:
+            return  # never resolved in this process
+        self._generations[username] = self.generation(username) + 1
+        self._metrics["invalidations"] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        m: Dict[str, Any] = dict(self._metrics)
+        lookups = m["hits"] + m["misses"]
+        m["hit_rate"] = round(m["hits"] / lookups, 4) if lookups else 0.0
+        m["size"] = len(self._entries)
+        return m
+
+
+# Process-wide principal cache behind get_current_user / require_permission
+auth_principals = AuthPrincipalCache()
@@ -0,0 +1,117 @@
+# backend/utils/availability.py
+from __future__ import annotations
+from bisect import bisect_left
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+# Appointments in these states do not occupy the provider
+INACTIVE_STATUSES = ["cancelled", "no_show"]
+MAX_RANGE_DAYS = 31
+
+
+def to_minutes(hhmm: str) -> int:
+    h, m = map(int, str(hhmm).split(":")[:2])
+    return h * 60 + m
+
+
+def fmt_minutes(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class BusyIntervals:
+    """
+    A provider-day's booked intervals sorted by start, with a running max of end
+    times. A slot [s, e) conflicts iff some interval starting before e ends after s,
+    i.e. iff the max end among intervals with start < e exceeds s: one bisect per slot.
+    """
+
+    def __init__(self, intervals: Iterable[Tuple[int, int, Optional[str]]] = ()):
+        items = sorted(intervals, key=lambda t: t[0])
+        self.starts = [s for s, _, _ in items]
+        self.max_end: List[Tuple[int, Optional[str]]] = []
+        best = (-1, None)
+        for _, end, appt_id in items:
+            if end > best[0]:
+                best = (end, appt_id)
+            self.max_end.append(best)
+
+    def conflict(self, start: int, end: int) -> Optional[str]:
+        """Id of an appointment overlapping [start, end) ('' if it has no id), else None."""
+        k = bisect_left(self.starts, end)
+        if k and self.max_end[k - 1][0] > start:
+            return self.max_end[k - 1][1] or ""
+        return None
+
+
+def day_slots(schedule: Mapping[str, Any], busy: Optional[BusyIntervals], duration_minutes: int) -> List[Dict[str, Any]]:
+    """The schedule's slot grid (duration-sized steps from start_time) with availability flags."""
+    start, end = to_minutes(schedule["start_time"]), to_minutes(schedule["end_time"])
+    busy = busy or BusyIntervals()
+    slots = []
+    t = start
+    while t + duration_minutes <= end:
+        appt_id = busy.conflict(t, t + duration_minutes)
+        slots.append({
+            "start_time": fmt_minutes(t),
+            "end_time": fmt_minutes(t + duration_minutes),
+            "is_available": appt_id is None,
+            "appointment_id": appt_id or None,
+        })
+        t += duration_minutes
+    return slots
+
+
+def date_range(start: date, end: date) -> List[date]:
+    return [start + timedelta(days=n) for n in range((end - start).days + 1)]
+
+
+async def load_schedules(db, provider_ids: List[str]) -> Dict[str, Dict[int, Dict[str, Any]]]:
+    """Weekly availability per provider: provider_id -> {day_of_week: schedule}."""
+    out: Dict[str, Dict[int, Dict[str, Any]]] = {p: {} for p in provider_ids}
+    async for s in db.provider_schedules.find(
+        {"provider_id": {"$in": provider_ids}, "is_available": True, "day_of_week": {"$exists": True}},
+        {"_id": 0},
+    ):
+        out.setdefault(s["provider_id"], {}).setdefault(s["day_of_week"], s)
+    return out
+
+
+async def load_busy(db, provider_ids: List[str], start: date, end: date,
+                    exclude_appointment_id: Optional[str] = None) -> Dict[Tuple[str, str], BusyIntervals]:
+    """All active appointments of the providers in [start, end] in one query: (provider_id, date) -> intervals."""
+    query: Dict[str, Any] = {
+        "provider_id": {"$in": provider_ids},
+        "appointment_date": {"$gte": start.isoformat(), "$lte": end.isoformat()},
+        "status": {"$nin": INACTIVE_STATUSES},
+    }
+    if exclude_appointment_id:
+        query["id"] = {"$ne": exclude_appointment_id}
+    raw: Dict[Tuple[str, str], List[Tuple[int, int, Optional[str]]]] = {}
+    projection = {"_id": 0, "id": 1, "provider_id": 1, "appointment_date": 1,
+                  "start_time": 1, "end_time": 1, "duration_minutes": 1}
+    async for a in db.appointments.find(query, projection):
+        try:
+            s = to_minutes(a["start_time"])
+            e = s + int(a["duration_minutes"]) if a.get("duration_minutes") else to_minutes(a["end_time"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        raw.setdefault((a["provider_id"], str(a["appointment_date"])[:10]), []).append((s, e, a.get("id")))
+    return {k: BusyIntervals(v) for k, v in raw.items()}
+
+
+async def compute_availability(db, provider_ids: List[str], start: date, end: date,
+                               duration_minutes: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Slot grids for many providers and days from two queries.
+    Returns provider_id -> {date_iso: {"schedule": ..., "slots": [...]}}; days off are omitted.
+    """
+    schedules = await load_schedules(db, provider_ids)
+    busy = await load_busy(db, provider_ids, start, end)
+    out: Dict[str, Dict[str, Any]] = {p: {} for p in provider_ids}
+    for day in date_range(start, end):
+        iso = day.isoformat()
+        for p in provider_ids:
+            sched = schedules.get(p, {}).get(day.weekday())
+            if sched:
+                out[p][iso] = {"schedule": sched, "slots": day_slots(sched, busy.get((p, iso)), duration_minutes)}
+    return out
@@ -0,0 +1,308 @@
+# backend/utils/daily_financials.py
+from __future__ import annotations
+import asyncio
+import os
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from pymongo import UpdateOne
+
+from .financial_reports import DEFAULT_CATEGORY
+
+SUMMARY_COLL = "daily_financial_summaries"
+DAILY_SUMMARY_MAX_DAYS = int(os.environ.get("DAILY_SUMMARY_MAX_DAYS", "31"))  # rows summed per read
+DAILY_SUMMARY_REBUILD_CHUNK_DAYS = int(os.environ.get("DAILY_SUMMARY_REBUILD_CHUNK_DAYS", "31"))
+DAILY_SUMMARY_INTERVAL_S = int(os.environ.get("DAILY_SUMMARY_INTERVAL_S", "3600"))
+
+# Same buckets /financial-summary always used: debit cards count as card income, anything else is "other"
+_METHOD_BUCKET = {"cash": "cash", "credit_card": "credit_card", "debit_card": "credit_card", "check": "check"}
+
+SUMMARY_FIELDS = (
+    "cash_income", "credit_card_income", "check_income", "other_income", "total_income",
+    "cash_expenses", "check_expenses", "credit_card_expenses", "other_expenses", "total_expenses",
+    "net_amount", "income_transaction_count", "expense_transaction_count", "transfer_transaction_count",
+    "checks_written_total", "checks_written_count", "vendor_payments_total", "vendor_payments_count",
+)
+_BREAKDOWNS = {"income": "income_by_category", "expense": "expense_by_category"}
+
+
+def day_of(value: Any) -> Optional[str]:
+    """ISO day of a stored date (ISO string via jsonable_encoder) or a date/datetime"""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, str) and len(value) >= 10:
+        return value[:10]
+    return None
+
+
+def _category_key(category: str) -> str:
+    # Category names become field names inside the row
+    return category.replace(".", "_").lstrip("$") or "unknown"
+
+
+def _add(inc: Dict[str, Any], key: str, value: float):
+    inc[key] = inc.get(key, 0) + value
+
+
+def _add_transactions(inc: Dict[str, Any], kind: Optional[str], method: Optional[str], category: Optional[str],
+                      total: float, count: int):
+    """Fold transactions (one, or an aggregated group) into flat $inc-style counters"""
+    if kind not in DEFAULT_CATEGORY:
+        _add(inc, "transfer_transaction_count", count)
+        return
+    bucket = _METHOD_BUCKET.get(method or "", "other")
+    category = _category_key(category or DEFAULT_CATEGORY[kind])
+    if kind == "income":
+        _add(inc, f"{bucket}_income", total)
+        _add(inc, "total_income", total)
+        _add(inc, "net_amount", total)
+        _add(inc, "income_transaction_count", count)
+    else:
+        _add(inc, f"{bucket}_expenses", total)
+        _add(inc, "total_expenses", total)
+        _add(inc, "net_amount", -total)
+        _add(inc, "expense_transaction_count", count)
+    _add(inc, f"{_BREAKDOWNS[kind]}.{category}", total)
+
+
+def _empty_row() -> Dict[str, Any]:
+    row: Dict[str, Any] = {f: 0 for f in SUMMARY_FIELDS}
+    row.update({b: {} for b in _BREAKDOWNS.values()})
+    return row
+
+
+def _nest(flat: Dict[str, Any]) -> Dict[str, Any]:
+    row = _empty_row()
+    for key, value in flat.items():
+        if "." in key:
+            outer, inner = key.split(".", 1)
+            row[outer][inner] = row[outer].get(inner, 0) + value
+        else:
+            row[key] += value
+    return row
+
+
+def _days(start: date, end: date) -> List[str]:
+    return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+
+
+def summarize_days(rows: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Month-end style totals from day rows (same keys as financial_reports.summarize)"""
+    income: Dict[str, float] = {}
+    expense: Dict[str, float] = {}
+    count = 0
+    for r in rows:
+        count += sum(r.get(f, 0) for f in ("income_transaction_count", "expense_transaction_count",
+                                            "transfer_transaction_count"))
+        for kind, bucket in (("income", income), ("expense", expense)):
+            for category, total in (r.get(_BREAKDOWNS[kind]) or {}).items():
+                bucket[category] = bucket.get(category, 0.0) + total
+    total_income = sum(income.values())
+    total_expenses = sum(expense.values())
+    return {
+        "total_income": round(total_income, 2),
+        "total_expenses": round(total_expenses, 2),
+        "net_income": round(total_income - total_expenses, 2),
+        "income_breakdown": {k: round(v, 2) for k, v in sorted(income.items()) if round(v, 2)},
+        "expense_breakdown": {k: round(v, 2) for k, v in sorted(expense.items()) if round(v, 2)},
+        "transaction_count": count,
+    }
+
+
+class DailyFinancialSummaries:
+    """
+    One precomputed row per day in daily_financial_summaries: the
+    /financial-summary totals plus per-category sums, checks written and
+    vendor payments. Dashboards and month-end reports read at most
+    DAILY_SUMMARY_MAX_DAYS rows instead of scanning the source collections.
+
+    Writes to financial_transactions, checks and vendor_invoices call the
+    record_* methods, which $inc the affected day. A day with no row yet is
+    rebuilt from the sources instead (the new write is already in them), so a
+    row exists only once it covers the whole day. rebuild() recomputes any
+    range; a failed increment marks its day for the next maintenance pass,
+    which also re-derives yesterday once a day.
+    """
+
+    def __init__(self):
+        self._dirty: Set[str] = set()
+        self._reconciled: Optional[date] = None
+        self._maintenance_task: Optional[asyncio.Task] = None
+
+    # ---------- incremental maintenance ----------
+    async def _apply(self, db, day: Optional[str], inc: Dict[str, Any]):
+        if not day or not inc:
+            return
+        try:
+            result = await db[SUMMARY_COLL].update_one(
+                {"summary_date": day}, {"$inc": inc, "$set": {"updated_at": datetime.utcnow()}}
+            )
+            if result.matched_count == 0:
+                d = date.fromisoformat(day)
+                await self.rebuild(db, d, d)
+        except Exception as e:
+            self._dirty.add(day)
+            print(f"[WARN] Daily financial summary for {day} not updated, queued for rebuild: {e}")
+
+    async def record_transaction(self, db, txn: Dict[str, Any], sign: int = 1):
+        """A financial transaction was inserted (sign=1) or is being replaced/removed (sign=-1)"""
+        inc: Dict[str, Any] = {}
+        _add_transactions(inc, txn.get("transaction_type"), txn.get("payment_method"), txn.get("category"),
+                          sign * float(txn.get("amount") or 0), sign)
+        await self._apply(db, day_of(txn.get("transaction_date")), inc)
+
+    async def record_check(self, db, check: Dict[str, Any], sign: int = 1):
+        """A check was written (sign=1) or voided (sign=-1)"""
+        inc = {"checks_written_total": sign * float(check.get("amount") or 0), "checks_written_count": sign}
+        await self._apply(db, day_of(check.get("check_date")), inc)
+
+    async def record_vendor_payment(self, db, invoice: Dict[str, Any], sign: int = 1):
+        """A vendor invoice was paid (sign=1) or its earlier payment is being superseded (sign=-1)"""
+        inc = {"vendor_payments_total": sign * float(invoice.get("amount_paid") or 0), "vendor_payments_count": sign}
+        await self._apply(db, day_of(invoice.get("payment_date")), inc)
+
+    # ---------- rebuild ----------
+    async def _source_totals(self, db, start: date, end: date) -> Dict[str, Dict[str, Any]]:
+        """Flat counters per day for [start, end], one $group per source collection"""
+        span = {"$gte": start.isoformat(), "$lte": end.isoformat()}
+        flat: Dict[str, Dict[str, Any]] = {d: {} for d in _days(start, end)}
+        txns = db.financial_transactions.aggregate([
+            {"$match": {"transaction_date": span}},
+            {"$group": {
+                "_id": {"day": {"$substrCP": ["$transaction_date", 0, 10]}, "type": "$transaction_type",
+                        "category": "$category", "method": "$payment_method"},
+                "total": {"$sum": "$amount"}, "count": {"$sum": 1},
+            }},
+        ])
+        async for g in txns:
+            k = g["_id"]
+            if k["day"] in flat:
+                _add_transactions(flat[k["day"]], k.get("type"), k.get("method"), k.get("category"),
+                                  g["total"], g["count"])
+        sources = (
+            (db.checks, "check_date", {"status": {"$ne": "voided"}}, "$amount", "checks_written"),
+            (db.vendor_invoices, "payment_date", {"payment_status": "paid"}, "$amount_paid", "vendor_payments"),
+        )
+        for coll, field, where, amount, prefix in sources:
+            groups = coll.aggregate([
+                {"$match": {field: span, **where}},
+                {"$group": {"_id": {"$substrCP": [f"${field}", 0, 10]}, "total": {"$sum": amount}, "count": {"$sum": 1}}},
+            ])
+            async for g in groups:
+                if g["_id"] in flat:
+                    _add(flat[g["_id"]], f"{prefix}_total", g["total"])
+                    _add(flat[g["_id"]], f"{prefix}_count", g["count"])
+        return flat
+
+    async def rebuild(self, db, start: date, end: date) -> int:
+        """Recompute every day row in [start, end] from the sources (days without activity get zero rows)"""
+        if end < start:
+            raise ValueError("end_date must not be before start_date")
+        written = 0
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(end, chunk_start + timedelta(days=DAILY_SUMMARY_REBUILD_CHUNK_DAYS - 1))
+            flat = await self._source_totals(db, chunk_start, chunk_end)
+            now = datetime.utcnow()
+            ops = [
+                UpdateOne(
+                    {"summary_date": day},
+                    {"$set": {**_nest(counters), "updated_at": now},
+                     "$setOnInsert": {"id": str(uuid.uuid4()), "created_by": "System", "created_at": now}},
+                    upsert=True,
+                )
+                for day, counters in flat.items()
+            ]
+            await db[SUMMARY_COLL].bulk_write(ops, ordered=False)
+            self._dirty.difference_update(flat)
+            written += len(ops)
+            chunk_start = chunk_end + timedelta(days=1)
+        return written
+
+    # ---------- reads ----------
+    async def days(self, db, start: date, end: date) -> List[Dict[str, Any]]:
+        """Day rows for [start, end] (at most DAILY_SUMMARY_MAX_DAYS), materializing any that are missing"""
+        if end < start:
+            raise ValueError("end_date must not be before start_date")
+        if (end - start).days + 1 > DAILY_SUMMARY_MAX_DAYS:
+            raise ValueError(f"Date range too large (max {DAILY_SUMMARY_MAX_DAYS} days)")
+        query = {"summary_date": {"$gte": start.isoformat(), "$lte": end.isoformat()}}
+        rows = await db[SUMMARY_COLL].find(query, {"_id": 0}).sort("summary_date", 1).to_list(DAILY_SUMMARY_MAX_DAYS)
+        missing = sorted(set(_days(start, end)) - {r["summary_date"] for r in rows})
+        if missing:
+            await self.rebuild(db, date.fromisoformat(missing[0]), date.fromisoformat(missing[-1]))
+            rows = await db[SUMMARY_COLL].find(query, {"_id": 0}).sort("summary_date", 1).to_list(DAILY_SUMMARY_MAX_DAYS)
+        return rows
+
+    async def day(self, db, day: date) -> Dict[str, Any]:
+        return (await self.days(db, day, day))[0]
+
+    # ---------- maintenance ----------
+    async def maintain_once(self, db):
+        today = date.today()
+        # Open today's and tomorrow's rows ahead of the first write, so those writes only $inc
+        await self.days(db, today, today + timedelta(days=1))
+        if self._reconciled != today:
+            yesterday = today - timedelta(days=1)
+            await self.rebuild(db, yesterday, yesterday)
+            self._reconciled = today
+        for day in sorted(self._dirty):
+            d = date.fromisoformat(day)
+            await self.rebuild(db, d, d)
+
+    def start_maintenance(self, db):
+        if self._maintenance_task is None or self._maintenance_task.done():
+            self._maintenance_task = asyncio.get_running_loop().create_task(self._maintain(db))
+
+    async def _maintain(self, db):
+        while True:
+            try:
+                await self.maintain_once(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[WARN] Daily financial summary maintenance failed: {e}")
+            await asyncio.sleep(DAILY_SUMMARY_INTERVAL_S)
+
+    async def stop(self):
+        if self._maintenance_task:
+            self._maintenance_task.cancel()
+            try:
+                await self._maintenance_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._maintenance_task = None
+
+
+async def ensure_daily_financial_indexes(db):
+    """Create daily financial summary indexes if they don't exist"""
+    try:
+        await db[SUMMARY_COLL].create_index([("summary_date", 1)], unique=True, background=True)
+        await db.checks.create_index([("check_date", 1), ("status", 1)], background=True)
+        await db.vendor_invoices.create_index([("payment_status", 1), ("payment_date", 1)], background=True)
+        print(f"[INFO] Daily financial summary indexes ensured for collections {SUMMARY_COLL}, checks, vendor_invoices")
+    except Exception as e:
+        print(f"[WARN] Failed to create daily financial summary indexes: {e}")
+
+
+# Process-wide maintainer of daily_financial_summaries behind /financial-summary, month-end reports and the dashboard
+daily_financials = DailyFinancialSummaries()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Backfill / rebuild daily financial summaries")
+    parser.add_argument("--start", required=True, type=date.fromisoformat, help="first day, YYYY-MM-DD")
+    parser.add_argument("--end", type=date.fromisoformat, help="last day, YYYY-MM-DD (default: today)")
+    args = parser.parse_args()
+
+    async def _main():
+        from backend.dependencies import db
+        await ensure_daily_financial_indexes(db)
+        print(await daily_financials.rebuild(db, args.start, args.end or date.today()), "day rows written")
+
+    asyncio.run(_main())
@@ -0,0 +1,124 @@
+# backend/utils/dashboard_stats.py
+from __future__ import annotations
+import asyncio
+import os
+import time
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .daily_financials import SUMMARY_COLL, daily_financials
+from .inventory_stock import count_low_stock
+
+DASHBOARD_STATS_TTL_S = float(os.environ.get("DASHBOARD_STATS_TTL_S", "15"))
+
+
+async def _today_income(db) -> float:
+    # One precomputed row; transaction writes keep it current
+    return round((await daily_financials.day(db, date.today()))["total_income"], 2)
+
+
+def _recent(coll: str, n: int) -> Callable[[Any], Awaitable[list]]:
+    return lambda db: db[coll].find({}, {"_id": 0}).sort("created_at", -1).limit(n).to_list(n)
+
+
+_PENDING = {"status": {"$in": ["draft", "sent"]}}
+
+# stat -> (collections it is derived from, loader)
+STATS: Dict[str, Tuple[Tuple[str, ...], Callable[[Any], Awaitable[Any]]]] = {
+    "total_patients": (("patients",), lambda db: db.patients.count_documents({"status": "active"})),
+    "total_invoices": (("invoices",), lambda db: db.invoices.count_documents({})),
+    "total_enhanced_invoices": (("enhanced_invoices",), lambda db: db.enhanced_invoices.count_documents({})),
+    "pending_invoices": (("invoices",), lambda db: db.invoices.count_documents(_PENDING)),
+    "pending_enhanced_invoices": (("enhanced_invoices",), lambda db: db.enhanced_invoices.count_documents(_PENDING)),
+    "low_stock_items": (("inventory",), count_low_stock),
+    "total_employees": (("employees",), lambda db: db.employees.count_documents({"is_active": True})),
+    "today_income": (("financial_transactions", SUMMARY_COLL), _today_income),
+    "unpaid_vendor_invoices": (("vendor_invoices",), lambda db: db.vendor_invoices.count_documents({"payment_status": "unpaid"})),
+    "pending_checks": (("checks",), lambda db: db.checks.count_documents({"status": {"$in": ["draft", "printed"]}})),
+    "recent_patients": (("patients",), _recent("patients", 5)),
+    "recent_invoices": (("invoices",), _recent("invoices", 3)),
+    "recent_enhanced_invoices": (("enhanced_invoices",), _recent("enhanced_invoices", 2)),
+}
+
+WATCHED_COLLECTIONS = sorted({c for deps, _ in STATS.values() for c in deps})
+
+
+class DashboardStatsService:
+    """
+    Per-stat TTL cache for /dashboard/stats.
+
+    Expired or invalidated stats are recomputed concurrently (one lock, so a burst
+    of page loads computes once). A write to a collection drops only the stats
+    derived from it: the API's write paths call invalidate() for their own
+    worker, and other workers follow a change stream when MongoDB runs as a
+    replica set. On a standalone mongod the TTL bounds staleness elsewhere.
+    """
+
+    def __init__(self, ttl_s: float = DASHBOARD_STATS_TTL_S):
+        self.ttl_s = ttl_s
+        self._values: Dict[str, Tuple[Any, float]] = {}
+        self._day: Optional[date] = None
+        self._lock = asyncio.Lock()
+        self._watch_task: Optional[asyncio.Task] = None
+
+    def invalidate(self, collection: Optional[str] = None):
+        if collection is None:
+            self._values.clear()
+            return
+        for name, (deps, _) in STATS.items():
+            if collection in deps:
+                self._values.pop(name, None)
+
+    def _stale(self, now: float):
+        return [n for n in STATS if n not in self._values or self._values[n][1] <= now]
+
+    async def get(self, db) -> Tuple[Dict[str, Any], str, float]:
+        """Returns (values, 'hit' | 'partial' | 'miss', compute_ms)."""
+        if self._day != date.today():
+            self._values.clear()  # today_income rolls over at midnight
+            self._day = date.today()
+        stale = self._stale(time.monotonic())
+        compute_ms = 0.0
+        if stale:
+            async with self._lock:
+                stale = self._stale(time.monotonic())
+                if stale:
+                    t0 = time.perf_counter()
+                    results = await asyncio.gather(*(STATS[n][1](db) for n in stale))
+                    expires = time.monotonic() + self.ttl_s
+                    for n, v in zip(stale, results):
+                        self._values[n] = (v, expires)
+                    compute_ms = (time.perf_counter() - t0) * 1000
+        state = "hit" if not stale else ("miss" if len(stale) == len(STATS) else "partial")
+        return {n: v for n, (v, _) in self._values.items()}, state, round(compute_ms, 2)
+
+    # ---------- change stream ----------
+    def start_watch(self, db):
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.get_running_loop().create_task(self._watch(db))
+
+    async def _watch(self, db):
+        pipeline = [{"$match": {"ns.coll": {"$in": WATCHED_COLLECTIONS}}}]
+        try:
+            async with db.watch(pipeline) as stream:
+                print("[INFO] Dashboard stats invalidation watching change stream")
+                async for change in stream:
+                    self.invalidate(change.get("ns", {}).get("coll"))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Standalone mongod has no change streams; the TTL still applies
+            print(f"[WARN] Dashboard stats change stream unavailable, using TTL only: {e}")
+
+    async def stop(self):
+        if self._watch_task:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._watch_task = None
+
+
+# Process-wide cache behind /dashboard/stats
+dashboard_stats = DashboardStatsService()
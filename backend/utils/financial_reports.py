@@ -0,0 +1,114 @@
+# backend/utils/financial_reports.py
+from __future__ import annotations
+import os
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+FINANCIAL_REPORT_MAX_DAYS = int(os.environ.get("FINANCIAL_REPORT_MAX_DAYS", "1100"))  # ~3 years per call
+
+# transaction_date is stored as an ISO date string (jsonable_encoder), so a period is a prefix of it
+GRANULARITIES = {"day": 10, "month": 7, "year": 4}
+DEFAULT_CATEGORY = {"income": "other_income", "expense": "other_expense"}
+
+# Matches the $match + $group below so the rollup is answered from the index alone
+TRANSACTION_REPORT_INDEX = [("transaction_date", 1), ("transaction_type", 1), ("category", 1),
+                            ("payment_method", 1), ("amount", 1)]
+
+
+def month_range(year: int, month: int) -> Tuple[date, date]:
+    start = date(year, month, 1)
+    nxt = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, nxt - timedelta(days=1)
+
+
+def validate_range(start: date, end: date):
+    if end < start:
+        raise ValueError("end_date must not be before start_date")
+    if (end - start).days + 1 > FINANCIAL_REPORT_MAX_DAYS:
+        raise ValueError(f"Date range too large (max {FINANCIAL_REPORT_MAX_DAYS} days)")
+
+
+async def category_totals(db, start: date, end: date, granularity: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Sum and count of financial_transactions in [start, end] per (type,
+    category, payment method), and per period when granularity is
+    day/month/year. One $group; nothing is loaded row by row.
+    """
+    key: Dict[str, Any] = {"type": "$transaction_type", "category": "$category", "method": "$payment_method"}
+    if granularity:
+        key["period"] = {"$substrCP": ["$transaction_date", 0, GRANULARITIES[granularity]]}
+    pipeline = [
+        {"$match": {"transaction_date": {"$gte": start.isoformat(), "$lte": end.isoformat()}}},
+        {"$group": {"_id": key, "total": {"$sum": "$amount"}, "count": {"$sum": 1}}},
+    ]
+    return [
+        {**d["_id"], "total": d["total"], "count": d["count"]}
+        async for d in db.financial_transactions.aggregate(pipeline)
+    ]
+
+
+def summarize(rows: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Report totals from category_totals rows (same keys the monthly report always returned)."""
+    income: Dict[str, float] = {}
+    expense: Dict[str, float] = {}
+    methods: Dict[str, Dict[str, float]] = {"income": {}, "expense": {}}
+    count = 0
+    for r in rows:
+        count += r["count"]
+        kind = r["type"]
+        if kind not in DEFAULT_CATEGORY:
+            continue  # transfers move money between accounts; they are neither income nor expense
+        bucket = income if kind == "income" else expense
+        category = r.get("category") or DEFAULT_CATEGORY[kind]
+        bucket[category] = bucket.get(category, 0.0) + r["total"]
+        method = r.get("method") or "other"
+        methods[kind][method] = methods[kind].get(method, 0.0) + r["total"]
+    total_income = sum(income.values())
+    total_expenses = sum(expense.values())
+    return {
+        "total_income": round(total_income, 2),
+        "total_expenses": round(total_expenses, 2),
+        "net_income": round(total_income - total_expenses, 2),
+        "income_breakdown": {k: round(v, 2) for k, v in sorted(income.items())},
+        "expense_breakdown": {k: round(v, 2) for k, v in sorted(expense.items())},
+        "by_payment_method": {k: {m: round(v, 2) for m, v in sorted(d.items())} for k, d in methods.items()},
+        "transaction_count": count,
+    }
+
+
+async def payables(db, due_by: date) -> Dict[str, Any]:
+    """Unpaid vendor invoices due on or before due_by."""
+    pipeline = [
+        {"$match": {"payment_status": "unpaid", "due_date": {"$lte": due_by.isoformat()}}},
+        {"$group": {"_id": None, "total": {"$sum": "$total_amount"}, "count": {"$sum": 1}}},
+    ]
+    docs = await db.vendor_invoices.aggregate(pipeline).to_list(1)
+    return {"total": round(docs[0]["total"], 2) if docs else 0.0, "count": docs[0]["count"] if docs else 0}
+
+
+async def period_report(db, start: date, end: date, granularity: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Totals for [start, end]; with granularity, also one entry per day/month/year
+    from the same aggregation (multi-period comparison in one call).
+    """
+    validate_range(start, end)
+    if granularity and granularity not in GRANULARITIES:
+        raise ValueError(f"group_by must be one of {', '.join(GRANULARITIES)}")
+    rows = await category_totals(db, start, end, granularity)
+    report = summarize(rows)
+    if granularity:
+        by_period: Dict[str, List[Dict[str, Any]]] = {}
+        for r in rows:
+            by_period.setdefault(r["period"], []).append(r)
+        report["periods"] = [{"period": p, **summarize(by_period[p])} for p in sorted(by_period)]
+    return report
+
+
+async def ensure_financial_report_indexes(db):
+    """Create financial report indexes if they don't exist"""
+    try:
+        await db.financial_transactions.create_index(TRANSACTION_REPORT_INDEX, background=True)
+        await db.vendor_invoices.create_index([("payment_status", 1), ("due_date", 1)], background=True)
+        print("[INFO] Financial report indexes ensured for collections financial_transactions, vendor_invoices")
+    except Exception as e:
+        print(f"[WARN] Failed to create financial report indexes: {e}")
@@ -1,18 +1,44 @@
 # backend/utils/forms.py
 from __future__ import annotations
+import csv
+import os
+import time
+import zlib
+from collections import OrderedDict
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
+from io import StringIO
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
 
 FORMS_COLL = "forms"
 SUBMISSIONS_COLL = "form_submissions"
+FORM_VALIDATOR_CACHE_SIZE = int(os.environ.get("FORM_VALIDATOR_CACHE_SIZE", "256"))
+FORM_VALIDATOR_TTL_S = float(os.environ.get("FORM_VALIDATOR_TTL_S", "30"))
+FORMS_BULK_MAX = int(os.environ.get("FORMS_BULK_MAX", "500"))
+# Covered by (form_id, created_at, _id), which exports need for a stable keyset order
+SUPERSEDED_SUBMISSION_INDEXES = ("form_id_1_created_at_-1",)
 
 async def ensure_form_indexes(db):
     """Create form indexes if they don't exist"""
     try:
         await db[FORMS_COLL].create_index([("key", 1)], unique=True, background=True)
         await db[FORMS_COLL].create_index([("status", 1), ("updated_at", -1)], background=True)
-        await db[SUBMISSIONS_COLL].create_index([("form_id", 1), ("created_at", -1)], background=True)
+        await db[SUBMISSIONS_COLL].create_index([("form_id", 1), ("created_at", -1), ("_id", -1)], background=True)
         await db[SUBMISSIONS_COLL].create_index([("form_key", 1), ("created_at", -1)], background=True)
+        existing = await db[SUBMISSIONS_COLL].index_information()
+        for name in SUPERSEDED_SUBMISSION_INDEXES:
+            if name in existing:
+                await db[SUBMISSIONS_COLL].drop_index(name)
+        # Bulk re-syncs rely on this key to turn a repeated client_id into a duplicate-key error
+        client_idx = existing.get("form_id_1_client_id_1")
+        if client_idx and not client_idx.get("unique"):
+            await db[SUBMISSIONS_COLL].drop_index("form_id_1_client_id_1")
+        await db[SUBMISSIONS_COLL].create_index(
+            [("form_id", 1), ("client_id", 1)], unique=True,
+            partialFilterExpression={"client_id": {"$exists": True}}, background=True,
+        )
         print(f"[INFO] Form indexes ensured for collections {FORMS_COLL} and {SUBMISSIONS_COLL}")
     except Exception as e:
         print(f"[WARN] Failed to create form indexes: {e}")
@@ -79,6 +105,96 @@ def validate_schema(schema: Dict[str, Any]) -> Tuple[bool, List[str]]:
     
     return len(errs) == 0, errs
 
+def _coerce_text(val):
+    if val is None:
+        raise ValueError("cannot be null")
+    return str(val).strip()
+
+def _coerce_email(val):
+    val = _coerce_text(val)
+    if val and ("@" not in val or "." not in val):
+        raise ValueError("invalid email format")
+    return val
+
+def _coerce_phone(val):
+    val = _coerce_text(val)
+    # Basic phone validation - allow digits, spaces, dashes, parentheses
+    if val and sum(c.isdigit() for c in val) < 10:
+        raise ValueError("phone number too short")
+    return val
+
+def _coerce_date(val):
+    # Validate ISO date format (YYYY-MM-DD)
+    s = str(val).strip()
+    if len(s) != 10 or s[4] != "-" or s[7] != "-":
+        raise ValueError("must be YYYY-MM-DD format")
+    try:
+        datetime.strptime(s, "%Y-%m-%d")
+    except ValueError:
+        raise ValueError("invalid date")
+    return s
+
+def _option_coercer(options: List[Any]) -> Callable[[Any], str]:
+    allowed = frozenset(str(opt) for opt in options)
+    listing = ", ".join(map(str, options))
+    def coerce(val):
+        s = str(val)
+        if s not in allowed:
+            raise ValueError(f"invalid option '{val}' (allowed: {listing})")
+        return s
+    return coerce
+
+def _unsupported(t: str) -> Callable[[Any], Any]:
+    def coerce(val):
+        raise ValueError(f"unsupported type {t}")
+    return coerce
+
+_COERCERS: Dict[str, Callable[[Any], Any]] = {
+    "text": _coerce_text,
+    "textarea": _coerce_text,
+    "email": _coerce_email,
+    "phone": _coerce_phone,
+    "number": float,
+    "date": _coerce_date,
+    "checkbox": bool,
+}
+
+class SubmissionValidator:
+    """
+    A form schema compiled once: field order, required flags and one coercer per
+    field (option sets for select/radio are built here, not per submission).
+    validate() gives the same results and messages as validate_submission().
+    """
+
+    def __init__(self, schema: Dict[str, Any]):
+        self.fields: Dict[str, Tuple[bool, Callable[[Any], Any]]] = {}
+        for f in schema.get("fields", []):
+            t = f["type"]
+            if t in {"select", "radio"}:
+                coerce = _option_coercer(f.get("options", []))
+            else:
+                coerce = _COERCERS.get(t) or _unsupported(t)
+            self.fields[f["key"]] = (bool(f.get("required", False)), coerce)
+
+    def validate(self, data: Dict[str, Any]) -> Tuple[bool, List[str]]:
+        """Coerces data in place; returns (is_valid, list_of_errors)"""
+        errs: List[str] = []
+        for key, (required, coerce) in self.fields.items():
+            val = data.get(key)
+            if required and (val is None or val == ""):
+                errs.append(f"missing required field '{key}'")
+                continue
+            if val is None:
+                continue
+            try:
+                data[key] = coerce(val)
+            except Exception as e:
+                errs.append(f"field '{key}': {e}")
+        for key in data:
+            if key not in self.fields:
+                errs.append(f"unexpected field '{key}' not in schema")
+        return len(errs) == 0, errs
+
 def validate_submission(schema: Dict[str, Any], data: Dict[str, Any]) -> Tuple[bool, List[str]]:
     """
     Validate form submission data against schema
@@ -86,80 +202,55 @@ def validate_submission(schema: Dict[str, Any], data: Dict[str, Any]) -> Tuple[b
     Returns:
         Tuple of (is_valid, list_of_errors)
     """
-    errs: List[str] = []
-    fields = {f["key"]: f for f in schema.get("fields", [])}
-    
-    # Check all fields in schema
-    for key, cfg in fields.items():
-        required = bool(cfg.get("required", False))
-        
-        # Check required fields
-        if required and (key not in data or data[key] is None or data[key] == ""):
-            errs.append(f"missing required field '{key}'")
-            continue
-        
-        # Skip validation for empty optional fields
-        if key not in data or data[key] is None:
-            continue
-        
-        val = data[key]
-        t = cfg["type"]
-        
-        try:
-            # Type-specific validation and conversion
-            if t in {"text", "textarea", "email", "phone"}:
-                if val is None: 
-                    raise ValueError("cannot be null")
-                data[key] = str(val).strip()
-                
-                # Email validation
-                if t == "email" and data[key]:
-                    if "@" not in data[key] or "." not in data[key]:
-                        raise ValueError("invalid email format")
-                
-                # Phone validation
-                if t == "phone" and data[key]:
-                    # Basic phone validation - allow digits, spaces, dashes, parentheses
-                    cleaned = ''.join(c for c in data[key] if c.isdigit())
-                    if len(cleaned) < 10:
-                        raise ValueError("phone number too short")
-                        
-            elif t == "number":
-                data[key] = float(val)
-                
-            elif t == "date":
-                # Validate ISO date format (YYYY-MM-DD)
-                s = str(val).strip()
-                if len(s) != 10 or s[4] != "-" or s[7] != "-":
-                    raise ValueError("must be YYYY-MM-DD format")
-                # Additional validation
-                try:
-                    datetime.strptime(s, "%Y-%m-%d")
-                    data[key] = s
-                except ValueError:
-                    raise ValueError("invalid date")
-                    
-            elif t == "checkbox":
-                data[key] = bool(val)
-                
-            elif t in {"select", "radio"}:
-                opts = cfg.get("options", [])
-                if str(val) not in [str(opt) for opt in opts]:
-                    raise ValueError(f"invalid option '{val}' (allowed: {', '.join(map(str, opts))})")
-                data[key] = str(val)
-                
-            else:
-                raise ValueError(f"unsupported type {t}")
-                
-        except Exception as e:
-            errs.append(f"field '{key}': {e}")
-    
-    # Check for extra fields not in schema
-    for key in data:
-        if key not in fields:
-            errs.append(f"unexpected field '{key}' not in schema")
-    
-    return len(errs) == 0, errs
+    return SubmissionValidator(schema).validate(data)
+
+class CompiledForm:
+    """A form document together with its compiled validator, as of one (form_id, version)."""
+
+    def __init__(self, form: Dict[str, Any]):
+        self.form = form
+        self.form_id = str(form["_id"])
+        self.version = form.get("version")
+        self.validator = SubmissionValidator(form.get("schema") or {})
+
+class FormValidatorCache:
+    """
+    LRU of CompiledForm keyed by the id or key a client submits to. Entries are
+    dropped by invalidate() when a form is saved, published or deleted in this
+    process; FORM_VALIDATOR_TTL_S bounds staleness for edits made on other workers.
+    """
+
+    def __init__(self, max_size: int = FORM_VALIDATOR_CACHE_SIZE, ttl_s: float = FORM_VALIDATOR_TTL_S):
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self._items: "OrderedDict[str, Tuple[CompiledForm, float]]" = OrderedDict()
+
+    async def get(self, form_ref: str, loader: Callable[[], Awaitable[Optional[Dict[str, Any]]]]) -> Optional[CompiledForm]:
+        item = self._items.get(form_ref)
+        if item and item[1] > time.monotonic():
+            self._items.move_to_end(form_ref)
+            return item[0]
+        form = await loader()
+        if not form:
+            self._items.pop(form_ref, None)
+            return None
+        compiled = CompiledForm(form)
+        self._items[form_ref] = (compiled, time.monotonic() + self.ttl_s)
+        self._items.move_to_end(form_ref)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+        return compiled
+
+    def invalidate(self, form: Optional[Dict[str, Any]] = None):
+        if form is None:
+            self._items.clear()
+            return
+        form_id, key = str(form.get("_id")), form.get("key")
+        for ref in [r for r, (c, _) in self._items.items() if c.form_id == form_id or r in (form_id, key)]:
+            del self._items[ref]
+
+# Process-wide compiled validators behind the submit endpoints
+form_validators = FormValidatorCache()
 
 def csv_headers_for(schema: Dict[str, Any]) -> List[str]:
     """Get CSV headers from form schema"""
@@ -195,6 +286,84 @@ def flatten_submission(schema: Dict[str, Any], sub: Dict[str, Any]) -> Dict[str,
     
     return row
 
+async def insert_submissions(db, docs: List[Dict[str, Any]]) -> Tuple[List[str], List[int]]:
+    """
+    insert_many(ordered=False) for a bulk submit: (inserted ids, positions in `docs` rejected
+    by the unique (form_id, client_id) index, i.e. already stored by an overlapping retry).
+    """
+    duplicates: List[int] = []
+    try:
+        await db[SUBMISSIONS_COLL].insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors") or []
+        if any(err.get("code") != 11000 for err in errors):
+            raise
+        duplicates = sorted(err["index"] for err in errors)
+    skip = set(duplicates)
+    return [str(d["_id"]) for i, d in enumerate(docs) if i not in skip], duplicates
+
+def plan_submissions_export(form_id: str, since: Optional[str] = None, until: Optional[str] = None,
+                            order: str = "desc", after_created_at: Optional[str] = None,
+                            after_id: Optional[str] = None) -> Tuple[Dict[str, Any], List[Tuple[str, int]]]:
+    """
+    (query, sort) for a submissions export in (created_at, _id) order. A resumed export passes
+    the last received row's _created_at and _id; rows sharing that timestamp (a bulk submit
+    stamps one time on the whole batch) are split on _id, so none repeat or go missing.
+    """
+    q: Dict[str, Any] = {"form_id": form_id}
+    created: Dict[str, Any] = {}
+    if since:
+        created["$gte"] = since
+    if until:
+        created["$lt"] = until
+    if created:
+        q["created_at"] = created
+    if (after_created_at is None) != (after_id is None):
+        raise ValueError("after_created_at and after_id must be given together")
+    op = "$gt" if order == "asc" else "$lt"
+    if after_created_at is not None:
+        last_id: Any = ObjectId(after_id) if ObjectId.is_valid(after_id) else after_id
+        q["$or"] = [{"created_at": {op: after_created_at}}, {"created_at": after_created_at, "_id": {op: last_id}}]
+    direction = 1 if order == "asc" else -1
+    return q, [("created_at", direction), ("_id", direction)]
+
+CSV_META_HEADERS = ["_id", "_created_at", "_form_version", "_created_by"]
+
+async def iter_submissions_csv(cursor, schema: Dict[str, Any], batch_size: int = 1000,
+                               gzip: bool = False, counter: Optional[Dict[str, int]] = None) -> AsyncIterator[bytes]:
+    """
+    Stream a submissions cursor as CSV, one encoded chunk per `batch_size` rows.
+    Memory stays bounded by one batch; with gzip=True chunks are a single gzip member.
+    `counter["rows"]` is updated as rows are written.
+    """
+    buf = StringIO()
+    writer = csv.DictWriter(buf, fieldnames=csv_headers_for(schema) + CSV_META_HEADERS)
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+    counter = counter if counter is not None else {}
+    counter.setdefault("rows", 0)
+
+    def drain() -> bytes:
+        chunk = buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+        return gz.compress(chunk) if gz else chunk
+
+    writer.writeheader()
+    yield drain()
+    pending = 0
+    async for submission in cursor:
+        writer.writerow(flatten_submission(schema, submission))
+        counter["rows"] += 1
+        pending += 1
+        if pending >= batch_size:
+            pending = 0
+            yield drain()
+    tail = drain()
+    if gz:
+        tail += gz.flush()
+    if tail:
+        yield tail
+
 def get_field_display_value(field_config: Dict[str, Any], value: Any) -> str:
     """
     Get display-friendly value for a form field
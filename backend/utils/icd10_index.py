@@ -0,0 +1,165 @@
+# backend/utils/icd10_index.py
+from __future__ import annotations
+import asyncio
+import heapq
+import os
+import re
+import time
+from array import array
+from bisect import bisect_left
+from itertools import islice
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+ICD10_COLL = "icd10_codes"
+ICD10_INDEX_TTL_S = int(os.environ.get("ICD10_INDEX_TTL_S", "600"))
+# Word-prefix candidates scored for a 1-2 character query once code-prefix hits are exhausted
+ICD10_SHORT_QUERY_CANDIDATES = int(os.environ.get("ICD10_SHORT_QUERY_CANDIDATES", "500"))
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_SEP = "\x00"  # never appears in a query, so no trigram spans two fields
+
+
+def relevance_score(query_lower: str, code: Dict[str, Any]) -> int:
+    """Relevance tiers used by /icd10/search (100 = exact code ... 30 = category/other)."""
+    code_l = code["code"].lower()
+    desc_l = code["description"].lower()
+    terms = [t.lower() for t in code.get("search_terms", [])]
+    if query_lower == code_l:
+        return 100
+    if code_l.startswith(query_lower):
+        return 90
+    if desc_l.startswith(query_lower):
+        return 80
+    if any(t.startswith(query_lower) for t in terms):
+        return 70
+    if query_lower in desc_l:
+        return 60
+    if any(query_lower in t for t in terms):
+        return 50
+    return 30
+
+
+def _trigrams(text: str):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class _IndexState(NamedTuple):
+    docs: List[Dict[str, Any]]
+    fields: List[Tuple[str, ...]]
+    codes: List[Tuple[str, int]]
+    tokens: List[Tuple[str, int]]
+    grams: Dict[str, array]
+
+
+_EMPTY = _IndexState([], [], [], [], {})
+
+
+class ICD10SearchIndex:
+    """
+    In-process search index over icd10_codes.
+
+    - code prefix: codes kept sorted so a prefix is one bisect range (a flattened trie)
+    - token prefix: sorted (token, doc) pairs from description/category/search terms
+    - trigram inverted index: substring candidates for queries of 3+ characters,
+      verified against the original fields so results match the old $regex search
+
+    Candidates are scored with relevance_score before truncating to `limit`;
+    1-2 character queries stop at `limit` code-prefix hits (they outrank every
+    word match) and otherwise score at most ICD10_SHORT_QUERY_CANDIDATES words.
+
+    build() runs in a worker thread and swaps in one immutable state, so a
+    refresh after the TTL happens in the background while searches keep
+    answering from the previous index.
+    """
+
+    def __init__(self, ttl_s: int = ICD10_INDEX_TTL_S):
+        self.ttl_s = ttl_s
+        self.loaded_at: Optional[float] = None
+        self._state = _EMPTY
+        self._lock = asyncio.Lock()  # one load at a time
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._state.docs)
+
+    def build(self, codes: List[Dict[str, Any]]):
+        docs, fields, code_keys, token_keys = [], [], [], []
+        grams: Dict[str, List[int]] = {}
+        for n, c in enumerate(codes):
+            c = {k: v for k, v in c.items() if k != "_id"}
+            code_l = str(c.get("code", "")).lower()
+            desc_l = str(c.get("description", "")).lower()
+            cat_l = str(c.get("category", "")).lower()
+            terms_l = tuple(str(t).lower() for t in c.get("search_terms", []) or [])
+            docs.append(c)
+            fields.append((code_l, desc_l, cat_l) + terms_l)
+            code_keys.append((code_l, n))
+            for tok in set(_TOKEN_RE.findall(" ".join((desc_l, cat_l) + terms_l))):
+                token_keys.append((tok, n))
+            for g in _trigrams(_SEP.join(fields[-1])):
+                grams.setdefault(g, []).append(n)
+
+        code_keys.sort()
+        token_keys.sort()
+        # One assignment swaps the whole index, so readers see either the old or the new one
+        self._state = _IndexState(docs, fields, code_keys, token_keys,
+                                  {g: array("I", ids) for g, ids in grams.items()})
+        self.loaded_at = time.monotonic()
+
+    async def _load(self, db) -> int:
+        codes = await db[ICD10_COLL].find({}, {"_id": 0}).to_list(None)
+        await asyncio.to_thread(self.build, codes)
+        return len(codes)
+
+    async def load(self, db) -> int:
+        async with self._lock:
+            return await self._load(db)
+
+    async def _refresh(self, db):
+        try:
+            await self.load(db)
+        except Exception as e:
+            print(f"[WARN] ICD-10 index refresh failed, still serving the previous index: {e}")
+
+    async def ensure_loaded(self, db):
+        """Load on first use (callers wait for one shared load); after the TTL, refresh in the background"""
+        if self.loaded_at is None:
+            async with self._lock:
+                if self.loaded_at is None:
+                    await self._load(db)
+        elif time.monotonic() - self.loaded_at > self.ttl_s:
+            if self._refresh_task is None or self._refresh_task.done():
+                self._refresh_task = asyncio.get_running_loop().create_task(self._refresh(db))
+
+    @staticmethod
+    def _prefix_range(keys: List[Tuple[str, int]], prefix: str):
+        i = bisect_left(keys, (prefix, -1))
+        while i < len(keys) and keys[i][0].startswith(prefix):
+            yield keys[i][1]
+            i += 1
+
+    @staticmethod
+    def _candidates(state: _IndexState, q: str, limit: int) -> set:
+        if len(q) >= 3:
+            postings = [state.grams.get(g) for g in _trigrams(q)]
+            if any(p is None for p in postings):
+                return set()
+            rarest = min(postings, key=len)
+            return {n for n in rarest if any(q in f for f in state.fields[n])}
+        # 1-2 characters: code prefix (scores 90-100, in code order) before any word prefix
+        found = set(islice(ICD10SearchIndex._prefix_range(state.codes, q), limit))
+        if len(found) < limit:
+            found.update(islice(ICD10SearchIndex._prefix_range(state.tokens, q), ICD10_SHORT_QUERY_CANDIDATES))
+        return found
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        q = (query or "").strip().lower()
+        if not q or limit <= 0:
+            return []
+        state = self._state
+        scored = ((-relevance_score(q, state.docs[n]), state.fields[n][0], n) for n in self._candidates(state, q, limit))
+        return [dict(state.docs[n]) for _, _, n in heapq.nsmallest(limit, scored)]
+
+
+# Process-wide index behind /icd10/search
+icd10_index = ICD10SearchIndex()
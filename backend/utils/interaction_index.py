@@ -0,0 +1,88 @@
+# backend/utils/interaction_index.py
+from __future__ import annotations
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+INTERACTIONS_COLL = "drug_interactions"
+# Safety net for edits made by other workers; local writers call load() directly
+INTERACTION_INDEX_TTL_S = int(os.environ.get("INTERACTION_INDEX_TTL_S", "300"))
+
+def pair_key(a: str, b: str) -> Tuple[str, str]:
+    return (a, b) if a <= b else (b, a)
+
+class DrugInteractionIndex:
+    """
+    In-memory symmetric interaction matrix: sorted (drug_id, drug_id) -> interaction doc.
+    Loaded at startup, reloaded after drug_interactions is reseeded, and at most
+    INTERACTION_INDEX_TTL_S stale otherwise.
+    """
+
+    def __init__(self, ttl_s: int = INTERACTION_INDEX_TTL_S):
+        self.ttl_s = ttl_s
+        self.pairs: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.loaded_at: Optional[float] = None
+
+    async def load(self, db) -> int:
+        pairs = {}
+        async for doc in db[INTERACTIONS_COLL].find({}, {"_id": 0}):
+            a, b = doc.get("drug1_id"), doc.get("drug2_id")
+            if a and b:
+                pairs[pair_key(a, b)] = doc
+        self.pairs = pairs  # swap in one step so readers never see a half-built map
+        self.loaded_at = time.monotonic()
+        return len(pairs)
+
+    async def ensure_loaded(self, db):
+        if self.loaded_at is None or time.monotonic() - self.loaded_at > self.ttl_s:
+            await self.load(db)
+
+    def lookup(self, a: str, b: str) -> Optional[Dict[str, Any]]:
+        if not a or not b or a == b:
+            return None
+        return self.pairs.get(pair_key(a, b))
+
+    def check_against(self, new_id: str, current: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Alerts for one new drug against current prescriptions (dicts with medication_id/medication_display)."""
+        alerts = []
+        for rx in current:
+            interaction = self.lookup(rx.get("medication_id"), new_id)
+            if interaction:
+                alerts.append(_alert(interaction, f"Interaction with {rx.get('medication_display')}"))
+        return alerts
+
+    def check_regimen(self, new_ids: List[str], current: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Alerts for N proposed drugs against each other and against current prescriptions."""
+        alerts = []
+        unique = list(dict.fromkeys(i for i in new_ids if i))
+        for n, a in enumerate(unique):
+            for b in unique[n + 1:]:
+                interaction = self.lookup(a, b)
+                if interaction:
+                    alerts.append({
+                        **_alert(interaction, f"Interaction between {interaction.get('drug1_name')} and {interaction.get('drug2_name')}"),
+                        "between": "proposed",
+                        "drug_ids": [a, b],
+                    })
+            for rx in current:
+                interaction = self.lookup(rx.get("medication_id"), a)
+                if interaction:
+                    alerts.append({
+                        **_alert(interaction, f"Interaction with {rx.get('medication_display')}"),
+                        "between": "current",
+                        "drug_ids": [a, rx.get("medication_id")],
+                    })
+        return alerts
+
+def _alert(interaction: Dict[str, Any], message: str) -> Dict[str, Any]:
+    return {
+        "type": "drug_interaction",
+        "severity": interaction.get("severity"),
+        "message": message,
+        "description": interaction.get("description"),
+        "clinical_consequence": interaction.get("clinical_consequence"),
+        "management": interaction.get("management_recommendation"),
+    }
+
+# Process-wide index used by the eRx endpoints
+interaction_index = DrugInteractionIndex()
@@ -0,0 +1,174 @@
+# backend/utils/inventory_stock.py
+from __future__ import annotations
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence
+
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure, PyMongoError
+
+INVENTORY_TXN_ATTEMPTS = int(os.environ.get("INVENTORY_TXN_ATTEMPTS", "3"))  # tries per batch on TransientTransactionError
+# A pending ledger row younger than this may still be settled by the request that wrote it
+INVENTORY_PENDING_GRACE_S = int(os.environ.get("INVENTORY_PENDING_GRACE_S", "300"))
+
+# Without transactions a ledger row is written first carrying PENDING_FIELD ({floor, at}); each stock update
+# records the ledger id in the item's APPLIED_FIELD so replaying it is a no-op, and both are cleared once settled
+PENDING_FIELD = "stock_pending"
+APPLIED_FIELD = "applied_ledger"
+
+# Server-side recomputation of the materialized flag, so it can never disagree with the stock it was derived from
+_LOW_STOCK_PIPELINE = [{"$set": {"low_stock": {"$lte": ["$current_stock", "$min_stock_level"]}}}]
+
+
+async def ensure_inventory_indexes(db):
+    """Create inventory indexes if they don't exist"""
+    try:
+        await db.inventory.create_index([("low_stock", 1)], background=True)
+        await db.inventory_transactions.create_index([(f"{PENDING_FIELD}.at", 1)], sparse=True, background=True)
+        print("[INFO] Inventory indexes ensured for collections inventory, inventory_transactions")
+    except Exception as e:
+        print(f"[WARN] Failed to create inventory indexes: {e}")
+
+
+async def refresh_low_stock(db, item_ids: Iterable[str]):
+    """Recompute inventory.low_stock for items whose stock or minimum level just changed."""
+    ids = [i for i in item_ids if i]
+    if ids:
+        await db.inventory.update_many({"id": {"$in": ids}}, _LOW_STOCK_PIPELINE)
+
+
+async def backfill_low_stock(db) -> int:
+    """Stamp low_stock on items written before the flag existed."""
+    res = await db.inventory.update_many({"low_stock": {"$exists": False}}, _LOW_STOCK_PIPELINE)
+    return res.modified_count
+
+
+async def count_low_stock(db) -> int:
+    return await db.inventory.count_documents({"low_stock": True})
+
+
+def _stock_update(row: Mapping[str, Any], now: str, floor: Optional[int], guarded: bool = False) -> UpdateOne:
+    """
+    One ledger row as a single atomic pipeline update: the new level is computed
+    from the stored one (never read-modify-write in Python) and low_stock is
+    recomputed in the same write. guarded makes it apply at most once per
+    ledger id (the id is kept in APPLIED_FIELD until the row is settled).
+    """
+    qty = int(row["quantity"])
+    kind = row["transaction_type"]
+    if kind == "adjustment":
+        level: Any = qty
+    elif kind in ("in", "out"):
+        level = {"$add": ["$current_stock", qty if kind == "in" else -qty]}
+        if floor is not None:
+            level = {"$max": [floor, level]}
+    else:
+        raise ValueError(f"Unknown inventory transaction type: {kind}")
+    where: Dict[str, Any] = {"id": row["item_id"]}
+    stage: Dict[str, Any] = {"current_stock": level, "updated_at": now}
+    if guarded:
+        where[APPLIED_FIELD] = {"$ne": row["id"]}
+        stage[APPLIED_FIELD] = {"$concatArrays": [{"$ifNull": [f"${APPLIED_FIELD}", []]}, [row["id"]]]}
+    return UpdateOne(where, [{"$set": stage}] + _LOW_STOCK_PIPELINE)
+
+
+_txn_supported: Optional[bool] = None  # learned on first use; standalone mongod has no transactions
+
+
+async def _levels(db, ids: List[str], session=None) -> Dict[str, int]:
+    return {
+        d["id"]: d.get("current_stock", 0)
+        async for d in db.inventory.find({"id": {"$in": ids}}, {"_id": 0, "id": 1, "current_stock": 1}, session=session)
+    }
+
+
+async def _write_batch(db, ops: List[UpdateOne], rows: List[Dict[str, Any]], ids: List[str], session) -> Dict[str, int]:
+    """Inside a transaction: stock updates, then ledger rows for the items that exist"""
+    await db.inventory.bulk_write(ops, ordered=True, session=session)
+    levels = await _levels(db, ids, session)
+    ledger = [r for r in rows if r["item_id"] in levels]
+    if ledger:
+        await db.inventory_transactions.insert_many(ledger, ordered=False, session=session)
+    return levels
+
+
+async def _settle(db, ledger: List[Dict[str, Any]], now: str):
+    """Apply pending ledger rows' stock updates (at most once each), then clear the pending state"""
+    ops = [_stock_update(r, now, r[PENDING_FIELD].get("floor"), guarded=True) for r in ledger]
+    await db.inventory.bulk_write(ops, ordered=True)
+    ledger_ids = [r["id"] for r in ledger]
+    await db.inventory_transactions.update_many({"id": {"$in": ledger_ids}}, {"$unset": {PENDING_FIELD: ""}})
+    await db.inventory.update_many({"id": {"$in": sorted({r["item_id"] for r in ledger})}},
+                                   {"$pull": {APPLIED_FIELD: {"$in": ledger_ids}}})
+
+
+async def _write_batch_standalone(db, rows: List[Dict[str, Any]], ids: List[str], floor: Optional[int],
+                                  now: str) -> Dict[str, int]:
+    """
+    Without a transaction: ledger rows go in first as pending, so a batch cut
+    short after that point is finished by finish_pending_inventory instead of
+    leaving stock changes with no ledger row.
+    """
+    known = await _levels(db, ids)
+    ledger = [{**r, PENDING_FIELD: {"floor": floor, "at": now}} for r in rows if r["item_id"] in known]
+    if not ledger:
+        return known
+    await db.inventory_transactions.insert_many(ledger, ordered=False)
+    await _settle(db, ledger, now)
+    return await _levels(db, ids)
+
+
+async def finish_pending_inventory(db, grace_s: int = INVENTORY_PENDING_GRACE_S) -> int:
+    """Settle ledger rows an interrupted standalone batch left pending for longer than grace_s; returns the count"""
+    cutoff = (datetime.utcnow() - timedelta(seconds=grace_s)).isoformat()
+    settled = 0
+    while True:
+        ledger = await db.inventory_transactions.find(
+            {f"{PENDING_FIELD}.at": {"$lte": cutoff}}, {"_id": 0}
+        ).to_list(1000)
+        if not ledger:
+            return settled
+        await _settle(db, ledger, datetime.utcnow().isoformat())
+        settled += len(ledger)
+
+
+async def apply_inventory_transactions(db, rows: Sequence[Dict[str, Any]], floor: Optional[int] = None) -> Dict[str, int]:
+    """
+    Apply ledger rows (jsonable InventoryTransaction dicts: item_id,
+    transaction_type in/out/adjustment, quantity) as one batch: a single
+    bulk_write of atomic stock updates and one insert_many into
+    inventory_transactions, inside a transaction where the deployment supports
+    one (retried on TransientTransactionError). Elsewhere the ledger rows are
+    written first as pending and each stock update applies once per ledger id.
+    floor clamps out-movements (invoice deductions never go below 0).
+
+    Returns {item_id: current_stock after the batch} for the items that exist;
+    rows for unknown items change nothing and are not recorded.
+    """
+    global _txn_supported
+    rows = [r for r in rows if r.get("item_id")]
+    if not rows:
+        return {}
+    now = datetime.utcnow().isoformat()
+    ops = [_stock_update(r, now, floor) for r in rows]
+    ids = sorted({r["item_id"] for r in rows})
+
+    client = getattr(db, "client", None)
+    attempt = 0
+    while client is not None and _txn_supported is not False:
+        attempt += 1
+        try:
+            async with await client.start_session() as session:
+                async with session.start_transaction():
+                    levels = await _write_batch(db, ops, rows, ids, session)
+            _txn_supported = True
+            return levels
+        except PyMongoError as e:
+            if e.has_error_label("TransientTransactionError") and attempt < INVENTORY_TXN_ATTEMPTS:
+                print(f"[WARN] Inventory ledger transaction aborted, retrying ({attempt}/{INVENTORY_TXN_ATTEMPTS}): {e}")
+                continue
+            if not isinstance(e, OperationFailure) or (e.code != 20 and "replica set" not in str(e)):
+                raise  # 20 = IllegalOperation on standalone
+            _txn_supported = False
+            print("[INFO] Inventory ledger: no transaction support, writing ledger rows as pending first")
+    return await _write_batch_standalone(db, rows, ids, floor, now)
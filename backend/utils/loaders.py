@@ -0,0 +1,91 @@
+# backend/utils/loaders.py
+from __future__ import annotations
+import asyncio
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+
+class BatchLoader:
+    """
+    Request-scoped batching loader (DataLoader style) over one collection.
+
+    load(k) calls made in the same event-loop tick are coalesced into a single
+    `{key: {"$in": [...]}}` query; every key is fetched at most once per loader.
+    With many=False a key resolves to one document (or None); with many=True it
+    resolves to the list of documents sharing that key (e.g. invoices by encounter_id).
+
+    Sequential `await load()` calls in a for-loop still run one query each, so
+    prefetch with load_many() over the page first, then read rows from the cache.
+    """
+
+    def __init__(self, db, collection: str, key: str = "id", projection: Optional[Mapping[str, Any]] = None,
+                 filter: Optional[Mapping[str, Any]] = None, many: bool = False):
+        self.db = db
+        self.collection = collection
+        self.key = key
+        self.projection = dict(projection) if projection else {"_id": 0}
+        self.projection.setdefault("_id", 0)
+        if len(self.projection) > 1 and not self.projection.get(key):
+            self.projection[key] = 1
+        self.filter = dict(filter or {})
+        self.many = many
+        self._cache: Dict[Any, asyncio.Future] = {}
+        self._queue: List[Any] = []
+
+    async def load(self, k: Any):
+        if k in self._cache:
+            return await self._cache[k]
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._cache[k] = fut
+        self._queue.append(k)
+        if len(self._queue) == 1:
+            loop.call_soon(lambda: loop.create_task(self._dispatch()))
+        return await fut
+
+    async def load_many(self, keys: Iterable[Any]) -> List[Any]:
+        return list(await asyncio.gather(*(self.load(k) for k in keys)))
+
+    def prime(self, k: Any, value: Any):
+        if k not in self._cache:
+            fut = asyncio.get_running_loop().create_future()
+            fut.set_result(value)
+            self._cache[k] = fut
+
+    async def _dispatch(self):
+        keys, self._queue = self._queue, []
+        try:
+            found: Dict[Any, Any] = {}
+            query = {**self.filter, self.key: {"$in": keys}}
+            async for doc in self.db[self.collection].find(query, self.projection):
+                k = doc.get(self.key)
+                if self.many:
+                    found.setdefault(k, []).append(doc)
+                else:
+                    found.setdefault(k, doc)
+            for k in keys:
+                fut = self._cache[k]
+                if not fut.done():
+                    fut.set_result(found.get(k, [] if self.many else None))
+        except Exception as e:
+            for k in keys:
+                fut = self._cache.pop(k, None)
+                if fut and not fut.done():
+                    fut.set_exception(e)
+
+
+class Loaders:
+    """Per-request registry so endpoints share one loader per (collection, key, filter)."""
+
+    def __init__(self, db):
+        self.db = db
+        self._loaders: Dict[tuple, BatchLoader] = {}
+
+    def get(self, collection: str, key: str = "id", projection: Optional[Mapping[str, Any]] = None,
+            filter: Optional[Mapping[str, Any]] = None, many: bool = False) -> BatchLoader:
+        ident = (collection, key, repr(sorted((projection or {}).items())), repr(sorted((filter or {}).items())), many)
+        if ident not in self._loaders:
+            self._loaders[ident] = BatchLoader(self.db, collection, key, projection, filter, many)
+        return self._loaders[ident]
+
+    def patients(self) -> BatchLoader:
+        return self.get("patients")
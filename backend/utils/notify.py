@@ -1,9 +1,16 @@
 # backend/utils/notify.py
 from __future__ import annotations
+import asyncio
+from collections import Counter
 from datetime import datetime
-from typing import Any, Mapping, Optional
+from typing import Any, Dict, Mapping, Optional
+
+from pymongo import UpdateOne
+
+from .push import publish_many_safely, publish_safely
 
 NOTIF_COLL = "notifications"
+COUNTERS_COLL = "notification_counters"  # one {user_id, total, unread} document per user
 
 async def ensure_notification_indexes(db):
     """Create notification indexes if they don't exist"""
@@ -12,10 +19,56 @@ async def ensure_notification_indexes(db):
         await db[NOTIF_COLL].create_index([("user_id", 1), ("read", 1), ("ts", -1)], background=True)
         await db[NOTIF_COLL].create_index([("type", 1), ("ts", -1)], background=True)
         await db[NOTIF_COLL].create_index([("subject_type", 1), ("subject_id", 1), ("ts", -1)], background=True)
+        await db[COUNTERS_COLL].create_index([("user_id", 1)], unique=True, background=True)
         print(f"[INFO] Notification indexes ensured for collection {NOTIF_COLL}")
     except Exception as e:
         print(f"[WARN] Failed to create notification indexes: {e}")
 
+async def _count_from_source(db, user_id: str) -> Dict[str, int]:
+    total, unread = await asyncio.gather(
+        db[NOTIF_COLL].count_documents({"user_id": user_id}),
+        db[NOTIF_COLL].count_documents({"user_id": user_id, "read": False}),
+    )
+    return {"total": total, "unread": unread}
+
+async def _seed_counter(db, user_id: str):
+    await db[COUNTERS_COLL].update_one({"user_id": user_id}, {"$set": await _count_from_source(db, user_id)})
+
+async def _bump_counters(db, deltas: Mapping[str, Mapping[str, int]]):
+    """
+    Apply {user_id: {"total": n, "unread": m}} increments in one bulk write.
+    A counter the upsert just created holds only this delta, so that user
+    (who may have notifications from before counters) is counted from the source.
+    """
+    users = [uid for uid, inc in deltas.items() if uid and any(inc.values())]
+    if not users:
+        return
+    ops = [UpdateOne({"user_id": uid}, {"$inc": dict(deltas[uid])}, upsert=True) for uid in users]
+    try:
+        result = await db[COUNTERS_COLL].bulk_write(ops, ordered=False)
+        await asyncio.gather(*(_seed_counter(db, users[i]) for i in (result.upserted_ids or {})))
+    except Exception as e:
+        # The counter only drifts; rebuild_counters() brings it back in line
+        print(f"[WARN] Failed to update notification counters: {e}")
+
+def _notification_doc(user_id, type, title, body, subject_type, subject_id, severity, meta, ts) -> Dict[str, Any]:
+    return {
+        "ts": ts,
+        "user_id": user_id,
+        "type": type,
+        "title": title[:140],  # Truncate title to reasonable length
+        "body": body[:3000],   # Truncate body to reasonable length
+        "subject_type": subject_type,
+        "subject_id": subject_id,
+        "severity": severity,
+        "meta": dict(meta or {}),
+        "read": False,
+        "read_ts": None,
+    }
+
+def _push_payload(doc: Mapping[str, Any]) -> Dict[str, Any]:
+    return {**doc, "_id": str(doc["_id"])} if "_id" in doc else dict(doc)
+
 async def notify_user(
     db,
     *,
@@ -27,26 +80,20 @@ async def notify_user(
     subject_id: Optional[str] = None,
     severity: str = "info",  # info | warning | error | success
     meta: Optional[Mapping[str, Any]] = None,
+    fields: Optional[Mapping[str, Any]] = None,
 ):
     """
-    Create a notification for a specific user
+    Create a notification for a specific user; `fields` are extra top-level
+    fields stored alongside (the legacy /api/notifications shape)
     """
-    doc = {
-        "ts": datetime.utcnow().isoformat(),
-        "user_id": user_id,
-        "type": type,
-        "title": title[:140],  # Truncate title to reasonable length
-        "body": body[:3000],   # Truncate body to reasonable length
-        "subject_type": subject_type,
-        "subject_id": subject_id,
-        "severity": severity,
-        "meta": dict(meta or {}),
-        "read": False,
-        "read_ts": None,
-    }
+    doc = _notification_doc(user_id, type, title, body, subject_type, subject_id, severity, meta,
+                            datetime.utcnow().isoformat())
+    doc.update({k: v for k, v in (fields or {}).items() if k not in doc})
     
     try:
         await db[NOTIF_COLL].insert_one(doc)
+        await _bump_counters(db, {user_id: {"total": 1, "unread": 1}})
+        await publish_safely("notifications", _push_payload(doc), user_id=user_id, type="notification.created")
         return doc
     except Exception as e:
         print(f"[ERROR] Failed to create notification: {e}")
@@ -56,17 +103,35 @@ async def notify_many(
     db,
     *,
     user_ids: list[str],
-    **kwargs
+    type: str,
+    title: str,
+    body: str,
+    subject_type: Optional[str] = None,
+    subject_id: Optional[str] = None,
+    severity: str = "info",
+    meta: Optional[Mapping[str, Any]] = None,
 ):
     """
-    Create notifications for multiple users
+    Create notifications for multiple users: one insert_many for the documents
+    and one bulk write for the recipients' counters
     """
-    out = []
-    for uid in user_ids:
-        doc = await notify_user(db, user_id=uid, **kwargs)
-        if doc:
-            out.append(doc)
-    return out
+    ts = datetime.utcnow().isoformat()
+    docs = [
+        _notification_doc(uid, type, title, body, subject_type, subject_id, severity, meta, ts)
+        for uid in user_ids
+    ]
+    if not docs:
+        return []
+    try:
+        await db[NOTIF_COLL].insert_many(docs, ordered=False)
+    except Exception as e:
+        print(f"[ERROR] Failed to create notifications: {e}")
+        return []
+    per_user = Counter(user_ids)
+    await _bump_counters(db, {uid: {"total": n, "unread": n} for uid, n in per_user.items()})
+    await publish_many_safely("notifications", [(d["user_id"], _push_payload(d)) for d in docs],
+                              type="notification.created")
+    return docs
 
 async def mark_read(db, notif_id: Any, user_id: str):
     """
@@ -83,10 +148,15 @@ async def mark_read(db, notif_id: Any, user_id: str):
                 pass
         
         ts = datetime.utcnow().isoformat()
-        await db[NOTIF_COLL].update_one(
-            {"_id": notif_id, "user_id": user_id}, 
+        result = await db[NOTIF_COLL].update_one(
+            {"_id": notif_id, "user_id": user_id, "read": False}, 
             {"$set": {"read": True, "read_ts": ts}}
         )
+        if result.modified_count:
+            await _bump_counters(db, {user_id: {"unread": -1}})
+            # other open tabs of this user drop the badge without polling
+            await publish_safely("notifications", {"_id": str(notif_id), "read_ts": ts},
+                                 user_id=user_id, type="notification.read")
         return await db[NOTIF_COLL].find_one({"_id": notif_id, "user_id": user_id})
     except Exception as e:
         print(f"[ERROR] Failed to mark notification as read: {e}")
@@ -102,18 +172,85 @@ async def mark_all_read(db, user_id: str):
             {"user_id": user_id, "read": False}, 
             {"$set": {"read": True, "read_ts": ts}}
         )
+        # Decrement by what was actually flipped, so notifications arriving meanwhile stay unread
+        await _bump_counters(db, {user_id: {"unread": -result.modified_count}})
+        if result.modified_count:
+            await publish_safely("notifications", {"count": result.modified_count, "read_ts": ts},
+                                 user_id=user_id, type="notification.read_all")
         return {"updated": True, "count": result.modified_count}
     except Exception as e:
         print(f"[ERROR] Failed to mark all notifications as read: {e}")
         return {"updated": False, "count": 0}
 
+async def delete_notification(db, notif_id: Any, user_id: str):
+    """
+    Delete a notification; returns the deleted document or None
+    """
+    doc = await db[NOTIF_COLL].find_one_and_delete({"_id": notif_id, "user_id": user_id})
+    if doc:
+        await _bump_counters(db, {user_id: {"total": -1, "unread": 0 if doc.get("read") else -1}})
+    return doc
+
+async def get_counts(db, user_id: str) -> Dict[str, int]:
+    """
+    Total and unread counts for a user: a single point read of the counter
+    document. A user without one (notifications that predate counters) is
+    counted from the source once and seeded.
+    """
+    doc = await db[COUNTERS_COLL].find_one({"user_id": user_id}, {"_id": 0, "total": 1, "unread": 1})
+    if doc is None:
+        counts = await _count_from_source(db, user_id)
+        await db[COUNTERS_COLL].update_one({"user_id": user_id}, {"$setOnInsert": counts}, upsert=True)
+        return counts
+    return {"total": max(int(doc.get("total", 0)), 0), "unread": max(int(doc.get("unread", 0)), 0)}
+
 async def get_unread_count(db, user_id: str):
     """
     Get count of unread notifications for a user
     """
     try:
-        count = await db[NOTIF_COLL].count_documents({"user_id": user_id, "read": False})
-        return count
+        return (await get_counts(db, user_id))["unread"]
     except Exception as e:
         print(f"[ERROR] Failed to get unread count: {e}")
-        return 0
\ No newline at end of file
+        return 0
+
+async def rebuild_counters(db) -> Dict[str, int]:
+    """
+    Recompute every user's counter from the notifications collection.
+    Same as: python -m backend.utils.notify --rebuild-counters
+
+    Counters are replaced in place by one $merge, so get_counts() keeps reading
+    them throughout; users left without notifications are zeroed afterwards.
+    """
+    started = datetime.utcnow()
+    await db[NOTIF_COLL].aggregate([
+        {"$group": {
+            "_id": "$user_id",
+            "total": {"$sum": 1},
+            "unread": {"$sum": {"$cond": [{"$eq": ["$read", False]}, 1, 0]}},
+        }},
+        {"$match": {"_id": {"$ne": None}}},
+        {"$project": {"_id": 0, "user_id": "$_id", "total": 1, "unread": 1, "rebuilt_at": {"$literal": started}}},
+        {"$merge": {"into": COUNTERS_COLL, "on": "user_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]).to_list(None)
+    await db[COUNTERS_COLL].update_many(
+        {"$or": [{"rebuilt_at": {"$exists": False}}, {"rebuilt_at": {"$lt": started}}]},
+        {"$set": {"total": 0, "unread": 0, "rebuilt_at": started}},
+    )
+    return {"users": await db[COUNTERS_COLL].count_documents({})}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Notification maintenance")
+    parser.add_argument("--rebuild-counters", action="store_true", help="recompute per-user total/unread counters")
+    args = parser.parse_args()
+
+    async def _main():
+        from backend.dependencies import db
+        await ensure_notification_indexes(db)
+        if args.rebuild_counters:
+            print(await rebuild_counters(db))
+
+    asyncio.run(_main())
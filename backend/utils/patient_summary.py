@@ -0,0 +1,94 @@
+# backend/utils/patient_summary.py
+from __future__ import annotations
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+VERSIONS_COLL = "patient_versions"
+PATIENT_SUMMARY_CACHE_SIZE = int(os.environ.get("PATIENT_SUMMARY_CACHE_SIZE", "512"))
+
+# section -> (collection, extra filter, sort, limit)
+SUMMARY_SECTIONS: Dict[str, Tuple[str, Dict[str, Any], Optional[Tuple[str, int]], int]] = {
+    "recent_encounters": ("encounters", {}, ("scheduled_date", -1), 10),
+    "allergies": ("allergies", {}, None, 100),
+    "active_medications": ("medications", {"status": "active"}, None, 100),
+    "medical_history": ("medical_history", {}, None, 100),
+    "recent_vitals": ("vital_signs", {}, ("recorded_at", -1), 1),
+    "recent_soap_notes": ("soap_notes", {}, ("created_at", -1), 5),
+    "documents": ("patient_documents", {}, ("upload_date", -1), 100),
+}
+
+
+async def ensure_patient_version_indexes(db):
+    """Create patient_versions indexes if they don't exist"""
+    try:
+        await db[VERSIONS_COLL].create_index([("patient_id", 1)], unique=True, background=True)
+        print(f"[INFO] Patient version indexes ensured for collection {VERSIONS_COLL}")
+    except Exception as e:
+        print(f"[WARN] Failed to create patient version indexes: {e}")
+
+
+async def get_patient_version(db, patient_id: str) -> int:
+    doc = await db[VERSIONS_COLL].find_one({"patient_id": patient_id}, {"_id": 0, "version": 1})
+    return int((doc or {}).get("version", 0))
+
+
+async def bump_patient_version(db, patient_id: Optional[str]):
+    """Mark every cached summary of this patient stale (call after any chart write)."""
+    if patient_id:
+        await db[VERSIONS_COLL].update_one({"patient_id": patient_id}, {"$inc": {"version": 1}}, upsert=True)
+
+
+async def bump_for_record(db, collection: str, record_id: Optional[str]):
+    """bump_patient_version for a record known only by id."""
+    if not record_id:
+        return
+    doc = await db[collection].find_one({"id": record_id}, {"_id": 0, "patient_id": 1})
+    await bump_patient_version(db, (doc or {}).get("patient_id"))
+
+
+def summary_etag(patient_id: str, version: int) -> str:
+    return f'"{patient_id}-v{version}"'
+
+
+async def fetch_patient_summary(db, patient_id: str, projections: Mapping[str, Mapping[str, Any]]) -> Dict[str, Any]:
+    """Patient plus every summary section, fetched concurrently with per-section projections."""
+    async def section(name: str):
+        coll, extra, sort, limit = SUMMARY_SECTIONS[name]
+        cursor = db[coll].find({"patient_id": patient_id, **extra}, {"_id": 0, **projections.get(name, {})})
+        if sort:
+            cursor = cursor.sort(*sort)
+        return await cursor.limit(limit).to_list(limit)
+
+    names = list(SUMMARY_SECTIONS)
+    patient, *rows = await asyncio.gather(
+        db.patients.find_one({"id": patient_id}, {"_id": 0, **projections.get("patient", {})}),
+        *(section(n) for n in names),
+    )
+    return {"patient": patient, **dict(zip(names, rows))}
+
+
+class PatientSummaryCache:
+    """LRU of serialized summaries keyed by patient_id, valid only for the version they were built at."""
+
+    def __init__(self, max_size: int = PATIENT_SUMMARY_CACHE_SIZE):
+        self.max_size = max_size
+        self._items: "OrderedDict[str, Tuple[int, Any]]" = OrderedDict()
+
+    def get(self, patient_id: str, version: int) -> Optional[Any]:
+        item = self._items.get(patient_id)
+        if not item or item[0] != version:
+            return None
+        self._items.move_to_end(patient_id)
+        return item[1]
+
+    def put(self, patient_id: str, version: int, payload: Any):
+        self._items[patient_id] = (version, payload)
+        self._items.move_to_end(patient_id)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+
+# Process-wide snapshot cache behind /patients/{patient_id}/summary
+patient_summary_cache = PatientSummaryCache()
@@ -0,0 +1,243 @@
+# backend/utils/payroll_ytd.py
+from __future__ import annotations
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, Mapping
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+YTD_COLL = "payroll_ytd"
+
+# Amounts accumulated per (employee_id, tax_year)
+YTD_FIELDS = (
+    "gross_pay", "taxable_wages", "total_taxes", "net_pay",
+    "federal_tax", "state_tax", "social_security_tax", "medicare_tax",
+)
+
+async def ensure_ytd_indexes(db):
+    """Create payroll_ytd indexes if they don't exist"""
+    try:
+        await db[YTD_COLL].create_index([("employee_id", 1), ("tax_year", 1)], unique=True, background=True)
+        await db.payroll_records.create_index([("payroll_period_id", 1), ("ytd_applied.tax_year", 1)], background=True)
+        print(f"[INFO] YTD indexes ensured for collection {YTD_COLL}")
+    except Exception as e:
+        print(f"[WARN] Failed to create YTD indexes: {e}")
+
+def _f(x) -> float:
+    try:
+        return float(x or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def tax_year_for_period(period: Mapping[str, Any] | None) -> int:
+    """Tax year a pay period belongs to (by its end date)."""
+    p = period or {}
+    iso = str(p.get("end_date") or p.get("start_date") or "")[:4]
+    return int(iso) if iso.isdigit() else datetime.utcnow().year
+
+def ytd_amounts(record: Mapping[str, Any]) -> Dict[str, float]:
+    """Contribution of one payroll record, tolerant of both record shapes (str/float fields)."""
+    gross = _f(record.get("gross_pay") or record.get("gross"))
+    pretax = _f(record.get("total_pre_tax_deductions") or record.get("pretax_deductions"))
+    posttax = _f(record.get("total_post_tax_deductions") or record.get("posttax_deductions"))
+    taxes = _f(record.get("total_taxes") or record.get("taxes"))
+    taxable = record.get("taxable_wages")
+    if taxable is None:
+        taxable = record.get("taxable_income")
+    if taxable is None:
+        taxable = gross - pretax
+    return {
+        "gross_pay": round(gross, 2),
+        "taxable_wages": round(_f(taxable), 2),
+        "total_taxes": round(taxes, 2),
+        "net_pay": round(gross - pretax - posttax - taxes, 2),
+        "federal_tax": round(_f(record.get("federal_tax")), 2),
+        "state_tax": round(_f(record.get("state_tax")), 2),
+        "social_security_tax": round(_f(record.get("social_security_tax")), 2),
+        "medicare_tax": round(_f(record.get("medicare_tax")), 2),
+    }
+
+async def _inc(db, employee_id: str, tax_year: int, delta: Mapping[str, float], op: str):
+    """
+    Add `delta` to the accumulator at most once per op id: the op is recorded in applied_ops by the
+    same update, and a replay no longer matches the filter (its upsert hits the unique key instead).
+    """
+    inc = {f: round(delta.get(f, 0.0), 2) for f in YTD_FIELDS if delta.get(f)}
+    if not inc:
+        return
+    try:
+        await db[YTD_COLL].update_one(
+            {"employee_id": employee_id, "tax_year": tax_year, "applied_ops": {"$ne": op}},
+            {"$inc": inc, "$push": {"applied_ops": op}, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        pass  # already applied
+
+async def _finish(db, record_id: str, pending: Mapping[str, Any]):
+    """Land a record's pending accumulator change, then clear it from the record and the op set."""
+    op = pending["op"]
+    await _inc(db, pending["employee_id"], pending["tax_year"], pending["delta"], op)
+    await db.payroll_records.update_one({"id": record_id, "ytd_pending.op": op}, {"$unset": {"ytd_pending": ""}})
+    await db[YTD_COLL].update_one(
+        {"employee_id": pending["employee_id"], "tax_year": pending["tax_year"]}, {"$pull": {"applied_ops": op}}
+    )
+
+async def finish_pending(db, record_id: str) -> bool:
+    """Complete a YTD change interrupted between the record update and the accumulator update."""
+    doc = await db.payroll_records.find_one({"id": record_id, "ytd_pending": {"$exists": True}}, {"ytd_pending": 1})
+    if not doc:
+        return False
+    await _finish(db, record_id, doc["ytd_pending"])
+    return True
+
+async def get_ytd(db, employee_id: str, tax_year: int) -> Dict[str, float]:
+    """Point lookup on (employee_id, tax_year); zeros when nothing has been posted."""
+    doc = await db[YTD_COLL].find_one({"employee_id": employee_id, "tax_year": tax_year}, {"_id": 0})
+    return {f: _f((doc or {}).get(f)) for f in YTD_FIELDS}
+
+async def get_ytd_many(db, employee_ids: Iterable[str], tax_year: int) -> Dict[str, Dict[str, float]]:
+    ids = list(employee_ids)
+    out = {i: {f: 0.0 for f in YTD_FIELDS} for i in ids}
+    async for doc in db[YTD_COLL].find({"employee_id": {"$in": ids}, "tax_year": tax_year}, {"_id": 0}):
+        out[doc["employee_id"]] = {f: _f(doc.get(f)) for f in YTD_FIELDS}
+    return out
+
+async def apply_record(db, record: Mapping[str, Any], tax_year: int) -> bool:
+    """
+    Add a posted record to its employee's YTD exactly once.
+    The record is claimed by stamping ytd_applied together with a pending op; only the claimer
+    increments, and a retry after a crash re-runs the same (idempotent) op.
+    """
+    amounts = ytd_amounts(record)
+    pending = {"op": uuid.uuid4().hex, "employee_id": record.get("employee_id"), "tax_year": tax_year, "delta": amounts}
+    res = await db.payroll_records.update_one(
+        {"id": record.get("id"), "ytd_applied": {"$exists": False}, "ytd_pending": {"$exists": False}},
+        {"$set": {"ytd_applied": {"tax_year": tax_year, **amounts}, "ytd_pending": pending}},
+    )
+    if not res.modified_count:
+        await finish_pending(db, record.get("id"))
+        return False
+    await _finish(db, record.get("id"), pending)
+    return True
+
+async def reapply_record(db, record: Mapping[str, Any]) -> bool:
+    """Move an already-posted record's YTD contribution to its recalculated amounts."""
+    await finish_pending(db, record.get("id"))
+    amounts = ytd_amounts(record)
+    op = uuid.uuid4().hex
+    prev = await db.payroll_records.find_one_and_update(
+        {"id": record.get("id"), "ytd_applied": {"$exists": True}, "ytd_pending": {"$exists": False}},
+        [
+            {"$set": {"ytd_pending": {
+                "op": op, "employee_id": "$employee_id", "tax_year": "$ytd_applied.tax_year",
+                "delta": {f: {"$subtract": [amounts[f], {"$ifNull": ["$ytd_applied." + f, 0]}]} for f in YTD_FIELDS},
+            }}},
+            {"$set": {"ytd_applied." + f: amounts[f] for f in YTD_FIELDS}},
+        ],
+        return_document=ReturnDocument.AFTER,
+    )
+    if not prev:
+        return False
+    await _finish(db, prev["id"], prev["ytd_pending"])
+    return True
+
+async def reverse_record(db, record_id: str) -> bool:
+    """Remove a record's YTD contribution (void). No-op if it was never applied."""
+    await finish_pending(db, record_id)
+    op = uuid.uuid4().hex
+    prev = await db.payroll_records.find_one_and_update(
+        {"id": record_id, "ytd_applied": {"$exists": True}, "ytd_pending": {"$exists": False}},
+        [{"$set": {"ytd_pending": {
+            "op": op, "employee_id": "$employee_id", "tax_year": "$ytd_applied.tax_year",
+            "delta": {f: {"$multiply": [-1, {"$ifNull": ["$ytd_applied." + f, 0]}]} for f in YTD_FIELDS},
+        }}}, {"$project": {"ytd_applied": 0}}],
+        return_document=ReturnDocument.AFTER,
+    )
+    if not prev:
+        return False
+    await _finish(db, record_id, prev["ytd_pending"])
+    return True
+
+async def apply_period(db, period: Mapping[str, Any]) -> int:
+    """Apply every not-yet-applied record of a posted period. Returns records applied."""
+    tax_year = tax_year_for_period(period)
+    applied = 0
+    async for r in db.payroll_records.find({"payroll_period_id": period.get("id"), "$or": [
+        {"ytd_applied": {"$exists": False}}, {"ytd_pending": {"$exists": True}},
+    ]}):
+        if await apply_record(db, r, tax_year):
+            applied += 1
+    return applied
+
+async def reverse_period(db, period_id: str) -> int:
+    reversed_ = 0
+    ids = [r["id"] async for r in db.payroll_records.find(
+        {"payroll_period_id": period_id, "$or": [{"ytd_applied": {"$exists": True}}, {"ytd_pending": {"$exists": True}}]},
+        {"id": 1},
+    )]
+    for rid in ids:
+        if await reverse_record(db, rid):
+            reversed_ += 1
+    return reversed_
+
+async def rebuild_ytd(db, tax_year: int) -> Dict[str, Any]:
+    """
+    Regenerate payroll_ytd for one tax year from posted payroll history.
+    A period counts when it has a POSTED run; its records are re-stamped with ytd_applied.
+    """
+    prefix = f"{tax_year:04d}-"
+    periods = [p async for p in db.pay_periods.find({"end_date": {"$regex": f"^{prefix}"}}, {"_id": 0})]
+    posted = set()
+    if periods:
+        async for run in db.payroll_runs.find(
+            {"period_id": {"$in": [p["id"] for p in periods]}, "status": "POSTED"}, {"period_id": 1}
+        ):
+            posted.add(run["period_id"])
+
+    await db.payroll_records.update_many(
+        {"$or": [{"ytd_applied.tax_year": tax_year}, {"ytd_pending.tax_year": tax_year}]},
+        {"$unset": {"ytd_applied": "", "ytd_pending": ""}},
+    )
+    await db[YTD_COLL].delete_many({"tax_year": tax_year})
+
+    totals: Dict[str, Dict[str, float]] = {}
+    records = 0
+    for p in periods:
+        if p["id"] not in posted:
+            continue
+        async for r in db.payroll_records.find({"payroll_period_id": p["id"]}):
+            amounts = ytd_amounts(r)
+            await db.payroll_records.update_one(
+                {"id": r.get("id")}, {"$set": {"ytd_applied": {"tax_year": tax_year, **amounts}}}
+            )
+            acc = totals.setdefault(r.get("employee_id"), {f: 0.0 for f in YTD_FIELDS})
+            for f in YTD_FIELDS:
+                acc[f] += amounts[f]
+            records += 1
+
+    now = datetime.utcnow()
+    for emp_id, acc in totals.items():
+        await db[YTD_COLL].update_one(
+            {"employee_id": emp_id, "tax_year": tax_year},
+            {"$set": {**{f: round(v, 2) for f, v in acc.items()}, "updated_at": now, "rebuilt_at": now}},
+            upsert=True,
+        )
+    return {"tax_year": tax_year, "periods": len(posted), "records": records, "employees": len(totals)}
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="Rebuild the payroll_ytd accumulator from posted payroll history")
+    parser.add_argument("--year", type=int, default=datetime.utcnow().year)
+    args = parser.parse_args()
+
+    async def _main(year: int):
+        from backend.dependencies import db
+        await ensure_ytd_indexes(db)
+        print(await rebuild_ytd(db, year))
+
+    asyncio.run(_main(args.year))
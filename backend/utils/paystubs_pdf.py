@@ -25,6 +25,19 @@ def _money(v):
     except Exception:
         return str(v)
 
+def _draw_header(c, clinic):
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(1*inch, 10.5*inch, clinic["name"])
+    c.setFont("Helvetica", 9)
+    c.drawString(1*inch, 10.2*inch, clinic["address"])
+    c.drawString(1*inch, 10.0*inch, f"{clinic['phone']} • {clinic['email']}")
+    _line(c, 1*inch, 9.85*inch, 7.75*inch, 9.85*inch)
+
+def _draw_footer(c):
+    c.setFont("Helvetica-Oblique", 8)
+    c.drawString(1*inch, 0.8*inch,
+                 "Generated by ClinicHub • For employee records only • Contact HR for questions.")
+
 def render_paystubs_pdf(stubs: list[dict], clinic_info: dict | None = None) -> bytes:
     """
     Each item in stubs should include at least:
@@ -35,17 +48,19 @@ def render_paystubs_pdf(stubs: list[dict], clinic_info: dict | None = None) -> b
     buf = BytesIO()
     c = canvas.Canvas(buf, pagesize=LETTER)
     width, height = LETTER
+    c.setTitle("ClinicHub Paystub")
 
-    for s in stubs or []:
-        c.setTitle("ClinicHub Paystub")
+    # Header and footer are identical on every page: draw them once as form XObjects
+    c.beginForm("paystub_header")
+    _draw_header(c, clinic)
+    c.endForm()
+    c.beginForm("paystub_footer")
+    _draw_footer(c)
+    c.endForm()
 
+    for s in stubs or []:
         # Header
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(1*inch, 10.5*inch, clinic["name"])
-        c.setFont("Helvetica", 9)
-        c.drawString(1*inch, 10.2*inch, clinic["address"])
-        c.drawString(1*inch, 10.0*inch, f"{clinic['phone']} • {clinic['email']}")
-        _line(c, 1*inch, 9.85*inch, 7.75*inch, 9.85*inch)
+        c.doForm("paystub_header")
 
         # Employee & period
         y = 9.55*inch
@@ -74,9 +89,7 @@ def render_paystubs_pdf(stubs: list[dict], clinic_info: dict | None = None) -> b
         _line(c, 1*inch, y, 7.75*inch, y)   # bottom
 
         # Footer
-        c.setFont("Helvetica-Oblique", 8)
-        c.drawString(1*inch, 0.8*inch,
-                     "Generated by ClinicHub • For employee records only • Contact HR for questions.")
+        c.doForm("paystub_footer")
         c.showPage()
 
     c.save()
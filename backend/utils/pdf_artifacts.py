@@ -0,0 +1,317 @@
+# backend/utils/pdf_artifacts.py
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import os
+import re
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from fastapi import Request, Response
+
+PDF_ARTIFACT_BACKEND = os.environ.get("PDF_ARTIFACT_BACKEND", "disk")  # disk | gridfs
+PDF_ARTIFACT_DIR = os.environ.get("PDF_ARTIFACT_DIR", str(Path(__file__).resolve().parent.parent / "pdf_artifacts"))
+PDF_ARTIFACT_MAX_MB = int(os.environ.get("PDF_ARTIFACT_MAX_MB", "512"))
+PDF_ARTIFACT_BUCKET = "pdf_artifacts"
+
+# Bump a kind's version whenever its renderer's layout changes so old artifacts stop matching
+TEMPLATE_VERSIONS: Dict[str, int] = {
+    "submission": 1,
+    "summary": 1,
+    "paystubs": 2,
+}
+
+
+def artifact_key(kind: str, content: Any, clinic_info: Optional[dict] = None) -> str:
+    """sha256 over (kind, template version, document content, clinic_info)."""
+    payload = json.dumps(
+        {"kind": kind, "v": TEMPLATE_VERSIONS[kind], "content": content, "clinic": clinic_info or {}},
+        sort_keys=True, default=str, separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ---------- backends ----------
+class DiskArtifactStore:
+    """
+    Files under <root>/<key[:2]>/<key>.pdf, written atomically (tmp + rename).
+    A read touches the file's mtime, so mtime order is LRU order; once the
+    directory exceeds max_bytes the least recently used files are removed.
+    Several workers may share the directory: each keeps its own size index,
+    rebuilt from a directory scan, and tolerates files another worker evicted.
+    """
+
+    def __init__(self, root: str = PDF_ARTIFACT_DIR, max_bytes: int = PDF_ARTIFACT_MAX_MB * 1024 * 1024):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._index: Optional["OrderedDict[str, int]"] = None
+        self._bytes = 0
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.pdf"
+
+    def _load_index(self):
+        entries = []
+        if self.root.exists():
+            for p in self.root.glob("*/*.pdf"):
+                try:
+                    st = p.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, p.stem, st.st_size))
+        entries.sort()
+        self._index = OrderedDict((k, size) for _, k, size in entries)
+        self._bytes = sum(self._index.values())
+
+    def _get(self, key: str) -> Optional[bytes]:
+        if self._index is None:
+            self._load_index()
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            self._bytes -= self._index.pop(key, 0)
+            return None
+        if key not in self._index:
+            self._index[key] = len(data)
+            self._bytes += len(data)
+        self._index.move_to_end(key)
+        return data
+
+    def _put(self, key: str, data: bytes):
+        if self._index is None:
+            self._load_index()
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{key}.{uuid.uuid4().hex[:8]}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        self._bytes += len(data) - self._index.pop(key, 0)
+        self._index[key] = len(data)
+        while self._bytes > self.max_bytes and len(self._index) > 1:
+            old, size = self._index.popitem(last=False)
+            self._bytes -= size
+            try:
+                self._path(old).unlink()
+            except FileNotFoundError:
+                pass
+
+    async def get(self, db, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def put(self, db, key: str, data: bytes, kind: str):
+        await asyncio.to_thread(self._put, key, data)
+
+    async def usage(self, db) -> Dict[str, Any]:
+        if self._index is None:
+            await asyncio.to_thread(self._load_index)
+        return {"backend": "disk", "artifacts": len(self._index), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+class GridFSArtifactStore:
+    """
+    GridFS bucket shared by every worker; filename is the artifact key and
+    metadata.last_access drives LRU eviction once the bucket exceeds max_bytes.
+    """
+
+    def __init__(self, bucket: str = PDF_ARTIFACT_BUCKET, max_bytes: int = PDF_ARTIFACT_MAX_MB * 1024 * 1024):
+        self.bucket_name = bucket
+        self.max_bytes = max_bytes
+
+    def _bucket(self, db):
+        from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+        return AsyncIOMotorGridFSBucket(db, bucket_name=self.bucket_name)
+
+    def _files(self, db):
+        return db[f"{self.bucket_name}.files"]
+
+    async def get(self, db, key: str) -> Optional[bytes]:
+        doc = await self._files(db).find_one({"filename": key}, {"_id": 1})
+        if not doc:
+            return None
+        stream = await self._bucket(db).open_download_stream(doc["_id"])
+        data = await stream.read()
+        await self._files(db).update_one({"_id": doc["_id"]}, {"$set": {"metadata.last_access": datetime.utcnow()}})
+        return data
+
+    async def put(self, db, key: str, data: bytes, kind: str):
+        if await self._files(db).find_one({"filename": key}, {"_id": 1}):
+            return
+        await self._bucket(db).upload_from_stream(
+            key, data, metadata={"kind": kind, "last_access": datetime.utcnow()}
+        )
+        await self._evict(db)
+
+    async def _evict(self, db):
+        rows = await self._files(db).aggregate([
+            {"$group": {"_id": None, "total": {"$sum": "$length"}, "count": {"$sum": 1}}}
+        ]).to_list(1)
+        total = rows[0]["total"] if rows else 0
+        if total <= self.max_bytes:
+            return
+        bucket = self._bucket(db)
+        async for doc in self._files(db).find({}, {"_id": 1, "length": 1}).sort("metadata.last_access", 1):
+            if total <= self.max_bytes:
+                break
+            try:
+                await bucket.delete(doc["_id"])
+            except Exception:
+                continue  # already evicted by another worker
+            total -= doc.get("length", 0)
+
+    async def usage(self, db) -> Dict[str, Any]:
+        rows = await self._files(db).aggregate([
+            {"$group": {"_id": None, "total": {"$sum": "$length"}, "count": {"$sum": 1}}}
+        ]).to_list(1)
+        row = rows[0] if rows else {"total": 0, "count": 0}
+        return {"backend": "gridfs", "artifacts": row["count"], "bytes": row["total"], "max_bytes": self.max_bytes}
+
+
+async def ensure_pdf_artifact_indexes(db):
+    """Create GridFS lookup/eviction indexes when the gridfs backend is in use"""
+    if not isinstance(pdf_artifacts.store, GridFSArtifactStore):
+        return
+    files = f"{pdf_artifacts.store.bucket_name}.files"
+    try:
+        await db[files].create_index([("filename", 1)], background=True)
+        await db[files].create_index([("metadata.last_access", 1)], background=True)
+        print(f"[INFO] PDF artifact indexes ensured for collection {files}")
+    except Exception as e:
+        print(f"[WARN] Failed to create PDF artifact indexes: {e}")
+
+
+# ---------- cache ----------
+class PDFArtifactCache:
+    """
+    Content-addressed store for rendered PDFs of immutable documents (submitted
+    forms, posted payroll runs). Concurrent requests for the same key share a
+    single render; a failed store write never fails the download.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._metrics = {"hits": 0, "misses": 0, "store_errors": 0, "prerendered": 0}
+
+    async def get_or_render(self, db, kind: str, content: Any, clinic_info: Optional[dict],
+                            render: Callable[[], Awaitable[bytes]]) -> Tuple[str, bytes, bool]:
+        """Returns (key, pdf bytes, cache hit)."""
+        key = artifact_key(kind, content, clinic_info)
+        if key in self._inflight:
+            return key, await asyncio.shield(self._inflight[key]), True
+        try:
+            data = await self.store.get(db, key)
+        except Exception as e:
+            self._metrics["store_errors"] += 1
+            print(f"[WARN] PDF artifact read failed for {key}: {e}")
+            data = None
+        if data is not None:
+            self._metrics["hits"] += 1
+            return key, data, True
+        if key in self._inflight:  # another request started rendering while we read the store
+            return key, await asyncio.shield(self._inflight[key]), True
+
+        self._metrics["misses"] += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            data = await render()
+            fut.set_result(data)
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved when nobody else is waiting
+            raise
+        except BaseException:
+            fut.cancel()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        try:
+            await self.store.put(db, key, data, kind)
+        except Exception as e:
+            self._metrics["store_errors"] += 1
+            print(f"[WARN] PDF artifact write failed for {key}: {e}")
+        return key, data, False
+
+    def prerender(self, db, kind: str, content: Any, clinic_info: Optional[dict],
+                  render: Callable[[], Awaitable[bytes]]):
+        """Fire-and-forget get_or_render, e.g. right after a payroll run is posted."""
+        async def run():
+            try:
+                _, _, hit = await self.get_or_render(db, kind, content, clinic_info, render)
+                if not hit:
+                    self._metrics["prerendered"] += 1
+            except Exception as e:
+                print(f"[WARN] PDF pre-render ({kind}) failed: {e}")
+
+        task = asyncio.get_running_loop().create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def metrics(self, db) -> Dict[str, Any]:
+        m = dict(self._metrics)
+        m["inflight"] = len(self._inflight)
+        try:
+            m.update(await self.store.usage(db))
+        except Exception as e:
+            m["usage_error"] = str(e)
+        return m
+
+
+# ---------- HTTP ----------
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def artifact_response(request: Request, key: str, data: bytes, filename: str, cache_state: str = "") -> Response:
+    """
+    Serve a stored PDF with a strong ETag (the artifact key): If-None-Match -> 304,
+    single `Range: bytes=a-b` -> 206 (honouring If-Range), unsatisfiable -> 416.
+    """
+    etag = f'"{key}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    }
+    if cache_state:
+        headers["X-PDF-Cache"] = cache_state
+    inm = request.headers.get("if-none-match")
+    if inm and (inm.strip() == "*" or etag in [t.strip() for t in inm.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    rng = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    size = len(data)
+    if rng and (not if_range or if_range.strip() == etag):
+        m = _RANGE_RE.match(rng.strip())
+        if m and (m.group(1) or m.group(2)):
+            if m.group(1):
+                start = int(m.group(1))
+                end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+            else:  # suffix range: last N bytes
+                start = max(size - int(m.group(2)), 0)
+                end = size - 1
+            if start >= size or start > end:
+                headers["Content-Range"] = f"bytes */{size}"
+                return Response(status_code=416, headers=headers)
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            return Response(content=data[start:end + 1], status_code=206, media_type="application/pdf", headers=headers)
+    return Response(content=data, media_type="application/pdf", headers=headers)
+
+
+def _make_store():
+    if PDF_ARTIFACT_BACKEND == "gridfs":
+        return GridFSArtifactStore()
+    return DiskArtifactStore()
+
+
+# Process-wide artifact cache behind the forms and payroll PDF endpoints
+pdf_artifacts = PDFArtifactCache(_make_store())
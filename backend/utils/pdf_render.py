@@ -0,0 +1,147 @@
+# backend/utils/pdf_render.py
+from __future__ import annotations
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Any, Dict, List, Optional
+
+from pypdf import PdfReader, PdfWriter
+
+PDF_RENDER_WORKERS = int(os.environ.get("PDF_RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_RENDER_MAX_PENDING = int(os.environ.get("PDF_RENDER_MAX_PENDING", "32"))
+PDF_CHUNK_PAGES = int(os.environ.get("PDF_CHUNK_PAGES", "50"))
+
+
+# ---------- worker side (runs inside the pool processes) ----------
+def _init_worker():
+    """Import ReportLab and load the standard font metrics once per process."""
+    from reportlab.pdfbase import pdfmetrics
+    for name in ("Helvetica", "Helvetica-Bold", "Helvetica-Oblique"):
+        pdfmetrics.getFont(name)
+
+
+def _render(kind: str, args: tuple) -> bytes:
+    if kind == "submission":
+        from backend.utils.forms_pdf import render_submission_pdf
+        return render_submission_pdf(*args)
+    if kind == "summary":
+        from backend.utils.forms_pdf import render_submissions_summary_pdf
+        return render_submissions_summary_pdf(*args)
+    if kind == "paystubs":
+        from backend.utils.paystubs_pdf import render_paystubs_pdf
+        return render_paystubs_pdf(*args)
+    raise ValueError(f"unknown PDF kind {kind}")
+
+
+def concat_pdfs(parts: List[bytes]) -> bytes:
+    writer = PdfWriter()
+    for part in parts:
+        for page in PdfReader(BytesIO(part)).pages:
+            writer.add_page(page)
+    out = BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+# ---------- service side (event loop) ----------
+class PDFRenderService:
+    """
+    Runs ReportLab renders in a bounded ProcessPoolExecutor so CPU-heavy PDFs never
+    block the event loop. At most PDF_RENDER_MAX_PENDING jobs are queued or running;
+    further callers wait for a slot. Paystub batches larger than PDF_CHUNK_PAGES are
+    rendered as parallel chunks and concatenated with pypdf.
+    PDF_RENDER_WORKERS=0 renders on a thread instead of a process pool.
+    """
+
+    def __init__(self, workers: int = PDF_RENDER_WORKERS, max_pending: int = PDF_RENDER_MAX_PENDING,
+                 chunk_pages: int = PDF_CHUNK_PAGES):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.chunk_pages = chunk_pages
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+        self._running = 0
+        self._metrics = {
+            "jobs": 0, "failures": 0, "chunked_jobs": 0,
+            "last_ms": 0.0, "max_ms": 0.0, "total_ms": 0.0, "total_wait_ms": 0.0,
+        }
+
+    def _executor(self):
+        if self.workers <= 0:
+            return None
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        return self._pool
+
+    async def _submit(self, kind: str, args: tuple) -> bytes:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        t0 = time.perf_counter()
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        self._running += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self._executor(), _render, kind, args)
+            except BrokenProcessPool:
+                self._pool = None  # a worker died (e.g. OOM); rebuild the pool and retry once
+                return await loop.run_in_executor(self._executor(), _render, kind, args)
+        except Exception:
+            self._metrics["failures"] += 1
+            raise
+        finally:
+            self._running -= 1
+            self._slots.release()
+            elapsed = (time.perf_counter() - started) * 1000
+            self._metrics["jobs"] += 1
+            self._metrics["last_ms"] = round(elapsed, 2)
+            self._metrics["max_ms"] = round(max(self._metrics["max_ms"], elapsed), 2)
+            self._metrics["total_ms"] += elapsed
+            self._metrics["total_wait_ms"] += (started - t0) * 1000
+
+    async def render_submission(self, form: dict, submission: dict, clinic_info: dict = None) -> bytes:
+        return await self._submit("submission", (form, submission, clinic_info))
+
+    async def render_summary(self, form: dict, submissions: list, clinic_info: dict = None) -> bytes:
+        return await self._submit("summary", (form, submissions, clinic_info))
+
+    async def render_paystubs(self, stubs: List[dict], clinic_info: dict = None) -> bytes:
+        stubs = list(stubs or [])
+        n = self.chunk_pages
+        if self.workers <= 1 or len(stubs) <= n:
+            return await self._submit("paystubs", (stubs, clinic_info))
+        self._metrics["chunked_jobs"] += 1
+        parts = await asyncio.gather(*(
+            self._submit("paystubs", (stubs[i:i + n], clinic_info)) for i in range(0, len(stubs), n)
+        ))
+        return await asyncio.to_thread(concat_pdfs, list(parts))
+
+    def metrics(self) -> Dict[str, Any]:
+        m = dict(self._metrics)
+        jobs = m["jobs"] or 1
+        m["avg_ms"] = round(m.pop("total_ms") / jobs, 2)
+        m["avg_wait_ms"] = round(m.pop("total_wait_ms") / jobs, 2)
+        m["queued"] = self._waiting
+        m["running"] = self._running
+        m["workers"] = self.workers
+        m["max_pending"] = self.max_pending
+        m["chunk_pages"] = self.chunk_pages
+        return m
+
+    def shutdown(self):
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Process-wide renderer used by the forms and payroll PDF endpoints
+pdf_renderer = PDFRenderService()
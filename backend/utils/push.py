@@ -0,0 +1,308 @@
+# backend/utils/push.py
+from __future__ import annotations
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+PUSH_BACKEND = os.environ.get("PUSH_BACKEND", "mongo")  # mongo (any number of workers) | local (single worker)
+PUSH_QUEUE_SIZE = int(os.environ.get("PUSH_QUEUE_SIZE", "256"))
+PUSH_REPLAY_SIZE = int(os.environ.get("PUSH_REPLAY_SIZE", "1000"))
+PUSH_HEARTBEAT_S = float(os.environ.get("PUSH_HEARTBEAT_S", "15"))
+PUSH_EVENT_TTL_S = int(os.environ.get("PUSH_EVENT_TTL_S", "3600"))
+PUSH_POLL_S = float(os.environ.get("PUSH_POLL_S", "0.5"))
+PUSH_POLL_LAG_S = float(os.environ.get("PUSH_POLL_LAG_S", "5"))
+PUSH_SEEN_SIZE = int(os.environ.get("PUSH_SEEN_SIZE", "20000"))  # ids remembered to skip re-polled events
+PUSH_RETRY_MIN_S = float(os.environ.get("PUSH_RETRY_MIN_S", "1"))
+PUSH_RETRY_MAX_S = float(os.environ.get("PUSH_RETRY_MAX_S", "60"))
+PUSH_COLL = "push_events"
+
+TOPICS = ("notifications", "webrtc", "queue")
+
+
+def parse_topics(raw: Optional[str]) -> Set[str]:
+    if not raw:
+        return set(TOPICS)
+    wanted = {t.strip() for t in raw.split(",") if t.strip()}
+    unknown = wanted - set(TOPICS)
+    if unknown:
+        raise ValueError(f"unknown topics: {', '.join(sorted(unknown))}")
+    return wanted
+
+
+def _valid_id(event_id: Optional[str]) -> Optional[str]:
+    return event_id if event_id and ObjectId.is_valid(event_id) else None
+
+
+def _no_change_streams(e: Exception) -> bool:
+    # Standalone mongod: "The $changeStream stage is only supported on replica sets"
+    return isinstance(e, OperationFailure) and (e.code == 40573 or "replica set" in str(e))
+
+
+def sse_format(event: Optional[Dict[str, Any]]) -> str:
+    """One SSE frame; None is a heartbeat comment."""
+    if event is None:
+        return ": ping\n\n"
+    return f"id: {event['id']}\nevent: {event['topic']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+class Subscription:
+    """
+    One open stream. Events are queued up to PUSH_QUEUE_SIZE; a client that falls
+    further behind is cut off (overflowed) instead of growing the queue, and is
+    expected to reconnect with its last event id to replay what it missed.
+    """
+
+    def __init__(self, user_id: str, topics: Iterable[str], maxsize: int = PUSH_QUEUE_SIZE):
+        self.user_id = user_id
+        self.topics = set(topics)
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        return event["topic"] in self.topics and event.get("user_id") in (None, self.user_id)
+
+    def offer(self, event: Dict[str, Any]) -> bool:
+        if self.overflowed:
+            return False
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.overflowed = True
+            return False
+
+
+class PushHub:
+    """
+    In-process pub/sub behind the push endpoints (SSE and WebSocket).
+
+    publish() fans an event out to the matching subscriptions of this worker and
+    keeps it in a replay ring so reconnecting clients can resume after their
+    Last-Event-ID. With PUSH_BACKEND=mongo (the default), every event is also
+    written to push_events (TTL PUSH_EVENT_TTL_S), replay reads that collection
+    whichever worker a client reconnects to, and the other workers pick events up
+    from a change stream. Without a replica set they poll push_events by _id
+    every PUSH_POLL_S instead (looking back PUSH_POLL_LAG_S, since ObjectIds from
+    different workers are only roughly ordered); events already delivered are
+    skipped. A failed change stream is retried with backoff, polling meanwhile.
+    PUSH_BACKEND=local keeps everything in process for a single worker.
+    """
+
+    def __init__(self, backend: str = PUSH_BACKEND, replay_size: int = PUSH_REPLAY_SIZE):
+        self.backend = backend
+        self._subs: Dict[str, Set[Subscription]] = {}
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=replay_size)
+        self._db = None
+        self._delivery = "local"  # local | change_stream | poll
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._poll_after: Optional[ObjectId] = None
+        self._watch_task: Optional[asyncio.Task] = None
+        self._metrics = {"published": 0, "delivered": 0, "overflowed": 0, "replayed": 0}
+
+    # ---------- publish ----------
+    async def publish(self, topic: str, data: Any, *, user_id: Optional[str] = None,
+                      type: Optional[str] = None) -> Dict[str, Any]:
+        """user_id=None broadcasts to every subscriber of the topic."""
+        return (await self.publish_many(topic, [(user_id, data)], type=type))[0]
+
+    async def publish_many(self, topic: str, items: Iterable[Tuple[Optional[str], Any]],
+                           type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """One event per (user_id, data); in mongo mode a single insert_many."""
+        ts = datetime.utcnow().isoformat()
+        events = [
+            {"id": str(ObjectId()), "topic": topic, "type": type or topic, "user_id": uid, "data": data, "ts": ts}
+            for uid, data in items
+        ]
+        self._metrics["published"] += len(events)
+        if self._persistent and events:
+            try:
+                now = datetime.utcnow()
+                docs = [{**{k: v for k, v in e.items() if k != "id"}, "_id": ObjectId(e["id"]), "created_at": now}
+                        for e in events]
+                await self._db[PUSH_COLL].insert_many(docs, ordered=True)
+            except Exception as e:
+                print(f"[WARN] Push event store failed, delivering on this worker only: {e}")
+        # Local subscribers get it now; the stream/poll copy is skipped as already seen
+        for event in events:
+            self._deliver(event)
+        return events
+
+    @property
+    def _persistent(self) -> bool:
+        return self.backend == "mongo" and self._db is not None
+
+    def _deliver(self, event: Dict[str, Any]):
+        if event["id"] in self._seen:
+            return
+        self._seen[event["id"]] = None
+        while len(self._seen) > PUSH_SEEN_SIZE:
+            self._seen.popitem(last=False)
+        self._recent.append(event)
+        targets = self._subs.get(event["user_id"], ()) if event.get("user_id") else \
+            [s for subs in self._subs.values() for s in subs]
+        for sub in list(targets):
+            if sub.overflowed or not sub.matches(event):
+                continue
+            if sub.offer(event):
+                self._metrics["delivered"] += 1
+            else:
+                self._metrics["overflowed"] += 1
+
+    # ---------- subscribe ----------
+    def subscribe(self, user_id: str, topics: Iterable[str] = TOPICS) -> Subscription:
+        sub = Subscription(user_id, topics)
+        self._subs.setdefault(user_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        subs = self._subs.get(sub.user_id)
+        if subs:
+            subs.discard(sub)
+            if not subs:
+                del self._subs[sub.user_id]
+
+    async def replay(self, sub: Subscription, last_id: Optional[str]) -> List[Dict[str, Any]]:
+        """Events for this subscription published after last_id, oldest first."""
+        last_id = _valid_id(last_id)
+        if not last_id:
+            return []
+        if self._persistent:
+            cursor = self._db[PUSH_COLL].find({
+                "_id": {"$gt": ObjectId(last_id)},
+                "topic": {"$in": sorted(sub.topics)},
+                "user_id": {"$in": [None, sub.user_id]},
+            }).sort("_id", 1).limit(self._recent.maxlen)
+            events = [self._from_doc(d) async for d in cursor]
+        else:
+            events = [e for e in self._recent if e["id"] > last_id and sub.matches(e)]
+        self._metrics["replayed"] += len(events)
+        return events
+
+    async def stream(self, sub: Subscription, last_id: Optional[str] = None,
+                     heartbeat_s: float = PUSH_HEARTBEAT_S) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        Replayed events, then live ones; yields None as a heartbeat when idle.
+        Ends when the subscription overflows. Subscribe before calling so nothing
+        published during the replay is lost (events already replayed are skipped).
+        """
+        replayed = set()
+        for event in await self.replay(sub, last_id):
+            replayed.add(event["id"])
+            yield event
+        while not sub.overflowed:
+            try:
+                event = await asyncio.wait_for(sub.queue.get(), heartbeat_s)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if event["id"] not in replayed:
+                yield event
+
+    # ---------- multi-worker adapter ----------
+    @staticmethod
+    def _from_doc(doc: Dict[str, Any]) -> Dict[str, Any]:
+        event = {k: v for k, v in doc.items() if k not in ("_id", "created_at")}
+        event["id"] = str(doc["_id"])
+        return event
+
+    async def start(self, db):
+        self._db = db
+        if self.backend != "mongo":
+            return
+        try:
+            await db[PUSH_COLL].create_index([("created_at", 1)], expireAfterSeconds=PUSH_EVENT_TTL_S, background=True)
+            await db[PUSH_COLL].create_index([("user_id", 1), ("_id", 1)], background=True)
+            print(f"[INFO] Push indexes ensured for collection {PUSH_COLL}")
+        except Exception as e:
+            print(f"[WARN] Failed to create push indexes: {e}")
+        self._poll_after = ObjectId.from_datetime(datetime.utcnow())
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.get_running_loop().create_task(self._follow(db))
+
+    async def _follow(self, db):
+        """Deliver other workers' events: change stream when available, restarted with backoff, else polling."""
+        delay = PUSH_RETRY_MIN_S
+        while True:
+            try:
+                await self._watch(db)
+                delay = PUSH_RETRY_MIN_S
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if _no_change_streams(e):
+                    print("[INFO] Push hub has no change streams (standalone mongod); polling push_events")
+                    self._delivery = "poll"
+                    while True:
+                        await self._poll_safely(db)
+                        await asyncio.sleep(PUSH_POLL_S)
+                print(f"[WARN] Push change stream failed, polling and retrying in {delay:.0f}s: {e}")
+            self._delivery = "poll"
+            deadline = time.monotonic() + delay
+            while time.monotonic() < deadline:
+                await self._poll_safely(db)
+                await asyncio.sleep(PUSH_POLL_S)
+            delay = min(delay * 2, PUSH_RETRY_MAX_S)
+
+    async def _watch(self, db):
+        async with db[PUSH_COLL].watch([{"$match": {"operationType": "insert"}}]) as stream:
+            self._delivery = "change_stream"
+            print("[INFO] Push hub delivering through change stream")
+            # Catch up on anything inserted while no stream was open
+            await self._poll(db)
+            async for change in stream:
+                self._deliver(self._from_doc(change["fullDocument"]))
+
+    async def _poll(self, db):
+        since = self._poll_after.generation_time - timedelta(seconds=PUSH_POLL_LAG_S)
+        async for doc in db[PUSH_COLL].find({"_id": {"$gt": ObjectId.from_datetime(since)}}).sort("_id", 1):
+            self._deliver(self._from_doc(doc))
+            self._poll_after = max(self._poll_after, doc["_id"])
+
+    async def _poll_safely(self, db):
+        try:
+            await self._poll(db)
+        except Exception as e:
+            print(f"[WARN] Push poll failed: {e}")
+
+    async def stop(self):
+        if self._watch_task:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._watch_task = None
+
+    def metrics(self) -> Dict[str, Any]:
+        m = dict(self._metrics)
+        m["subscribers"] = sum(len(s) for s in self._subs.values())
+        m["users"] = len(self._subs)
+        m["backend"] = "mongo" if self._persistent else "local"
+        m["delivery"] = self._delivery if self._persistent else "local"
+        return m
+
+
+async def publish_safely(topic: str, data: Any, *, user_id: Optional[str] = None, type: Optional[str] = None):
+    """publish() for write paths: a push failure must never fail the write itself."""
+    try:
+        await push_hub.publish(topic, data, user_id=user_id, type=type)
+    except Exception as e:
+        print(f"[WARN] Push publish ({topic}) failed: {e}")
+
+
+async def publish_many_safely(topic: str, items: Iterable[Tuple[Optional[str], Any]], type: Optional[str] = None):
+    try:
+        await push_hub.publish_many(topic, items, type=type)
+    except Exception as e:
+        print(f"[WARN] Push publish ({topic}) failed: {e}")
+
+
+# Process-wide hub behind /api/push/stream and /api/push/ws
+push_hub = PushHub()
@@ -0,0 +1,310 @@
+# backend/utils/search_index.py
+from __future__ import annotations
+import asyncio
+import base64
+import json
+import re
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+SEARCH_COLL = "search_index"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(*texts: Any) -> List[str]:
+    """Unique lowercase alphanumeric tokens (2+ chars) in first-seen order."""
+    seen: Dict[str, None] = {}
+    for t in texts:
+        if t is None:
+            continue
+        if isinstance(t, (list, tuple)):
+            for tok in tokenize(*t):
+                seen.setdefault(tok, None)
+            continue
+        for tok in _TOKEN_RE.findall(str(t).lower()):
+            if len(tok) > 1:
+                seen.setdefault(tok, None)
+    return list(seen)
+
+
+def _join(v: Any) -> str:
+    return " ".join(str(x) for x in v) if isinstance(v, (list, tuple)) else str(v or "")
+
+
+def _patient_entry(p: Mapping[str, Any]) -> Dict[str, Any]:
+    name = (p.get("name") or [{}])[0]
+    given, family = _join(name.get("given")), name.get("family", "")
+    return {
+        "title": f"{given} {family}".strip(),
+        "subtitle": f"MRN: {p.get('mrn', 'N/A')}",
+        "title_tokens": tokenize(given, family),
+        "body_tokens": tokenize(p.get("mrn")),
+        "data": {"id": p.get("id"), "mrn": p.get("mrn"), "birth_date": p.get("birth_date"),
+                 "gender": p.get("gender"), "status": p.get("status")},
+    }
+
+
+def _referral_entry(r: Mapping[str, Any]) -> Dict[str, Any]:
+    return {
+        "title": f"Referral to {r.get('referred_to_specialty')}",
+        "subtitle": r.get("reason_for_referral"),
+        "title_tokens": tokenize(r.get("referred_to_specialty")),
+        "body_tokens": tokenize(r.get("reason_for_referral"), r.get("referred_to_provider_name")),
+        "data": {"id": r.get("id"), "patient_id": r.get("patient_id"), "status": r.get("status"),
+                 "urgency": r.get("urgency"), "referred_to_provider_name": r.get("referred_to_provider_name")},
+    }
+
+
+def _document_entry(d: Mapping[str, Any]) -> Dict[str, Any]:
+    return {
+        "title": d.get("title"),
+        "subtitle": f"Type: {d.get('document_type')}",
+        "title_tokens": tokenize(d.get("title")),
+        "body_tokens": tokenize(d.get("content"), d.get("tags")),
+        "data": {"id": d.get("id"), "patient_id": d.get("patient_id"), "document_type": d.get("document_type"),
+                 "status": d.get("status"), "tags": d.get("tags"), "created_at": d.get("created_at")},
+    }
+
+
+def _template_entry(t: Mapping[str, Any]) -> Dict[str, Any]:
+    return {
+        "title": t.get("name"),
+        "subtitle": f"Specialty: {t.get('specialty', 'General')}",
+        "title_tokens": tokenize(t.get("name")),
+        "body_tokens": tokenize(t.get("specialty"), t.get("condition")),
+        "data": {"id": t.get("id"), "template_type": t.get("template_type"), "specialty": t.get("specialty"),
+                 "condition": t.get("condition")},
+    }
+
+
+def _appointment_entry(a: Mapping[str, Any]) -> Dict[str, Any]:
+    return {
+        "title": f"{a.get('patient_name')} with {a.get('provider_name')}",
+        "subtitle": f"{a.get('appointment_date')} {a.get('start_time', '')}".strip(),
+        "title_tokens": tokenize(a.get("patient_name"), a.get("provider_name")),
+        "body_tokens": tokenize(a.get("appointment_number"), a.get("reason"), a.get("appointment_type")),
+        "data": {"id": a.get("id"), "patient_id": a.get("patient_id"), "provider_id": a.get("provider_id"),
+                 "appointment_date": a.get("appointment_date"), "start_time": a.get("start_time"),
+                 "status": a.get("status")},
+    }
+
+
+def _telehealth_entry(s: Mapping[str, Any]) -> Dict[str, Any]:
+    return {
+        "title": f"Telehealth Session - {s.get('session_type')}",
+        "subtitle": f"Status: {s.get('status')}",
+        "title_tokens": tokenize(s.get("session_type")),
+        "body_tokens": tokenize(s.get("notes"), s.get("title")),
+        "data": {"id": s.get("id"), "patient_id": s.get("patient_id"), "provider_id": s.get("provider_id"),
+                 "scheduled_start": s.get("scheduled_start"), "status": s.get("status")},
+    }
+
+
+# module -> (collection, result type, result module label, entry builder)
+SEARCH_MODULES: Dict[str, tuple] = {
+    "patients": ("patients", "patient", "patients", _patient_entry),
+    "referrals": ("referrals", "referral", "referrals", _referral_entry),
+    "appointments": ("appointments", "appointment", "appointments", _appointment_entry),
+    "documents": ("clinical_documents", "document", "documents", _document_entry),
+    "templates": ("clinical_templates", "template", "clinical-templates", _template_entry),
+    "telehealth": ("telehealth_sessions", "telehealth", "telehealth", _telehealth_entry),
+}
+
+
+async def ensure_search_indexes(db):
+    """Create search_index indexes if they don't exist"""
+    try:
+        await db[SEARCH_COLL].create_index([("module", 1), ("ref_id", 1)], unique=True, background=True)
+        await db[SEARCH_COLL].create_index([("module", 1), ("tokens", 1)], background=True)
+        print(f"[INFO] Search indexes ensured for collection {SEARCH_COLL}")
+    except Exception as e:
+        print(f"[WARN] Failed to create search indexes: {e}")
+
+
+def build_entry(module: str, doc: Mapping[str, Any]) -> Dict[str, Any]:
+    entry = SEARCH_MODULES[module][3](doc)
+    title_tokens = entry.pop("title_tokens")
+    body_tokens = entry.pop("body_tokens")
+    entry.update({
+        "module": module,
+        "ref_id": doc.get("id"),
+        "title_tokens": title_tokens,
+        "tokens": list(dict.fromkeys(title_tokens + body_tokens)),
+        "indexed_at": datetime.utcnow(),
+    })
+    return entry
+
+
+async def index_document(db, module: str, doc: Mapping[str, Any]):
+    """Upsert the index entry for one source document (called after it was written)."""
+    if not doc or not doc.get("id"):
+        return
+    entry = build_entry(module, doc)
+    await db[SEARCH_COLL].replace_one({"module": module, "ref_id": entry["ref_id"]}, entry, upsert=True)
+
+
+async def reindex(db, module: str, ref_ids: Iterable[str]):
+    """
+    Re-read source documents by id and refresh their entries; missing ones are dropped.
+    Never raises: search freshness must not fail the write that triggered it.
+    """
+    ids = [i for i in ref_ids if i]
+    if not ids:
+        return
+    try:
+        found = set()
+        async for doc in db[SEARCH_MODULES[module][0]].find({"id": {"$in": ids}}, {"_id": 0}):
+            await index_document(db, module, doc)
+            found.add(doc["id"])
+        missing = [i for i in ids if i not in found]
+        if missing:
+            await db[SEARCH_COLL].delete_many({"module": module, "ref_id": {"$in": missing}})
+    except Exception as e:
+        print(f"[WARN] Search reindex failed for {module}: {e}")
+
+
+async def rebuild_search_index(db, modules: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """Regenerate the entries of the given modules (all by default) from their collections."""
+    counts = {}
+    for module in modules or SEARCH_MODULES:
+        coll = SEARCH_MODULES[module][0]
+        await db[SEARCH_COLL].delete_many({"module": module})
+        n = 0
+        batch = []
+        async for doc in db[coll].find({}, {"_id": 0}):
+            if doc.get("id"):
+                batch.append(build_entry(module, doc))
+            if len(batch) >= 500:
+                await db[SEARCH_COLL].insert_many(batch, ordered=False)
+                n += len(batch)
+                batch = []
+        if batch:
+            await db[SEARCH_COLL].insert_many(batch, ordered=False)
+            n += len(batch)
+        counts[module] = n
+    return counts
+
+
+def score_entry(terms: List[str], title_tokens: List[str]) -> int:
+    """3 per query term found as a title word prefix, 1 per term matched only in the body."""
+    return sum(3 if any(t.startswith(q) for t in title_tokens) else 1 for q in terms)
+
+
+def encode_cursor(key: tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[tuple]:
+    if not cursor:
+        return None
+    try:
+        return tuple(json.loads(base64.urlsafe_b64decode(cursor.encode()).decode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid search cursor")
+
+
+def _score_expr(terms: List[str]) -> Dict[str, Any]:
+    """score_entry() as an aggregation expression over title_tokens."""
+    return {"$add": [
+        {"$cond": [
+            {"$gt": [{"$size": {"$filter": {
+                "input": {"$ifNull": ["$title_tokens", []]},
+                "cond": {"$eq": [{"$substrCP": ["$$this", 0, len(q)]}, q]},
+            }}}, 0]},
+            3, 1,
+        ]}
+        for q in terms
+    ]}
+
+
+def _after_bound(module: str, after: Optional[tuple]) -> Optional[Dict[str, Any]]:
+    """Match entries of `module` that sort after the cursor key (-score, module label, id)."""
+    if not after:
+        return None
+    neg_score, label, ref_id = after
+    score = -neg_score
+    if SEARCH_MODULES[module][2] > label:
+        return {"score": {"$lte": score}}
+    if SEARCH_MODULES[module][2] < label:
+        return {"score": {"$lt": score}}
+    return {"$or": [{"score": {"$lt": score}}, {"score": score, "ref_id": {"$gt": ref_id}}]}
+
+
+def _match(module: str, terms: List[str]) -> Dict[str, Any]:
+    # Every term must prefix-match a token; the first (longest) term drives the index bounds
+    ordered = sorted(terms, key=len, reverse=True)
+    return {"module": module, "$and": [{"tokens": {"$regex": f"^{re.escape(t)}"}} for t in ordered]}
+
+
+async def _search_module(db, module: str, terms: List[str], after: Optional[tuple],
+                         limit: int) -> Tuple[List[Dict[str, Any]], int]:
+    """(this module's next `limit` entries in (score desc, id) order after the cursor, total matches)."""
+    pipeline: List[Dict[str, Any]] = [
+        {"$match": _match(module, terms)},
+        {"$project": {"_id": 0, "ref_id": 1, "title": 1, "subtitle": 1, "data": 1, "score": _score_expr(terms)}},
+    ]
+    bound = _after_bound(module, after)
+    if bound:
+        pipeline.append({"$match": bound})
+    pipeline += [{"$sort": {"score": -1, "ref_id": 1}}, {"$limit": limit}]
+    entries, total = await asyncio.gather(
+        db[SEARCH_COLL].aggregate(pipeline).to_list(limit),
+        db[SEARCH_COLL].count_documents(_match(module, terms)),
+    )
+    return entries, total
+
+
+def _result_key(r: Mapping[str, Any]) -> tuple:
+    return (-r["score"], r["module"], r["id"])
+
+
+async def search(db, query: str, modules: Optional[List[str]] = None, limit: int = 50,
+                 cursor: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Query every requested module concurrently and page with an opaque cursor over the
+    (score desc, module, id) ordering. Each module scores, sorts and applies the cursor
+    bound in Mongo, so only its next `limit` + 1 entries come back to be merged;
+    total_count is the number of matches across all pages.
+    """
+    terms = tokenize(query)
+    wanted = [m for m in (modules or SEARCH_MODULES) if m in SEARCH_MODULES]
+    after = decode_cursor(cursor)
+    if not terms or not wanted:
+        return {"query": query, "results": [], "total_count": 0, "next_cursor": None}
+
+    hits = await asyncio.gather(*(_search_module(db, m, terms, after, limit + 1) for m in wanted))
+    results = []
+    for module, (entries, _) in zip(wanted, hits):
+        _, rtype, label, _ = SEARCH_MODULES[module]
+        for e in entries:
+            results.append({
+                "type": rtype,
+                "id": e["ref_id"],
+                "title": e.get("title"),
+                "subtitle": e.get("subtitle"),
+                "module": label,
+                "score": e["score"],
+                "data": e.get("data") or {},
+            })
+
+    results.sort(key=_result_key)
+    page = results[:limit]
+    next_cursor = encode_cursor(_result_key(page[-1])) if len(results) > limit else None
+    total = sum(n for _, n in hits)
+    return {"query": query, "results": page, "total_count": total, "next_cursor": next_cursor}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rebuild the global search index from the source collections")
+    parser.add_argument("--module", action="append", choices=sorted(SEARCH_MODULES))
+    args = parser.parse_args()
+
+    async def _main(modules):
+        from backend.dependencies import db
+        await ensure_search_indexes(db)
+        print(await rebuild_search_index(db, modules))
+
+    asyncio.run(_main(args.module))
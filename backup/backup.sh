@@ -61,6 +61,9 @@ backup_application_data() {
     # Backup logs
     restic backup /backup/logs --tag logs --tag "date-$BACKUP_DATE" || error_exit "Logs backup failed"
     
+    # Backup archived audit months (their Mongo partitions are dropped once archived)
+    restic backup /backup/audit_archive --tag audit_archive --tag "date-$BACKUP_DATE" || error_exit "Audit archive backup failed"
+    
     # Backup configuration (excluding secrets for security)
     restic backup /backup/secrets --tag secrets --tag "date-$BACKUP_DATE" || error_exit "Secrets backup failed"
     
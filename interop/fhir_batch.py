@@ -0,0 +1,158 @@
+"""
+FHIR micro-batching for the interop worker.
+
+Upserts are coalesced per resource (resourceType/id, newest event wins) and
+flushed as FHIR transaction Bundles once max_entries resources are pending or
+window_s after the first one arrived. A resource with a bundle in flight is
+held back for the next bundle, so writes to the same resource never race.
+Event versions (the domain event timestamp) order a retried copy against
+newer events: CommittedVersions remembers what already landed, so a retry
+that was overtaken is dropped instead of overwriting the newer resource.
+"""
+
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+ResourceKey = Tuple[str, str]
+
+
+def _newer(version: Optional[str], than: Optional[str]) -> bool:
+    """Unversioned events are treated as newest (arrival order)"""
+    return version is None or than is None or version >= than
+
+
+def resource_key(resource: Dict[str, Any]) -> ResourceKey:
+    """(resourceType, id); raises ValueError for a resource that cannot be upserted"""
+    resource_type = resource.get('resourceType')
+    resource_id = resource.get('id')
+    if not resource_type or not resource_id:
+        raise ValueError("Invalid FHIR resource: missing resourceType or id")
+    return resource_type, str(resource_id)
+
+
+def transaction_bundle(resources: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """A transaction Bundle with one conditional-free PUT (create or update) per resource"""
+    entries = []
+    for resource in resources:
+        resource_type, resource_id = resource_key(resource)
+        url = f"{resource_type}/{resource_id}"
+        entries.append({
+            'fullUrl': url,
+            'resource': resource,
+            'request': {'method': 'PUT', 'url': url},
+        })
+    return {'resourceType': 'Bundle', 'type': 'transaction', 'entry': entries}
+
+
+class PendingResource:
+    """Newest version of one resource plus every message it stands for (its own message last)"""
+    __slots__ = ('key', 'resource', 'version', 'tokens')
+
+    def __init__(self, key: ResourceKey, resource: Dict[str, Any], token: Any, version: Optional[str] = None):
+        self.key = key
+        self.resource = resource
+        self.version = version
+        self.tokens = [token]
+
+
+class CommittedVersions:
+    """Last committed event version per resource, bounded LRU"""
+
+    def __init__(self, max_size: int = 100000):
+        self.max_size = max_size
+        self._versions: "OrderedDict[ResourceKey, str]" = OrderedDict()
+
+    def superseded(self, key: ResourceKey, version: Optional[str]) -> bool:
+        """True when an event at least this new has already landed for the resource"""
+        committed = self._versions.get(key)
+        return version is not None and committed is not None and version <= committed
+
+    def commit(self, key: ResourceKey, version: Optional[str]):
+        if version is None:
+            return
+        if _newer(version, self._versions.get(key)):
+            self._versions[key] = version
+        self._versions.move_to_end(key)
+        while len(self._versions) > self.max_size:
+            self._versions.popitem(last=False)
+
+
+class FhirBatcher:
+    """
+    Collects resources and hands micro-batches to flush(batch). Each flush runs
+    as its own task; the caller bounds how many bundles are on the wire at once
+    and acks/nacks the tokens of every PendingResource in the batch.
+    """
+
+    def __init__(self, flush: Callable[[List[PendingResource]], Awaitable[None]],
+                 max_entries: int = 50, window_s: float = 0.05):
+        self._flush = flush
+        self.max_entries = max(1, max_entries)
+        self.window_s = window_s
+        self._pending: Dict[ResourceKey, PendingResource] = {}
+        self._inflight: Set[ResourceKey] = set()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.metrics = {'events': 0, 'coalesced': 0, 'bundles': 0, 'entries': 0}
+
+    def add(self, resource: Dict[str, Any], token: Any, version: Optional[str] = None):
+        key = resource_key(resource)
+        self.metrics['events'] += 1
+        pending = self._pending.get(key)
+        if pending:
+            if _newer(version, pending.version):
+                pending.resource, pending.version = resource, version
+                pending.tokens.append(token)
+            else:
+                # An older copy (e.g. a retry) arrived late: superseded by what is pending
+                pending.tokens.insert(len(pending.tokens) - 1, token)
+            self.metrics['coalesced'] += 1
+        else:
+            self._pending[key] = PendingResource(key, resource, token, version)
+        self._schedule()
+
+    def _schedule(self):
+        if len(self._pending) >= self.max_entries:
+            self._kick()
+        elif self._pending and self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window_s, self._kick)
+
+    def _kick(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        batch = []
+        for key, pending in list(self._pending.items()):
+            if key in self._inflight:
+                continue
+            batch.append(self._pending.pop(key))
+            if len(batch) >= self.max_entries:
+                break
+        if batch:
+            self._inflight.update(p.key for p in batch)
+            self.metrics['bundles'] += 1
+            self.metrics['entries'] += len(batch)
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        if self._pending and self._timer is None:
+            # Held-back resources go out with the next window (or when their bundle lands)
+            self._timer = asyncio.get_running_loop().call_later(self.window_s, self._kick)
+
+    async def _run(self, batch: List[PendingResource]):
+        try:
+            await self._flush(batch)
+        finally:
+            self._inflight.difference_update(p.key for p in batch)
+
+    async def drain(self):
+        """Flush everything pending and wait for bundles in flight (shutdown)"""
+        while self._pending or self._tasks:
+            if self._pending:
+                self._kick()
+            if self._tasks:
+                await asyncio.wait(set(self._tasks))
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Re-drive interop events.
+
+    python replay.py dlq interop.fhir [--limit N] [--dry-run]
+        Move messages parked in interop.fhir.dlq back onto interop.fhir with a
+        fresh attempt budget (after fixing whatever made them fail).
+
+    python replay.py events [--since ISO] [--until ISO] [--event-type T]
+                            [--aggregate-id ID] [--limit N] [--dry-run]
+        Republish domain events stored by the backend (domain_events) to the
+        clinichub.events exchange, routed by event_type like the originals.
+"""
+
+import os
+import json
+import argparse
+from datetime import datetime
+
+import pika
+from pymongo import MongoClient
+
+from retry import ATTEMPTS_HEADER, ERROR_HEADER, dead_letter_queue, reset_headers
+from worker import WORK_QUEUES, logger, rabbitmq_parameters
+
+
+def replay_dlq(channel, queue: str, limit: int, dry_run: bool = False) -> int:
+    """Move up to limit messages from <queue>.dlq back to queue; returns how many"""
+    dlq = dead_letter_queue(queue)
+    held = []
+    moved = 0
+    try:
+        while moved + len(held) < limit:
+            method, properties, body = channel.basic_get(queue=dlq)
+            if method is None:
+                break
+            headers = properties.headers or {}
+            logger.info(f"{dlq} #{method.delivery_tag}: attempts={headers.get(ATTEMPTS_HEADER)} "
+                        f"error={headers.get(ERROR_HEADER)}")
+            if dry_run:
+                held.append(method.delivery_tag)
+                continue
+            properties.headers = reset_headers(headers)
+            # confirm_delivery is on: this raises unless the broker has taken the copy
+            channel.basic_publish(exchange='', routing_key=queue, body=body, properties=properties)
+            channel.basic_ack(delivery_tag=method.delivery_tag)
+            moved += 1
+    finally:
+        for delivery_tag in held:
+            channel.basic_nack(delivery_tag=delivery_tag, requeue=True)
+    return len(held) if dry_run else moved
+
+
+def replay_domain_events(channel, db, since=None, until=None, event_type=None, aggregate_id=None,
+                         limit: int = 0, dry_run: bool = False) -> int:
+    """Republish stored domain events, oldest first; returns how many"""
+    q = {}
+    if since or until:
+        q['timestamp'] = {}
+        if since:
+            q['timestamp']['$gte'] = since
+        if until:
+            q['timestamp']['$lt'] = until
+    if event_type:
+        q['event_type'] = event_type
+    if aggregate_id:
+        q['aggregate_id'] = aggregate_id
+
+    count = 0
+    for event in db.domain_events.find(q, {'_id': 0}).sort('timestamp', 1).limit(limit):
+        count += 1
+        if dry_run:
+            logger.info(f"Would replay {event.get('event_type')} {event.get('aggregate_id')} ({event.get('timestamp')})")
+            continue
+        channel.basic_publish(
+            exchange='clinichub.events',
+            routing_key=event['event_type'],
+            body=json.dumps(event, default=str).encode(),
+            properties=pika.BasicProperties(
+                content_type='application/json',
+                message_id=event.get('id'),
+                headers={'x-interop-replayed-at': datetime.utcnow().isoformat()},
+                delivery_mode=2  # persistent
+            )
+        )
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-drive interop events from the DLQ or from domain_events")
+    sub = parser.add_subparsers(dest='source', required=True)
+
+    dlq = sub.add_parser('dlq', help="move dead-lettered messages back to their work queue")
+    dlq.add_argument('queue', choices=WORK_QUEUES)
+    dlq.add_argument('--limit', type=int, default=1000)
+    dlq.add_argument('--dry-run', action='store_true', help="list what would move and leave it parked")
+
+    events = sub.add_parser('events', help="republish domain_events from MongoDB")
+    events.add_argument('--since', help="ISO timestamp, inclusive")
+    events.add_argument('--until', help="ISO timestamp, exclusive")
+    events.add_argument('--event-type')
+    events.add_argument('--aggregate-id')
+    events.add_argument('--limit', type=int, default=0, help="0 = no limit")
+    events.add_argument('--dry-run', action='store_true')
+    events.add_argument('--mongo-url', default=os.getenv('MONGO_URL', 'mongodb://localhost:27017'))
+    events.add_argument('--db-name', default=os.getenv('DB_NAME', 'clinichub'))
+    args = parser.parse_args()
+
+    connection = pika.BlockingConnection(rabbitmq_parameters(os.getenv('RABBITMQ_URL')))
+    try:
+        channel = connection.channel()
+        channel.confirm_delivery()
+        if args.source == 'dlq':
+            n = replay_dlq(channel, args.queue, args.limit, args.dry_run)
+            logger.info(f"{'Found' if args.dry_run else 'Replayed'} {n} message(s) from {dead_letter_queue(args.queue)}")
+        else:
+            mongo = MongoClient(args.mongo_url)
+            try:
+                n = replay_domain_events(channel, mongo[args.db_name], args.since, args.until,
+                                         args.event_type, args.aggregate_id, args.limit, args.dry_run)
+            finally:
+                mongo.close()
+            logger.info(f"{'Found' if args.dry_run else 'Replayed'} {n} domain event(s)")
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
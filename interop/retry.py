@@ -0,0 +1,112 @@
+"""
+Retry routing for interop events.
+
+A failed message is acked on its work queue after being republished to a delay
+queue for its attempt (TTL = INTEROP_RETRY_BASE_S * 2^attempt). When the TTL
+expires, RabbitMQ dead-letters it back onto the work queue. Once
+INTEROP_MAX_ATTEMPTS is reached, or on a permanent error, it goes to
+<queue>.dlq. A server's Retry-After moves the message to the first delay
+queue that waits at least that long. The attempt counter and last error travel in message headers,
+and replay.py re-drives parked messages.
+"""
+
+import os
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+INTEROP_MAX_ATTEMPTS = int(os.getenv('INTEROP_MAX_ATTEMPTS', '6'))
+INTEROP_RETRY_BASE_S = int(os.getenv('INTEROP_RETRY_BASE_S', '5'))
+
+ATTEMPTS_HEADER = 'x-interop-attempts'
+ERROR_HEADER = 'x-interop-last-error'
+FIRST_FAILED_HEADER = 'x-interop-first-failed-at'
+SOURCE_HEADER = 'x-interop-source-queue'
+
+# 4xx answers that mean "not now" rather than "never": timeout, conflicting concurrent write, throttled
+RETRYABLE_STATUSES = (408, 409, 429)
+
+
+def retry_delays_s(max_attempts: int = INTEROP_MAX_ATTEMPTS, base_s: int = INTEROP_RETRY_BASE_S) -> List[int]:
+    """Delay before retry n (1-based) is base * 2^(n-1); the last attempt goes to the DLQ, not a delay"""
+    return [base_s * 2 ** n for n in range(max(0, max_attempts - 1))]
+
+
+def retry_queue(queue: str, delay_s: int) -> str:
+    return f"{queue}.retry.{delay_s}s"
+
+
+def dead_letter_queue(queue: str) -> str:
+    return f"{queue}.dlq"
+
+
+def retry_topology(queue: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """(queue name, arguments) for the delay queues and DLQ that back a work queue"""
+    queues = [
+        (retry_queue(queue, delay), {
+            'x-message-ttl': delay * 1000,
+            'x-dead-letter-exchange': '',
+            'x-dead-letter-routing-key': queue,
+        })
+        for delay in retry_delays_s()
+    ]
+    queues.append((dead_letter_queue(queue), {}))
+    return queues
+
+
+def attempts_of(headers: Optional[Dict[str, Any]]) -> int:
+    try:
+        return int((headers or {}).get(ATTEMPTS_HEADER, 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def is_permanent(status: Optional[int]) -> bool:
+    """A 4xx the server will keep giving for this payload; no response, 5xx and RETRYABLE_STATUSES are retried"""
+    return status is not None and status < 500 and status not in RETRYABLE_STATUSES
+
+
+def parse_retry_after(value: Optional[str], now: Optional[datetime] = None) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date); None if absent or malformed"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - (now or datetime.now(timezone.utc))).total_seconds())
+
+
+def route_failure(queue: str, headers: Optional[Dict[str, Any]], error: str,
+                  permanent: bool = False, retry_after_s: Optional[float] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Where a failed message goes next and the headers to send it with. The
+    attempt that just failed is counted; permanent errors skip straight to
+    the DLQ. retry_after_s picks a longer delay queue when the backoff for
+    this attempt would be shorter (capped at the longest one).
+    """
+    attempts = attempts_of(headers) + 1
+    out = dict(headers or {})
+    out[ATTEMPTS_HEADER] = attempts
+    out[ERROR_HEADER] = str(error)[:1000]
+    out[SOURCE_HEADER] = queue
+    out.setdefault(FIRST_FAILED_HEADER, datetime.utcnow().isoformat())
+    delays = retry_delays_s()
+    if permanent or attempts > len(delays):
+        return dead_letter_queue(queue), out
+    delay = delays[attempts - 1]
+    if retry_after_s and retry_after_s > delay:
+        delay = next((d for d in delays if d >= retry_after_s), delays[-1])
+    return retry_queue(queue, delay), out
+
+
+def reset_headers(headers: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Headers for a replayed message: a fresh attempt budget, provenance kept"""
+    out = {k: v for k, v in (headers or {}).items() if k not in (ATTEMPTS_HEADER, ERROR_HEADER)}
+    out['x-interop-replayed-at'] = datetime.utcnow().isoformat()
+    return out
@@ -11,14 +11,19 @@ import os
 import json
 import logging
 import asyncio
-from typing import Dict, Any
+import signal
+from typing import Dict, Any, List, Optional, Set, Tuple
 from datetime import datetime
 
+import httpx
 import pika
-import requests
+from pika.adapters.asyncio_connection import AsyncioConnection
 from fhirclient import client
 from dotenv import load_dotenv
 
+from fhir_batch import CommittedVersions, FhirBatcher, PendingResource, resource_key, transaction_bundle
+from retry import is_permanent, parse_retry_after, route_failure, retry_topology
+
 # Load environment variables
 load_dotenv()
 
@@ -29,6 +34,48 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Unacked messages per consumer; keep it >= FHIR_BATCH_SIZE so bundles can fill
+INTEROP_PREFETCH = int(os.getenv('INTEROP_PREFETCH', '200'))
+FHIR_BATCH_SIZE = int(os.getenv('FHIR_BATCH_SIZE', '50'))
+FHIR_BATCH_WINDOW_MS = int(os.getenv('FHIR_BATCH_WINDOW_MS', '50'))
+FHIR_TIMEOUT_S = float(os.getenv('FHIR_TIMEOUT_S', '30'))
+# Resources whose last committed event version is remembered, to drop retries overtaken by newer events
+FHIR_COMMITTED_CACHE_SIZE = int(os.getenv('FHIR_COMMITTED_CACHE_SIZE', '100000'))
+# Requests on the wire per destination
+FHIR_MAX_CONCURRENCY = int(os.getenv('FHIR_MAX_CONCURRENCY', '4'))
+MIRTH_MAX_CONCURRENCY = int(os.getenv('MIRTH_MAX_CONCURRENCY', '4'))
+
+WORK_QUEUES = ('interop.fhir', 'interop.hl7')
+
+FHIR_HEADERS = {
+    'Content-Type': 'application/fhir+json',
+    'Accept': 'application/fhir+json'
+}
+
+def rabbitmq_parameters(url: Optional[str] = None) -> pika.connection.Parameters:
+    """Connection parameters from RABBITMQ_URL, or the compose defaults"""
+    if url:
+        return pika.URLParameters(url)
+    return pika.ConnectionParameters(
+        host='rabbitmq',
+        port=5672,
+        virtual_host='clinichub',
+        credentials=pika.PlainCredentials('clinichub', 'changeme')
+    )
+
+
+class Delivery:
+    """One consumed message; enough to ack it or republish it for a retry"""
+    __slots__ = ('channel', 'delivery_tag', 'queue', 'body', 'properties')
+    
+    def __init__(self, queue: str, channel, method, properties, body: bytes):
+        self.channel = channel
+        self.delivery_tag = method.delivery_tag
+        self.queue = queue
+        self.body = body
+        self.properties = properties
+
+
 class ClinicHubInteropWorker:
     """Processes ClinicHub domain events for healthcare interoperability"""
     
@@ -43,10 +90,23 @@ class ClinicHubInteropWorker:
         self.fhir_client = None
         self._init_fhir_client()
         
-        # Initialize message queue connection
+        # Message queue connection, opened on the running loop by run()
         self.connection = None
         self.channel = None
-        self._init_rabbitmq()
+        self._closed: Optional[asyncio.Future] = None
+        self._stopping = False
+        self._publish_seq = 0
+        self._confirms: Dict[int, asyncio.Future] = {}
+        
+        # Pooled HTTP client (created in run()) and per-destination concurrency
+        self.http: Optional[httpx.AsyncClient] = None
+        self._limits = {
+            'fhir': asyncio.Semaphore(FHIR_MAX_CONCURRENCY),
+            'mirth': asyncio.Semaphore(MIRTH_MAX_CONCURRENCY),
+        }
+        self._tasks: Set[asyncio.Task] = set()
+        self.fhir_batcher = FhirBatcher(self._flush_fhir_batch, FHIR_BATCH_SIZE, FHIR_BATCH_WINDOW_MS / 1000)
+        self.fhir_committed = CommittedVersions(FHIR_COMMITTED_CACHE_SIZE)
     
     def _read_secret(self, env_var: str, fallback: str = '') -> str:
         """Read secret from file or environment variable"""
@@ -68,69 +128,206 @@ class ClinicHubInteropWorker:
         except Exception as e:
             logger.error(f"Failed to initialize FHIR client: {e}")
     
-    def _init_rabbitmq(self):
-        """Initialize RabbitMQ connection"""
-        try:
-            # Parse connection parameters
-            if self.rabbitmq_url:
-                connection_params = pika.URLParameters(self.rabbitmq_url)
-            else:
-                connection_params = pika.ConnectionParameters(
-                    host='rabbitmq',
-                    port=5672,
-                    virtual_host='clinichub',
-                    credentials=pika.PlainCredentials('clinichub', 'changeme')
-                )
-            
-            self.connection = pika.BlockingConnection(connection_params)
-            self.channel = self.connection.channel()
-            
-            # Declare exchanges and queues
-            self.channel.exchange_declare(exchange='clinichub.events', exchange_type='topic')
-            self.channel.queue_declare(queue='interop.fhir', durable=True)
-            self.channel.queue_declare(queue='interop.hl7', durable=True)
-            
-            # Bind queues to exchanges
-            self.channel.queue_bind(exchange='clinichub.events', queue='interop.fhir', routing_key='*.created')
-            self.channel.queue_bind(exchange='clinichub.events', queue='interop.fhir', routing_key='*.updated')
-            self.channel.queue_bind(exchange='clinichub.events', queue='interop.hl7', routing_key='lab.*')
-            
-            logger.info("RabbitMQ connection initialized")
-        except Exception as e:
-            logger.error(f"Failed to initialize RabbitMQ: {e}")
+    async def _init_rabbitmq(self):
+        """Open the RabbitMQ connection and channel, declare the topology and set prefetch"""
+        loop = asyncio.get_running_loop()
+        opened = loop.create_future()
+        self._closed = loop.create_future()
+        
+        def on_open(connection):
+            if not opened.done():
+                opened.set_result(connection)
+        
+        def on_open_error(connection, error):
+            if not opened.done():
+                opened.set_exception(error if isinstance(error, Exception) else ConnectionError(str(error)))
+        
+        def on_close(connection, reason):
+            if not self._closed.done():
+                self._closed.set_result(reason)
+        
+        self.connection = AsyncioConnection(
+            rabbitmq_parameters(self.rabbitmq_url),
+            on_open_callback=on_open,
+            on_open_error_callback=on_open_error,
+            on_close_callback=on_close,
+            custom_ioloop=loop
+        )
+        await opened
+        
+        channel_opened = loop.create_future()
+        self.connection.channel(on_open_callback=channel_opened.set_result)
+        self.channel = await channel_opened
+        self.channel.add_on_close_callback(self._on_channel_closed)
+        
+        # Declare exchanges and queues
+        await self._rpc(self.channel.exchange_declare, exchange='clinichub.events', exchange_type='topic')
+        await self._rpc(self.channel.queue_declare, queue='interop.fhir', durable=True)
+        await self._rpc(self.channel.queue_declare, queue='interop.hl7', durable=True)
+        
+        # Delay queues (dead-lettering back to the work queue) and a DLQ per work queue
+        for work_queue in WORK_QUEUES:
+            for name, arguments in retry_topology(work_queue):
+                await self._rpc(self.channel.queue_declare, queue=name, durable=True, arguments=arguments)
+        
+        # Bind queues to exchanges
+        await self._rpc(self.channel.queue_bind, exchange='clinichub.events', queue='interop.fhir', routing_key='*.created')
+        await self._rpc(self.channel.queue_bind, exchange='clinichub.events', queue='interop.fhir', routing_key='*.updated')
+        await self._rpc(self.channel.queue_bind, exchange='clinichub.events', queue='interop.hl7', routing_key='lab.*')
+        
+        # Per consumer: bounds unacked messages (and so memory) while letting bundles fill
+        await self._rpc(self.channel.basic_qos, prefetch_count=INTEROP_PREFETCH)
+        # A failed message is only acked once its retry copy is confirmed by the broker
+        await self._rpc(self.channel.confirm_delivery, ack_nack_callback=self._on_publish_confirm)
+        
+        logger.info("RabbitMQ connection initialized")
+    
+    async def _rpc(self, method, **kwargs):
+        """Call a pika channel method and wait for the broker's reply"""
+        reply = asyncio.get_running_loop().create_future()
+        method(callback=lambda frame: reply.done() or reply.set_result(frame), **kwargs)
+        await asyncio.wait({reply, self._closed}, return_when=asyncio.FIRST_COMPLETED)
+        if not reply.done():
+            raise ConnectionError(f"RabbitMQ connection closed during {method.__name__}")
+        return reply.result()
+    
+    def _on_channel_closed(self, channel, reason):
+        for confirm in self._confirms.values():
+            if not confirm.done():
+                confirm.set_result(False)
+        self._confirms.clear()
+        if not self._stopping:
+            logger.error(f"RabbitMQ channel closed: {reason}")
+        if self.connection and not (self.connection.is_closing or self.connection.is_closed):
+            self.connection.close()
+    
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    def _ack(self, delivery: Delivery):
+        if delivery.channel.is_open:  # otherwise the broker redelivers it anyway
+            delivery.channel.basic_ack(delivery_tag=delivery.delivery_tag)
+    
+    async def _fail(self, delivery: Delivery, error: str, permanent: bool = False,
+                    retry_after_s: Optional[float] = None):
+        """Park a failed message in its next delay queue (or the DLQ), then ack the original"""
+        target, headers = route_failure(delivery.queue, delivery.properties.headers, error, permanent, retry_after_s)
+        if await self._republish(target, delivery, headers):
+            logger.warning(f"{delivery.queue} message -> {target} (attempt {headers['x-interop-attempts']}): {error}")
+            self._ack(delivery)
+        elif delivery.channel.is_open:
+            delivery.channel.basic_nack(delivery_tag=delivery.delivery_tag, requeue=True)
+    
+    async def _republish(self, queue: str, delivery: Delivery, headers: Dict[str, Any]) -> bool:
+        """Publish a copy through the default exchange and wait for the broker's confirm"""
+        if not self.channel or not self.channel.is_open:
+            return False
+        original = delivery.properties
+        properties = pika.BasicProperties(
+            content_type=original.content_type,
+            message_id=original.message_id,
+            correlation_id=original.correlation_id,
+            timestamp=original.timestamp,
+            type=original.type,
+            app_id=original.app_id,
+            headers=headers,
+            delivery_mode=2  # persistent
+        )
+        self._publish_seq += 1
+        confirm = asyncio.get_running_loop().create_future()
+        self._confirms[self._publish_seq] = confirm
+        self.channel.basic_publish(exchange='', routing_key=queue, body=delivery.body, properties=properties)
+        return await confirm
+    
+    def _on_publish_confirm(self, frame):
+        method = frame.method
+        ok = isinstance(method, pika.spec.Basic.Ack)
+        if method.multiple:
+            seqs = [seq for seq in self._confirms if seq <= method.delivery_tag]
+        else:
+            seqs = [method.delivery_tag]
+        for seq in seqs:
+            confirm = self._confirms.pop(seq, None)
+            if confirm and not confirm.done():
+                confirm.set_result(ok)
     
     def process_fhir_event(self, ch, method, properties, body):
-        """Process FHIR-related domain events"""
+        """Queue a FHIR event's resource for the next transaction bundle"""
+        delivery = Delivery('interop.fhir', ch, method, properties, body)
         try:
             event = json.loads(body.decode())
-            logger.info(f"Processing FHIR event: {event['event_type']}")
+            logger.debug(f"Processing FHIR event: {event['event_type']}")
             
             # Extract FHIR resource from event
             fhir_resource = event.get('data', {}).get('fhir_resource')
             if not fhir_resource:
                 logger.warning("No FHIR resource found in event")
-                ch.basic_ack(delivery_tag=method.delivery_tag)
+                self._ack(delivery)
                 return
             
-            # Send to HAPI FHIR server
-            success = self._send_to_fhir_server(fhir_resource)
+            # A retry (or redelivery) overtaken by a newer committed event must not overwrite it
+            version = event.get('timestamp')
+            key = resource_key(fhir_resource)
+            if self.fhir_committed.superseded(key, version):
+                logger.info(f"Dropping superseded FHIR event for {'/'.join(key)} ({version})")
+                self._ack(delivery)
+                return
             
-            if success:
-                logger.info(f"Successfully processed FHIR event: {event['aggregate_id']}")
-                ch.basic_ack(delivery_tag=method.delivery_tag)
-            else:
-                logger.error(f"Failed to process FHIR event: {event['aggregate_id']}")
-                # Reject and requeue for retry (implement max retry logic)
-                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            # Settled once the bundle carrying it (or a newer version) lands
+            self.fhir_batcher.add(fhir_resource, delivery, version)
                 
         except Exception as e:
             logger.error(f"Error processing FHIR event: {e}")
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            self._spawn(self._fail(delivery, f"unprocessable event: {e}", permanent=True))
+    
+    async def _flush_fhir_batch(self, batch: List[PendingResource]):
+        """Send one micro-batch as a transaction Bundle and settle its messages"""
+        # A newer version may have committed while this one waited behind its bundle
+        current = []
+        for pending in batch:
+            if self.fhir_committed.superseded(pending.key, pending.version):
+                for delivery in pending.tokens:
+                    self._ack(delivery)
+            else:
+                current.append(pending)
+        if not current:
+            return
+        batch = current
+        status, retry_after_s = await self._send_to_fhir_server([p.resource for p in batch])
+        permanent = is_permanent(status)
+        if permanent and status >= 400 and len(batch) > 1:
+            # One bad resource rolls back the whole transaction: resend individually to isolate it
+            logger.warning(f"FHIR bundle of {len(batch)} rejected ({status}), retrying resources individually")
+            await asyncio.gather(*(self._flush_fhir_batch([p]) for p in batch))
+            return
+        
+        if status in (200, 201):
+            for pending in batch:
+                self.fhir_committed.commit(pending.key, pending.version)
+                for delivery in pending.tokens:
+                    self._ack(delivery)
+            return
+        
+        # Other 4xx are permanent for this resource; 408/409/429, 5xx and network errors are retried with backoff
+        failures = []
+        for pending in batch:
+            logger.error(f"Failed to process FHIR resource {'/'.join(pending.key)} ({status})")
+            # Only the newest version is retried; the older events it coalesced are superseded
+            for delivery in pending.tokens[:-1]:
+                self._ack(delivery)
+            failures.append(self._fail(pending.tokens[-1], f"FHIR server returned {status or 'no response'}",
+                                       permanent, retry_after_s))
+        await asyncio.gather(*failures)
     
     def process_hl7_event(self, ch, method, properties, body):
-        """Process HL7-related domain events"""
+        """Handle an HL7 event in its own task so a slow Mirth call never stalls the channel"""
+        self._spawn(self._process_hl7_event(Delivery('interop.hl7', ch, method, properties, body)))
+    
+    async def _process_hl7_event(self, delivery: Delivery):
         try:
-            event = json.loads(body.decode())
+            event = json.loads(delivery.body.decode())
             logger.info(f"Processing HL7 event: {event['event_type']}")
             
             # Convert event to HL7 message format
@@ -138,51 +335,37 @@ class ClinicHubInteropWorker:
             
             if hl7_message:
                 # Send to Mirth Connect for processing
-                success = self._send_to_mirth(hl7_message, event['event_type'])
+                success = await self._send_to_mirth(hl7_message, event['event_type'])
                 
                 if success:
                     logger.info(f"Successfully processed HL7 event: {event['aggregate_id']}")
-                    ch.basic_ack(delivery_tag=method.delivery_tag)
+                    self._ack(delivery)
                 else:
                     logger.error(f"Failed to process HL7 event: {event['aggregate_id']}")
-                    ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+                    await self._fail(delivery, "Mirth Connect rejected the message")
             else:
                 logger.warning(f"Could not convert event to HL7: {event['event_type']}")
-                ch.basic_ack(delivery_tag=method.delivery_tag)
+                self._ack(delivery)
                 
         except Exception as e:
             logger.error(f"Error processing HL7 event: {e}")
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            await self._fail(delivery, f"unprocessable event: {e}", permanent=True)
     
-    def _send_to_fhir_server(self, fhir_resource: Dict[str, Any]) -> bool:
-        """Send FHIR resource to HAPI FHIR server"""
+    async def _send_to_fhir_server(self, resources: List[Dict[str, Any]]) -> Tuple[Optional[int], Optional[float]]:
+        """POST a transaction Bundle to HAPI FHIR; returns (HTTP status or None if unreachable, Retry-After seconds)"""
+        bundle = transaction_bundle(resources)
         try:
-            resource_type = fhir_resource.get('resourceType')
-            resource_id = fhir_resource.get('id')
-            
-            if not resource_type or not resource_id:
-                logger.error("Invalid FHIR resource: missing resourceType or id")
-                return False
-            
-            # PUT request to create/update resource
-            url = f"{self.hapi_fhir_url}/{resource_type}/{resource_id}"
-            headers = {
-                'Content-Type': 'application/fhir+json',
-                'Accept': 'application/fhir+json'
-            }
-            
-            response = requests.put(url, json=fhir_resource, headers=headers, timeout=30)
-            
-            if response.status_code in [200, 201]:
-                logger.info(f"FHIR resource created/updated: {resource_type}/{resource_id}")
-                return True
-            else:
-                logger.error(f"FHIR server error: {response.status_code} - {response.text}")
-                return False
-                
+            async with self._limits['fhir']:
+                response = await self.http.post(self.hapi_fhir_url, json=bundle, headers=FHIR_HEADERS)
         except Exception as e:
             logger.error(f"Error sending to FHIR server: {e}")
-            return False
+            return None, None
+        
+        if response.status_code in [200, 201]:
+            logger.info(f"FHIR transaction committed: {len(resources)} resources")
+        else:
+            logger.error(f"FHIR server error: {response.status_code} - {response.text[:500]}")
+        return response.status_code, parse_retry_after(response.headers.get('Retry-After'))
     
     def _convert_to_hl7(self, event: Dict[str, Any]) -> str:
         """Convert domain event to HL7 v2 message"""
@@ -219,53 +402,72 @@ PID|1||{event['aggregate_id']}||{event['data'].get('last_name', '')}^{event['dat
         
         return hl7_message
     
-    def _send_to_mirth(self, hl7_message: str, message_type: str) -> bool:
+    
+    async def _send_to_mirth(self, hl7_message: str, message_type: str) -> bool:
         """Send HL7 message to Mirth Connect"""
         try:
-            # This would integrate with Mirth Connect's REST API
-            # For now, just log the message
-            logger.info(f"HL7 Message ({message_type}):\n{hl7_message}")
+            async with self._limits['mirth']:
+                # This would integrate with Mirth Connect's REST API through self.http
+                # For now, just log the message
+                logger.info(f"HL7 Message ({message_type}):\n{hl7_message}")
             return True
             
         except Exception as e:
             logger.error(f"Error sending to Mirth: {e}")
             return False
     
-    def start_consuming(self):
-        """Start consuming messages from RabbitMQ"""
-        if not self.channel:
-            logger.error("RabbitMQ channel not initialized")
-            return
-        
-        try:
-            # Set up consumers
-            self.channel.basic_consume(
-                queue='interop.fhir',
-                on_message_callback=self.process_fhir_event
-            )
-            
-            self.channel.basic_consume(
-                queue='interop.hl7',
-                on_message_callback=self.process_hl7_event
+    async def run(self):
+        """Consume both queues until stop() or until the broker connection drops"""
+        self.http = httpx.AsyncClient(
+            timeout=httpx.Timeout(FHIR_TIMEOUT_S, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=FHIR_MAX_CONCURRENCY + MIRTH_MAX_CONCURRENCY,
+                max_keepalive_connections=FHIR_MAX_CONCURRENCY + MIRTH_MAX_CONCURRENCY
             )
+        )
+        try:
+            await self._init_rabbitmq()
             
-            logger.info("Starting message consumption...")
-            self.channel.start_consuming()
+            # Set up consumers
+            self.channel.basic_consume(queue='interop.fhir', on_message_callback=self.process_fhir_event)
+            self.channel.basic_consume(queue='interop.hl7', on_message_callback=self.process_hl7_event)
             
-        except KeyboardInterrupt:
-            logger.info("Stopping consumer...")
-            self.channel.stop_consuming()
-            if self.connection:
-                self.connection.close()
-        except Exception as e:
-            logger.error(f"Error in message consumption: {e}")
+            logger.info(f"Starting message consumption (prefetch {INTEROP_PREFETCH}, "
+                        f"FHIR bundles of up to {FHIR_BATCH_SIZE} every {FHIR_BATCH_WINDOW_MS}ms)...")
+            reason = await self._closed
+            if not self._stopping:
+                raise ConnectionError(f"RabbitMQ connection lost: {reason}")
+        finally:
+            await self.http.aclose()
+    
+    async def stop(self):
+        """Stop consuming, settle what is already in flight, then close the connection"""
+        if self._stopping:
+            return
+        self._stopping = True
+        logger.info("Stopping consumer...")
+        if self.channel and self.channel.is_open:
+            for consumer_tag in list(self.channel.consumer_tags):
+                self.channel.basic_cancel(consumer_tag)
+        await self.fhir_batcher.drain()
+        if self._tasks:
+            await asyncio.wait(set(self._tasks))
+        if self.connection and not (self.connection.is_closing or self.connection.is_closed):
+            self.connection.close()
+        elif self._closed and not self._closed.done():
+            self._closed.set_result("stopped")
+
+async def serve():
+    worker = ClinicHubInteropWorker()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: loop.create_task(worker.stop()))
+    await worker.run()
 
 def main():
     """Main entry point"""
     logger.info("Starting ClinicHub Interoperability Worker")
-    
-    worker = ClinicHubInteropWorker()
-    worker.start_consuming()
+    asyncio.run(serve())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
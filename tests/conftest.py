@@ -0,0 +1,208 @@
+import mongomock
+import pytest
+from pymongo.errors import BulkWriteError, OperationFailure
+from mongomock import aggregate as _mongomock_aggregate
+
+
+def _compat(value):
+    # mongomock implements $substr but not $substrCP (identical on the ASCII ISO dates we slice)
+    if isinstance(value, dict):
+        return {("$substr" if k == "$substrCP" else k): _compat(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_compat(v) for v in value]
+    return value
+
+
+def _project(doc, projection):
+    if not projection:
+        return doc
+    keep = {k for k, v in projection.items() if v and k != "_id"}
+    return {k: v for k, v in doc.items() if k in keep or (k == "_id" and projection.get("_id", 1))}
+
+
+class AsyncCursor:
+    """Motor-style cursor over a mongomock cursor or result list"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, n):
+        self._cursor = self._cursor.limit(n)
+        return self
+
+    def skip(self, n):
+        self._cursor = self._cursor.skip(n)
+        return self
+
+    def hint(self, index):
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    async def to_list(self, length=None):
+        docs = list(self._cursor)
+        return docs if length is None else docs[:length]
+
+    def __aiter__(self):
+        self._it = iter(self._cursor)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._it)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class AsyncCollection:
+    """Motor-style collection over mongomock, logging every call on the owning database"""
+
+    def __init__(self, db, name):
+        self._db = db
+        self._coll = db.sync[name]
+        self.name = name
+
+    def _call(self, method, args, kwargs):
+        self._db.calls.append((self.name, method, args))
+        if method in self._db.failing:
+            raise RuntimeError(f"{method} failed")
+        kwargs.pop("session", None)
+        kwargs.pop("background", None)
+        return getattr(self._coll, method)(*args, **kwargs)
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self._call("find", args, kwargs))
+
+    def aggregate(self, pipeline, **kwargs):
+        pipeline = _compat(pipeline)
+        if pipeline and "$merge" in pipeline[-1]:
+            return AsyncCursor(self._merge(pipeline[:-1], pipeline[-1]["$merge"], kwargs))
+        return AsyncCursor(self._call("aggregate", (pipeline,), kwargs))
+
+    def _merge(self, pipeline, spec, kwargs):
+        # mongomock has no $merge; supports the whenMatched replace/merge + whenNotMatched insert forms
+        rows = list(self._call("aggregate", (pipeline,), kwargs))
+        target = self._db.sync[spec["into"]]
+        on = spec.get("on", "_id")
+        on = [on] if isinstance(on, str) else on
+        for row in rows:
+            key = {k: row[k] for k in on}
+            if spec.get("whenMatched", "merge") == "replace":
+                new = {k: v for k, v in row.items() if k != "_id"}
+                if target.find_one(key) is None:
+                    target.insert_one(new)
+                else:
+                    target.replace_one(key, new)
+            else:
+                target.update_one(key, {"$set": {k: v for k, v in row.items() if k != "_id"}}, upsert=True)
+        return []
+
+    def _pipeline_update(self, filt, pipeline, many):
+        # mongomock has no update-with-aggregation-pipeline; evaluate the stages per matched document
+        matched = list(self._coll.find(filt))[: None if many else 1]
+        for doc in matched:
+            new, = _mongomock_aggregate.process_pipeline([doc], self._db.sync, pipeline, None)
+            self._coll.replace_one({"_id": doc["_id"]}, new)
+        return matched
+
+    async def update_one(self, filt, update, *args, **kwargs):
+        if isinstance(update, list):
+            self._db.calls.append((self.name, "update_one", (filt,)))
+            n = len(self._pipeline_update(filt, update, many=False))
+            return mongomock.results.UpdateResult({"n": n, "nModified": n}, True)
+        return self._call("update_one", (filt, update) + args, kwargs)
+
+    async def update_many(self, filt, update, *args, **kwargs):
+        if isinstance(update, list):
+            self._db.calls.append((self.name, "update_many", (filt,)))
+            n = len(self._pipeline_update(filt, update, many=True))
+            return mongomock.results.UpdateResult({"n": n, "nModified": n}, True)
+        return self._call("update_many", (filt, update) + args, kwargs)
+
+    async def find_one_and_update(self, filt, update, *args, **kwargs):
+        if isinstance(update, list):
+            self._db.calls.append((self.name, "find_one_and_update", (filt,)))
+            before = self._pipeline_update(filt, update, many=False)
+            if not before:
+                return None
+            projection = kwargs.get("projection")
+            if kwargs.get("return_document"):
+                return self._coll.find_one({"_id": before[0]["_id"]}, projection)
+            return _project(before[0], projection)
+        return self._call("find_one_and_update", (filt, update) + args, kwargs)
+
+    async def bulk_write(self, ops, ordered=True, **kwargs):
+        # One op at a time: mongomock has no pipeline updates and misnumbers upserts in unordered batches
+        self._db.calls.append((self.name, "bulk_write", (ops,)))
+        if "bulk_write" in self._db.failing:
+            raise RuntimeError("bulk_write failed")
+        result = {"nInserted": 0, "nMatched": 0, "nModified": 0, "nUpserted": 0, "nRemoved": 0,
+                  "upserted": [], "writeErrors": [], "writeConcernErrors": []}
+        for i, op in enumerate(ops):
+            if isinstance(getattr(op, "_doc", None), list):
+                n = len(self._pipeline_update(op._filter, op._doc, many=False))
+                result["nMatched"] += n
+                result["nModified"] += n
+                continue
+            try:
+                one = self._coll.bulk_write([op]).bulk_api_result
+            except BulkWriteError as e:
+                result["writeErrors"] += [{**err, "index": i} for err in e.details["writeErrors"]]
+                if ordered:
+                    break
+                continue
+            for key in ("nInserted", "nMatched", "nModified", "nUpserted", "nRemoved"):
+                result[key] += one[key]
+            result["upserted"] += [{"index": i, "_id": u["_id"]} for u in one["upserted"]]
+        if result["writeErrors"]:
+            raise BulkWriteError(result)
+        return mongomock.results.BulkWriteResult(result, True)
+
+    def watch(self, *args, **kwargs):
+        # Like a standalone mongod
+        raise OperationFailure("The $changeStream stage is only supported on replica sets", code=40573)
+
+    def __getattr__(self, method):
+        async def call(*args, **kwargs):
+            return self._call(method, args, kwargs)
+        return call
+
+
+class AsyncDatabase:
+    """
+    Motor-style database over mongomock. `calls` records (collection, method,
+    args) for round-trip assertions; method names added to `failing` raise.
+    """
+
+    def __init__(self):
+        self.sync = mongomock.MongoClient().db
+        self.client = None  # no sessions/transactions: code under test takes its standalone path
+        self.calls = []
+        self.failing = set()
+        self._collections = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = AsyncCollection(self, name)
+        return self._collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    async def list_collection_names(self):
+        return self.sync.list_collection_names()
+
+    def count(self, collection, method):
+        return sum(1 for c, m, _ in self.calls if c == collection and m == method)
+
+
+@pytest.fixture
+def mongo():
+    return AsyncDatabase()
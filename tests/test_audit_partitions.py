@@ -0,0 +1,71 @@
+import json
+from backend.utils.audit_partitions import ArchiveWriter, month_of, months_back, read_archive
+
+def _doc(i, action):
+    return {"_id": f"{i:04d}", "ts": f"2023-01-{1 + i // 10:02d}T00:00:{i % 60:02d}", "action": action,
+            "subject_type": "payroll_run", "user": {"id": "u1"}}
+
+def test_months_route_and_count_back():
+    assert month_of("2024-03-09T10:00:00") == "202403"
+    assert months_back("202403", 13) == "202302" and months_back("202401", 1) == "202312"
+
+def test_archive_reads_skip_blocks_and_resume_after_cursor(tmp_path):
+    docs = sorted((_doc(i, "payroll.run.post" if i < 50 else "forms.submit") for i in range(100)),
+                  key=lambda d: (d["ts"], d["_id"]), reverse=True)
+    path = tmp_path / "audit_log" / "202301.jsonl.gz"
+    writer = ArchiveWriter(path, "audit_log", "202301")
+    for i in range(0, 100, 20):
+        writer.add_block(docs[i:i + 20])
+    index = writer.close()
+    assert index["count"] == 100 and len(index["blocks"]) == 5
+    assert json.loads((tmp_path / "audit_log" / "202301.idx.json").read_text())["sha256"] == index["sha256"]
+
+    posts = read_archive(str(path), index, "audit_log", {"action": "payroll.run.post"}, None, None, None, 10)
+    assert [d["_id"] for d in posts] == [d["_id"] for d in docs if d["action"] == "payroll.run.post"][:10]
+    after = (posts[-1]["ts"], posts[-1]["_id"])
+    more = read_archive(str(path), index, "audit_log", {"user.id": "u1"}, None, None, after, 5)
+    assert (more[0]["ts"], more[0]["_id"]) < after and len(more) == 5
+
+def _partitions(mongo, tmp_path):
+    import asyncio
+    from backend.utils.audit_partitions import AuditPartitions, ensure_audit_partition_indexes
+    asyncio.run(ensure_audit_partition_indexes(mongo))
+    return AuditPartitions(archive_dir=str(tmp_path), hot_months=13)
+
+def test_archive_due_keeps_partitions_without_archive_dir(mongo):
+    import asyncio
+    from backend.utils.audit_partitions import AuditPartitions
+    mongo.sync["audit_log_202301"].insert_many([_doc(i, "forms.submit") for i in range(5)])
+    assert asyncio.run(AuditPartitions(archive_dir="").archive_due(mongo)) == []
+    assert mongo.sync["audit_log_202301"].count_documents({}) == 5
+
+def test_archived_month_merges_late_rows_and_pages_across_both(mongo, tmp_path):
+    import asyncio
+    parts = _partitions(mongo, tmp_path)
+    mongo.sync["audit_log_202301"].insert_many([_doc(i, "forms.submit") for i in range(30)])
+    first = asyncio.run(parts.archive_month(mongo, "audit_log", "202301"))
+    assert first["path"] == "audit_log/202301.jsonl.gz" and "audit_log_202301" not in mongo.sync.list_collection_names()
+
+    mongo.sync["audit_log_202301"].insert_many([_doc(i, "forms.submit") for i in range(30, 40)])
+    parts._cache.clear()
+    items, cursor = asyncio.run(parts.page(mongo, "audit_log", {}, limit=40))
+    assert len(items) == 40 and cursor is None
+    assert [i["ts"] for i in items] == sorted((i["ts"] for i in items), reverse=True)
+
+    second, = asyncio.run(parts.archive_due(mongo))
+    assert second["generation"] == 2 and second["count"] == 40
+    assert not (tmp_path / "audit_log" / "202301.jsonl.gz").exists()
+    assert "audit_log_202301" not in mongo.sync.list_collection_names()
+    assert sum(r["count"] for r in mongo.sync["audit_rollups"].find()) == 40
+
+def test_missing_archive_file_is_skipped(mongo, tmp_path, capsys):
+    import asyncio
+    parts = _partitions(mongo, tmp_path)
+    mongo.sync["audit_log_202301"].insert_many([_doc(i, "forms.submit") for i in range(5)])
+    asyncio.run(parts.archive_month(mongo, "audit_log", "202301"))
+    (tmp_path / "audit_log" / "202301.jsonl.gz").unlink()
+    mongo.sync["audit_log_202302"].insert_one({"_id": "x", "ts": "2023-02-01T00:00:00", "action": "a"})
+    parts._cache.clear()
+    items, _ = asyncio.run(parts.page(mongo, "audit_log", {}, limit=10))
+    assert [i["action"] for i in items] == ["a"]
+    assert "not available on this host" in capsys.readouterr().out
@@ -0,0 +1,19 @@
+import pytest
+from bson import ObjectId
+from backend.utils.audit_query import decode_cursor, encode_cursor, plan_audit_query
+
+def test_planner_picks_the_index_matching_the_filters():
+    q, hint = plan_audit_query({"subject_type": "payroll_run", "subject_id": "R1", "action": "payroll.run.post"})
+    assert hint[:2] == [("subject_type", 1), ("subject_id", 1)] and q["action"] == "payroll.run.post"
+    assert plan_audit_query({"action": "x", "user.id": "u1"})[1][0] == ("user.id", 1)
+    assert plan_audit_query({}, since="2024-01-01")[1] == [("ts", -1), ("_id", -1)]
+    q, hint = plan_audit_query({"subject_id": "R1", "action": "x"})
+    assert hint[0] == ("subject_id", 1) and q == {"subject_id": "R1", "action": "x"}
+
+def test_cursor_continues_strictly_after_the_last_row():
+    oid = ObjectId()
+    assert decode_cursor(encode_cursor("2024-05-01T10:00:00", oid)) == ("2024-05-01T10:00:00", oid)
+    q, _ = plan_audit_query({"action": "a"}, cursor=encode_cursor("2024-05-01T10:00:00", "abc"))
+    assert q["$or"] == [{"ts": {"$lt": "2024-05-01T10:00:00"}}, {"ts": "2024-05-01T10:00:00", "_id": {"$lt": "abc"}}]
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
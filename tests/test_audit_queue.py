@@ -0,0 +1,37 @@
+import asyncio
+import json
+from backend.utils.audit_queue import AuditQueue
+
+def test_flush_batches_and_clears_journal(mongo, tmp_path):
+    async def run():
+        q = AuditQueue(spill_dir=str(tmp_path), flush_events=100, flush_ms=10_000)
+        for i in range(3):
+            q.enqueue(mongo, "audit_log", {"n": i})
+        assert q.metrics()["queue_depth"] == 3
+        # Already journaled (not held in a Python buffer) before any flush
+        journal, = tmp_path.glob("*.open")
+        assert [json.loads(line)["d"]["n"] for line in journal.read_text().splitlines()] == [0, 1, 2]
+        await q.flush()
+        await q.stop()
+        return q
+    q = asyncio.run(run())
+    assert [r["n"] for r in mongo.sync.audit_log.find().sort("n", 1)] == [0, 1, 2]
+    assert mongo.count("audit_log", "insert_many") == 1 and q.metrics()["flushes"] == 1
+    assert list(tmp_path.iterdir()) == []
+
+def test_failed_flush_spills_and_replays_once(mongo, tmp_path):
+    async def run():
+        q = AuditQueue(spill_dir=str(tmp_path), flush_events=100, flush_ms=10_000)
+        mongo.failing.add("insert_many")
+        q.enqueue(mongo, "audit_log", {"n": 1})
+        await q.flush()
+        assert mongo.sync.audit_log.count_documents({}) == 0
+        assert len(list(tmp_path.glob("*.jsonl"))) == 1
+        mongo.failing.clear()
+        await q.flush()
+        await q.stop()
+        return q
+    q = asyncio.run(run())
+    assert [r["n"] for r in mongo.sync.audit_log.find()] == [1]
+    assert q.metrics()["replayed"] == 1
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,26 @@
+from types import SimpleNamespace
+from backend.utils.auth_cache import AuthPrincipalCache
+
+def _user(**kw):
+    return SimpleNamespace(id="u-1", username="alice", permissions=["patients:read"], **kw)
+
+def test_hits_until_invalidated_by_username_or_id():
+    cache = AuthPrincipalCache(maxsize=10, ttl_s=60)
+    assert cache.get("alice", 1) is None
+    user = _user()
+    cache.put("alice", 1, user, cache.generation("alice"))
+    assert cache.get("alice", 1) is user and cache.get("alice", 2) is None
+    assert cache.permissions(user) == frozenset({"patients:read"})
+    cache.invalidate(user_id="u-1")
+    assert cache.get("alice", 1) is None
+    assert cache.metrics()["hits"] == 1 and cache.metrics()["misses"] == 3
+
+def test_load_racing_an_invalidation_is_not_cached():
+    cache = AuthPrincipalCache(maxsize=1, ttl_s=60)
+    generation = cache.generation("alice")
+    cache.invalidate("alice")  # e.g. lockout written while the user was being loaded
+    cache.put("alice", 1, _user(), generation)
+    assert cache.get("alice", 1) is None
+    cache.put("bob", 1, _user(), 0)
+    cache.put("carol", 1, _user(), 0)
+    assert cache.get("bob", 1) is None and cache.metrics()["evictions"] == 1
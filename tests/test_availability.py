@@ -0,0 +1,16 @@
+from backend.utils.availability import BusyIntervals, day_slots
+
+def test_slot_grid_marks_overlaps_from_interval_index():
+    # 09:00-10:00 and an overlapping 09:30-09:45 booking, then 11:15-11:45
+    busy = BusyIntervals([(540, 600, "A1"), (570, 585, "A2"), (675, 705, "A3")])
+    slots = day_slots({"start_time": "09:00", "end_time": "12:00"}, busy, 30)
+    flags = [(s["start_time"], s["is_available"]) for s in slots]
+    assert flags == [("09:00", False), ("09:30", False), ("10:00", True),
+                     ("10:30", True), ("11:00", False), ("11:30", False)]
+    assert slots[0]["appointment_id"] == "A1"
+    assert slots[2]["appointment_id"] is None
+
+def test_back_to_back_booking_does_not_conflict():
+    busy = BusyIntervals([(480, 510, "A1")])
+    assert busy.conflict(510, 540) is None
+    assert busy.conflict(450, 481) == "A1"
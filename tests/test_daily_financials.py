@@ -0,0 +1,34 @@
+import asyncio
+from datetime import date
+from backend.utils.daily_financials import SUMMARY_COLL, DailyFinancialSummaries, summarize_days
+
+def _row(mongo, day):
+    return mongo.sync[SUMMARY_COLL].find_one({"summary_date": day})
+
+def test_missing_day_is_rebuilt_then_writes_increment(mongo):
+    mongo.sync.financial_transactions.insert_many([
+        {"transaction_type": "income", "payment_method": "debit_card", "category": "patient_payment",
+         "amount": amount, "transaction_date": "2024-03-05"} for amount in (30.0, 50.0)])
+    svc = DailyFinancialSummaries()
+    txn = {"transaction_type": "expense", "payment_method": "check", "category": "rent",
+           "amount": 30.0, "transaction_date": "2024-03-05"}
+    asyncio.run(svc.record_transaction(mongo, txn))  # no row yet: built from the sources
+    row = _row(mongo, "2024-03-05")
+    assert row["credit_card_income"] == 80.0 and row["income_transaction_count"] == 2
+    asyncio.run(svc.record_transaction(mongo, txn))
+    asyncio.run(svc.record_transaction(mongo, {**txn, "amount": 10.0}, -1))
+    assert mongo.count("financial_transactions", "aggregate") == 1
+    row = _row(mongo, "2024-03-05")
+    assert row["check_expenses"] == 20.0 and row["net_amount"] == 60.0 and row["expense_by_category"] == {"rent": 20.0}
+    assert mongo.sync[SUMMARY_COLL].count_documents({}) == 1
+
+def test_month_reads_day_rows(mongo):
+    svc = DailyFinancialSummaries()
+    rows = asyncio.run(svc.days(mongo, date(2024, 2, 1), date(2024, 2, 29)))
+    assert len(rows) == 29 and mongo.count("financial_transactions", "aggregate") == 1
+    assert mongo.sync[SUMMARY_COLL].count_documents({}) == 29
+    asyncio.run(svc.record_transaction(mongo, {"transaction_type": "income", "amount": 50.0, "transaction_date": "2024-02-10"}))
+    assert _row(mongo, "2024-02-10")["income_transaction_count"] == 1
+    report = summarize_days(asyncio.run(svc.days(mongo, date(2024, 2, 1), date(2024, 2, 29))))
+    assert mongo.count("financial_transactions", "aggregate") == 1
+    assert report["income_breakdown"] == {"other_income": 50.0} and report["transaction_count"] == 1
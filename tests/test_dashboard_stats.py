@@ -0,0 +1,24 @@
+import asyncio
+from backend.utils.dashboard_stats import DashboardStatsService
+
+def test_invalidate_recomputes_only_stats_of_the_written_collection(mongo):
+    stats = DashboardStatsService(ttl_s=3600)
+    mongo.sync.patients.insert_one({"id": "P1", "status": "active"})
+    mongo.sync.employees.insert_one({"id": "E1", "is_active": True})
+
+    async def run():
+        first, state, _ = await stats.get(mongo)
+        mongo.sync.patients.insert_one({"id": "P2", "status": "active"})
+        mongo.sync.employees.insert_one({"id": "E2", "is_active": True})
+        cached, cached_state, _ = await stats.get(mongo)
+        stats.invalidate("patients")
+        calls = len(mongo.calls)
+        fresh, fresh_state, _ = await stats.get(mongo)
+        return first, state, cached, cached_state, fresh, fresh_state, mongo.calls[calls:]
+
+    first, state, cached, cached_state, fresh, fresh_state, recomputed = asyncio.run(run())
+    assert state == "miss" and first["total_patients"] == 1
+    assert cached_state == "hit" and cached["total_patients"] == 1
+    assert fresh_state == "partial" and fresh["total_patients"] == 2 and len(fresh["recent_patients"]) == 2
+    assert fresh["total_employees"] == 1  # not derived from patients, still cached
+    assert {coll for coll, _, _ in recomputed} == {"patients"}
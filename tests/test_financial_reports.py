@@ -0,0 +1,38 @@
+import asyncio
+from datetime import date
+import pytest
+from backend.finance_enhancements import FinancialAnalyzer
+from backend.utils.financial_reports import month_range, period_report
+
+def _txn(day, kind, category, method, amount):
+    return {"transaction_date": day, "transaction_type": kind, "category": category,
+            "payment_method": method, "amount": amount}
+
+def test_rollups_come_from_one_group_and_split_by_period(mongo):
+    mongo.sync.financial_transactions.insert_many([
+        _txn("2024-01-03", "income", "patient_payment", "cash", 60.0),
+        _txn("2024-01-20", "income", "patient_payment", "cash", 40.0),
+        _txn("2024-01-21", "expense", None, "check", 40.0),
+        _txn("2024-02-29", "income", "patient_payment", "credit_card", 50.0),
+        _txn("2024-02-10", "transfer", None, "bank_transfer", 999.0),
+        _txn("2024-03-01", "income", "patient_payment", "cash", 500.0),  # outside the range
+    ])
+    report = asyncio.run(period_report(mongo, date(2024, 1, 1), date(2024, 2, 29), "month"))
+    assert mongo.count("financial_transactions", "aggregate") == 1
+    assert report["total_income"] == 150.0 and report["net_income"] == 110.0 and report["transaction_count"] == 5
+    assert report["expense_breakdown"] == {"other_expense": 40.0}
+    assert report["by_payment_method"]["income"] == {"cash": 100.0, "credit_card": 50.0}
+    assert [(p["period"], p["net_income"]) for p in report["periods"]] == [("2024-01", 60.0), ("2024-02", 50.0)]
+    with pytest.raises(ValueError):
+        asyncio.run(period_report(mongo, date(2024, 2, 1), date(2024, 1, 1)))
+    assert month_range(2024, 12) == (date(2024, 12, 1), date(2024, 12, 31))
+
+def test_profit_loss_from_category_totals():
+    pl = FinancialAnalyzer.profit_loss_from_totals(date(2024, 1, 1), date(2024, 1, 31), [
+        {"type": "income", "category": "patient_payment", "total": 100.0},
+        {"type": "income", "category": "insurance_payment", "total": 50.0},
+        {"type": "expense", "category": "payroll", "total": 60.0},
+        {"type": "expense", "category": "medical_supplies", "total": 15.5},
+    ])
+    assert float(pl.total_revenue) == 150.0 and float(pl.salaries_wages) == 60.0
+    assert float(pl.medical_supplies) == 15.5 and float(pl.net_income) == 74.5
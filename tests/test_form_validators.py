@@ -0,0 +1,56 @@
+import asyncio
+from backend.utils.forms import FormValidatorCache, SubmissionValidator
+
+SCHEMA = {"fields": [
+    {"key": "name", "type": "text", "required": True},
+    {"key": "email", "type": "email"},
+    {"key": "age", "type": "number"},
+    {"key": "dob", "type": "date"},
+    {"key": "color", "type": "select", "options": ["red", 2]},
+]}
+
+def test_compiled_validator_coerces_and_reports_like_before():
+    v = SubmissionValidator(SCHEMA)
+    data = {"name": "  Ana ", "age": "41", "dob": "2024-02-29", "color": 2}
+    assert v.validate(data) == (True, [])
+    assert data == {"name": "Ana", "age": 41.0, "dob": "2024-02-29", "color": "2"}
+    ok, errs = v.validate({"email": "nope", "dob": "2023-02-30", "color": "blue", "x": 1})
+    assert not ok and errs == [
+        "missing required field 'name'",
+        "field 'email': invalid email format",
+        "field 'dob': invalid date",
+        "field 'color': invalid option 'blue' (allowed: red, 2)",
+        "unexpected field 'x' not in schema",
+    ]
+
+def test_cache_loads_once_until_invalidated():
+    form = {"_id": "f1", "key": "intake", "version": 1, "schema": SCHEMA}
+    loads = []
+    async def loader():
+        loads.append(1)
+        return dict(form)
+    async def run():
+        cache = FormValidatorCache(ttl_s=60)
+        a = await cache.get("intake", loader)
+        b = await cache.get("intake", loader)
+        cache.invalidate({"_id": "f1", "key": "intake"})
+        c = await cache.get("intake", loader)
+        return a, b, c
+    a, b, c = asyncio.run(run())
+    assert a is b and c is not a and len(loads) == 2
+
+def test_overlapping_bulk_retries_report_duplicates_instead_of_inserting_twice(mongo):
+    from backend.utils.forms import ensure_form_indexes, insert_submissions
+    async def run():
+        mongo.sync.form_submissions.create_index([("form_id", 1), ("client_id", 1)], sparse=True)  # pre-fix index
+        await ensure_form_indexes(mongo)
+        first = await insert_submissions(mongo, [{"form_id": "F1", "client_id": "k1"}])
+        # A second kiosk retry passed the client_id pre-check before the first one landed
+        second = await insert_submissions(mongo, [{"form_id": "F1", "client_id": "k1"}, {"form_id": "F1", "client_id": "k2"},
+                                                  {"form_id": "F1"}, {"form_id": "F1"}])
+        return first, second
+    (first_ids, first_dups), (ids, dups) = asyncio.run(run())
+    assert len(first_ids) == 1 and first_dups == []
+    assert len(ids) == 3 and dups == [0]
+    assert mongo.sync.form_submissions.count_documents({"client_id": "k1"}) == 1
+    assert mongo.sync.form_submissions.index_information()["form_id_1_client_id_1"]["unique"]
@@ -0,0 +1,47 @@
+import asyncio
+import csv
+import gzip
+from io import StringIO
+from backend.utils.forms import iter_submissions_csv
+
+SCHEMA = {"fields": [{"key": "name", "type": "text", "label": "Name"},
+                     {"key": "consent", "type": "checkbox", "label": "Consent"}]}
+
+async def _cursor(n):
+    for i in range(n):
+        yield {"_id": f"S{i}", "data": {"name": f"p{i}", "consent": i % 2 == 0},
+               "created_at": f"2025-01-01T00:00:{i:02d}", "form_version": 2, "created_by": {"id": "u1"}}
+
+def _collect(n, **kw):
+    async def run():
+        counter = {}
+        chunks = [c async for c in iter_submissions_csv(_cursor(n), SCHEMA, counter=counter, **kw)]
+        return chunks, counter
+    return asyncio.run(run())
+
+def test_streams_header_first_then_batches():
+    chunks, counter = _collect(5, batch_size=2)
+    assert chunks[0].decode().startswith("name,consent,_id,_created_at")
+    assert len(chunks) == 4  # header, 2 + 2 rows, final row
+    rows = list(csv.DictReader(StringIO(b"".join(chunks).decode())))
+    assert counter["rows"] == 5
+    assert [r["consent"] for r in rows[:2]] == ["Yes", "No"]
+
+def test_gzip_output_is_one_valid_member():
+    chunks, _ = _collect(3, batch_size=2, gzip=True)
+    rows = list(csv.DictReader(StringIO(gzip.decompress(b"".join(chunks)).decode())))
+    assert [r["_id"] for r in rows] == ["S0", "S1", "S2"]
+
+def test_resume_splits_rows_sharing_a_timestamp(mongo):
+    from backend.utils.forms import plan_submissions_export
+    # A bulk submit stamps one created_at on the whole batch
+    mongo.sync.form_submissions.insert_many([{"form_id": "F1", "created_at": "2025-01-01T00:00:00"} for _ in range(6)]
+                                            + [{"form_id": "F1", "created_at": "2025-01-01T00:00:01"}])
+    for order in ("asc", "desc"):
+        q, sort = plan_submissions_export("F1", order=order)
+        first = list(mongo.sync.form_submissions.find(q).sort(sort).limit(3))
+        last = first[-1]
+        q, sort = plan_submissions_export("F1", order=order, after_created_at=last["created_at"], after_id=str(last["_id"]))
+        rest = list(mongo.sync.form_submissions.find(q).sort(sort))
+        ids = [d["_id"] for d in first + rest]
+        assert len(ids) == 7 and len(set(ids)) == 7
@@ -0,0 +1,53 @@
+import asyncio
+from backend.utils.icd10_index import ICD10SearchIndex
+
+CODES = [
+    {"code": "E11.9", "description": "Type 2 diabetes mellitus without complications",
+     "category": "Endocrine", "search_terms": ["diabetes", "t2dm"]},
+    {"code": "E11.65", "description": "Type 2 diabetes mellitus with hyperglycemia",
+     "category": "Endocrine", "search_terms": ["diabetes", "high blood sugar"]},
+    {"code": "I10", "description": "Essential (primary) hypertension",
+     "category": "Cardiovascular", "search_terms": ["high blood pressure", "htn"]},
+    {"code": "Z00.00", "description": "Encounter for general adult medical examination",
+     "category": "Preventive Care", "search_terms": ["physical", "diabetes screening"]},
+]
+
+def _index():
+    idx = ICD10SearchIndex()
+    idx.build([dict(c) for c in CODES])
+    return idx
+
+def test_ranks_all_matches_before_limit():
+    idx = _index()
+    # The exact code wins even though it would not be among the first rows of a limited scan
+    assert [c["code"] for c in idx.search("e11.65", limit=1)] == ["E11.65"]
+    assert [c["code"] for c in idx.search("diabetes")] == ["E11.65", "E11.9", "Z00.00"]
+
+def test_short_queries_and_substrings():
+    idx = _index()
+    assert [c["code"] for c in idx.search("I1")] == ["I10"]
+    assert [c["code"] for c in idx.search("blood")] == ["E11.65", "I10"]
+    assert idx.search("cardio")[0]["code"] == "I10"  # category-only match
+    assert idx.search("zzz") == []
+
+def test_short_prefix_stops_at_code_hits():
+    idx = ICD10SearchIndex()
+    idx.build([{"code": f"A{n:02d}", "description": f"Infection {n}"} for n in range(40)]
+              + [{"code": "B01", "description": "Acute varicella"}])
+    assert [c["code"] for c in idx.search("a", limit=3)] == ["A00", "A01", "A02"]
+    assert [c["code"] for c in idx.search("ac", limit=3)] == ["B01"]
+
+def test_stale_index_refreshes_once_in_background(mongo):
+    mongo.sync.icd10_codes.insert_many([dict(c) for c in CODES])
+    async def run():
+        idx = ICD10SearchIndex(ttl_s=60)
+        await asyncio.gather(*(idx.ensure_loaded(mongo) for _ in range(3)))  # first load is shared
+        mongo.sync.icd10_codes.insert_one({"code": "J45.909", "description": "Unspecified asthma"})
+        idx.loaded_at -= 61
+        await asyncio.gather(*(idx.ensure_loaded(mongo) for _ in range(3)))
+        stale = idx.search("j45")  # still answering from the previous index
+        await idx._refresh_task
+        return stale, idx.search("j45")
+    stale, fresh = asyncio.run(run())
+    assert stale == [] and [c["code"] for c in fresh] == ["J45.909"]
+    assert mongo.count("icd10_codes", "find") == 2
@@ -0,0 +1,36 @@
+import asyncio
+from backend.utils.interaction_index import INTERACTIONS_COLL, DrugInteractionIndex
+
+def _interaction(a, b, severity="major"):
+    return {"drug1_id": a, "drug2_id": b, "drug1_name": a.title(), "drug2_name": b.title(), "severity": severity}
+
+def test_lookup_is_symmetric_and_checks_regimens(mongo):
+    mongo.sync[INTERACTIONS_COLL].insert_many([_interaction("warfarin", "aspirin"), _interaction("ssri", "tramadol")])
+    index = DrugInteractionIndex()
+    assert asyncio.run(index.load(mongo)) == 2
+    assert index.lookup("aspirin", "warfarin")["severity"] == "major"
+    assert index.lookup("warfarin", "warfarin") is None and index.lookup("warfarin", "ssri") is None
+    current = [{"medication_id": "warfarin", "medication_display": "Warfarin 5mg"}]
+    assert [a["message"] for a in index.check_against("aspirin", current)] == ["Interaction with Warfarin 5mg"]
+    alerts = index.check_regimen(["ssri", "tramadol", "aspirin", "ssri"], current)
+    assert [(a["between"], sorted(a["drug_ids"])) for a in alerts] == [
+        ("proposed", ["ssri", "tramadol"]), ("current", ["aspirin", "warfarin"])]
+
+def test_reload_picks_up_reseeded_pairs_and_ttl_bounds_staleness(mongo):
+    mongo.sync[INTERACTIONS_COLL].insert_one(_interaction("warfarin", "aspirin"))
+    index = DrugInteractionIndex(ttl_s=300)
+    async def run():
+        await index.ensure_loaded(mongo)
+        mongo.sync[INTERACTIONS_COLL].update_one({"drug1_id": "warfarin"}, {"$set": {"severity": "minor"}})
+        await index.ensure_loaded(mongo)  # within the TTL: no reload
+        stale = index.lookup("warfarin", "aspirin")["severity"]
+        await index.load(mongo)  # what a reseed triggers
+        fresh = index.lookup("warfarin", "aspirin")["severity"]
+        index.loaded_at -= 301
+        mongo.sync[INTERACTIONS_COLL].delete_many({})
+        await index.ensure_loaded(mongo)
+        return stale, fresh
+    stale, fresh = asyncio.run(run())
+    assert (stale, fresh) == ("major", "minor")
+    assert index.lookup("warfarin", "aspirin") is None
+    assert mongo.count(INTERACTIONS_COLL, "find") == 3
@@ -0,0 +1,59 @@
+import asyncio
+from interop.fhir_batch import CommittedVersions, FhirBatcher, transaction_bundle
+
+def test_coalesces_per_resource_into_transaction_bundles():
+    async def run():
+        sent = []
+        async def flush(batch):
+            sent.append([(p.key, p.resource["v"], p.tokens) for p in batch])
+        batcher = FhirBatcher(flush, max_entries=2, window_s=0.01)
+        batcher.add({"resourceType": "Patient", "id": "p1", "v": 1}, "t1")
+        batcher.add({"resourceType": "Patient", "id": "p1", "v": 2}, "t2")
+        batcher.add({"resourceType": "Observation", "id": "o1", "v": 1}, "t3")
+        batcher.add({"resourceType": "Patient", "id": "p2", "v": 1}, "t4")
+        await batcher.drain()
+        return sent, batcher.metrics
+    sent, metrics = asyncio.run(run())
+    assert sent == [[(("Patient", "p1"), 2, ["t1", "t2"]), (("Observation", "o1"), 1, ["t3"])],
+                    [(("Patient", "p2"), 1, ["t4"])]]
+    assert metrics == {"events": 4, "coalesced": 1, "bundles": 2, "entries": 3}
+    bundle = transaction_bundle([{"resourceType": "Patient", "id": "p1"}])
+    assert bundle["type"] == "transaction" and bundle["entry"][0]["request"] == {"method": "PUT", "url": "Patient/p1"}
+
+def test_resource_in_flight_waits_for_its_bundle():
+    async def run():
+        order, release = [], asyncio.Event()
+        async def flush(batch):
+            order.append(("start", [p.resource["v"] for p in batch]))
+            if batch[0].resource["v"] == 1:
+                await release.wait()
+            order.append(("end", [p.resource["v"] for p in batch]))
+        batcher = FhirBatcher(flush, max_entries=1, window_s=0.001)
+        batcher.add({"resourceType": "Patient", "id": "p1", "v": 1}, "t1")
+        await asyncio.sleep(0.01)
+        batcher.add({"resourceType": "Patient", "id": "p1", "v": 2}, "t2")
+        await asyncio.sleep(0.01)
+        release.set()
+        await batcher.drain()
+        return order
+    assert asyncio.run(run()) == [("start", [1]), ("end", [1]), ("start", [2]), ("end", [2])]
+
+def test_late_retry_never_replaces_a_newer_version():
+    async def run():
+        sent = []
+        async def flush(batch):
+            sent.append([(p.resource["v"], p.tokens) for p in batch])
+        batcher = FhirBatcher(flush, max_entries=10, window_s=0.01)
+        batcher.add({"resourceType": "Patient", "id": "p1", "v": 3}, "t3", "2024-03-05T12:00:03")
+        batcher.add({"resourceType": "Patient", "id": "p1", "v": 2}, "retry2", "2024-03-05T12:00:02")
+        await batcher.drain()
+        return sent
+    assert asyncio.run(run()) == [[(3, ["retry2", "t3"])]]
+    committed = CommittedVersions(max_size=2)
+    committed.commit(("Patient", "p1"), "2024-03-05T12:00:03")
+    committed.commit(("Patient", "p1"), "2024-03-05T12:00:02")
+    assert committed.superseded(("Patient", "p1"), "2024-03-05T12:00:02")
+    assert committed.superseded(("Patient", "p1"), "2024-03-05T12:00:03")  # redelivered duplicate
+    assert not committed.superseded(("Patient", "p1"), "2024-03-05T12:00:03.5")
+    assert not committed.superseded(("Patient", "p2"), "2024-03-05T12:00:01")
+    assert not committed.superseded(("Patient", "p1"), None)
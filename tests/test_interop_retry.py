@@ -0,0 +1,30 @@
+from datetime import datetime, timezone
+from interop.retry import (ATTEMPTS_HEADER, is_permanent, parse_retry_after, reset_headers, retry_delays_s,
+                           retry_topology, route_failure)
+
+def test_failures_back_off_exponentially_then_dead_letter():
+    assert retry_delays_s(6, 5) == [5, 10, 20, 40, 80]
+    headers, targets = None, []
+    for _ in range(6):
+        target, headers = route_failure("interop.fhir", headers, "FHIR server returned 503")
+        targets.append(target)
+    assert targets == ["interop.fhir.retry.5s", "interop.fhir.retry.10s", "interop.fhir.retry.20s",
+                       "interop.fhir.retry.40s", "interop.fhir.retry.80s", "interop.fhir.dlq"]
+    assert headers[ATTEMPTS_HEADER] == 6 and ATTEMPTS_HEADER not in reset_headers(headers)
+    assert route_failure("interop.hl7", None, "bad json", permanent=True)[0] == "interop.hl7.dlq"
+
+def test_delay_queues_dead_letter_back_to_the_work_queue():
+    name, args = retry_topology("interop.hl7")[0]
+    assert name == "interop.hl7.retry.5s"
+    assert args == {"x-message-ttl": 5000, "x-dead-letter-exchange": "", "x-dead-letter-routing-key": "interop.hl7"}
+    assert retry_topology("interop.hl7")[-1] == ("interop.hl7.dlq", {})
+
+def test_throttling_and_conflicts_are_retried_after_the_servers_delay():
+    assert [is_permanent(s) for s in (400, 404, 422, 408, 409, 429, 503, None)] == [True] * 3 + [False] * 5
+    now = datetime(2024, 3, 5, 12, 0, 0, tzinfo=timezone.utc)
+    assert parse_retry_after("30") == 30.0 and parse_retry_after("soon") is None and parse_retry_after(None) is None
+    assert parse_retry_after("Tue, 05 Mar 2024 12:01:00 GMT", now) == 60.0
+    assert route_failure("interop.fhir", None, "429", retry_after_s=3)[0] == "interop.fhir.retry.5s"
+    target, headers = route_failure("interop.fhir", None, "429", retry_after_s=30)
+    assert target == "interop.fhir.retry.40s" and headers[ATTEMPTS_HEADER] == 1
+    assert route_failure("interop.fhir", None, "429", retry_after_s=3600)[0] == "interop.fhir.retry.80s"
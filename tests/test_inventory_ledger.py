@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from pymongo.errors import OperationFailure
+from backend.utils import inventory_stock
+from backend.utils.inventory_stock import APPLIED_FIELD, PENDING_FIELD, apply_inventory_transactions, finish_pending_inventory
+
+def _stock(mongo):
+    return {d["id"]: (d["current_stock"], d.get("low_stock")) for d in mongo.sync.inventory.find({}, {"_id": 0})}
+
+def _seed(mongo):
+    mongo.sync.inventory.insert_many([{"id": "a", "current_stock": 7, "min_stock_level": 5},
+                                      {"id": "b", "current_stock": 0, "min_stock_level": 0}])
+
+def _rows(*movements):
+    return [{"id": f"t{n}", "item_id": i, "transaction_type": kind, "quantity": qty}
+            for n, (i, kind, qty) in enumerate(movements)]
+
+def test_movements_are_relative_atomic_updates(mongo):
+    _seed(mongo)
+    asyncio.run(apply_inventory_transactions(mongo, _rows(("a", "out", 3), ("b", "out", 2)), floor=0))
+    assert _stock(mongo) == {"a": (4, True), "b": (0, True)}
+    asyncio.run(apply_inventory_transactions(mongo, _rows(("a", "adjustment", 9), ("b", "in", 1))))
+    assert _stock(mongo) == {"a": (9, False), "b": (1, False)}
+    with pytest.raises(ValueError):
+        asyncio.run(apply_inventory_transactions(mongo, _rows(("a", "transfer", 1))))
+    assert mongo.sync.inventory_transactions.count_documents({}) == 4
+
+def test_one_batch_per_invoice_and_unknown_items_skipped(mongo):
+    _seed(mongo)
+    levels = asyncio.run(apply_inventory_transactions(mongo, _rows(("a", "out", 1), ("b", "out", 1), ("missing", "out", 1)), floor=0))
+    assert levels == {"a": 6, "b": 0}
+    assert mongo.count("inventory", "bulk_write") == 1 and mongo.count("inventory_transactions", "insert_many") == 1
+    ledger = list(mongo.sync.inventory_transactions.find({}, {"_id": 0}))
+    assert [r["item_id"] for r in ledger] == ["a", "b"] and not any(PENDING_FIELD in r for r in ledger)
+    assert not any(d.get(APPLIED_FIELD) for d in mongo.sync.inventory.find())
+
+def test_interrupted_standalone_batch_is_settled_once(mongo):
+    _seed(mongo)
+    mongo.failing.add("bulk_write")  # ledger written, stock update lost
+    with pytest.raises(RuntimeError):
+        asyncio.run(apply_inventory_transactions(mongo, _rows(("a", "out", 2))))
+    assert mongo.sync.inventory_transactions.count_documents({PENDING_FIELD: {"$exists": True}}) == 1
+    assert asyncio.run(finish_pending_inventory(mongo)) == 0  # still inside the grace period
+    mongo.failing = {"update_many"}  # stock applied, ledger never marked settled
+    with pytest.raises(RuntimeError):
+        asyncio.run(apply_inventory_transactions(mongo, [{"id": "t9", "item_id": "a", "transaction_type": "in", "quantity": 10}]))
+    mongo.failing.clear()
+    assert asyncio.run(finish_pending_inventory(mongo, grace_s=0)) == 2
+    assert asyncio.run(finish_pending_inventory(mongo, grace_s=0)) == 0
+    assert _stock(mongo)["a"] == (15, False)
+    assert mongo.sync.inventory_transactions.count_documents({PENDING_FIELD: {"$exists": True}}) == 0
+    assert mongo.sync.inventory.find_one({"id": "a"})[APPLIED_FIELD] == []
+
+class _Transaction:
+    def __init__(self, client):
+        self.client = client
+    async def __aenter__(self):
+        self.client.transactions += 1
+        if self.client.transactions == 1:
+            raise OperationFailure("WriteConflict", code=112, details={"errorLabels": ["TransientTransactionError"]})
+    async def __aexit__(self, *exc):
+        return False
+
+class _Session(_Transaction):
+    async def __aenter__(self):
+        return self
+    def start_transaction(self):
+        return _Transaction(self.client)
+
+class _Client:
+    transactions = 0
+    async def start_session(self):
+        return _Session(self)
+
+def test_transient_transaction_errors_are_retried(mongo, monkeypatch):
+    monkeypatch.setattr(inventory_stock, "_txn_supported", None)
+    _seed(mongo)
+    mongo.client = _Client()
+    levels = asyncio.run(apply_inventory_transactions(mongo, _rows(("a", "out", 2))))
+    assert levels == {"a": 5} and mongo.client.transactions == 2
+    assert mongo.sync.inventory_transactions.count_documents({PENDING_FIELD: {"$exists": True}}) == 0
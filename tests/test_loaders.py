@@ -0,0 +1,32 @@
+import asyncio
+from backend.utils.loaders import BatchLoader
+
+def _finds(mongo, collection):
+    return [args[0] for c, m, args in mongo.calls if c == collection and m == "find"]
+
+def test_sixty_rows_cost_one_deduplicated_query(mongo):
+    mongo.sync.patients.insert_many([{"id": f"P{i}", "n": i} for i in range(30)])
+    async def run():
+        loader = BatchLoader(mongo, "patients")
+        rows = await loader.load_many(f"P{i % 30}" for i in range(60))
+        again = await loader.load("P5")
+        missing = await loader.load("nope")
+        return rows, again, missing
+    rows, again, missing = asyncio.run(run())
+    assert [r["n"] for r in rows] == [i % 30 for i in range(60)]
+    assert again["n"] == 5 and missing is None
+    queries = _finds(mongo, "patients")
+    assert len(queries) == 2 and len(mongo.calls) == 2  # the page, then the one unknown key
+    assert sorted(queries[0]["id"]["$in"]) == sorted(f"P{i}" for i in range(30))
+    assert queries[1] == {"id": {"$in": ["nope"]}}
+
+def test_many_groups_rows_by_key(mongo):
+    mongo.sync.invoices.insert_many([{"encounter_id": "E1", "total_amount": 5},
+                                     {"encounter_id": "E1", "total_amount": 7},
+                                     {"encounter_id": "E3", "total_amount": 1}])
+    async def run():
+        loader = BatchLoader(mongo, "invoices", key="encounter_id", many=True)
+        return await loader.load_many(["E1", "E2"])
+    e1, e2 = asyncio.run(run())
+    assert sum(i["total_amount"] for i in e1) == 12 and e2 == []
+    assert mongo.count("invoices", "find") == 1
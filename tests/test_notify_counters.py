@@ -0,0 +1,44 @@
+import asyncio
+from backend.utils.notify import COUNTERS_COLL, NOTIF_COLL, get_counts, mark_all_read, notify_many, notify_user, rebuild_counters
+
+def _counter(mongo, user_id):
+    doc = mongo.sync[COUNTERS_COLL].find_one({"user_id": user_id})
+    return {"total": doc["total"], "unread": doc["unread"]}
+
+def test_fan_out_is_one_insert_and_counters_track_reads(mongo):
+    async def run():
+        await notify_many(mongo, user_ids=["u1", "u2", "u1"], type="t", title="T", body="B")
+        writes = mongo.count(NOTIF_COLL, "insert_many"), mongo.count(COUNTERS_COLL, "bulk_write")
+        await mark_all_read(mongo, "u1")
+        return writes, await get_counts(mongo, "u1"), await get_counts(mongo, "u2")
+    writes, u1, u2 = asyncio.run(run())
+    assert writes == (1, 1)
+    assert mongo.sync[NOTIF_COLL].count_documents({"user_id": "u1"}) == 2
+    assert _counter(mongo, "u1") == u1 == {"total": 2, "unread": 0}
+    assert _counter(mongo, "u2") == u2 == {"total": 1, "unread": 1}
+
+def test_legacy_fields_are_stored_and_counted(mongo):
+    asyncio.run(notify_user(mongo, user_id="u1", type="reminder", title="T", body="B",
+                            fields={"id": "N1", "is_read": False, "read": True}))
+    doc = mongo.sync[NOTIF_COLL].find_one({"id": "N1"})
+    assert doc["is_read"] is False and doc["read"] is False  # own fields are not overridden
+    assert _counter(mongo, "u1") == {"total": 1, "unread": 1}
+
+def test_rebuild_replaces_counters_in_place(mongo):
+    mongo.sync[NOTIF_COLL].insert_many([{"user_id": "u1", "read": False}, {"user_id": "u1", "read": True}])
+    mongo.sync[COUNTERS_COLL].insert_many([{"user_id": "u1", "total": 9, "unread": 9},
+                                           {"user_id": "gone", "total": 3, "unread": 1}])
+    assert asyncio.run(rebuild_counters(mongo)) == {"users": 2}
+    assert mongo.count(COUNTERS_COLL, "delete_many") == 0
+    assert _counter(mongo, "u1") == {"total": 2, "unread": 1}
+    assert _counter(mongo, "gone") == {"total": 0, "unread": 0}
+
+def test_first_counted_write_seeds_from_existing_notifications(mongo):
+    mongo.sync[NOTIF_COLL].insert_many([{"user_id": "u1", "read": False} for _ in range(3)]
+                                       + [{"user_id": "u2", "read": True}])
+    async def run():
+        await notify_user(mongo, user_id="u1", type="t", title="T", body="B")
+        await notify_many(mongo, user_ids=["u1", "u2"], type="t", title="T", body="B")
+        return await get_counts(mongo, "u1"), await get_counts(mongo, "u2")
+    assert asyncio.run(run()) == ({"total": 5, "unread": 5}, {"total": 2, "unread": 1})
+    assert _counter(mongo, "u1") == {"total": 5, "unread": 5}
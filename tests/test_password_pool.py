@@ -0,0 +1,63 @@
+import asyncio
+import time
+import pytest
+from backend.utils.password_pool import LoginThrottled, PasswordHashPool
+
+def test_hashing_runs_off_the_loop_in_turn():
+    async def run():
+        pool = PasswordHashPool(workers=1, queue_size=8)
+        ticks = []
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.01)
+        results = await asyncio.gather(ticker(), *(pool.run(lambda i=i: time.sleep(0.02) or i) for i in range(3)))
+        pool.shutdown()
+        return results[1:], ticks, pool.metrics()
+    results, ticks, metrics = asyncio.run(run())
+    assert results == [0, 1, 2] and metrics["hashed"] == 3
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.05
+
+def test_limits_reject_before_hashing():
+    async def run():
+        pool = PasswordHashPool(workers=1, queue_size=0, per_user=1, per_ip=2)
+        async with pool.admit("Alice", "10.0.0.1"):
+            with pytest.raises(LoginThrottled) as same_user:
+                async with pool.admit("alice", "10.0.0.2"):
+                    pass
+            async with pool.admit("bob", "10.0.0.1"):
+                with pytest.raises(LoginThrottled) as same_ip:
+                    async with pool.admit("carol", "10.0.0.1"):
+                        pass
+        busy = asyncio.ensure_future(pool.run(lambda: time.sleep(0.02)))
+        await asyncio.sleep(0)
+        with pytest.raises(LoginThrottled) as shed:
+            await pool.run(lambda: None)
+        await busy
+        pool.shutdown()
+        return same_user.value, same_ip.value, shed.value, pool.metrics()
+    same_user, same_ip, shed, metrics = asyncio.run(run())
+    assert same_user.status_code == 429 and same_ip.status_code == 429 and shed.status_code == 503
+    assert metrics["logins_in_progress"] == 0 and metrics["rejected_user"] == metrics["rejected_ip"] == metrics["shed"] == 1
+
+def test_client_ip_trusts_forwarding_headers_only_from_proxies():
+    from backend.utils.password_pool import client_ip, parse_networks
+    trusted = parse_networks("127.0.0.1/32,172.16.0.0/12")
+    nginx = "172.18.0.5"
+    assert client_ip(nginx, {"x-forwarded-for": "203.0.113.7"}, trusted) == "203.0.113.7"
+    assert client_ip(nginx, {"x-real-ip": "203.0.113.8"}, trusted) == "203.0.113.8"
+    # A client-supplied hop left of the real one does not choose the bucket
+    assert client_ip(nginx, {"x-forwarded-for": "1.2.3.4, 203.0.113.7, 172.18.0.9"}, trusted) == "203.0.113.7"
+    # Headers from an untrusted peer are ignored
+    assert client_ip("198.51.100.2", {"x-forwarded-for": "1.2.3.4"}, trusted) == "198.51.100.2"
+    assert client_ip(nginx, {}, trusted) == nginx
+
+def test_clients_behind_one_proxy_get_separate_ip_buckets():
+    from backend.utils.password_pool import client_ip, parse_networks
+    trusted = parse_networks("172.16.0.0/12")
+    async def run():
+        pool = PasswordHashPool(per_ip=1)
+        ips = [client_ip("172.18.0.5", {"x-forwarded-for": f"203.0.113.{i}"}, trusted) for i in range(3)]
+        async with pool.admit("a", ips[0]), pool.admit("b", ips[1]), pool.admit("c", ips[2]):
+            return pool.metrics()
+    assert asyncio.run(run())["rejected_ip"] == 0
@@ -0,0 +1,51 @@
+import asyncio
+from fastapi import Request, Response
+from backend import server_contaminated_14k as server
+from backend.routers import receipts
+from backend.utils.patient_summary import (PatientSummaryCache, fetch_patient_summary, get_patient_version,
+                                           summary_etag)
+
+def _request(etag=None):
+    headers = [(b"if-none-match", etag.encode())] if etag else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+def _summary(etag=None):
+    response = Response()
+    out = asyncio.run(server.get_patient_summary("p1", _request(etag), response))
+    return out, response.headers.get("etag")
+
+def _seed(mongo):
+    mongo.sync.patients.insert_one({"id": "p1", "name": [{"family": "Doe", "given": ["Jane"]}]})
+    mongo.sync.soap_notes.insert_many([
+        {"id": f"n{i}", "patient_id": "p1", "encounter_id": "e1", "subjective": "s", "objective": "o",
+         "assessment": "a", "plan": "p", "provider": "dr", "created_at": f"2024-03-0{i}T09:00:00"}
+        for i in range(1, 8)])
+    mongo.sync.soap_notes.insert_one({"id": "other", "patient_id": "p2", "created_at": "2024-03-09T09:00:00"})
+
+def test_sections_are_filtered_sorted_and_projected(mongo):
+    _seed(mongo)
+    mongo.sync.medications.insert_many([{"id": "m1", "patient_id": "p1", "status": "active", "secret": 1},
+                                        {"id": "m2", "patient_id": "p1", "status": "stopped"}])
+    data = asyncio.run(fetch_patient_summary(mongo, "p1", {"active_medications": {"id": 1}}))
+    assert data["patient"]["id"] == "p1"
+    assert [n["id"] for n in data["recent_soap_notes"]] == ["n7", "n6", "n5", "n4", "n3"]
+    assert data["active_medications"] == [{"id": "m1"}]
+    assert data["allergies"] == [] and data["recent_vitals"] == []
+
+def test_chart_write_changes_the_etag(mongo, monkeypatch):
+    _seed(mongo)
+    monkeypatch.setattr(server, "db", mongo)
+    monkeypatch.setattr(receipts, "db", mongo)
+    monkeypatch.setattr(server, "patient_summary_cache", PatientSummaryCache())
+    summary, etag = _summary()
+    assert etag == summary_etag("p1", 0) and len(summary["recent_soap_notes"]) == 5
+    not_modified, _ = _summary(etag)
+    assert not_modified.status_code == 304 and not_modified.headers["etag"] == etag
+    reads = mongo.count("patients", "find_one")
+    assert _summary()[1] == etag and mongo.count("patients", "find_one") == reads  # served from the snapshot
+
+    asyncio.run(receipts.create_from_soap("n7"))
+    assert asyncio.run(get_patient_version(mongo, "p1")) == 1
+    summary, new_etag = _summary(etag)
+    assert new_etag == summary_etag("p1", 1) != etag
+    assert summary["recent_soap_notes"][0]["status"] == "completed"
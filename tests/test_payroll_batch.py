@@ -0,0 +1,40 @@
+from datetime import datetime
+from backend.payroll_batch import hours_from_entries, compute_payroll_rows
+
+def _entries(*pairs):
+    out = []
+    for start, end in pairs:
+        out.append({"entry_type": "clock_in", "timestamp": start})
+        out.append({"entry_type": "clock_out", "timestamp": end})
+    return out
+
+def test_hours_split_regular_and_overtime():
+    days = [(datetime(2025, 8, d, 8), datetime(2025, 8, d, 17)) for d in range(4, 9)]
+    hours = hours_from_entries(_entries(*days))
+    assert hours["total_hours"] == 45.0
+    assert hours["regular_hours"] == 40.0
+    assert hours["overtime_hours"] == 5.0
+    assert len(hours["daily_breakdown"]) == 5
+
+def test_compute_rows_matches_legacy_formula_and_adds_ytd():
+    employees = [
+        {"id": "E1", "hourly_rate": 20.0},
+        {"id": "E2", "hourly_rate": 0.0, "salary": 41600.0},
+    ]
+    hours = {
+        "E1": {"regular_hours": 40.0, "overtime_hours": 2.0},
+        "E2": {"regular_hours": 10.0, "overtime_hours": 0.0},
+    }
+    ytd = {"E1": {"gross_pay": 1000.0, "net_pay": 700.0}}
+
+    rows = {r["employee_id"]: r for r in compute_payroll_rows("P1", employees, hours, ytd)}
+
+    e1 = rows["E1"]
+    assert e1["gross_pay"] == 40 * 20 + 2 * 30
+    assert abs(e1["total_taxes"] - e1["gross_pay"] * (0.12 + 0.05 + 0.062 + 0.0145)) < 1e-9
+    assert abs(e1["net_pay"] - (e1["gross_pay"] - e1["total_taxes"])) < 1e-9
+    assert e1["ytd_gross_pay"] == 1000.0 + e1["gross_pay"]
+
+    e2 = rows["E2"]
+    assert e2["regular_rate"] == 20.0  # 41600 / 2080
+    assert e2["ytd_gross_pay"] == e2["gross_pay"]
@@ -0,0 +1,63 @@
+import asyncio
+from backend.utils.payroll_ytd import YTD_COLL, apply_period, apply_record, get_ytd, reapply_record, rebuild_ytd, reverse_period
+
+def _seed(db):
+    db.sync.pay_periods.insert_many([{"id": "P1", "end_date": "2024-01-15"}, {"id": "P2", "end_date": "2024-01-31"}])
+    db.sync.payroll_runs.insert_many([{"period_id": "P1", "status": "POSTED"}, {"period_id": "P2", "status": "DRAFT"}])
+    db.sync.payroll_records.insert_many([
+        {"id": "R1", "employee_id": "E1", "payroll_period_id": "P1", "gross_pay": "1000", "total_taxes": "200"},
+        {"id": "R2", "employee_id": "E1", "payroll_period_id": "P2", "gross_pay": "500", "total_taxes": "100"},
+    ])
+
+def test_apply_reverse_reapply_are_idempotent(mongo):
+    _seed(mongo)
+    async def run():
+        assert await apply_period(mongo, {"id": "P1", "end_date": "2024-01-15"}) == 1
+        assert await apply_period(mongo, {"id": "P1", "end_date": "2024-01-15"}) == 0  # retried post
+        assert not await apply_record(mongo, mongo.sync.payroll_records.find_one({"id": "R1"}), 2024)
+        first = await get_ytd(mongo, "E1", 2024)
+        recalculated = {**mongo.sync.payroll_records.find_one({"id": "R1"}), "gross_pay": "1200"}
+        assert await reapply_record(mongo, recalculated) and await reapply_record(mongo, recalculated)
+        moved = await get_ytd(mongo, "E1", 2024)
+        assert await reverse_period(mongo, "P1") == 1 and await reverse_period(mongo, "P1") == 0  # retried void
+        return first, moved, await get_ytd(mongo, "E1", 2024)
+    first, moved, voided = asyncio.run(run())
+    assert first["gross_pay"] == 1000.0 and first["net_pay"] == 800.0
+    assert moved["gross_pay"] == 1200.0 and moved["net_pay"] == 1000.0
+    assert voided["gross_pay"] == 0.0 and voided["total_taxes"] == 0.0
+
+def test_rebuild_matches_posted_runs_and_can_rerun(mongo):
+    _seed(mongo)
+    mongo.sync[YTD_COLL].insert_one({"employee_id": "E1", "tax_year": 2024, "gross_pay": 99999.0})  # drifted
+    async def run():
+        first = await rebuild_ytd(mongo, 2024)
+        again = await rebuild_ytd(mongo, 2024)
+        return first, again, await get_ytd(mongo, "E1", 2024)
+    first, again, ytd = asyncio.run(run())
+    assert first == again == {"tax_year": 2024, "periods": 1, "records": 1, "employees": 1}
+    assert ytd["gross_pay"] == 1000.0 and mongo.sync[YTD_COLL].count_documents({}) == 1
+    assert mongo.sync.payroll_records.find_one({"id": "R2"}).get("ytd_applied") is None
+
+def test_interrupted_apply_is_finished_once_on_retry(mongo):
+    _seed(mongo)
+    # Crash after the record was claimed but before the accumulator was incremented
+    mongo.sync.payroll_records.update_one({"id": "R1"}, {"$set": {
+        "ytd_applied": {"tax_year": 2024, "gross_pay": 1000.0},
+        "ytd_pending": {"op": "op-1", "employee_id": "E1", "tax_year": 2024, "delta": {"gross_pay": 1000.0}},
+    }})
+    async def run():
+        await apply_period(mongo, {"id": "P1", "end_date": "2024-01-15"})
+        await apply_period(mongo, {"id": "P1", "end_date": "2024-01-15"})
+        return await get_ytd(mongo, "E1", 2024)
+    assert asyncio.run(run())["gross_pay"] == 1000.0
+    assert "ytd_pending" not in mongo.sync.payroll_records.find_one({"id": "R1"})
+    assert mongo.sync[YTD_COLL].find_one({"employee_id": "E1"})["applied_ops"] == []
+
+def test_replayed_increment_is_applied_once(mongo):
+    from backend.utils.payroll_ytd import _inc, ensure_ytd_indexes
+    async def run():
+        await ensure_ytd_indexes(mongo)
+        await _inc(mongo, "E1", 2024, {"gross_pay": 100.0}, "op-1")
+        await _inc(mongo, "E1", 2024, {"gross_pay": 100.0}, "op-1")
+        return await get_ytd(mongo, "E1", 2024)
+    assert asyncio.run(run())["gross_pay"] == 100.0
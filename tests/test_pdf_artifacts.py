@@ -0,0 +1,41 @@
+import asyncio
+from starlette.requests import Request
+from backend.utils.pdf_artifacts import DiskArtifactStore, PDFArtifactCache, artifact_key, artifact_response
+
+def _request(**headers):
+    raw = [(k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+def test_concurrent_downloads_render_once_and_evict_lru(tmp_path):
+    store = DiskArtifactStore(str(tmp_path), max_bytes=250)
+    cache = PDFArtifactCache(store)
+    renders = []
+    async def render(tag):
+        renders.append(tag)
+        await asyncio.sleep(0.01)
+        return tag.encode() * 100
+    async def run():
+        first = await asyncio.gather(*(cache.get_or_render(None, "submission", {"id": 1}, None, lambda: render("a"))
+                                       for _ in range(5)))
+        await cache.get_or_render(None, "submission", {"id": 2}, None, lambda: render("b"))
+        await cache.get_or_render(None, "submission", {"id": 1}, None, lambda: render("a"))  # touch: a is now newest
+        await cache.get_or_render(None, "submission", {"id": 3}, None, lambda: render("c"))
+        return first
+    first = asyncio.run(run())
+    assert renders == ["a", "b", "c"]
+    assert {k for k, _, _ in first} == {artifact_key("submission", {"id": 1})}
+    assert store._path(artifact_key("submission", {"id": 1})).exists()
+    assert not store._path(artifact_key("submission", {"id": 2})).exists()
+    assert artifact_key("submission", {"id": 1}) != artifact_key("submission", {"id": 1}, {"name": "Other clinic"})
+
+def test_etag_and_range_responses():
+    data = bytes(range(100))
+    etag = '"k1"'
+    assert artifact_response(_request(if_none_match=etag), "k1", data, "x.pdf").status_code == 304
+    part = artifact_response(_request(range="bytes=10-19"), "k1", data, "x.pdf")
+    assert part.status_code == 206 and part.body == data[10:20]
+    assert part.headers["content-range"] == "bytes 10-19/100"
+    assert artifact_response(_request(range="bytes=-5"), "k1", data, "x.pdf").body == data[95:]
+    assert artifact_response(_request(range="bytes=200-"), "k1", data, "x.pdf").status_code == 416
+    stale = artifact_response(_request(range="bytes=0-9", if_range='"old"'), "k1", data, "x.pdf")
+    assert stale.status_code == 200 and stale.body == data
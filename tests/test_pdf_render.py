@@ -0,0 +1,36 @@
+import asyncio
+from io import BytesIO
+from pypdf import PdfReader
+from backend.utils.pdf_render import PDFRenderService
+
+def _stubs(n):
+    return [{"employee_id": f"E{i}", "period": {"start_date": "2025-01-01", "end_date": "2025-01-15"},
+             "gross": 1000 + i, "deductions": 50, "taxes": 200, "net": 750 + i, "run_id": "R1", "record_id": f"P{i}"}
+            for i in range(n)]
+
+def _texts(pdf):
+    return [page.extract_text() for page in PdfReader(BytesIO(pdf)).pages]
+
+def test_renders_in_worker_processes():
+    async def run():
+        service = PDFRenderService(workers=2, chunk_pages=50)
+        try:
+            pdf = await service.render_paystubs(_stubs(3))
+            return pdf, service.metrics()
+        finally:
+            service.shutdown()
+    pdf, metrics = asyncio.run(run())
+    assert pdf.startswith(b"%PDF") and len(_texts(pdf)) == 3
+    assert metrics["jobs"] == 1 and metrics["chunked_jobs"] == 0 and metrics["failures"] == 0
+
+def test_large_batches_render_as_chunks_and_merge_in_order():
+    async def run():
+        service = PDFRenderService(workers=2, chunk_pages=2)
+        try:
+            return await service.render_paystubs(_stubs(5)), service.metrics()
+        finally:
+            service.shutdown()
+    pdf, metrics = asyncio.run(run())
+    texts = _texts(pdf)
+    assert len(texts) == 5 and all(f"E{i}" in t for i, t in enumerate(texts))
+    assert metrics["chunked_jobs"] == 1 and metrics["jobs"] == 3
@@ -0,0 +1,81 @@
+import asyncio
+from backend.utils.push import PushHub, sse_format
+
+def test_routes_by_user_and_topic_and_resumes_after_last_id():
+    async def run():
+        hub = PushHub(backend="local")
+        mine = hub.subscribe("u1", {"notifications", "queue"})
+        first = await hub.publish("notifications", {"n": 1}, user_id="u1")
+        await hub.publish("notifications", {"n": 2}, user_id="u2")
+        await hub.publish("webrtc", {"sdp": "x"}, user_id="u1")
+        await hub.publish("queue", {"encounter_id": "E1"})
+        live = [mine.queue.get_nowait()["data"] for _ in range(mine.queue.qsize())]
+        hub.unsubscribe(mine)
+
+        again = hub.subscribe("u1", {"notifications", "queue"})
+        stream = hub.stream(again, first["id"], heartbeat_s=0.01)
+        replayed = await stream.__anext__()
+        heartbeat = await stream.__anext__()
+        await stream.aclose()
+        return live, replayed, heartbeat
+    live, replayed, heartbeat = asyncio.run(run())
+    assert live == [{"n": 1}, {"encounter_id": "E1"}]
+    assert replayed["data"] == {"encounter_id": "E1"} and heartbeat is None
+    assert sse_format(None) == ": ping\n\n"
+
+def test_slow_subscriber_is_cut_off_not_buffered():
+    async def run():
+        hub = PushHub(backend="local")
+        sub = hub.subscribe("u1")
+        sub.queue = asyncio.Queue(2)
+        for i in range(5):
+            await hub.publish("notifications", {"n": i}, user_id="u1")
+        return sub, hub.metrics()
+    sub, metrics = asyncio.run(run())
+    assert sub.overflowed and sub.queue.qsize() == 2
+    assert metrics["delivered"] == 2 and metrics["overflowed"] == 1
+
+def test_workers_share_events_through_push_events_without_change_streams(mongo, monkeypatch):
+    import backend.utils.push as push
+    monkeypatch.setattr(push, "PUSH_POLL_S", 0.01)
+    monkeypatch.setattr(push, "PUSH_RETRY_MIN_S", 0.01)
+    async def run():
+        a, b = PushHub(backend="mongo"), PushHub(backend="mongo")
+        await a.start(mongo)
+        await b.start(mongo)
+        sub = b.subscribe("u1", {"webrtc"})
+        first = await a.publish("webrtc", {"sdp": "offer"}, user_id="u1")
+        await a.publish("webrtc", {"sdp": "answer"}, user_id="u1")
+        got = await asyncio.wait_for(sub.queue.get(), 1)
+        await asyncio.sleep(0.05)  # later polls must not redeliver
+        b.unsubscribe(sub)
+        # A reconnect that lands on a third worker replays from the collection
+        c = PushHub(backend="mongo")
+        c._db = mongo
+        replayed = await c.replay(c.subscribe("u1", {"webrtc"}), first["id"])
+        await a.stop()
+        await b.stop()
+        return got, sub.queue.qsize(), replayed, b.metrics()
+    got, left, replayed, metrics = asyncio.run(run())
+    assert got["data"] == {"sdp": "offer"} and left == 1
+    assert [e["data"] for e in replayed] == [{"sdp": "answer"}]
+    assert metrics["backend"] == "mongo" and metrics["delivery"] == "poll"
+
+def test_change_stream_is_restarted_after_a_failure(mongo, monkeypatch):
+    import backend.utils.push as push
+    monkeypatch.setattr(push, "PUSH_POLL_S", 0.01)
+    monkeypatch.setattr(push, "PUSH_RETRY_MIN_S", 0.01)
+    async def run():
+        hub = PushHub(backend="mongo")
+        attempts = []
+        async def watch(db):
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise ConnectionError("stream dropped")
+            await asyncio.sleep(3600)
+        hub._watch = watch
+        await hub.start(mongo)
+        await asyncio.sleep(0.1)
+        await hub.stop()
+        return len(attempts)
+    assert asyncio.run(run()) == 2
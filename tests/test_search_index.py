@@ -0,0 +1,51 @@
+from backend.utils.search_index import build_entry, decode_cursor, encode_cursor, score_entry, tokenize
+
+def test_document_entry_indexes_content_but_projects_summary():
+    doc = {"id": "D1", "title": "Echo report", "document_type": "imaging", "patient_id": "P1",
+           "content": "Left ventricular ejection fraction 55%. " * 50, "tags": ["cardiology"]}
+    entry = build_entry("documents", doc)
+    assert entry["ref_id"] == "D1"
+    assert {"echo", "ventricular", "ejection", "cardiology"} <= set(entry["tokens"])
+    assert "content" not in entry["data"]
+    assert entry["subtitle"] == "Type: imaging"
+
+def test_title_matches_outrank_body_matches_and_cursor_round_trips():
+    terms = tokenize("Echo")
+    assert score_entry(terms, ["echo", "report"]) > score_entry(terms, ["stress", "test"])
+    key = (-3, "documents", "D1")
+    assert decode_cursor(encode_cursor(key)) == key
+
+def test_search_ranks_in_mongo_and_pages_through_every_match(mongo):
+    import asyncio
+    from backend.utils.search_index import search
+    docs = [{"id": f"D{i:03d}", "title": "Echo report" if i % 50 == 7 else "Cardiology note",
+             "content": "echo", "document_type": "imaging"} for i in range(300)]
+    mongo.sync["search_index"].insert_many([build_entry("documents", d) for d in docs])
+    mongo.sync["search_index"].insert_one(build_entry("templates", {"id": "T1", "name": "Echo follow-up"}))
+
+    seen, cursor = [], None
+    while True:
+        res = asyncio.run(search(mongo, "echo", ["documents", "templates"], limit=40, cursor=cursor))
+        assert res["total_count"] == 301
+        seen += res["results"]
+        cursor = res["next_cursor"]
+        if not cursor:
+            break
+    assert len(seen) == 301 and len({(r["module"], r["id"]) for r in seen}) == 301
+    assert [r["score"] for r in seen[:7]] == [3] * 7 and seen[7]["score"] == 1
+    assert [(r["module"], r["id"]) for r in seen[:2]] == [("clinical-templates", "T1"), ("documents", "D007")]
+
+def test_patient_update_refreshes_its_entry(mongo, monkeypatch):
+    import asyncio
+    from backend import server_contaminated_14k as server
+    from backend.utils.search_index import search
+    monkeypatch.setattr(server, "db", mongo)
+    mongo.sync.patients.insert_one({"id": "P1", "name": [{"family": "Smith", "given": ["Jane"]}],
+                                    "created_at": "2024-01-01T00:00:00"})
+    mongo.sync["search_index"].insert_one(build_entry("patients", mongo.sync.patients.find_one({}, {"_id": 0})))
+    update = server.PatientCreate(first_name="Jane", last_name="Doe", date_of_birth="1980-02-03",
+                                  email="jane@example.com", phone="555-0100")
+    asyncio.run(server.update_patient.__wrapped__("P1", update, None, None))
+    found = asyncio.run(search(mongo, "doe", ["patients"]))["results"]
+    assert [r["id"] for r in found] == ["P1"] and found[0]["data"]["birth_date"] == "1980-02-03"
+    assert asyncio.run(search(mongo, "smith", ["patients"]))["results"] == []